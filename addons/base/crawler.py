@@ -0,0 +1,153 @@
+"""Concurrent crawling of addon file trees through WaterButler, e.g. to stat them for archiving"""
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from website import settings
+
+logger = logging.getLogger(__name__)
+
+_session = None
+_session_lock = threading.Lock()
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_session():
+    """Process wide requests session, pooling connections to WaterButler across folders and crawls."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_maxsize=settings.ADDON_CRAWL_WORKERS)
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+        return _session
+
+
+class TokenBucket(object):
+    """
+    Rate limiter allowing `rate` acquisitions per second on average, and bursts of up to `capacity`.
+    A falsy `rate` doesn't limit.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(rate or 0, 1)
+        self.tokens = self.capacity
+        self.updated = time.time()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self.lock:
+                now = time.time()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+
+def get_rate_limiter(provider):
+    """The rate limiter shared by all of this process's crawls of `provider`, see `ADDON_CRAWL_RATE_LIMITS`."""
+    with _rate_limiters_lock:
+        if provider not in _rate_limiters:
+            rate = settings.ADDON_CRAWL_RATE_LIMITS.get(provider, settings.ADDON_CRAWL_RATE_LIMITS['default'])
+            _rate_limiters[provider] = TokenBucket(rate)
+        return _rate_limiters[provider]
+
+
+class FileTreeCrawler(object):
+    """
+    Crawl a file tree breadth first, listing up to `workers` folders at once and no faster than the provider's
+    rate limit allows.
+
+    The children listed for each folder path are kept in `listings`. It can be passed back in to resume a
+    crawl that failed, without listing the folders that were already listed again.
+
+    :param callable list_folder: takes a folder's metadata and returns the metadata of its children
+    :param str provider: the addon's short name, for rate limiting
+    """
+
+    def __init__(self, list_folder, provider, workers=None, listings=None):
+        self.list_folder = list_folder
+        self.rate_limiter = get_rate_limiter(provider)
+        self.provider = provider
+        self.workers = workers or settings.ADDON_CRAWL_WORKERS
+        self.listings = {} if listings is None else listings
+        self.listed = 0
+        self.elapsed = 0
+
+    @property
+    def folders_per_second(self):
+        return self.listed / self.elapsed if self.elapsed else 0
+
+    def _list_folder(self, folder):
+        self.rate_limiter.acquire()
+        return self.list_folder(folder)
+
+    def crawl(self, root):
+        """
+        List every folder under `root` and return `root` with the metadata of its children, recursively,
+        in 'children'.
+
+        :raises: the first error raised listing a folder, once the folders being listed are done
+        """
+        start = time.time()
+        futures = {}
+        error = None
+
+        def visit(executor, folder):
+            if folder.get('kind') == 'file':
+                return
+            listing = self.listings.get(folder['path'])
+            if listing is None:
+                futures[executor.submit(self._list_folder, folder)] = folder
+                return
+            for child in listing:
+                visit(executor, child)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            visit(executor, root)
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    folder = futures.pop(future)
+                    if future.cancelled():
+                        continue
+                    try:
+                        listing = future.result()
+                    except Exception as e:
+                        if error is None:
+                            error = e
+                            # Keep what is being listed, drop what hasn't started
+                            for pending in futures:
+                                pending.cancel()
+                        continue
+                    self.listings[folder['path']] = listing
+                    self.listed += 1
+                    if error is None:
+                        visit(executor, folder)
+
+        self.elapsed = time.time() - start
+        logger.info('Listed {} {} folders in {:.1f}s ({:.1f} folders/s), {} listed before'.format(
+            self.listed, self.provider, self.elapsed, self.folders_per_second, len(self.listings) - self.listed,
+        ))
+        if error is not None:
+            raise error
+        return self._build_tree(root)
+
+    def _build_tree(self, folder):
+        if folder.get('kind') == 'file':
+            return folder
+        folder['children'] = [self._build_tree(dict(child)) for child in self.listings[folder['path']]]
+        return folder
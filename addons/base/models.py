@@ -1,9 +1,8 @@
 import abc
+import functools
 import os
-import time
 
 import markupsafe
-import requests
 from django.db import models
 from django.utils import timezone
 from framework.auth import Auth
@@ -17,7 +16,7 @@ from osf.models.user import OSFUser
 from osf.utils.datetime_aware_jsonfield import DateTimeAwareJSONField
 from osf.utils.fields import NonNaiveDateTimeField
 from website import settings
-from addons.base import logger, serializer
+from addons.base import crawler, logger, serializer
 from website.oauth.signals import oauth_complete
 
 lookup = TemplateLookup(
@@ -564,7 +563,7 @@ class BaseStorageAddon(object):
             name = name + ': {folder}'.format(folder=folder_name)
         return name
 
-    def _get_fileobj_child_metadata(self, filenode, user, cookie=None, version=None):
+    def _get_fileobj_child_metadata(self, filenode, user, cookie=None, version=None, base_url=None, owner_id=None):
         from api.base.utils import waterbutler_api_url_for
 
         kwargs = {}
@@ -576,32 +575,31 @@ class BaseStorageAddon(object):
             kwargs['cookie'] = user.get_or_create_cookie().decode()
 
         metadata_url = waterbutler_api_url_for(
-            self.owner._id,
+            owner_id or self.owner._id,
             self.config.short_name,
             path=filenode.get('path', '/'),
             user=user,
             view_only=True,
             _internal=True,
-            base_url=self.owner.osfstorage_region.waterbutler_url,
+            base_url=base_url or self.owner.osfstorage_region.waterbutler_url,
             **kwargs
         )
 
-        res = requests.get(metadata_url)
+        res = crawler.get_session().get(metadata_url, timeout=settings.ADDON_CRAWL_TIMEOUT)
 
         if res.status_code != 200:
             raise HTTPError(res.status_code, data={'error': res.json()})
 
-        # TODO: better throttling?
-        time.sleep(1.0 / 5.0)
-
         data = res.json().get('data', None)
         if data:
             return [child['attributes'] for child in data]
         return []
 
-    def _get_file_tree(self, filenode=None, user=None, cookie=None, version=None):
+    def _get_file_tree(self, filenode=None, user=None, cookie=None, version=None, listings=None):
         """
-        Recursively get file metadata
+        Recursively get file metadata, listing several folders at once, see `addons.base.crawler`.
+
+        :param dict listings: folder listings to fill in, and to reuse from a previous attempt if given
         """
         filenode = filenode or {
             'path': '/',
@@ -611,15 +609,18 @@ class BaseStorageAddon(object):
         if filenode.get('kind') == 'file':
             return filenode
 
-        kwargs = {
-            'version': version,
-            'cookie': cookie,
-        }
-        filenode['children'] = [
-            self._get_file_tree(child, user, cookie=cookie)
-            for child in self._get_fileobj_child_metadata(filenode, user, **kwargs)
-        ]
-        return filenode
+        # Look these up once here, folders are listed in other threads
+        if not cookie and user:
+            cookie = user.get_or_create_cookie().decode()
+        list_folder = functools.partial(
+            self._get_fileobj_child_metadata,
+            user=user,
+            cookie=cookie,
+            version=version,
+            base_url=self.owner.osfstorage_region.waterbutler_url,
+            owner_id=self.owner._id,
+        )
+        return crawler.FileTreeCrawler(list_folder, self.config.short_name, listings=listings).crawl(filenode)
 
 
 class BaseOAuthNodeSettings(BaseNodeSettings):
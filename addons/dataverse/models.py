@@ -147,9 +147,9 @@ class NodeSettings(BaseOAuthNodeSettings, BaseStorageAddon):
                 auth=auth,
             )
 
-    def _get_fileobj_child_metadata(self, filenode, user, cookie=None, version=None):
+    def _get_fileobj_child_metadata(self, filenode, user, cookie=None, version=None, **kwargs):
         try:
-            return super(NodeSettings, self)._get_fileobj_child_metadata(filenode, user, cookie=cookie, version=version)
+            return super(NodeSettings, self)._get_fileobj_child_metadata(filenode, user, cookie=cookie, version=version, **kwargs)
         except HTTPError as e:
             # The Dataverse API returns a 404 if the dataset has no published files
             if e.code == http_status.HTTP_404_NOT_FOUND and version == 'latest-published':
@@ -24,17 +24,15 @@ from addons.osfstorage.tests.utils import make_payload
 from framework.auth import signing
 from website.util import rubeus, api_url_for
 from framework.auth import cas
-from api.caching.utils import storage_usage_cache
 
 from osf import features
-from osf.models import Tag, QuickFilesNode
+from osf.models import Tag, QuickFilesNode, NodeStorageUsage
 from osf.models import files as models
 from addons.osfstorage.apps import osf_storage_root
 from addons.osfstorage import utils
 from addons.base.views import make_auth, addon_view_file
 from addons.osfstorage import settings as storage_settings
 from api_tests.utils import create_test_file, create_test_preprint_file
-from api.caching.settings import STORAGE_USAGE_KEY
 
 from osf_tests.factories import ProjectFactory, ApiOAuth2PersonalTokenFactory, PreprintFactory
 from website.files.utils import attach_versions
@@ -444,24 +442,23 @@ class TestUploadFileHook(HookTestCase):
     def test_add_file_updates_cache(self):
         name = 'ლ(ಠ益ಠლ).unicode'
         parent = self.node_settings.get_root()
-        key = STORAGE_USAGE_KEY.format(target_id=self.node._id)
-        assert storage_usage_cache.get(key) is None
+        assert not NodeStorageUsage.objects.filter(node=self.node).exists()
 
         with override_flag(features.STORAGE_USAGE, active=True):
             self.send_upload_hook(parent, payload=self.make_payload(name=name))
-        assert storage_usage_cache.get(key) == 123
+        assert NodeStorageUsage.objects.get(node=self.node).total == 123
 
         # Don't update the cache for duplicate uploads
         with override_flag(features.STORAGE_USAGE, active=True):
             self.send_upload_hook(parent, payload=self.make_payload(name=name))
-        assert storage_usage_cache.get(key) == 123
+        assert NodeStorageUsage.objects.get(node=self.node).total == 123
 
         # Do update the cache for new versions
         payload = self.make_payload(name=name)
         payload['metadata']['name'] = 'new hash'
         with override_flag(features.STORAGE_USAGE, active=True):
             self.send_upload_hook(parent, payload=payload)
-        assert storage_usage_cache.get(key) == 246
+        assert NodeStorageUsage.objects.get(node=self.node).total == 246
 
 
 @pytest.mark.django_db
@@ -981,8 +978,6 @@ class TestDeleteHookNode(DeleteHook):
 class TestDeleteHookProjectOnly(DeleteHook):
 
     def test_delete_reduces_cache_size(self):
-        key = STORAGE_USAGE_KEY.format(target_id=self.node._id)
-
         file = create_record_with_version('new file', self.node_settings, size=123)
         assert self.node.storage_usage == 123
 
@@ -992,7 +987,7 @@ class TestDeleteHookProjectOnly(DeleteHook):
         assert_equal(resp.status_code, 200)
         assert_equal(resp.json, {'status': 'success'})
 
-        assert storage_usage_cache.get(key) == 0
+        assert NodeStorageUsage.objects.get(node=self.node).total == 0
         assert_is(self.node.storage_usage, 0)
 
 
@@ -1347,9 +1342,8 @@ class TestMoveHookProjectsOnly(TestMoveHook):
                 target=self.node,
                 method='post_json',)
 
-        # Cache should stay untouched because net storage usage hasn't changed
-        key = STORAGE_USAGE_KEY.format(target_id=self.project._id)
-        assert storage_usage_cache.get(key) is None
+        # Total should stay untouched because net storage usage hasn't changed
+        assert NodeStorageUsage.objects.get(node=self.project).total == 123
 
         assert_equal(res.status_code, 200)
 
@@ -1385,11 +1379,8 @@ class TestMoveHookProjectsOnly(TestMoveHook):
                 method='post_json',)
 
         # both caches are updated
-        source_key = STORAGE_USAGE_KEY.format(target_id=self.project._id)
-        assert storage_usage_cache.get(source_key) == 0
-
-        destination = STORAGE_USAGE_KEY.format(target_id=other_target._id)
-        assert storage_usage_cache.get(destination) == 123
+        assert NodeStorageUsage.objects.get(node=self.project).total == 0
+        assert NodeStorageUsage.objects.get(node=other_target).total == 123
 
         assert_equal(res.status_code, 200)
 
@@ -1460,11 +1451,8 @@ class TestCopyHook(HookTestCase):
                 method='post_json',)
 
         # both caches are updated
-        source_key = STORAGE_USAGE_KEY.format(target_id=self.project._id)
-        assert storage_usage_cache.get(source_key) == 123
-
-        destination = STORAGE_USAGE_KEY.format(target_id=other_target._id)
-        assert storage_usage_cache.get(destination) == 123
+        assert NodeStorageUsage.objects.get(node=self.project).total == 123
+        assert NodeStorageUsage.objects.get(node=other_target).total == 123
 
         assert_equal(res.status_code, 201)
 
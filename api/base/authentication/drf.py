@@ -34,11 +34,7 @@ def get_session_from_cookie(cookie_val):
         session_id = ensure_str(itsdangerous.Signer(settings.SECRET_KEY).unsign(cookie_val))
     except itsdangerous.BadSignature:
         return None
-    try:
-        session = Session.objects.get(_id=session_id)
-        return session
-    except Session.DoesNotExist:
-        return None
+    return Session.load_cached(session_id)
 
 
 def check_user(user):
@@ -229,11 +225,12 @@ class OSFCASAuthentication(authentication.BaseAuthentication):
         The `user` in `cas_auth_response` is the unique GUID of the user. Please do not use
         the primary key `id` or the email `username`.
 
+        Token profiles are cached for a short time, see `cas.get_cached_profile`.
+
         :param request: the request
         :return: the user who owns the bear token and the cas repsonse
         """
 
-        client = cas.get_client()
         try:
             auth_header_field = request.META['HTTP_AUTHORIZATION']
             auth_token = cas.parse_auth_header(auth_header_field)
@@ -241,7 +238,7 @@ class OSFCASAuthentication(authentication.BaseAuthentication):
             return None
 
         try:
-            cas_auth_response = client.profile(auth_token)
+            cas_auth_response = cas.get_cached_profile(auth_token)
         except cas.CasHTTPError:
             raise exceptions.NotAuthenticated(_('User provided an invalid OAuth2 access token'))
 
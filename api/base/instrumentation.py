@@ -0,0 +1,187 @@
+"""Per request instrumentation of API views
+
+`InstrumentationMiddleware` starts a `RequestTimings` for each request. While it's active the database backend,
+elasticsearch connections, serializers and embeds record what they do into it, and when the request ends its
+timings are added to per view histograms and can be reported in a Server-Timing header.
+
+Kept free of Django imports so that database backends and settings can import it.
+"""
+import bisect
+import contextlib
+import functools
+import logging
+import threading
+import time
+from collections import Counter, defaultdict, OrderedDict
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+# Timings recorded for each request, in Server-Timing order
+DB = 'db'
+ES = 'es'
+SERIALIZER = 'serializer'
+EMBED = 'embed'
+TIMINGS = (DB, ES, SERIALIZER, EMBED)
+
+# Upper bounds of the histogram buckets
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+DURATION_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class RequestTimings(object):
+    """Counts and durations, in seconds, of what a request spent its time on."""
+
+    def __init__(self):
+        self.start = time.time()
+        self.duration = None
+        self.counts = Counter()
+        self.durations = Counter()
+        self.depths = Counter()
+        self.view_fqn = None
+        self.query_budget = None
+
+    def add(self, name, duration, count=1):
+        self.counts[name] += count
+        self.durations[name] += duration
+
+    def finish(self):
+        self.duration = time.time() - self.start
+
+    def server_timing(self):
+        """The timings as the value of a Server-Timing header, durations in milliseconds."""
+        metrics = [
+            '{};desc="{} {}";dur={:.1f}'.format(
+                name, self.counts[name], 'queries' if name == DB else 'calls', self.durations[name] * 1000,
+            ) if name in (DB, ES) else '{};dur={:.1f}'.format(name, self.durations[name] * 1000)
+            for name in TIMINGS
+        ]
+        metrics.append('total;dur={:.1f}'.format((self.duration or 0) * 1000))
+        return ', '.join(metrics)
+
+
+def start():
+    _local.timings = RequestTimings()
+    return _local.timings
+
+
+def stop():
+    timings = current()
+    _local.timings = None
+    if timings is not None:
+        timings.finish()
+    return timings
+
+
+def current():
+    """The timings of the request being handled by this thread, None if it isn't instrumented."""
+    return getattr(_local, 'timings', None)
+
+
+@contextlib.contextmanager
+def timed(name):
+    """
+    Record the time spent in the block under `name`. Only the outermost block is recorded when they nest,
+    e.g. for serializers that serialize embedded resources.
+    """
+    timings = current()
+    if timings is None or timings.depths[name]:
+        yield
+    else:
+        timings.depths[name] += 1
+        start = time.time()
+        try:
+            yield
+        finally:
+            timings.depths[name] -= 1
+            timings.add(name, time.time() - start)
+
+
+def timer(name):
+    """Decorator recording the time spent in the function under `name`, see `timed`."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapped(*args, **kwargs):
+            with timed(name):
+                return func(*args, **kwargs)
+        return wrapped
+    return decorator
+
+
+def instrument_es_connection(connection_class):
+    """Subclass of an elasticsearch connection class that records its requests."""
+    class InstrumentedConnection(connection_class):
+        def perform_request(self, *args, **kwargs):
+            with timed(ES):
+                return super(InstrumentedConnection, self).perform_request(*args, **kwargs)
+
+    InstrumentedConnection.__name__ = 'Instrumented{}'.format(connection_class.__name__)
+    return InstrumentedConnection
+
+
+class Histogram(object):
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def as_dict(self):
+        buckets = OrderedDict(
+            ('<={}'.format(bound), count) for bound, count in zip(self.buckets, self.counts)
+        )
+        buckets['+Inf'] = self.counts[-1]
+        return OrderedDict([('count', self.count), ('sum', self.sum), ('buckets', buckets)])
+
+
+def _new_view_histograms():
+    histograms = OrderedDict([('queries', Histogram(QUERY_COUNT_BUCKETS))])
+    for name in TIMINGS + ('total', ):
+        histograms['{}_ms'.format(name)] = Histogram(DURATION_BUCKETS_MS)
+    return histograms
+
+
+# view_fqn -> histogram name -> Histogram
+view_histograms = defaultdict(_new_view_histograms)
+_histograms_lock = threading.Lock()
+
+
+def record_view(timings, log_interval=None):
+    """Add a finished request's timings to the histograms of its view, logging them every `log_interval` requests."""
+    with _histograms_lock:
+        histograms = view_histograms[timings.view_fqn]
+        histograms['queries'].observe(timings.counts[DB])
+        for name in TIMINGS:
+            histograms['{}_ms'.format(name)].observe(timings.durations[name] * 1000)
+        histograms['total_ms'].observe(timings.duration * 1000)
+        if log_interval and histograms['total_ms'].count % log_interval == 0:
+            logger.info('Timings of %s: %s', timings.view_fqn, get_view_stats(timings.view_fqn))
+
+
+def get_view_stats(view_fqn):
+    return OrderedDict((name, histogram.as_dict()) for name, histogram in view_histograms[view_fqn].items())
+
+
+def check_query_budget(timings, raise_error=False):
+    """
+    Raise or log when a request made more queries than its view's `query_budget`.
+
+    :raises QueryBudgetExceeded: if `raise_error`
+    """
+    if timings.query_budget is None or timings.counts[DB] <= timings.query_budget:
+        return
+    message = '{} made {} queries, over its budget of {}'.format(timings.view_fqn, timings.counts[DB], timings.query_budget)
+    if raise_error:
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
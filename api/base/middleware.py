@@ -23,6 +23,7 @@ from framework.celery_tasks.handlers import (
     celery_teardown_request,
 )
 from .api_globals import api_globals
+from api.base import instrumentation
 from api.base import settings as api_settings
 from waffle.middleware import WaffleMiddleware
 from waffle.models import Flag
@@ -63,6 +64,35 @@ SLOAN_FEATURES = {
 from django.db.models import Q
 
 
+class InstrumentationMiddleware(MiddlewareMixin):
+    """
+    Record the SQL queries, elasticsearch calls, serializer and embed time of each request, aggregate them
+    per view, report them in a Server-Timing header, and enforce views' query budgets.
+    """
+    def process_request(self, request):
+        if api_settings.INSTRUMENT_REQUESTS:
+            instrumentation.start()
+
+    def process_view(self, request, callback, callback_args, callback_kwargs):
+        timings = instrumentation.current()
+        view_class = getattr(callback, 'view_class', None)
+        if timings is not None and getattr(view_class, 'view_name', None):
+            timings.view_fqn = ':'.join([view_class.view_category, view_class.view_name])
+            if request.method in ('GET', 'HEAD'):
+                timings.query_budget = getattr(view_class, 'query_budget', None)
+
+    def process_response(self, request, response):
+        timings = instrumentation.stop()
+        if timings is None:
+            return response
+        if timings.view_fqn:
+            instrumentation.record_view(timings, log_interval=api_settings.INSTRUMENTATION_LOG_INTERVAL)
+        if api_settings.SERVER_TIMING_HEADER:
+            response['Server-Timing'] = timings.server_timing()
+        instrumentation.check_query_budget(timings, raise_error=api_settings.QUERY_BUDGET_RAISE)
+        return response
+
+
 class CeleryTaskMiddleware(MiddlewareMixin):
     """Celery Task middleware."""
 
@@ -1,8 +1,19 @@
+import base64
+import datetime
+import decimal
+import functools
+import hashlib
+import json
+import uuid
+
 from django.utils import six
-from collections import OrderedDict
+from collections import OrderedDict, namedtuple
 from django.urls import reverse
-from django.core.paginator import InvalidPage, Paginator as DjangoPaginator
-from django.db.models import QuerySet
+from django.core.cache import caches
+from django.core.paginator import EmptyPage, InvalidPage, Page, PageNotAnInteger, Paginator as DjangoPaginator
+from django.db import connections
+from django.db.models import Model, Q, QuerySet
+from django.utils.functional import cached_property
 
 from rest_framework import pagination
 from rest_framework.exceptions import NotFound
@@ -11,23 +22,210 @@ from rest_framework.utils.urls import (
     replace_query_param, remove_query_param,
 )
 from api.base.serializers import is_anonymized
-from api.base.settings import MAX_PAGE_SIZE
+from api.base.settings import (
+    MAX_PAGE_SIZE,
+    LIST_COUNT_CACHE_NAME,
+    LIST_COUNT_CACHE_TIMEOUT,
+    LIST_COUNT_ESTIMATE_THRESHOLD,
+)
 from api.base.utils import absolute_reverse
 
 from osf.models import AbstractNode, Comment, Preprint, Guid, DraftRegistration
 from website.search.elastic_search import DOC_TYPE_TO_MODEL
 
 
+# How a view counts its lists for meta.total, see `JSONAPIPagination.get_count`
+COUNT_EXACT = 'exact'
+COUNT_CACHED = 'cached'
+COUNT_ESTIMATE = 'estimate'
+COUNT_STRATEGIES = (COUNT_EXACT, COUNT_CACHED, COUNT_ESTIMATE)
+
+# Query params that don't change which objects a list contains, left out of count cache keys
+COUNT_CACHE_IGNORED_PARAMS = ('page', 'sort', 'embed', 'fields', 'version', 'format', 'related_counts', '_')
+
+CursorPage = namedtuple('CursorPage', ['cursor', 'previous', 'next', 'count', 'per_page'])
+
+
+def get_keyset_ordering(queryset):
+    """
+    The ordering of `queryset` as a list of field names ending in the primary key, so that it orders rows
+    uniquely and can be used for keyset pagination; None if the queryset is ordered by something other than
+    fields (expressions, extra or random ordering) or isn't a queryset.
+    """
+    if not isinstance(queryset, QuerySet) or queryset.query.extra_order_by:
+        return None
+    query = queryset.query
+    ordering = query.order_by or (query.get_meta().ordering if query.default_ordering else [])
+    if not all(isinstance(field, six.string_types) and field != '?' for field in ordering):
+        return None
+    pk_names = ('pk', queryset.model._meta.pk.name)
+    keyset_ordering = []
+    for field in ordering:
+        keyset_ordering.append(field)
+        if field.lstrip('-') in pk_names:
+            return keyset_ordering
+    return keyset_ordering + ['pk']
+
+
+def _get_field_value(obj, field):
+    value = obj
+    for attr in field.lstrip('-').split('__'):
+        if value is None:
+            return None
+        value = getattr(value, attr)
+    if isinstance(value, Model):
+        return value.pk
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        # Full precision, unlike DjangoJSONEncoder which truncates to milliseconds
+        return value.isoformat()
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    return value
+
+
+def get_keyset_position(obj, ordering):
+    """The values of the `ordering` fields of `obj`, as stored in a cursor."""
+    return [_get_field_value(obj, field) for field in ordering]
+
+
+def get_keyset_filter(ordering, position, reverse=False):
+    """
+    Q matching the rows that come after `position` when ordered by `ordering`, or before it if `reverse`.
+    NULLs sort last in ascending and first in descending order, as they do in Postgres.
+    """
+    keyset_filter = Q(pk__in=[])
+    equal = Q()
+    for field, value in zip(ordering, position):
+        name = field.lstrip('-')
+        nullable = name not in ('pk', 'id')
+        # Whether rows on this side of the position have greater values of this field
+        greater = field.startswith('-') == reverse
+        if greater and value is not None:
+            compare = Q(**{name + '__gt': value})
+            if nullable:
+                compare |= Q(**{name + '__isnull': True})
+            keyset_filter |= equal & compare
+        elif not greater:
+            compare = Q(**{name + '__isnull': False}) if value is None else Q(**{name + '__lt': value})
+            keyset_filter |= equal & compare
+        equal &= Q(**{name + '__isnull': True}) if value is None else Q(**{name: value})
+    return keyset_filter
+
+
+def encode_cursor(position, reverse=False):
+    data = json.dumps({'p': position, 'r': reverse}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """
+    :return tuple: (position, reverse)
+    :raises ValueError: if the cursor is malformed
+    """
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+        position, reverse = data['p'], data['r']
+    except (TypeError, KeyError, UnicodeError, ValueError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(position, list) or not isinstance(reverse, bool):
+        raise ValueError('Invalid cursor')
+    return position, reverse
+
+
+class LookaheadPage(Page):
+    """Page that knows whether there is a next page from the rows past it, rather than from the count."""
+
+    def __init__(self, object_list, number, paginator, has_next):
+        super(LookaheadPage, self).__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+
+class CountedPaginator(DjangoPaginator):
+    """
+    Django paginator that gets the count of its object list from `get_count`. When `count_is_exact` says
+    that count is only approximate it's only reported, and pages are found by their rows instead: a page
+    exists if it has any, and has a next page if a row past it exists, fetched along with the page.
+    """
+
+    def __init__(self, object_list, per_page, get_count=None, count_is_exact=None, **kwargs):
+        super(CountedPaginator, self).__init__(object_list, per_page, **kwargs)
+        self.get_count = get_count
+        self.count_is_exact = count_is_exact
+
+    @cached_property
+    def count(self):
+        if self.get_count is None:
+            return super(CountedPaginator, self).count
+        return self.get_count(self.object_list)
+
+    @property
+    def is_exact(self):
+        # Whether the count is exact is only known once it's counted
+        self.count
+        return self.count_is_exact is None or self.count_is_exact()
+
+    def page(self, number):
+        if self.is_exact:
+            return super(CountedPaginator, self).page(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        bottom = (number - 1) * self.per_page
+        object_list = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not object_list and (number > 1 or not self.allow_empty_first_page):
+            raise EmptyPage('That page contains no results')
+        return LookaheadPage(object_list[:self.per_page], number, self, has_next=len(object_list) > self.per_page)
+
+
 class JSONAPIPagination(pagination.PageNumberPagination):
     """
     Custom paginator that formats responses in a JSON-API compatible format.
 
     Properly handles pagination of embedded objects.
 
+    Views choose how meta.total is counted with `count_strategy`; for strategies other than exact the
+    kind of count returned is reported as meta.total_type.
+
+    Views that set `cursor_pagination` can also be paginated by cursor: `page[cursor]=` returns the first
+    page and links to the next and previous pages carry opaque cursors. Pages are selected with a keyset
+    filter on the view's ordering and the primary key instead of an offset, and no total is counted unless
+    the view's count strategy is cached or estimate.
+
     """
 
     page_size_query_param = 'page[size]'
     max_page_size = MAX_PAGE_SIZE
+    cursor_query_param = 'page[cursor]'
+    invalid_cursor_message = 'Invalid cursor'
+    cursor_page = None
+    count_type = None
+
+    @property
+    def django_paginator_class(self):
+        return functools.partial(CountedPaginator, get_count=self.get_count, count_is_exact=self.count_is_exact)
+
+    def count_is_exact(self):
+        return self.count_type in (None, COUNT_EXACT)
+
+    def cursor_query(self, url, cursor):
+        """
+        Builds uri and adds cursor param.
+        """
+        url = remove_query_param(self.request.build_absolute_uri(url), '_')
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
 
     def page_number_query(self, url, page_number):
         """
@@ -42,32 +240,62 @@ class JSONAPIPagination(pagination.PageNumberPagination):
         return paginated_url
 
     def get_self_real_link(self, url):
+        if self.cursor_page:
+            return self.cursor_query(url, self.cursor_page.cursor)
         page_number = self.page.number
         return self.page_number_query(url, page_number)
 
     def get_first_real_link(self, url):
+        if self.cursor_page:
+            if not self.cursor_page.previous:
+                return None
+            return self.cursor_query(url, '')
         if not self.page.has_previous():
             return None
         return self.page_number_query(url, 1)
 
     def get_last_real_link(self, url):
-        if not self.page.has_next():
+        # Finding the last page by cursor, or without an exact count, would mean walking the whole list
+        if self.cursor_page or not self.page.has_next() or not self.page.paginator.is_exact:
             return None
         page_number = self.page.paginator.num_pages
         return self.page_number_query(url, page_number)
 
     def get_previous_real_link(self, url):
+        if self.cursor_page:
+            if not self.cursor_page.previous:
+                return None
+            return self.cursor_query(url, self.cursor_page.previous)
         if not self.page.has_previous():
             return None
         page_number = self.page.previous_page_number()
         return self.page_number_query(url, page_number)
 
     def get_next_real_link(self, url):
+        if self.cursor_page:
+            if not self.cursor_page.next:
+                return None
+            return self.cursor_query(url, self.cursor_page.next)
         if not self.page.has_next():
             return None
         page_number = self.page.next_page_number()
         return self.page_number_query(url, page_number)
 
+    def get_meta(self):
+        if self.cursor_page:
+            meta = OrderedDict()
+            if self.cursor_page.count is not None:
+                meta['total'] = self.cursor_page.count
+            meta['per_page'] = self.cursor_page.per_page
+        else:
+            meta = OrderedDict([
+                ('total', self.page.paginator.count),
+                ('per_page', self.page.paginator.per_page),
+            ])
+        if self.count_type:
+            meta['total_type'] = self.count_type
+        return meta
+
     def get_response_dict_deprecated(self, data, url):
         return OrderedDict([
             ('data', data),
@@ -77,12 +305,7 @@ class JSONAPIPagination(pagination.PageNumberPagination):
                     ('last', self.get_last_real_link(url)),
                     ('prev', self.get_previous_real_link(url)),
                     ('next', self.get_next_real_link(url)),
-                    (
-                        'meta', OrderedDict([
-                            ('total', self.page.paginator.count),
-                            ('per_page', self.page.paginator.per_page),
-                        ]),
-                    ),
+                    ('meta', self.get_meta()),
                 ]),
             ),
         ])
@@ -90,12 +313,7 @@ class JSONAPIPagination(pagination.PageNumberPagination):
     def get_response_dict(self, data, url):
         return OrderedDict([
             ('data', data),
-            (
-                'meta', OrderedDict([
-                    ('total', self.page.paginator.count),
-                    ('per_page', self.page.paginator.per_page),
-                ]),
-            ),
+            ('meta', self.get_meta()),
             (
                 'links', OrderedDict([
                     ('self', self.get_self_real_link(url)),
@@ -141,13 +359,15 @@ class JSONAPIPagination(pagination.PageNumberPagination):
 
         If this is an embedded resource, returns first page, ignoring query params.
         """
+        # Needed to count the queryset
+        self.request = request
         if request.parser_context['kwargs'].get('is_embedded'):
             # Pagination requires an order by clause, especially when using Postgres.
             # see: https://docs.djangoproject.com/en/1.10/topics/pagination/#required-arguments
             if isinstance(queryset, QuerySet) and not queryset.ordered:
                 queryset = queryset.order_by(queryset.model._meta.pk.name)
 
-            paginator = DjangoPaginator(queryset, self.page_size)
+            paginator = self.django_paginator_class(queryset, self.page_size)
             page_number = 1
             try:
                 self.page = paginator.page(page_number)
@@ -165,8 +385,121 @@ class JSONAPIPagination(pagination.PageNumberPagination):
             return list(self.page)
 
         else:
+            view = request.parser_context['view']
+            if getattr(view, 'cursor_pagination', False) and self.cursor_query_param in request.query_params:
+                ordering = get_keyset_ordering(queryset)
+                # Lists that can't be ordered by fields keep their page links, which clients can follow as well
+                if ordering:
+                    return self.paginate_queryset_by_cursor(queryset, ordering, request, view)
             return super(JSONAPIPagination, self).paginate_queryset(queryset, request, view=None)
 
+    def paginate_queryset_by_cursor(self, queryset, ordering, request, view):
+        self.request = request
+        page_size = self.get_page_size(request)
+        cursor = request.query_params[self.cursor_query_param]
+        position, reverse = None, False
+        if cursor:
+            try:
+                position, reverse = decode_cursor(cursor)
+            except ValueError:
+                raise NotFound(self.invalid_cursor_message)
+            if len(position) != len(ordering):
+                # A cursor from a differently sorted list
+                raise NotFound(self.invalid_cursor_message)
+
+        count = None
+        if getattr(view, 'count_strategy', COUNT_EXACT) != COUNT_EXACT:
+            count = self.get_count(queryset)
+
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(get_keyset_filter(ordering, position, reverse))
+        if reverse:
+            queryset = queryset.reverse()
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+            has_previous, has_next = has_more, True
+        else:
+            has_previous, has_next = position is not None, has_more
+
+        previous_position = get_keyset_position(results[0], ordering) if results else position
+        next_position = get_keyset_position(results[-1], ordering) if results else position
+        self.cursor_page = CursorPage(
+            cursor=cursor,
+            previous=encode_cursor(previous_position, reverse=True) if has_previous else None,
+            next=encode_cursor(next_position) if has_next and next_position is not None else None,
+            count=count,
+            per_page=page_size,
+        )
+        return results
+
+    def get_count(self, queryset):
+        """
+        Count `queryset` for meta.total by the view's `count_strategy`:
+
+        * exact: count it every time
+        * cached: count it exactly, then reuse the count for `count_cache_timeout` seconds
+        * estimate: use the planner's row estimate if it's above `count_estimate_threshold`, otherwise count it
+
+        Stale or estimated counts are only reported, see `CountedPaginator`, so they never hide rows. Lists
+        without an exact count have no last link.
+        """
+        view = self.request.parser_context['view']
+        strategy = getattr(view, 'count_strategy', COUNT_EXACT)
+        assert strategy in COUNT_STRATEGIES, 'Unknown count strategy {}'.format(strategy)
+        if not isinstance(queryset, QuerySet):
+            return len(queryset)
+        if strategy == COUNT_CACHED:
+            self.count_type = COUNT_CACHED
+            return self.get_cached_count(queryset, view)
+        if strategy == COUNT_ESTIMATE:
+            threshold = getattr(view, 'count_estimate_threshold', None)
+            if threshold is None:
+                threshold = LIST_COUNT_ESTIMATE_THRESHOLD
+            estimate = self.get_estimated_count(queryset)
+            if estimate > threshold:
+                self.count_type = COUNT_ESTIMATE
+                return estimate
+            self.count_type = COUNT_EXACT
+        return queryset.count()
+
+    def get_estimated_count(self, queryset):
+        """The number of rows the query planner expects `queryset` to return."""
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute('EXPLAIN (FORMAT JSON) {}'.format(sql), params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, six.string_types):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    def get_cached_count(self, queryset, view):
+        """
+        Count `queryset`, caching the count for the view's `count_cache_timeout` seconds per view, url kwargs,
+        user and query params that can change the list, so it may be that much out of date.
+        """
+        request = self.request
+        params = sorted(
+            (key, sorted(values)) for key, values in request.query_params.lists()
+            if key.split('[')[0] not in COUNT_CACHE_IGNORED_PARAMS
+        )
+        kwargs = sorted(
+            (key, value) for key, value in request.parser_context['kwargs'].items()
+            if key not in ('version', 'is_embedded')
+        )
+        key = 'count:{}'.format(hashlib.sha256(json.dumps(
+            [view.view_fqn, kwargs, getattr(request.user, 'id', None), params],
+        ).encode('utf-8')).hexdigest())
+        cache = caches[LIST_COUNT_CACHE_NAME]
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, getattr(view, 'count_cache_timeout', None) or LIST_COUNT_CACHE_TIMEOUT)
+        return count
+
 
 class MaxSizePagination(JSONAPIPagination):
     page_size = 1000
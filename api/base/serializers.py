@@ -14,6 +14,7 @@ from rest_framework.fields import SkipField
 from rest_framework.fields import get_attribute as get_nested_attributes
 from rest_framework.mixins import RetrieveModelMixin
 
+from api.base import instrumentation
 from api.base import utils
 from osf.utils import permissions as osf_permissions
 from osf.utils import sanitize
@@ -28,6 +29,10 @@ from api.base.versioning import KEBAB_CASE_VERSION, get_kebab_snake_case_field
 
 from osf.models.validators import SwitchValidator
 
+# How `JSONAPISerializer.to_representation` serializes each field, see `JSONAPISerializer.get_field_plan`
+FieldPlan = collections.namedtuple('FieldPlan', ['type_', 'fields', 'is_anonymous'])
+PlannedField = collections.namedtuple('PlannedField', ['field', 'nested_field', 'many', 'is_link', 'embed'])
+
 def get_meta_type(serializer_class, request):
     meta = getattr(serializer_class, 'Meta', None)
     if meta is None:
@@ -82,6 +87,9 @@ class ConditionalField(ser.Field):
     Skips the inner field based on `should_show` or `should_hide`; override whichever makes the logic more readable.
     If you'd prefer to return `None` rather skipping the field, override `should_be_none` as well.
     """
+    # Set if `should_show`/`should_hide` only depend on the request and not the instance, so they can be
+    # decided once for every object serialized in the request
+    request_only = False
 
     def __init__(self, field, **kwargs):
         super(ConditionalField, self).__init__(**kwargs)
@@ -134,6 +142,7 @@ class ShowIfVersion(ConditionalField):
     Skips the field if the specified request version is not after a feature's earliest supported version,
     or not before the feature's latest supported version.
     """
+    request_only = True
 
     def __init__(self, field, min_version=None, max_version=None, **kwargs):
         super(ShowIfVersion, self).__init__(field, **kwargs)
@@ -776,6 +785,21 @@ class RelationshipField(ser.HyperlinkedIdentityField):
             urls = None
         return urls
 
+    def resolve_related_path(self, obj, path, request):
+        """
+        Like django's `resolve` for the related link of `obj`, using the link template of the related view
+        rather than matching the path against every url pattern when possible.
+        """
+        view = self.views['related']
+        kwargs = self.view_kwargs['related']
+        if callable(view):
+            view = view(getattr(obj, self.field_name, None))
+        if callable(kwargs):
+            kwargs = kwargs(obj)
+        template = utils.get_link_template(view, kwargs, version=request.parser_context['kwargs'].get('version'))
+        match = template and template.resolve(path)
+        return match or resolve(path)
+
     def to_esi_representation(self, value, envelope='data'):
         relationships = self.to_representation(value)
         try:
@@ -873,7 +897,7 @@ class RelationshipField(ser.HyperlinkedIdentityField):
         self_meta = self.get_meta_information(self.self_meta, value)
         relationship = format_relationship_links(related_url, self_url, related_meta, self_meta)
         if related_url:
-            resolved_url = resolve(related_path)
+            resolved_url = self.resolve_related_path(value, related_path, request)
             related_class = resolved_url.func.view_class
             if issubclass(related_class, RetrieveModelMixin):
                 try:
@@ -1192,6 +1216,7 @@ class NodeFileHyperLinkField(RelationshipField):
 
 
 class JSONAPIListSerializer(ser.ListSerializer):
+    @instrumentation.timer(instrumentation.SERIALIZER)
     def to_representation(self, data):
         enable_esi = self.context.get('enable_esi', False)
         envelope = self.context.update({'envelope': None})
@@ -1207,6 +1232,13 @@ class JSONAPIListSerializer(ser.ListSerializer):
                 self.child.to_esi_representation(item, envelope=None) for item in data
             ]
         else:
+            prefetches = [
+                embed.prefetch for embed in self.context.get('embed', {}).values() if hasattr(embed, 'prefetch')
+            ]
+            if prefetches:
+                data = list(data)
+                for prefetch in prefetches:
+                    prefetch(data)
             ret = [
                 self.child.to_representation(item, envelope=envelope) for item in data
             ]
@@ -1373,34 +1405,30 @@ class JSONAPISerializer(BaseAPISerializer):
             field = field.field
         return getattr(field, 'child_relation', field)
 
-    # overrides Serializer
-    def to_representation(self, obj, envelope='data'):
-        """Serialize to final representation.
+    def get_field_plan(self):
+        """
+        The fields to serialize and how to place them in the resource object. This only depends on the request
+        (its version, sparse fieldset, embeds and whether it's anonymized), so it's computed once and reused for
+        every object a list serializes.
 
-        :param obj: Object to be serialized.
-        :param envelope: Key for resource object.
+        :return FieldPlan:
         """
-        ret = {}
         request = self.context.get('request')
+        embeds = self.context.get('embed', {})
+        is_anonymous = is_anonymized(request)
         type_ = get_meta_type(self, request)
         assert type_ is not None, 'Must define Meta.type_ or Meta.get_type()'
-        self.parse_sparse_fields(allow_unsafe=True, context=self.context)
-
-        data = {
-            'id': '',
-            'type': type_,
-            'attributes': {},
-            'relationships': {},
-            'embeds': {},
-            'links': {},
-        }
+        key = (
+            request.version,
+            request.query_params.get('fields[{}]'.format(type_)),
+            frozenset(embeds),
+            is_anonymous,
+        )
+        field_plans = self.__dict__.setdefault('_field_plans', {})
+        if key in field_plans:
+            return field_plans[key]
 
-        embeds = self.context.get('embed', {})
-        context_envelope = self.context.get('envelope', envelope)
-        if context_envelope == 'None':
-            context_envelope = None
-        enable_esi = self.context.get('enable_esi', False)
-        is_anonymous = is_anonymized(self.context['request'])
+        self.parse_sparse_fields(allow_unsafe=True, context=self.context)
         to_be_removed = set()
         if is_anonymous and hasattr(self, 'non_anonymized_fields'):
             # Drop any fields that are not specified in the `non_anonymized_fields` variable.
@@ -1423,10 +1451,52 @@ class JSONAPISerializer(BaseAPISerializer):
                 ),
             )
 
+        planned_fields = []
         for field in fields:
+            if getattr(field, 'request_only', False) and not field.should_show(None) and not field.should_be_none(None):
+                # Skipped for every object
+                continue
             nested_field = self.get_unwrapped_field(field)
+            planned_fields.append(PlannedField(
+                field=field,
+                nested_field=nested_field,
+                many=hasattr(field, 'child_relation'),
+                is_link=bool(getattr(field, 'json_api_link', False) or getattr(nested_field, 'json_api_link', False)),
+                embed=bool(embeds and (field.field_name in embeds or getattr(field, 'always_embed', None))),
+            ))
+        field_plans[key] = FieldPlan(type_=type_, fields=planned_fields, is_anonymous=is_anonymous)
+        return field_plans[key]
+
+    # overrides Serializer
+    @instrumentation.timer(instrumentation.SERIALIZER)
+    def to_representation(self, obj, envelope='data'):
+        """Serialize to final representation.
+
+        :param obj: Object to be serialized.
+        :param envelope: Key for resource object.
+        """
+        ret = {}
+        plan = self.get_field_plan()
+
+        data = {
+            'id': '',
+            'type': plan.type_,
+            'attributes': {},
+            'relationships': {},
+            'embeds': {},
+            'links': {},
+        }
+
+        context_envelope = self.context.get('envelope', envelope)
+        if context_envelope == 'None':
+            context_envelope = None
+        enable_esi = self.context.get('enable_esi', False)
+        is_anonymous = plan.is_anonymous
+
+        for planned in plan.fields:
+            field = planned.field
             try:
-                if hasattr(field, 'child_relation'):
+                if planned.many:
                     attribute = field.child_relation.get_attribute(obj)
                 else:
                     attribute = field.get_attribute(obj)
@@ -1435,7 +1505,7 @@ class JSONAPISerializer(BaseAPISerializer):
             if attribute is None:
                 # We skip `to_representation` for `None` values so that
                 # fields do not have to explicitly deal with that case.
-                if isinstance(nested_field, RelationshipField):
+                if isinstance(planned.nested_field, RelationshipField):
                     # if this is a RelationshipField, serialize as a null relationship
                     data['relationships'][field.field_name] = {'data': None}
                 else:
@@ -1443,7 +1513,7 @@ class JSONAPISerializer(BaseAPISerializer):
                     data['attributes'][field.field_name] = None
             else:
                 try:
-                    if hasattr(field, 'child_relation'):
+                    if planned.many:
                         if hasattr(attribute, 'all'):
                             representation = field.child_relation.to_representation(attribute.all())
                         else:
@@ -1455,10 +1525,10 @@ class JSONAPISerializer(BaseAPISerializer):
                             representation = field.to_representation(attribute)
                 except SkipField:
                     continue
-                if getattr(field, 'json_api_link', False) or getattr(nested_field, 'json_api_link', False):
+                if planned.is_link:
                     # If embed=field_name is appended to the query string or 'always_embed' flag is True, directly embed the
                     # results in addition to adding a relationship link
-                    if embeds and (field.field_name in embeds or getattr(field, 'always_embed', None)):
+                    if planned.embed:
                         if enable_esi:
                             try:
                                 result = field.to_esi_representation(attribute, envelope=envelope)
@@ -1879,6 +1949,8 @@ class HideIfSwitch(ConditionalField):
     If switch is switched this field is hidden/unhidden. This field is hidden if the switch state matches
     the value of the hide_if parameter.
     """
+    request_only = True
+
     def __init__(self, switch_name: str, field: ser.Field, hide_if: bool = False, **kwargs):
         """
         :param switch_name: The name of the switch that is validated
@@ -11,7 +11,9 @@ https://docs.djangoproject.com/en/1.8/ref/settings/
 """
 
 import os
+from elasticsearch import Urllib3HttpConnection
 from future.moves.urllib.parse import urlparse
+from api.base.instrumentation import instrument_es_connection
 from website import settings as osf_settings
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -214,6 +216,7 @@ CORS_ALLOW_CREDENTIALS = True
 ORIGINS_WHITELIST = ()
 
 MIDDLEWARE = (
+    'api.base.middleware.InstrumentationMiddleware',
     'api.base.middleware.DjangoGlobalMiddleware',
     'api.base.middleware.CeleryTaskMiddleware',
     'api.base.middleware.PostcommitTaskMiddleware',
@@ -285,6 +288,11 @@ ENABLE_VARNISH = osf_settings.ENABLE_VARNISH
 ENABLE_ESI = osf_settings.ENABLE_ESI
 VARNISH_SERVERS = osf_settings.VARNISH_SERVERS
 ESI_MEDIA_TYPES = osf_settings.ESI_MEDIA_TYPES
+# Fetch the embedded objects of a whole page of a list with one query per embed, for views that support it
+BATCH_EMBEDS = True
+# Defaults for list views that don't count meta.total exactly, see `JSONAPIPagination.get_count`
+LIST_COUNT_CACHE_TIMEOUT = 300
+LIST_COUNT_ESTIMATE_THRESHOLD = 10000
 
 ADDONS_FOLDER_CONFIGURABLE = ['box', 'dropbox', 's3', 'googledrive', 'figshare', 'owncloud', 'onedrive']
 ADDONS_OAUTH = ADDONS_FOLDER_CONFIGURABLE + ['dataverse', 'github', 'bitbucket', 'gitlab', 'mendeley', 'zotero', 'forward']
@@ -304,6 +312,16 @@ ANONYMOUS_USER_NAME = None
 # If set to True, automated tests with extra queries will fail.
 NPLUSONE_RAISE = False
 
+# Record the SQL queries, elasticsearch calls, serializer and embed time of each request, aggregated per view
+INSTRUMENT_REQUESTS = True
+# Log each view's aggregated timings every this many requests to it
+INSTRUMENTATION_LOG_INTERVAL = 1000
+# Report each request's timings in a Server-Timing header
+SERVER_TIMING_HEADER = False
+# If set to True, requests to views that make more queries than their `query_budget` fail instead of logging
+# a warning. Set by the tests of the budgets.
+QUERY_BUDGET_RAISE = False
+
 # salt used for generating hashids
 HASHIDS_SALT = 'pinkhimalayan'
 
@@ -312,6 +330,7 @@ ELASTICSEARCH_DSL = {
     'default': {
         'hosts': os.environ.get('ELASTIC6_URI', '127.0.0.1:9201'),
         'retry_on_timeout': True,
+        'connection_class': instrument_es_connection(Urllib3HttpConnection),
     },
 }
 # Store yearly indices for time-series metrics
@@ -319,8 +338,15 @@ ELASTICSEARCH_METRICS_DATE_FORMAT = '%Y'
 
 WAFFLE_CACHE_NAME = 'waffle_cache'
 STORAGE_USAGE_CACHE_NAME = 'storage_usage'
+CAS_PROFILE_CACHE_NAME = 'cas_profile'
+SEARCH_RESULTS_CACHE_NAME = 'search_results'
+CITATION_CACHE_NAME = 'citations'
+LIST_COUNT_CACHE_NAME = 'list_counts'
+ARCHIVER_STAT_CACHE_NAME = 'archiver_stat'
 
 
+# Database caches are culled across their whole table once it holds MAX_ENTRIES, so each database cache below has
+# its own table, sized for the keys it holds, and doesn't evict the others' entries. Tables are created by migrations.
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
@@ -332,6 +358,40 @@ CACHES = {
     WAFFLE_CACHE_NAME: {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     },
+    # Shared between processes so that token revocation is seen everywhere
+    CAS_PROFILE_CACHE_NAME: {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'osf_cas_profile_cache',
+        'KEY_PREFIX': CAS_PROFILE_CACHE_NAME,
+        'OPTIONS': {'MAX_ENTRIES': 20000, 'CULL_FREQUENCY': 10},
+    },
+    # Shared between processes so that index writes by celery workers invalidate it everywhere
+    SEARCH_RESULTS_CACHE_NAME: {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'osf_search_results_cache',
+        'KEY_PREFIX': SEARCH_RESULTS_CACHE_NAME,
+        'OPTIONS': {'MAX_ENTRIES': 10000, 'CULL_FREQUENCY': 10},
+    },
+    CITATION_CACHE_NAME: {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'osf_citation_cache',
+        'KEY_PREFIX': CITATION_CACHE_NAME,
+        'OPTIONS': {'MAX_ENTRIES': 50000, 'CULL_FREQUENCY': 10},
+    },
+    # Cached list totals, shared between processes so each is only counted once per timeout
+    LIST_COUNT_CACHE_NAME: {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'osf_list_count_cache',
+        'KEY_PREFIX': LIST_COUNT_CACHE_NAME,
+        'OPTIONS': {'MAX_ENTRIES': 10000, 'CULL_FREQUENCY': 10},
+    },
+    # Folder listings of addons whose stat failed, shared between celery workers so a retry can resume the crawl
+    ARCHIVER_STAT_CACHE_NAME: {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'osf_archiver_stat_cache',
+        'KEY_PREFIX': ARCHIVER_STAT_CACHE_NAME,
+        'OPTIONS': {'MAX_ENTRIES': 1000, 'CULL_FREQUENCY': 10},
+    },
 }
 
 SLOAN_ID_COOKIE_NAME = 'sloan_id'
@@ -1,11 +1,16 @@
 # -*- coding: utf-8 -*-
+import re
+import string
+
 from past.builtins import basestring
 import furl
 from future.moves.urllib.parse import urlunsplit, urlsplit, parse_qs, urlencode
 from distutils.version import StrictVersion
 from hashids import Hashids
 
-from django.utils.http import urlquote
+from django.urls import NoReverseMatch, ResolverMatch, get_script_prefix, get_urlconf, resolve
+from django.utils.http import RFC3986_SUBDELIMS, urlquote
+from elasticsearch_dsl import Q
 from django.core.exceptions import ObjectDoesNotExist
 from django.db.models import QuerySet, F
 from rest_framework.exceptions import NotFound
@@ -73,9 +78,101 @@ def get_user_auth(request):
     return auth
 
 
+# Characters left unquoted in url kwargs, as in django's `reverse`
+LINK_TEMPLATE_SAFE_CHARS = RFC3986_SUBDELIMS + '/~:@'
+
+# (urlconf, script prefix, view name, kwarg names, version) -> LinkTemplate, or None if the route can't be templated
+_link_templates = {}
+
+
+class LinkTemplate(object):
+    """
+    The url of a view as a format string with a field per url kwarg, so urls can be built by formatting
+    instead of matching kwargs against the url patterns in `reverse`, and parsed with one regex instead of
+    trying every url pattern in `resolve`. Kwarg values are quoted like `reverse` does but not checked
+    against the route's patterns. The version kwarg only has a few values, which are written into the
+    template, so a view has a template per version prefix.
+    """
+
+    def __init__(self, template, match, version=None):
+        self.template = template
+        self.match = match
+        self.version = version
+        pattern = ''
+        for literal, field_name, _, _ in string.Formatter().parse(template):
+            pattern += re.escape(literal)
+            if field_name is not None:
+                pattern += '(?P<{}>.+?)'.format(field_name)
+        self.regex = re.compile('^{}$'.format(pattern))
+
+    @classmethod
+    def compile(cls, view_name, kwarg_names, version=None):
+        """
+        Reverse the view with placeholder kwargs and replace them with format fields. Returns None when a
+        placeholder doesn't fit the route's pattern or isn't found exactly once in the url.
+        """
+        placeholders = {name: 'linktemplate{}placeholder'.format(i) for i, name in enumerate(kwarg_names)}
+        kwargs = dict(placeholders)
+        if version is not None:
+            kwargs['version'] = version
+        try:
+            url = reverse(view_name, kwargs=kwargs)
+        except NoReverseMatch:
+            return None
+        template = url.replace('{', '{{').replace('}', '}}')
+        for name, placeholder in placeholders.items():
+            if template.count(placeholder) != 1:
+                return None
+            template = template.replace(placeholder, '{' + name + '}')
+        return cls(template, resolve(url), version=version)
+
+    def format(self, kwargs):
+        return self.template.format(**{
+            name: urlquote(value, safe=LINK_TEMPLATE_SAFE_CHARS)
+            for name, value in kwargs.items()
+        })
+
+    def resolve(self, path):
+        """Like django's `resolve` for paths of this template, None for other paths."""
+        match = self.regex.match(path)
+        if not match:
+            return None
+        kwargs = match.groupdict()
+        if self.version is not None:
+            kwargs['version'] = self.version
+        return ResolverMatch(
+            self.match.func, (), kwargs, self.match.url_name,
+            self.match.app_names, self.match.namespaces,
+        )
+
+
+def get_link_template(view_name, kwarg_names, version=None):
+    """
+    The LinkTemplate for reversing `view_name` with `kwarg_names` and the `version` kwarg, compiled once
+    per process, or None if the view's route can't be templated.
+    """
+    kwarg_names = frozenset(kwarg_names) - {'version'}
+    key = (get_urlconf(), get_script_prefix(), view_name, kwarg_names, version)
+    try:
+        return _link_templates[key]
+    except KeyError:
+        template = _link_templates[key] = LinkTemplate.compile(view_name, sorted(kwarg_names), version=version)
+        return template
+
+
+def reverse_with_template(view_name, kwargs=None):
+    """Like django's `reverse`, from the view's link template when it has one."""
+    kwargs = kwargs or {}
+    version = kwargs.get('version')
+    template = get_link_template(view_name, kwargs, version=version)
+    if template is None:
+        return reverse(view_name, kwargs=kwargs)
+    return template.format({name: value for name, value in kwargs.items() if name != 'version'})
+
+
 def absolute_reverse(view_name, query_kwargs=None, args=None, kwargs=None):
     """Like django's `reverse`, except returns an absolute URL. Also add query parameters."""
-    relative_url = reverse(view_name, kwargs=kwargs)
+    relative_url = reverse_with_template(view_name, kwargs=kwargs)
 
     url = website_util.api_v2_url(relative_url, params=query_kwargs, base_prefix='')
     return url
@@ -227,6 +324,25 @@ def assert_resource_type(obj, resource_tuple):
     assert isinstance(obj, resource_tuple), 'obj must be {} {}; got {}'.format(a_or_an, error_message, obj)
 
 
+def get_embed_prefetch_cache(request):
+    """Objects fetched for batched embeds during this request, keyed by (view class, lookup value)."""
+    if not hasattr(request._request, '_embed_prefetch_cache'):
+        request._request._embed_prefetch_cache = {}
+    return request._request._embed_prefetch_cache
+
+
+def is_prefetched_for_embed(request, view, obj):
+    """
+    Whether `obj` is the object fetched in bulk for embedding `view`, and so already passed the bulk
+    permission check of its `bulk_get_embedded_objects`.
+    """
+    lookup_url_kwarg = getattr(view, 'embed_lookup_url_kwarg', None)
+    if not lookup_url_kwarg or not view.kwargs.get('is_embedded'):
+        return False
+    prefetched = getattr(request._request, '_embed_prefetch_cache', {})
+    return prefetched.get((type(view), view.kwargs.get(lookup_url_kwarg))) is obj
+
+
 class MockQueryset(list):
     """
     This class is meant to convert a simple list into a filterable queryset look-a-like.
@@ -244,5 +360,135 @@ class MockQueryset(list):
         return self.search.count()
 
     def add_dict_as_item(self, dict):
-        item = type('item', (object,), dict)
-        self.append(item)
+        self.append(dict_as_item(dict))
+
+
+def dict_as_item(dict):
+    return type('item', (object,), dict)
+
+
+# ListFilterMixin operators that `build_search_filter` can express
+SEARCH_FILTER_OPERATORS = ('eq', 'ne', 'gt', 'gte', 'lt', 'lte')
+
+
+def build_search_filter(field, op, value):
+    """Build the elasticsearch query for a parsed ListFilterMixin filter on `field`."""
+    if op == 'eq':
+        return Q('term', **{field: value})
+    if op == 'ne':
+        return ~Q('term', **{field: value})
+    return Q('range', **{field: {op: value}})
+
+
+class SearchQueryset(object):
+    """
+    A lazy queryset look-a-like for list views backed by elasticsearch, for when the view's filters and
+    ordering are already part of the query. Slicing fetches just that window of results and iterating walks
+    the whole result set in batches, so a page costs O(page size) and nothing holds every result in memory.
+
+    Subclasses implement `fetch(start, stop)` and `get_count()`.
+    """
+    batch_size = 1000
+
+    def __init__(self):
+        self._count = None
+
+    def fetch(self, start, stop):
+        raise NotImplementedError()
+
+    def get_count(self):
+        raise NotImplementedError()
+
+    def count(self):
+        if self._count is None:
+            self._count = self.get_count()
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            if key.step is not None:
+                raise ValueError('SearchQueryset does not support slicing with a step')
+            start = key.start or 0
+            stop = self.count() if key.stop is None else key.stop
+            return self.fetch(start, stop) if stop > start else []
+        return self.fetch(key, key + 1)[0]
+
+    def __iter__(self):
+        start = 0
+        while True:
+            batch = self.fetch(start, start + self.batch_size)
+            yield from batch
+            if len(batch) < self.batch_size:
+                return
+            start += self.batch_size
+
+
+class SearchHitsQueryset(SearchQueryset):
+    """
+    SearchQueryset over the hits of a search. Iterating pages with `search_after` rather than `from`, so
+    walking the whole result set isn't capped by the index's max_result_window.
+
+    :param search: Search with the view's filters applied
+    :param to_items: callable turning a list of hits into the items to serialize
+    :param sort: sort keys of the search; `tiebreaker`, a field unique per hit, is appended to them
+    """
+
+    def __init__(self, search, to_items, sort=(), tiebreaker='_id'):
+        super().__init__()
+        self.search = search.sort(*(list(sort) + [tiebreaker]))
+        self.to_items = to_items
+
+    def get_count(self):
+        return self.search.count()
+
+    def fetch(self, start, stop):
+        return self.to_items(list(self.search[start:stop].execute()))
+
+    def __iter__(self):
+        search = self.search[:self.batch_size]
+        while True:
+            hits = list(search.execute())
+            yield from self.to_items(hits)
+            if len(hits) < self.batch_size:
+                return
+            search = search.extra(search_after=list(hits[-1].meta.sort))
+
+
+class SearchBucketsQueryset(SearchQueryset):
+    """
+    SearchQueryset over the buckets of a terms aggregation of a search. A window is the top `stop` buckets in
+    `order`, e.g. [{'_count': 'desc'}, {'_key': 'asc'}], less the first `start`; only bucket keys and counts
+    are sent back, never hits.
+
+    :param search: Search with the view's filters applied
+    :param field: the field to aggregate on
+    :param to_items: callable turning a list of buckets into the items to serialize
+    :param missing: bucket key for documents without the field, if they should be counted
+    """
+
+    def __init__(self, search, field, to_items, order=None, missing=None):
+        super().__init__()
+        self.search = search.extra(size=0)
+        self.to_items = to_items
+        self.order = order
+        self.terms_kwargs = {'field': field}
+        if missing is not None:
+            self.terms_kwargs['missing'] = missing
+
+    def get_count(self):
+        search = self.search._clone()
+        search.aggs.metric('count', 'cardinality', precision_threshold=40000, **self.terms_kwargs)
+        count = getattr(search.execute().aggregations, 'count', None)
+        return int(count.value) if count else 0
+
+    def fetch(self, start, stop):
+        search = self.search._clone()
+        terms_kwargs = dict(self.terms_kwargs, size=stop)
+        if self.order:
+            terms_kwargs['order'] = self.order
+        search.aggs.bucket('buckets', 'terms', **terms_kwargs)
+        buckets = getattr(search.execute().aggregations, 'buckets', None)
+        return self.to_items(list(buckets.buckets)[start:stop]) if buckets else []
@@ -17,6 +17,7 @@ from rest_framework.exceptions import ValidationError, NotFound
 from rest_framework.mixins import ListModelMixin
 from rest_framework.response import Response
 
+from api.base import instrumentation
 from api.base import permissions as base_permissions
 from api.base import utils
 from api.base.exceptions import RelationshipPostMakesNoChanges, InvalidFilterValue, InvalidFilterOperator
@@ -31,7 +32,7 @@ from api.base.serializers import (
     LinkedRegistrationsRelationshipSerializer,
 )
 from api.base.throttling import RootAnonThrottle, UserRateThrottle, BurstRateThrottle
-from api.base.utils import is_bulk_request, get_user_auth, default_node_list_queryset
+from api.base.utils import is_bulk_request, get_user_auth, default_node_list_queryset, get_embed_prefetch_cache
 from api.nodes.filters import NodesFilterMixin
 from api.nodes.utils import get_file_object
 from api.nodes.permissions import ContributorOrPublic
@@ -48,12 +49,43 @@ from waffle import sample_is_active
 
 class JSONAPIBaseView(generics.GenericAPIView):
 
+    # The url kwarg identifying the object of a detail view. Views that set it can be embedded in batches
+    # and must implement `bulk_get_embedded_objects`.
+    embed_lookup_url_kwarg = None
+
+    # Whether lists may be walked with `page[cursor]` (keyset pagination) instead of page numbers
+    cursor_pagination = False
+    # How lists count meta.total: 'exact', 'cached' or 'estimate', see `JSONAPIPagination.get_count`.
+    # Cursor paginated lists only report a total if it isn't exact.
+    count_strategy = 'exact'
+    # Seconds to reuse cached counts for, defaults to LIST_COUNT_CACHE_TIMEOUT
+    count_cache_timeout = None
+    # Estimated row count above which estimates are reported, defaults to LIST_COUNT_ESTIMATE_THRESHOLD
+    count_estimate_threshold = None
+    # Most SQL queries a read (GET or HEAD) request to the view, including its embeds, should make; see
+    # QUERY_BUDGET_RAISE. Writes fan out to signals and tasks, so they aren't budgeted.
+    query_budget = None
+
     def __init__(self, **kwargs):
         assert getattr(self, 'view_name', None), 'Must specify view_name on view.'
         assert getattr(self, 'view_category', None), 'Must specify view_category on view.'
         self.view_fqn = ':'.join([self.view_category, self.view_name])
         super(JSONAPIBaseView, self).__init__(**kwargs)
 
+    @classmethod
+    def bulk_get_embedded_objects(cls, request, lookups):
+        """
+        Fetch the objects this view would return when embedded for many values of `embed_lookup_url_kwarg`
+        at once. An object left out, e.g. one the user can't see, is looked up by the view as usual when it's
+        embedded, so only objects the view would return without error should be included; the view still
+        runs its object permission checks on them.
+
+        :param request: the request embedding this view
+        :param list lookups: url kwarg values
+        :return dict: lookup value -> object
+        """
+        raise NotImplementedError()
+
     def _get_embed_partial(self, field_name, field):
         """Create a partial function to fetch the values of an embedded field. A basic
         example is to include a Node's children in a single response.
@@ -65,11 +97,48 @@ class JSONAPIBaseView(generics.GenericAPIView):
         if getattr(field, 'field', None):
             field = field.field
 
-        def partial(item):
+        resolved = {}
+
+        def resolve(item):
             # resolve must be implemented on the field
-            v, view_args, view_kwargs = field.resolve(item, field_name, self.request)
+            key = (type(item), getattr(item, 'pk', None))
+            if key[1] is None:
+                return field.resolve(item, field_name, self.request)
+            if key not in resolved:
+                resolved[key] = field.resolve(item, field_name, self.request)
+            return resolved[key]
+
+        @instrumentation.timer(instrumentation.EMBED)
+        def prefetch(items):
+            """
+            Fetch the objects this field embeds for a whole page of items, one query per embedded view
+            class, for the per-item partial to find in `request.parents`. Only detail views that implement
+            `bulk_get_embedded_objects` are batched; everything else is resolved one item at a time.
+            """
+            lookups = defaultdict(set)
+            for item in items:
+                try:
+                    v, view_args, view_kwargs = resolve(item)
+                except Exception:
+                    # Let the partial raise it for this item
+                    continue
+                lookup_url_kwarg = getattr(getattr(v, 'cls', None), 'embed_lookup_url_kwarg', None)
+                if lookup_url_kwarg and view_kwargs.get(lookup_url_kwarg):
+                    lookups[v.cls].add(view_kwargs[lookup_url_kwarg])
+
+            prefetched = get_embed_prefetch_cache(self.request)
+            for view_cls, values in lookups.items():
+                values = [value for value in values if (view_cls, value) not in prefetched]
+                if values:
+                    for value, obj in view_cls.bulk_get_embedded_objects(self.request, values).items():
+                        prefetched[(view_cls, value)] = obj
+
+        @instrumentation.timer(instrumentation.EMBED)
+        def partial(item):
+            v, view_args, view_kwargs = resolve(item)
             if not v:
                 return None
+            view_kwargs = dict(view_kwargs)
 
             request = EmbeddedRequest(self.request)
 
@@ -79,6 +148,12 @@ class JSONAPIBaseView(generics.GenericAPIView):
 
             request.parents.setdefault(type(item), {})[item._id] = item
 
+            lookup_url_kwarg = getattr(v.cls, 'embed_lookup_url_kwarg', None)
+            if lookup_url_kwarg:
+                prefetched = get_embed_prefetch_cache(self.request).get((v.cls, view_kwargs.get(lookup_url_kwarg)))
+                if prefetched is not None:
+                    request.parents.setdefault(type(prefetched), {})[view_kwargs[lookup_url_kwarg]] = prefetched
+
             view_kwargs.update({
                 'request': request,
                 'is_embedded': True,
@@ -137,6 +212,8 @@ class JSONAPIBaseView(generics.GenericAPIView):
 
             return ret
 
+        if django_settings.BATCH_EMBEDS:
+            partial.prefetch = prefetch
         return partial
 
     def get_serializer_context(self):
@@ -1,10 +1,19 @@
-from api.caching.tasks import ban_url
-from framework.postcommit_tasks.handlers import enqueue_postcommit_task
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
 
-# unused for now
-# from django.dispatch import receiver
-# from django.db.models.signals import post_save
-# @receiver(post_save)
+from api.caching.rules import get_ban_rule
+from api.caching.tasks import enqueue_ban
+from website import settings
+
+
+@receiver(post_save)
+@receiver(post_delete)
 def ban_object_from_cache(sender, instance, **kwargs):
-    if hasattr(instance, 'absolute_api_v2_url'):
-        enqueue_postcommit_task(ban_url, (instance, ), {}, celery=False, once_per_request=True)
+    if settings.ENABLE_VARNISH and settings.VARNISH_BAN_ON_MODEL_CHANGES and get_ban_rule(instance):
+        enqueue_ban(instance)
+
+
+@receiver(m2m_changed)
+def ban_object_from_cache_on_m2m_change(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        ban_object_from_cache(sender, instance)
@@ -0,0 +1,81 @@
+"""
+Registry of which cached API urls a model change invalidates. A model registered here has its own
+`absolute_api_v2_url` prefix banned, if it has one, along with the prefixes of the related objects
+returned by its rule. Only registered models are banned on save/delete, see api.caching.listeners.
+"""
+
+# Maps a lowercased model label to a function returning the related objects to ban along with an instance
+BAN_RULES = {}
+
+
+def ban_rule(*model_labels):
+    """Register the decorated function as the ban rule for the given models, e.g. 'osf.comment'."""
+    def wrapper(func):
+        for label in model_labels:
+            BAN_RULES[label] = func
+        return func
+    return wrapper
+
+
+def get_ban_rule(instance):
+    """Return the ban rule for an instance, looking through proxy/typed models to the concrete model."""
+    meta = instance._meta
+    return BAN_RULES.get(meta.label_lower) or BAN_RULES.get(meta.concrete_model._meta.label_lower)
+
+
+def get_related_bannables(instance):
+    rule = get_ban_rule(instance)
+    if rule is None:
+        return []
+    return [related for related in rule(instance) if related is not None]
+
+
+def _referent(guid):
+    return guid.referent if guid is not None else None
+
+
+@ban_rule('osf.abstractnode')
+def ban_node(node):
+    # The parent's children list
+    return [node.parent_node]
+
+
+@ban_rule('osf.noderelation')
+def ban_node_relation(node_relation):
+    return [node_relation.parent, node_relation.child]
+
+
+@ban_rule('osf.contributor')
+def ban_contributor(contributor):
+    # The node's contributors list and the user's nodes list
+    return [contributor.node, contributor.user]
+
+
+@ban_rule('osf.comment')
+def ban_comment(comment):
+    return [_referent(comment.target), _referent(comment.root_target)]
+
+
+@ban_rule('osf.nodelog')
+def ban_node_log(log):
+    return [log.node]
+
+
+@ban_rule('osf.preprint')
+def ban_preprint(preprint):
+    return [preprint.node]
+
+
+@ban_rule('osf.basefilenode')
+def ban_file(file_node):
+    return [file_node.target]
+
+
+@ban_rule('addons_wiki.wikipage')
+def ban_wiki_page(wiki_page):
+    return [wiki_page.node]
+
+
+@ban_rule('osf.osfuser')
+def ban_user(user):
+    return []
@@ -1,4 +1,7 @@
 NEVER_TIMEOUT = None  # for django caches setting None as a timeout value means the cache never times out.
 FIVE_MIN_TIMEOUT = 60 * 5
 
-STORAGE_USAGE_KEY = 'storage_usage:{target_id}'
+BAN_TIMEOUT = 0.3  # 300ms timeout for bans
+BAN_POOL_SIZE = 10  # concurrent bans and pooled connections to the Varnish servers
+BAN_MAX_PATHS_PER_PATTERN = 50
+BAN_PATTERN_HEADER = 'X-Ban-Url'
@@ -1,141 +1,299 @@
 from future.moves.urllib.parse import urlparse
-from django.db import connection
+from django.db import connection, transaction
 
+import re
+import time
 import requests
 import logging
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 
 from django.apps import apps
-from api.caching.utils import storage_usage_cache
 from framework.postcommit_tasks.handlers import enqueue_postcommit_task
 
 from api.caching import settings as cache_settings
+from api.caching.rules import get_related_bannables
 from framework.celery_tasks import app
 from website import settings
 
 logger = logging.getLogger(__name__)
 
+_local = threading.local()
+_ban_session = None
+
+# Counters for sizing Varnish bans: flushes, paths, bans sent, failures and total latency in ms
+ban_stats = Counter()
+
 
 def get_varnish_servers():
     #  TODO: this should get the varnish servers from HAProxy or a setting
     return settings.VARNISH_SERVERS
 
 
-def get_bannable_urls(instance):
-    from osf.models import Comment
-    bannable_urls = []
-    parsed_absolute_url = {}
+def get_bannable_paths(instance):
+    """
+    Return the API path prefixes that have to be banned when `instance` changes, along with the hostname
+    they are served under: the instance's own and those of the related objects from its ban rule
+    (see api.caching.rules), e.g. a Comment also bans its target and root target.
+    """
+    bannable_paths = []
+    hostname = ''
+    for obj in [instance] + get_related_bannables(instance):
+        try:
+            parsed_url = urlparse(obj.absolute_api_v2_url)
+        except AttributeError:
+            # some objects, e.g. contributors or NodeWikiPage referents, don't have an absolute_api_v2_url
+            continue
+        bannable_paths.append(parsed_url.path)
+        hostname = hostname or parsed_url.hostname
 
-    if not hasattr(instance, 'absolute_api_v2_url'):
+    if not bannable_paths:
         logger.warning('Tried to ban {}:{} but it didn\'t have a absolute_api_v2_url method'.format(instance.__class__, instance))
-        return [], ''
-
-    for host in get_varnish_servers():
-        # add instance url
-        varnish_parsed_url = urlparse(host)
-        parsed_absolute_url = urlparse(instance.absolute_api_v2_url)
-        url_string = '{scheme}://{netloc}{path}.*'.format(
-            scheme=varnish_parsed_url.scheme,
-            netloc=varnish_parsed_url.netloc,
-            path=parsed_absolute_url.path,
+    return bannable_paths, hostname
+
+
+def collapse_paths(paths):
+    """Dedupe path prefixes, dropping any prefix that is already covered by a shorter one."""
+    collapsed = []
+    for path in sorted(set(paths)):
+        if not collapsed or not path.startswith(collapsed[-1]):
+            collapsed.append(path)
+    return collapsed
+
+
+def get_ban_patterns(paths):
+    """Merge path prefixes into as few anchored regexes as `BAN_MAX_PATHS_PER_PATTERN` allows."""
+    paths = collapse_paths(paths)
+    chunk_size = cache_settings.BAN_MAX_PATHS_PER_PATTERN
+    return [
+        '^(?:{})'.format('|'.join(re.escape(path) for path in paths[i:i + chunk_size]))
+        for i in range(0, len(paths), chunk_size)
+    ]
+
+
+def get_ban_session():
+    global _ban_session
+    if _ban_session is None:
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=cache_settings.BAN_POOL_SIZE,
+            pool_maxsize=cache_settings.BAN_POOL_SIZE,
         )
-        bannable_urls.append(url_string)
-        if isinstance(instance, Comment):
-            try:
-                parsed_target_url = urlparse(instance.target.referent.absolute_api_v2_url)
-            except AttributeError:
-                # some referents don't have an absolute_api_v2_url
-                # I'm looking at you NodeWikiPage
-                # Note: NodeWikiPage has been deprecated. Is this an issue with WikiPage/WikiVersion?
-                pass
-            else:
-                url_string = '{scheme}://{netloc}{path}.*'.format(
-                    scheme=varnish_parsed_url.scheme,
-                    netloc=varnish_parsed_url.netloc,
-                    path=parsed_target_url.path,
-                )
-                bannable_urls.append(url_string)
+        _ban_session = requests.Session()
+        _ban_session.mount('http://', adapter)
+        _ban_session.mount('https://', adapter)
+    return _ban_session
+
 
-            try:
-                parsed_root_target_url = urlparse(instance.root_target.referent.absolute_api_v2_url)
-            except AttributeError:
-                # some root_targets don't have an absolute_api_v2_url
-                pass
+def get_bans(paths_by_hostname):
+    """
+    The BANs to send for path prefixes, as (url, hostname, pattern) tuples. With `VARNISH_REGEX_BANS` the
+    prefixes for each hostname are merged into as few regexes as possible, sent to each server's root in the
+    `BAN_PATTERN_HEADER` header. Otherwise each prefix is banned by its url on each server, as the VCL
+    deployed before regex bans expects.
+    """
+    bans = []
+    for hostname, paths in paths_by_hostname.items():
+        for server in get_varnish_servers():
+            if settings.VARNISH_REGEX_BANS:
+                bans.extend((server, hostname, pattern) for pattern in get_ban_patterns(paths))
             else:
-                url_string = '{scheme}://{netloc}{path}.*'.format(
-                    scheme=varnish_parsed_url.scheme,
-                    netloc=varnish_parsed_url.netloc,
-                    path=parsed_root_target_url.path,
+                server_url = urlparse(server)
+                bans.extend(
+                    ('{}://{}{}.*'.format(server_url.scheme, server_url.netloc, path), hostname, None)
+                    for path in collapse_paths(paths)
                 )
-                bannable_urls.append(url_string)
+    return bans
+
+
+def send_ban(url, hostname, pattern=None):
+    """
+    Send a single BAN to a Varnish server, for objects cached under `hostname`. A regex `pattern` goes in the
+    `BAN_PATTERN_HEADER` header, which the VCL in regex_bans.vcl matches against `req.url`.
+    """
+    headers = {'Host': hostname}
+    if pattern:
+        headers[cache_settings.BAN_PATTERN_HEADER] = pattern
+    banned = pattern or url
+    try:
+        response = get_ban_session().request('BAN', url, timeout=cache_settings.BAN_TIMEOUT, headers=headers)
+    except Exception as ex:
+        logger.error('Banning {} on {} failed: {}'.format(banned, url, ex))
+        return False
+    if not response.ok:
+        logger.error('Banning {} on {} failed: {}'.format(banned, url, response.text))
+        return False
+    logger.info('Banning {} on {} succeeded'.format(banned, url))
+    return True
+
+
+def ban_paths(paths_by_hostname):
+    """
+    Ban path prefixes on every Varnish server, deduped and sent concurrently, see `get_bans`.
+
+    :param dict paths_by_hostname: path prefixes to ban, keyed by the hostname they are served under
+    :return: the number of BAN requests that failed
+    """
+    if not settings.ENABLE_VARNISH:
+        return 0
+    bans = get_bans(paths_by_hostname)
+    if not bans:
+        return 0
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=min(len(bans), cache_settings.BAN_POOL_SIZE)) as executor:
+        results = list(executor.map(lambda ban: send_ban(*ban), bans))
+    elapsed_ms = (time.time() - start) * 1000
+
+    failures = results.count(False)
+    ban_stats['flushes'] += 1
+    ban_stats['paths'] += sum(len(paths) for paths in paths_by_hostname.values())
+    ban_stats['bans'] += len(bans)
+    ban_stats['failures'] += failures
+    ban_stats['latency_ms'] += int(elapsed_ms)
+    logger.info('Sent {} bans for {} paths in {:.0f}ms'.format(
+        len(bans), sum(len(paths) for paths in paths_by_hostname.values()), elapsed_ms
+    ))
+    return failures
+
+
+class BanCollector(defaultdict):
+    """
+    Bannable path prefixes keyed by hostname. Its repr is its identity rather than its contents, so the
+    postcommit task flushing it is queued once per request however many paths are added.
+    """
+
+    def __init__(self):
+        super(BanCollector, self).__init__(set)
+
+    def __repr__(self):
+        return '<BanCollector {}>'.format(id(self))
+
 
-    return bannable_urls, parsed_absolute_url.hostname
+def get_ban_collector():
+    if not hasattr(_local, 'ban_collector'):
+        _local.ban_collector = BanCollector()
+    return _local.ban_collector
+
+
+def flush_bans(collector=None):
+    """
+    Ban everything collected by `enqueue_ban` in `collector`, this thread's by default. Postcommit tasks run
+    in their own greenlets, so the request's collector is passed in rather than looked up there.
+    """
+    collector = get_ban_collector() if collector is None else collector
+    paths_by_hostname = dict(collector)
+    collector.clear()
+    if paths_by_hostname:
+        ban_paths(paths_by_hostname)
+
+
+def enqueue_ban(instance):
+    """
+    Ban `instance` from the cache after the request commits. Bannable paths from the whole request
+    are collected and sent together by a single `flush_bans`.
+    """
+    if not settings.ENABLE_VARNISH:
+        return
+    paths, hostname = get_bannable_paths(instance)
+    if paths:
+        collector = get_ban_collector()
+        collector[hostname].update(paths)
+        enqueue_postcommit_task(flush_bans, (collector,), {}, celery=False, once_per_request=True)
+
+
+@contextmanager
+def collect_bans():
+    """
+    Collect the bans enqueued inside the block, e.g. by a celery task touching many objects, and send
+    them together on exit.
+    """
+    previous = getattr(_local, 'ban_collector', None)
+    collector = _local.ban_collector = BanCollector()
+    try:
+        yield collector
+    finally:
+        flush_bans(collector)
+        if previous is not None:
+            _local.ban_collector = previous
 
 
 @app.task(max_retries=5, default_retry_delay=60)
 def ban_url(instance):
-    # TODO: Refactor; Pull url generation into postcommit_task handling so we only ban urls once per request
-    timeout = 0.3  # 300ms timeout for bans
     if settings.ENABLE_VARNISH:
-        bannable_urls, hostname = get_bannable_urls(instance)
-
-        for url_to_ban in set(bannable_urls):
-            try:
-                response = requests.request(
-                    'BAN', url_to_ban, timeout=timeout, headers=dict(
-                        Host=hostname,
-                    ),
-                )
-            except Exception as ex:
-                logger.error('Banning {} failed: {}'.format(
-                    url_to_ban,
-                    ex.message,
-                ))
-            else:
-                if not response.ok:
-                    logger.error('Banning {} failed: {}'.format(
-                        url_to_ban,
-                        response.text,
-                    ))
-                else:
-                    logger.info('Banning {} succeeded'.format(
-                        url_to_ban,
-                    ))
+        paths, hostname = get_bannable_paths(instance)
+        ban_paths({hostname: paths})
+
+
+STORAGE_USAGE_PAGE_SQL = """
+    SELECT count(*), sum(size), max(id) from
+    (SELECT obfnv.id, version.size FROM osf_basefileversionsthrough AS obfnv
+    LEFT JOIN osf_basefilenode file ON obfnv.basefilenode_id = file.id
+    LEFT JOIN osf_fileversion version ON obfnv.fileversion_id = version.id
+    LEFT JOIN django_content_type type on file.target_content_type_id = type.id
+    WHERE file.provider = 'osfstorage'
+    AND type.model = 'abstractnode'
+    AND file.deleted_on IS NULL
+    AND file.target_object_id=%s
+    AND obfnv.id > %s
+    ORDER BY obfnv.id
+    LIMIT %s) file_page
+"""
+
+
+def count_storage_usage(target_id, per_page=500000):
+    """Recount the bytes used by a node's osfstorage file versions, paging through them by id."""
+    last_id = 0
+    storage_usage_total = 0
+    with connection.cursor() as cursor:
+        while True:
+            cursor.execute(STORAGE_USAGE_PAGE_SQL, [target_id, last_id, per_page])
+            count, page_total, last_id = cursor.fetchone()
+            if not count:
+                break
+            storage_usage_total += int(page_total or 0)
+    return storage_usage_total
 
 
 @app.task(max_retries=5, default_retry_delay=10)
 def update_storage_usage_cache(target_id, target_guid, per_page=500000):
+    """
+    Recount a node's storage usage and store it as the node's running total. The total's row is locked
+    while counting, so versions added concurrently are applied on top of the recount rather than lost.
+    """
     if not settings.ENABLE_STORAGE_USAGE_CACHE:
         return
-    sql = """
-        SELECT count(size), sum(size) from
-        (SELECT size FROM osf_basefileversionsthrough AS obfnv
-        LEFT JOIN osf_basefilenode file ON obfnv.basefilenode_id = file.id
-        LEFT JOIN osf_fileversion version ON obfnv.fileversion_id = version.id
-        LEFT JOIN django_content_type type on file.target_content_type_id = type.id
-        WHERE file.provider = 'osfstorage'
-        AND type.model = 'abstractnode'
-        AND file.deleted_on IS NULL
-        AND file.target_object_id=%s
-        ORDER BY version.id
-        LIMIT %s OFFSET %s) file_page
-    """
-    count = per_page
-    offset = 0
-    storage_usage_total = 0
-    with connection.cursor() as cursor:
-        while count:
-            cursor.execute(sql, [target_id, per_page, offset])
-            result = cursor.fetchall()
-            storage_usage_total += int(result[0][1]) if result[0][1] else 0
-            count = int(result[0][0]) if result[0][0] else 0
-            offset += count
+    NodeStorageUsage = apps.get_model('osf.NodeStorageUsage')
+    with transaction.atomic():
+        NodeStorageUsage.objects.get_or_create(node_id=target_id)
+        usage = NodeStorageUsage.objects.select_for_update().get(node_id=target_id)
+        total = count_storage_usage(target_id, per_page=per_page)
+        if usage.total != total:
+            logger.info('Storage usage of {} reconciled from {} to {}'.format(target_guid, usage.total, total))
+            usage.total = total
+            usage.save()
+    return total
 
-    key = cache_settings.STORAGE_USAGE_KEY.format(target_id=target_guid)
-    storage_usage_cache.set(key, storage_usage_total, cache_settings.FIVE_MIN_TIMEOUT)
 
+def tracks_storage_usage(target):
+    AbstractNode = apps.get_model('osf.AbstractNode')
+    return settings.ENABLE_STORAGE_USAGE_CACHE and isinstance(target, AbstractNode) and not target.is_quickfiles
 
-def update_storage_usage(target):
-    Preprint = apps.get_model('osf.preprint')
 
-    if settings.ENABLE_STORAGE_USAGE_CACHE and not isinstance(target, Preprint) and not target.is_quickfiles:
+def update_storage_usage(target):
+    """Schedule a full recount of a node's storage usage after the request commits."""
+    if tracks_storage_usage(target):
         enqueue_postcommit_task(update_storage_usage_cache, (target.id, target._id,), {}, celery=True)
+
+
+def update_storage_usage_total(target, delta):
+    """
+    Add `delta` bytes to a node's running storage usage total. A node without a total yet gets a full
+    recount instead, which will include the change once it is committed.
+    """
+    if not delta or not tracks_storage_usage(target):
+        return
+    NodeStorageUsage = apps.get_model('osf.NodeStorageUsage')
+    if not NodeStorageUsage.add(target.id, delta):
+        update_storage_usage(target)
@@ -0,0 +1,207 @@
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import mock
+import pytest
+
+from api.caching import settings as cache_settings
+from api.caching import tasks
+from framework.auth import Auth
+from framework.postcommit_tasks.handlers import postcommit_before_request, postcommit_queue
+from osf.models import Tag
+from osf_tests.factories import CommentFactory, NodeFactory, ProjectFactory
+
+
+class FakeVarnishHandler(BaseHTTPRequestHandler):
+
+    def do_BAN(self):
+        self.server.bans.append({
+            'host': self.headers['Host'],
+            'path': self.path,
+            'pattern': self.headers[cache_settings.BAN_PATTERN_HEADER],
+        })
+        self.send_response(self.server.status_code)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def fake_varnish():
+    server = HTTPServer(('127.0.0.1', 0), FakeVarnishHandler)
+    server.bans = []
+    server.status_code = 200
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    url = 'http://127.0.0.1:{}'.format(server.server_address[1])
+    with mock.patch('api.caching.tasks.settings.ENABLE_VARNISH', True), \
+            mock.patch('api.caching.tasks.settings.VARNISH_SERVERS', [url]), \
+            mock.patch('api.caching.tasks.settings.VARNISH_REGEX_BANS', True):
+        yield server
+    server.shutdown()
+    server.server_close()
+
+
+class FakeBannable(object):
+
+    def __init__(self, path):
+        self.absolute_api_v2_url = 'http://localhost:8000{}'.format(path)
+
+
+class TestBanPatterns:
+
+    def test_collapse_paths(self):
+        paths = ['/v2/nodes/abcde/children/', '/v2/nodes/abcde/', '/v2/users/fghij/', '/v2/nodes/abcde/']
+        assert tasks.collapse_paths(paths) == ['/v2/nodes/abcde/', '/v2/users/fghij/']
+
+    def test_get_ban_patterns(self):
+        patterns = tasks.get_ban_patterns(['/v2/nodes/abcde/', '/v2/users/fghij/'])
+        assert len(patterns) == 1
+        assert re.match(patterns[0], '/v2/nodes/abcde/children/?page=2')
+        assert re.match(patterns[0], '/v2/users/fghij/')
+        assert not re.match(patterns[0], '/v2/nodes/fghij/')
+        assert not re.match(patterns[0], '/v3/v2/nodes/abcde/')
+
+    @mock.patch('api.caching.settings.BAN_MAX_PATHS_PER_PATTERN', 2)
+    def test_get_ban_patterns_chunks(self):
+        patterns = tasks.get_ban_patterns(['/v2/nodes/{}/'.format(i) for i in range(5)])
+        assert len(patterns) == 3
+
+
+class TestBans:
+
+    def test_ban_paths_sends_one_ban_per_server(self, fake_varnish):
+        failures = tasks.ban_paths({'localhost': ['/v2/nodes/abcde/', '/v2/nodes/abcde/children/', '/v2/users/fghij/']})
+
+        assert failures == 0
+        assert fake_varnish.bans == [{
+            'host': 'localhost',
+            'path': '/',
+            'pattern': tasks.get_ban_patterns(['/v2/nodes/abcde/', '/v2/users/fghij/'])[0],
+        }]
+
+    def test_ban_paths_by_url_without_regex_bans(self, fake_varnish):
+        with mock.patch('api.caching.tasks.settings.VARNISH_REGEX_BANS', False):
+            failures = tasks.ban_paths({'localhost': ['/v2/nodes/abcde/', '/v2/nodes/abcde/children/', '/v2/users/fghij/']})
+
+        assert failures == 0
+        assert sorted(fake_varnish.bans, key=lambda ban: ban['path']) == [
+            {'host': 'localhost', 'path': '/v2/nodes/abcde/.*', 'pattern': None},
+            {'host': 'localhost', 'path': '/v2/users/fghij/.*', 'pattern': None},
+        ]
+
+    def test_ban_paths_reports_failures(self, fake_varnish):
+        fake_varnish.status_code = 500
+        assert tasks.ban_paths({'localhost': ['/v2/nodes/abcde/']}) == 1
+
+    def test_ban_paths_disabled(self, fake_varnish):
+        with mock.patch('api.caching.tasks.settings.ENABLE_VARNISH', False):
+            tasks.ban_paths({'localhost': ['/v2/nodes/abcde/']})
+        assert fake_varnish.bans == []
+
+    @mock.patch('api.caching.tasks.enqueue_postcommit_task')
+    def test_enqueued_bans_are_coalesced(self, mock_enqueue, fake_varnish):
+        tasks.enqueue_ban(FakeBannable('/v2/nodes/abcde/'))
+        tasks.enqueue_ban(FakeBannable('/v2/nodes/abcde/'))
+        tasks.enqueue_ban(FakeBannable('/v2/users/fghij/'))
+        assert fake_varnish.bans == []
+
+        tasks.flush_bans()
+
+        assert len(fake_varnish.bans) == 1
+        assert fake_varnish.bans[0]['pattern'] == tasks.get_ban_patterns(['/v2/nodes/abcde/', '/v2/users/fghij/'])[0]
+        assert all(call[0][0] is tasks.flush_bans for call in mock_enqueue.call_args_list)
+        assert len(set(repr(call[0][1]) for call in mock_enqueue.call_args_list)) == 1
+
+    def test_enqueued_bans_are_flushed_from_another_thread(self, fake_varnish):
+        postcommit_before_request()
+        tasks.enqueue_ban(FakeBannable('/v2/nodes/abcde/'))
+        tasks.enqueue_ban(FakeBannable('/v2/users/fghij/'))
+        queued = list(postcommit_queue().values())
+        assert len(queued) == 1
+
+        # Postcommit tasks run in their own greenlet, which has its own thread locals
+        thread = threading.Thread(target=queued[0])
+        thread.start()
+        thread.join()
+
+        assert len(fake_varnish.bans) == 1
+        assert fake_varnish.bans[0]['pattern'] == tasks.get_ban_patterns(['/v2/nodes/abcde/', '/v2/users/fghij/'])[0]
+        assert tasks.get_ban_collector() == {}
+
+    def test_collect_bans(self, fake_varnish):
+        with tasks.collect_bans():
+            with mock.patch('api.caching.tasks.enqueue_postcommit_task'):
+                for guid in ('abcde', 'fghij', 'abcde'):
+                    tasks.enqueue_ban(FakeBannable('/v2/nodes/{}/'.format(guid)))
+            assert fake_varnish.bans == []
+
+        assert len(fake_varnish.bans) == 1
+        assert fake_varnish.bans[0]['pattern'] == tasks.get_ban_patterns(['/v2/nodes/abcde/', '/v2/nodes/fghij/'])[0]
+
+
+@pytest.mark.django_db
+class TestBanRules:
+
+    @pytest.fixture()
+    def project(self):
+        return ProjectFactory()
+
+    @pytest.fixture()
+    def component(self, project):
+        return NodeFactory(parent=project, creator=project.creator)
+
+    def test_comment_bans_target(self, project):
+        comment = CommentFactory(node=project)
+        paths, hostname = tasks.get_bannable_paths(comment)
+        assert '/v2/comments/{}/'.format(comment._id) in paths
+        assert '/v2/nodes/{}/'.format(project._id) in paths
+
+    def test_component_bans_parent(self, project, component):
+        paths, hostname = tasks.get_bannable_paths(component)
+        assert paths == ['/v2/nodes/{}/'.format(component._id), '/v2/nodes/{}/'.format(project._id)]
+
+    def test_contributor_bans_node_and_user(self, project):
+        contributor = project.contributor_set.get(user=project.creator)
+        paths, hostname = tasks.get_bannable_paths(contributor)
+        assert paths == ['/v2/nodes/{}/'.format(project._id), '/v2/users/{}/'.format(project.creator._id)]
+
+    @mock.patch('api.caching.listeners.enqueue_ban')
+    def test_listener_disabled_by_default(self, mock_enqueue_ban, project):
+        with mock.patch('api.caching.listeners.settings.ENABLE_VARNISH', True):
+            project.title = 'Uncached'
+            project.save()
+        assert not mock_enqueue_ban.called
+
+    @mock.patch('api.caching.listeners.enqueue_ban')
+    def test_listener_bans_registered_models(self, mock_enqueue_ban, project):
+        with mock.patch('api.caching.listeners.settings.ENABLE_VARNISH', True), \
+                mock.patch('api.caching.listeners.settings.VARNISH_BAN_ON_MODEL_CHANGES', True):
+            project.title = 'Banned'
+            project.save()
+            assert mock_enqueue_ban.call_args[0][0] == project
+
+            mock_enqueue_ban.reset_mock()
+            project.add_tag('cached', auth=Auth(project.creator))
+            banned = [call[0][0] for call in mock_enqueue_ban.call_args_list]
+            assert project in banned
+            assert not any(isinstance(obj, Tag) for obj in banned)
+
+    def test_save_bans_after_request(self, fake_varnish, project):
+        postcommit_before_request()
+        with mock.patch('api.caching.listeners.settings.VARNISH_BAN_ON_MODEL_CHANGES', True):
+            project.title = 'Banned'
+            project.save()
+        flushes = [func for func in postcommit_queue().values() if func.func is tasks.flush_bans]
+        assert len(flushes) == 1
+        assert fake_varnish.bans == []
+
+        thread = threading.Thread(target=flushes[0])
+        thread.start()
+        thread.join()
+
+        assert len(fake_varnish.bans) == 1
+        assert re.match(fake_varnish.bans[0]['pattern'], '/v2/nodes/{}/'.format(project._id))
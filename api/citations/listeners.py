@@ -0,0 +1,21 @@
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from api.citations.utils import invalidate_cached_citations
+from osf.models import Contributor, PreprintContributor
+from website import settings
+
+
+@receiver(post_save, sender=Contributor)
+@receiver(post_delete, sender=Contributor)
+@receiver(post_save, sender=PreprintContributor)
+@receiver(post_delete, sender=PreprintContributor)
+def invalidate_citations_on_contributor_change(sender, instance, **kwargs):
+    if not settings.CITATION_CACHE_TIMEOUT:
+        return
+    try:
+        target = instance.node if sender is Contributor else instance.preprint
+    except ObjectDoesNotExist:  # deleted along with its node
+        return
+    invalidate_cached_citations(target)
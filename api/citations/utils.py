@@ -1,7 +1,14 @@
 # -*- coding: utf-8 -*-
 
+import functools
+import hashlib
 import os
 import re
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings as django_settings
 from rest_framework import status as http_status
 
 from citeproc import CitationStylesStyle, CitationStylesBibliography
@@ -12,8 +19,17 @@ from citeproc.source.json import CiteProcJSON
 from framework.exceptions import HTTPError
 from framework.auth import utils
 from osf.models.citation import CitationStyle
+from website import settings as website_settings
 from website.settings import CITATION_STYLES_PATH, BASE_PATH, CUSTOM_CITATIONS
 
+# Hit/miss counters for the rendered citation cache, see `get_cached_citation`
+citation_cache_stats = Counter()
+
+CITATION_CACHE_KEY = 'citation:{generation}:{node_generation}:{node_id}:{modified}:{style_hash}'
+CITATION_CACHE_GENERATION_KEY = 'citation:generation'
+CITATION_CACHE_NODE_GENERATION_KEY = 'citation:generation:{node_id}'
+
+_style_lock = threading.Lock()
 
 def clean_up_common_errors(cit):
     cit = re.sub(r'\.+', '.', cit)
@@ -44,36 +60,63 @@ def process_name(node, user):
     }
 
 
-def render_citation(node, style='apa'):
-    """Given a node, return a citation"""
-    reformat_styles = ['apa', 'chicago-author-date', 'modern-language-association']
-    csl = node.csl
-    data = [csl, ]
+def get_style_path(style):
+    custom = CUSTOM_CITATIONS.get(style, False)
+    return os.path.join(BASE_PATH, 'static', custom) if custom else os.path.join(CITATION_STYLES_PATH, style)
 
-    bib_source = CiteProcJSON(data)
 
-    custom = CUSTOM_CITATIONS.get(style, False)
-    path = os.path.join(BASE_PATH, 'static', custom) if custom else os.path.join(CITATION_STYLES_PATH, style)
+def _get_style_mtime(path):
+    # citeproc appends the .csl extension itself when it's missing from the path
+    for candidate in (path, path + '.csl'):
+        if os.path.isfile(candidate):
+            return os.path.getmtime(candidate)
+    return None
 
+
+@functools.lru_cache(maxsize=website_settings.CITATION_STYLE_CACHE_SIZE)
+def _parse_style(style, path, mtime):
     try:
-        bib_style = CitationStylesStyle(path, validate=False)
+        return CitationStylesStyle(path, validate=False)
     except ValueError:
         citation_style = CitationStyle.load(style)
         if citation_style is not None and citation_style.has_parent_style:
             parent_style = citation_style.parent_style
             parent_path = os.path.join(CITATION_STYLES_PATH, parent_style)
-            bib_style = CitationStylesStyle(parent_path, validate=False)
+            return CitationStylesStyle(parent_path, validate=False)
         else:
             raise ValueError('Unable to find a dependent or independent parent style related to {}.csl'.format(style))
 
-    bibliography = CitationStylesBibliography(bib_style, bib_source, formatter.plain)
 
-    citation = Citation([CitationItem(node._id)])
+def get_style(style):
+    """
+    Return the parsed CitationStylesStyle for a style id, or for its parent if it's a dependent style.
+    Parsed styles are kept in a per-process LRU cache keyed by the style's file modification time, so
+    updating the styles on disk takes effect without a restart.
+
+    :raises: ValueError if neither the style nor a parent style can be found
+    """
+    path = get_style_path(style)
+    return _parse_style(style, path, _get_style_mtime(path))
 
-    bibliography.register(citation)
 
-    bib = bibliography.bibliography()
-    cit = str(bib[0] if len(bib) else '')
+def render_citation(node, style='apa'):
+    """Given a node, return a citation"""
+    csl = node.csl
+    bib_style = get_style(style)
+
+    # Building a bibliography attaches it and its formatter to the shared parsed style
+    with _style_lock:
+        bibliography = CitationStylesBibliography(bib_style, CiteProcJSON([csl]), formatter.plain)
+        bibliography.register(Citation([CitationItem(node._id)]))
+        bib = bibliography.bibliography()
+        cit = str(bib[0] if len(bib) else '')
+
+    return format_citation(node, csl, cit, style)
+
+
+def format_citation(node, csl, cit, style):
+    """Clean up a citation rendered by citeproc and apply OSF's own author formatting for some styles."""
+    reformat_styles = ['apa', 'chicago-author-date', 'modern-language-association']
 
     title = csl['title'] if csl else node.csl['title']
     title = title.rstrip('.')
@@ -101,6 +144,67 @@ def render_citation(node, style='apa'):
 
     return cit
 
+
+def _get_citation_cache():
+    # Avoid circular imports, the API settings import website.settings
+    from django.core.cache import caches
+    return caches[django_settings.CITATION_CACHE_NAME]
+
+
+def _get_citation_cache_key(cache, node, style):
+    """
+    The key embeds the node's modified timestamp, so title and other edits that save the node orphan its
+    citations, plus two generations: one bumped when the node's contributors change and one bumped when
+    any user's name changes.
+    """
+    node_generation_key = CITATION_CACHE_NODE_GENERATION_KEY.format(node_id=node._id)
+    generations = cache.get_many([CITATION_CACHE_GENERATION_KEY, node_generation_key])
+    style_hash = hashlib.sha256(style.encode('utf-8')).hexdigest()
+    return CITATION_CACHE_KEY.format(
+        generation=generations.get(CITATION_CACHE_GENERATION_KEY, 0),
+        node_generation=generations.get(node_generation_key, 0),
+        node_id=node._id,
+        modified=node.modified.isoformat(),
+        style_hash=style_hash,
+    )
+
+
+def get_cached_citation(node, style='apa'):
+    """
+    Return the citation of a node in the given style, rendering it only if it isn't cached. Citations
+    are cached for `CITATION_CACHE_TIMEOUT` seconds; setting it to 0 disables the cache.
+    """
+    if not website_settings.CITATION_CACHE_TIMEOUT:
+        return render_citation(node, style=style)
+
+    cache = _get_citation_cache()
+    key = _get_citation_cache_key(cache, node, style)
+    citation = cache.get(key)
+    if citation is not None:
+        citation_cache_stats['hits'] += 1
+        return citation
+
+    citation_cache_stats['misses'] += 1
+    citation = render_citation(node, style=style)
+    cache.set(key, citation, website_settings.CITATION_CACHE_TIMEOUT)
+    return citation
+
+
+def invalidate_cached_citations(node):
+    """Orphan every cached citation of a node, e.g. after its contributors change."""
+    cache = _get_citation_cache()
+    key = CITATION_CACHE_NODE_GENERATION_KEY.format(node_id=node._id)
+    cache.set(key, time.time(), None)
+    citation_cache_stats['invalidations'] += 1
+
+
+def invalidate_all_cached_citations():
+    """Orphan every cached citation, e.g. after a user's name changes; stale entries expire on their own."""
+    cache = _get_citation_cache()
+    cache.set(CITATION_CACHE_GENERATION_KEY, time.time(), None)
+    citation_cache_stats['invalidations'] += 1
+
+
 def add_period_to_title(cit):
     title_split = cit.split('”')  # quote is ” (\xe2\x80\x9d) not normal "
     if len(title_split) == 2 and title_split[0][-1] != '.':
@@ -1,3 +1,6 @@
+import csv
+from io import StringIO
+
 from rest_framework_csv.renderers import CSVRenderer
 
 
@@ -15,6 +18,27 @@ class MetricsCSVRenderer(CSVRenderer):
         data = data.get('data')
         return super().render(data, media_type=media_type, renderer_context=renderer_context, writer_opts=writer_opts)
 
+    def render_stream(self, batches):
+        """
+        Yield a CSV with the header row followed by a chunk per batch of serialized resource objects, so
+        exports can be streamed without holding every row in memory.
+        """
+        csv_buffer = StringIO()
+        csv_writer = csv.writer(csv_buffer, **(self.writer_opts or {}))
+
+        def flush():
+            value = csv_buffer.getvalue()
+            csv_buffer.seek(0)
+            csv_buffer.truncate()
+            return value.encode(self.charset)
+
+        csv_writer.writerow([self.labels.get(key, key) for key in self.header])
+        yield flush()
+        for batch in batches:
+            for item in self.flatten_data(batch):
+                csv_writer.writerow([item.get(key, None) for key in self.header])
+            yield flush()
+
 class InstitutionUserMetricsCSVRenderer(MetricsCSVRenderer):
     """
     MetricsCSVRenderer with headers and labels specific to the InstitutionUserMetrics Endpoint
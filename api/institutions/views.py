@@ -1,4 +1,9 @@
+import functools
+import itertools
+import operator
+
 from django.db.models import F
+from django.http import StreamingHttpResponse
 from rest_framework import generics
 from rest_framework import permissions as drf_permissions
 from rest_framework import exceptions
@@ -14,18 +19,24 @@ from osf.metrics import UserInstitutionProjectCounts
 from osf.utils import permissions as osf_permissions
 
 from api.base import permissions as base_permissions
-from api.base.filters import ListFilterMixin
+from api.base.filters import ListFilterMixin, OSFOrderingFilter
 from api.base.views import JSONAPIBaseView
 from api.base.serializers import JSONAPISerializer
 from api.base.utils import get_object_or_error, get_user_auth
-from api.base.pagination import JSONAPIPagination, MaxSizePagination
+from api.base.pagination import MaxSizePagination
 from api.base.parsers import (
     JSONAPIRelationshipParser,
     JSONAPIRelationshipParserForRegularJSON,
 )
-from api.base.settings import MAX_SIZE_OF_ES_QUERY
 from api.base.exceptions import RelationshipPostMakesNoChanges
-from api.base.utils import MockQueryset
+from api.base.utils import (
+    SEARCH_FILTER_OPERATORS,
+    SearchBucketsQueryset,
+    SearchHitsQueryset,
+    SearchQueryset,
+    build_search_filter,
+    dict_as_item,
+)
 from api.base.settings import DEFAULT_ES_NULL_VALUE
 from api.metrics.permissions import IsInstitutionalMetricsUser
 from api.nodes.serializers import NodeSerializer
@@ -406,6 +417,12 @@ class InstitutionSummaryMetrics(JSONAPIBaseView, generics.RetrieveAPIView, Insti
 
 
 class InstitutionImpactList(JSONAPIBaseView, ListFilterMixin, generics.ListAPIView, InstitutionMixin):
+    """
+    Base view for lists of institutional metrics read from elasticsearch. Filters and orderings on fields
+    in `search_filter_fields` and `search_sort_fields` are part of the elasticsearch query and each page
+    fetches only its own results; any others load every result and are filtered and sorted in memory.
+    CSV exports are streamed.
+    """
     permission_classes = (
         drf_permissions.IsAuthenticatedOrReadOnly,
         base_permissions.TokenHasScope,
@@ -417,56 +434,94 @@ class InstitutionImpactList(JSONAPIBaseView, ListFilterMixin, generics.ListAPIVi
 
     view_category = 'institutions'
 
+    # Serializer source fields that elasticsearch can sort on, mapped to their sort options, and that it can
+    # filter on, mapped to the field filtered
+    search_sort_fields = {}
+    search_filter_fields = {}
+
     @property
     def is_csv_export(self):
         if isinstance(self.request.accepted_renderer, MetricsCSVRenderer):
             return True
         return False
 
-    @property
-    def pagination_class(self):
-        if self.is_csv_export:
-            return MaxSizePagination
-        return JSONAPIPagination
-
-    def _format_search(self, search, default_kwargs=None):
+    def get_search(self):
+        """The Search for every result of the list, before filtering."""
         raise NotImplementedError()
 
-    def _paginate(self, search):
-        if self.pagination_class is MaxSizePagination:
-            return search.extra(size=MAX_SIZE_OF_ES_QUERY)
-
-        page = self.request.query_params.get('page')
-        page_size = self.request.query_params.get('page[size]')
-
-        if page_size:
-            page_size = int(page_size)
-        else:
-            page_size = api_settings.PAGE_SIZE
-
-        if page:
-            search = search.extra(size=int(page) * page_size)
-        return search
-
-    def _make_elasticsearch_results_filterable(self, search, **kwargs) -> MockQueryset:
+    def get_search_queryset(self, search, ordering):
         """
-        Since ES returns a list obj instead of a awesome filterable queryset we are faking the filter feature used by
-        querysets by create a mock queryset with limited filterbility.
-
-        :param departments: Dict {'Department Name': 3} means "Department Name" has 3 users.
-        :return: mock_queryset
+        :param search: Search returned by `get_search`, with the request's filters applied
+        :param ordering: source field names from the `sort` param, each in `search_sort_fields`
+        :return: SearchQueryset
         """
-        items = self._format_search(search, default_kwargs=kwargs)
+        raise NotImplementedError()
 
-        search = self._paginate(search)
+    def get_ordering(self):
+        return OSFOrderingFilter().get_ordering(self.request, None, self)
 
-        queryset = MockQueryset(items, search)
-        return queryset
+    def get_search_filters(self):
+        """
+        Translate the request's filter params into elasticsearch queries, or return None if one of them
+        can't be.
+        """
+        queries = []
+        for field_names in self.parse_query_params(self.request.query_params).values():
+            sub_queries = []
+            for params in field_names.values():
+                operations = params if isinstance(params, list) else [params]
+                field = self.search_filter_fields.get(operations[0]['source_field_name'])
+                if not field or any(operation['op'] not in SEARCH_FILTER_OPERATORS for operation in operations):
+                    return None
+                sub_queries.append(functools.reduce(operator.and_, [
+                    build_search_filter(field, operation['op'], operation['value'])
+                    for operation in operations
+                ]))
+            queries.append(functools.reduce(operator.or_, sub_queries))
+        return queries
+
+    def can_search(self, ordering, filters):
+        return filters is not None and all(field.lstrip('-') in self.search_sort_fields for field in ordering)
 
-    # overrides RetrieveApiView
+    # overrides ListAPIView
     def get_queryset(self):
+        ordering = self.get_ordering()
+        filters = self.get_search_filters()
+        if self.can_search(ordering, filters):
+            search = self.get_search()
+            for query in filters:
+                search = search.filter(query)
+            return self.get_search_queryset(search, ordering)
         return self.get_queryset_from_request()
 
+    # overrides ListFilterMixin
+    def get_default_queryset(self):
+        # Everything, for ListFilterMixin and OSFOrderingFilter to filter and sort in memory
+        return list(self.get_search_queryset(self.get_search(), []))
+
+    # overrides GenericAPIView
+    def filter_queryset(self, queryset):
+        if isinstance(queryset, SearchQueryset):
+            # Already filtered and sorted by elasticsearch
+            return queryset
+        return super().filter_queryset(queryset)
+
+    # overrides ListAPIView
+    def list(self, request, *args, **kwargs):
+        if not self.is_csv_export:
+            return super().list(request, *args, **kwargs)
+
+        results = iter(self.filter_queryset(self.get_queryset()))
+        batches = (
+            self.get_serializer(batch, many=True).data
+            for batch in iter(lambda: list(itertools.islice(results, SearchQueryset.batch_size)), [])
+        )
+        renderer = request.accepted_renderer
+        return StreamingHttpResponse(
+            renderer.render_stream(batches),
+            content_type='{}; charset={}'.format(renderer.media_type, renderer.charset),
+        )
+
 
 class InstitutionDepartmentList(InstitutionImpactList):
     view_name = 'institution-department-metrics'
@@ -474,22 +529,36 @@ class InstitutionDepartmentList(InstitutionImpactList):
     serializer_class = InstitutionDepartmentMetricsSerializer
     renderer_classes = tuple(api_settings.DEFAULT_RENDERER_CLASSES, ) + (InstitutionDepartmentMetricsCSVRenderer, )
 
-    ordering = ('-number_of_users', 'name',)
+    # Descending names, as OSFOrderingFilter has always sorted ties on the original ('-number_of_users', 'name')
+    ordering = ('-number_of_users', '-name',)
+
+    # Departments are terms aggregation buckets, sorted by their count or key
+    search_sort_fields = {
+        'number_of_users': '_count',
+        'name': '_key',
+    }
+
+    def get_search(self):
+        return UserInstitutionProjectCounts.get_current_records(self.get_institution())
+
+    def get_search_queryset(self, search, ordering):
+        order = [
+            {self.search_sort_fields[field.lstrip('-')]: 'desc' if field.startswith('-') else 'asc'}
+            for field in ordering
+        ]
+        if not any('_key' in key for key in order):
+            order.append({'_key': 'asc'})
+        return SearchBucketsQueryset(
+            search,
+            field='department',
+            to_items=self.buckets_to_items,
+            order=order,
+            missing=DEFAULT_ES_NULL_VALUE,
+        )
 
-    def _format_search(self, search, default_kwargs=None):
-        results = search.execute()
-
-        if results.aggregations:
-            buckets = results.aggregations['date_range']['departments'].buckets
-            department_data = [{'name': bucket['key'], 'number_of_users': bucket['doc_count']} for bucket in buckets]
-            return department_data
-        else:
-            return []
-
-    def get_default_queryset(self):
-        institution = self.get_institution()
-        search = UserInstitutionProjectCounts.get_department_counts(institution)
-        return self._make_elasticsearch_results_filterable(search, id=institution._id)
+    @staticmethod
+    def buckets_to_items(buckets):
+        return [dict_as_item({'name': bucket.key, 'number_of_users': bucket.doc_count}) for bucket in buckets]
 
 
 class InstitutionUserMetricsList(InstitutionImpactList):
@@ -500,22 +569,40 @@ class InstitutionUserMetricsList(InstitutionImpactList):
 
     ordering = ('user_name',)
 
-    def _format_search(self, search, default_kwargs=None):
-        results = search.execute()
-
-        users = []
-        for user_record in results:
-            record_dict = {}
-            record_dict.update(default_kwargs)
-            record_dict.update(user_record.to_dict())
-            user_id = user_record.user_id
-            fullname = OSFUser.objects.get(guids___id=user_id).fullname
-            record_dict['user_name'] = fullname
-            users.append(record_dict)
-
-        return users
-
-    def get_default_queryset(self):
-        institution = self.get_institution()
-        search = UserInstitutionProjectCounts.get_current_user_metrics(institution)
-        return self._make_elasticsearch_results_filterable(search, id=institution._id, department=DEFAULT_ES_NULL_VALUE)
+    # user_name comes from the database, so sorting or filtering on it happens in memory
+    search_sort_fields = {
+        'user_id': {},
+        'department': {'missing': DEFAULT_ES_NULL_VALUE},
+        'public_project_count': {},
+        'private_project_count': {},
+    }
+    search_filter_fields = {
+        'public_project_count': 'public_project_count',
+        'private_project_count': 'private_project_count',
+    }
+
+    def get_search(self):
+        return UserInstitutionProjectCounts.get_current_records(self.get_institution())
+
+    def get_search_queryset(self, search, ordering):
+        sort = []
+        for field in ordering:
+            name = field.lstrip('-')
+            options = dict(self.search_sort_fields[name], order='desc' if field.startswith('-') else 'asc')
+            sort.append({name: options})
+        return SearchHitsQueryset(search, to_items=self.hits_to_items, sort=sort, tiebreaker='user_id')
+
+    def hits_to_items(self, hits):
+        institution_id = self.kwargs['institution_id']
+        fullnames = dict(
+            OSFUser.objects.filter(
+                guids___id__in=[hit.user_id for hit in hits],
+            ).values_list('guids___id', 'fullname'),
+        )
+        items = []
+        for hit in hits:
+            record_dict = {'id': institution_id, 'department': DEFAULT_ES_NULL_VALUE}
+            record_dict.update(hit.to_dict())
+            record_dict['user_name'] = fullnames.get(hit.user_id)
+            items.append(dict_as_item(record_dict))
+        return items
@@ -17,7 +17,7 @@ from osf.models import (
 )
 from osf.utils import permissions as osf_permissions
 
-from api.base.utils import get_user_auth, is_deprecated, assert_resource_type
+from api.base.utils import get_user_auth, is_deprecated, assert_resource_type, is_prefetched_for_embed
 
 
 class ContributorOrPublic(permissions.BasePermission):
@@ -39,7 +39,7 @@ class ContributorOrPublic(permissions.BasePermission):
             obj = obj.branched_from
 
         if request.method in permissions.SAFE_METHODS:
-            return obj.is_public or obj.can_view(auth)
+            return obj.is_public or is_prefetched_for_embed(request, view, obj) or obj.can_view(auth)
         else:
             return obj.can_edit(auth)
 
@@ -10,12 +10,13 @@ import requests
 
 from addons.osfstorage.models import OsfStorageFile, OsfStorageFolder, NodeSettings, Region
 from addons.wiki.models import NodeSettings as WikiNodeSettings
-from osf.models import AbstractNode, Preprint, Guid, NodeRelation, Contributor
+from osf.models import AbstractNode, Preprint, Guid, NodeRelation, Contributor, NodePermissionIndex
 from osf.models.node import NodeGroupObjectPermission
 from osf.utils import permissions
 
 from api.base.exceptions import ServiceUnavailableError
 from api.base.utils import get_object_or_error, waterbutler_api_url_for, get_user_auth, has_admin_scope
+from website import settings as website_settings
 
 def get_file_object(target, path, provider, request):
     # Don't bother going to waterbutler for osfstorage
@@ -93,18 +94,27 @@ class NodeOptimizationMixin(object):
         region = Region.objects.filter(id=OuterRef('region_id'))
         node_settings = NodeSettings.objects.annotate(region_abbrev=Subquery(region.values('_id')[:1])).filter(owner_id=OuterRef('pk'))
 
-        admin_permission = Permission.objects.get(codename=permissions.ADMIN_NODE)
-        write_permission = Permission.objects.get(codename=permissions.WRITE_NODE)
-        read_permission = Permission.objects.get(codename=permissions.READ_NODE)
         contrib = Contributor.objects.filter(user=auth.user, node=OuterRef('pk'))
-        user_group = OSFUserGroup.objects.filter(osfuser_id=auth.user.id if auth.user else None, group_id=OuterRef('group_id'))
-        node_group = NodeGroupObjectPermission.objects.annotate(user_group=Subquery(user_group.values_list('group_id')[:1])).filter(user_group__isnull=False, content_object_id=OuterRef('pk'))
+        if website_settings.NODE_PERMISSION_INDEX:
+            node_permissions = NodePermissionIndex.objects.filter(node_id=OuterRef('pk'))
+            has_read = Exists(node_permissions.for_user(auth.user, permissions.READ_NODE, implicit=False))
+            has_write = Exists(node_permissions.for_user(auth.user, permissions.WRITE_NODE, implicit=False))
+            has_admin = Exists(node_permissions.for_user(auth.user, permissions.ADMIN_NODE, implicit=False))
+        else:
+            admin_permission = Permission.objects.get(codename=permissions.ADMIN_NODE)
+            write_permission = Permission.objects.get(codename=permissions.WRITE_NODE)
+            read_permission = Permission.objects.get(codename=permissions.READ_NODE)
+            user_group = OSFUserGroup.objects.filter(osfuser_id=auth.user.id if auth.user else None, group_id=OuterRef('group_id'))
+            node_group = NodeGroupObjectPermission.objects.annotate(user_group=Subquery(user_group.values_list('group_id')[:1])).filter(user_group__isnull=False, content_object_id=OuterRef('pk'))
+            has_read = Exists(node_group.filter(permission_id=read_permission.id))
+            has_write = Exists(node_group.filter(permission_id=write_permission.id))
+            has_admin = Exists(node_group.filter(permission_id=admin_permission.id))
         # user_is_contrib means user is a traditional contributor, while has_read/write/admin are permissions the user has either through group membership or contributorship
         return queryset.prefetch_related('root').prefetch_related('subjects').annotate(
             user_is_contrib=Exists(contrib),
-            has_read=Exists(node_group.filter(permission_id=read_permission.id)),
-            has_write=Exists(node_group.filter(permission_id=write_permission.id)),
-            has_admin=Exists(node_group.filter(permission_id=admin_permission.id)),
+            has_read=has_read,
+            has_write=has_write,
+            has_admin=has_admin,
             has_wiki_addon=Exists(wiki_addon),
             annotated_parent_id=Subquery(parent.values('parent__id')[:1], output_field=CharField()),
             has_viewable_preprints=Exists(preprints),
@@ -55,7 +55,7 @@ from api.base.views import (
     WaterButlerMixin,
 )
 from api.base.waffle_decorators import require_flag
-from api.citations.utils import render_citation
+from api.citations.utils import get_cached_citation
 from api.comments.permissions import CanCommentOrPublic
 from api.comments.serializers import (
     CommentCreateSerializer,
@@ -242,6 +242,10 @@ class NodeList(JSONAPIBaseView, bulk_views.BulkUpdateJSONAPIView, bulk_views.Bul
     view_name = 'node-list'
 
     ordering = ('-modified', )  # default ordering
+    cursor_pagination = True
+    count_strategy = 'cached'
+    # Embedded parents, contributors and the like are fetched per page, so this doesn't grow with the page size
+    query_budget = 60
 
     # overrides NodesFilterMixin
     def get_default_queryset(self):
@@ -367,6 +371,32 @@ class NodeDetail(JSONAPIBaseView, generics.RetrieveUpdateDestroyAPIView, NodeMix
     view_category = 'nodes'
     view_name = 'node-detail'
 
+    embed_lookup_url_kwarg = 'node_id'
+    query_budget = 40
+
+    # overrides JSONAPIBaseView
+    @classmethod
+    def bulk_get_embedded_objects(cls, request, lookups):
+        auth = get_user_auth(request)
+        if auth.private_key:
+            # View-only links are checked node by node
+            return {}
+        nodes = [
+            node for node in Node.objects.filter(
+                guids___id__in=lookups,
+                is_deleted=False,
+            ).annotate(
+                region=F('addons_osfstorage_node_settings__region___id'),
+            ).exclude(region=None)
+            if not (node.is_collection or node.is_registration)
+        ]
+        # One query for the read permission of every private node, rather than one check per node
+        private_ids = [node.id for node in nodes if not node.is_public]
+        viewable_ids = set(
+            Node.objects.filter(id__in=private_ids).can_view(auth.user).values_list('id', flat=True),
+        ) if private_ids else set()
+        return {node._id: node for node in nodes if node.is_public or node.id in viewable_ids}
+
     # overrides RetrieveUpdateDestroyAPIView
     def get_object(self):
         return self.get_node()
@@ -416,6 +446,7 @@ class NodeContributorsList(BaseContributorList, bulk_views.BulkUpdateJSONAPIView
     view_category = 'nodes'
     view_name = 'node-contributors'
     ordering = ('_order',)  # default ordering
+    cursor_pagination = True
 
     def get_resource(self):
         return self.get_node()
@@ -795,7 +826,7 @@ class NodeCitationStyleDetail(JSONAPIBaseView, generics.RetrieveAPIView, NodeMix
 
         style = self.kwargs.get('style_id')
         try:
-            citation = render_citation(node=node, style=style)
+            citation = get_cached_citation(node, style=style)
         except ValueError as err:  # style requested could not be found
             csl_name = re.findall(r'[a-zA-Z]+\.csl', str(err))[0]
             raise NotFound('{} is not a known style.'.format(csl_name))
@@ -1093,6 +1124,7 @@ class NodeFilesList(JSONAPIBaseView, generics.ListAPIView, WaterButlerMixin, Lis
     )
 
     ordering = ('_materialized_path',)  # default ordering
+    cursor_pagination = True
 
     required_read_scopes = [CoreScopes.NODE_FILE_READ]
     required_write_scopes = [CoreScopes.NODE_FILE_WRITE]
@@ -1523,6 +1555,8 @@ class NodeLogList(JSONAPIBaseView, generics.ListAPIView, NodeMixin, ListFilterMi
     log_lookup_url_kwarg = 'node_id'
 
     ordering = ('-date', )
+    cursor_pagination = True
+    count_strategy = 'estimate'
 
     permission_classes = (
         drf_permissions.IsAuthenticatedOrReadOnly,
@@ -24,7 +24,7 @@ from api.base.parsers import (
 )
 from api.base.utils import absolute_reverse, get_user_auth
 from api.base import permissions as base_permissions
-from api.citations.utils import render_citation
+from api.citations.utils import get_cached_citation
 from api.preprints.serializers import (
     PreprintSerializer,
     PreprintCreateSerializer,
@@ -273,7 +273,7 @@ class PreprintCitationStyleDetail(JSONAPIBaseView, generics.RetrieveAPIView, Pre
 
         if preprint.can_view(auth):
             try:
-                citation = render_citation(node=preprint, style=style)
+                citation = get_cached_citation(preprint, style=style)
             except ValueError as err:  # style requested could not be found
                 csl_name = re.findall(r'[a-zA-Z]+\.csl', str(err))[0]
                 raise NotFound('{} is not a known style.'.format(csl_name))
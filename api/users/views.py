@@ -97,6 +97,11 @@ class UserMixin(object):
 
     def get_user(self, check_permissions=True):
         key = self.kwargs[self.user_lookup_url_kwarg]
+
+        if self.kwargs.get('is_embedded') is True:
+            if key in self.request.parents[OSFUser]:
+                return self.request.parents[OSFUser].get(key)
+
         # If Contributor is in self.request.parents,
         # then this view is getting called due to an embedded request (contributor embedding user)
         # We prefer to access the user from the contributor object and take advantage
@@ -117,10 +122,6 @@ class UserMixin(object):
                     display_name='user',
                 )
 
-        if self.kwargs.get('is_embedded') is True:
-            if key in self.request.parents[OSFUser]:
-                return self.request.parents[OSFUser].get(key)
-
         current_user = self.request.user
 
         if isinstance(current_user, AnonymousUser):
@@ -188,6 +189,20 @@ class UserDetail(JSONAPIBaseView, generics.RetrieveUpdateAPIView, UserMixin):
     serializer_class = UserDetailSerializer
     parser_classes = (JSONAPIMultipleRelationshipsParser, JSONAPIMultipleRelationshipsParserForRegularJSON,)
 
+    embed_lookup_url_kwarg = 'user_id'
+    query_budget = 30
+
+    # overrides JSONAPIBaseView
+    @classmethod
+    def bulk_get_embedded_objects(cls, request, lookups):
+        # Any user can be read, disabled ones are left to UserMixin to raise UserGone for
+        users = OSFUser.objects.filter(
+            guids___id__in=lookups,
+        ).annotate(
+            default_region=F('addons_osfstorage_user_settings__default_region___id'),
+        ).exclude(default_region=None)
+        return {user._id: user for user in users if not user.is_disabled}
+
     def get_serializer_class(self):
         if self.request.auth:
             scopes = self.request.auth.attributes['accessTokenScope']
@@ -230,6 +230,86 @@ class TestOAuthValidation(ApiTestCase):
         assert_equal(res.status_code, 403, msg=res.json)
 
 
+class TestOAuthProfileCache(ApiTestCase):
+    """Test that CAS profile lookups for OAuth2 bearer tokens are cached and invalidated on revocation"""
+
+    def setUp(self):
+        super(TestOAuthProfileCache, self).setUp()
+        self.user = UserFactory()
+        self.project = ProjectFactory(title='Cached Token Project', is_public=False, creator=self.user)
+        self.url = '/{}nodes/{}/'.format(API_BASE, self.project._id)
+
+    @mock.patch('framework.auth.cas.CasClient.profile')
+    def test_valid_token_profile_is_cached(self, mock_user_info):
+        mock_user_info.return_value = cas.CasResponse(
+            authenticated=True, user=self.user._id,
+            attributes={'accessTokenScope': ['osf.full_read']}
+        )
+
+        for _ in range(3):
+            res = self.app.get(self.url, auth='some_valid_token', auth_type='jwt')
+            assert_equal(res.status_code, 200, msg=res.json)
+        assert_equal(mock_user_info.call_count, 1)
+
+    @mock.patch('framework.auth.cas.CasClient.profile')
+    def test_rejected_token_is_negatively_cached(self, mock_user_info):
+        mock_user_info.side_effect = cas.CasHTTPError(401, 'Unauthorized', {}, '')
+
+        for _ in range(2):
+            res = self.app.get(self.url, auth='invalid_token', auth_type='jwt', expect_errors=True)
+            assert_equal(res.status_code, 401)
+        assert_equal(mock_user_info.call_count, 1)
+
+    @mock.patch('framework.auth.cas.CasClient.profile')
+    def test_server_error_is_not_cached(self, mock_user_info):
+        mock_user_info.side_effect = cas.CasHTTPError(500, 'Server Error', {}, '')
+
+        for _ in range(2):
+            res = self.app.get(self.url, auth='some_valid_token', auth_type='jwt', expect_errors=True)
+            assert_equal(res.status_code, 401)
+        assert_equal(mock_user_info.call_count, 2)
+
+    @mock.patch('framework.auth.cas.requests.post')
+    @mock.patch('framework.auth.cas.CasClient.profile')
+    def test_token_revocation_invalidates_cache(self, mock_user_info, mock_revoke):
+        mock_user_info.return_value = cas.CasResponse(
+            authenticated=True, user=self.user._id,
+            attributes={'accessTokenScope': ['osf.full_read']}
+        )
+        mock_revoke.return_value = mock.Mock(status_code=204)
+
+        self.app.get(self.url, auth='some_valid_token', auth_type='jwt')
+        cas.get_client().revoke_tokens({'token': 'some_valid_token'})
+        self.app.get(self.url, auth='some_valid_token', auth_type='jwt')
+        assert_equal(mock_user_info.call_count, 2)
+
+    @mock.patch('framework.auth.cas.requests.post')
+    @mock.patch('framework.auth.cas.CasClient.profile')
+    def test_application_revocation_invalidates_cache(self, mock_user_info, mock_revoke):
+        mock_user_info.return_value = cas.CasResponse(
+            authenticated=True, user=self.user._id,
+            attributes={'accessTokenScope': ['osf.full_read']}
+        )
+        mock_revoke.return_value = mock.Mock(status_code=204)
+
+        self.app.get(self.url, auth='some_valid_token', auth_type='jwt')
+        cas.get_client().revoke_application_tokens('client_id', 'client_secret')
+        self.app.get(self.url, auth='some_valid_token', auth_type='jwt')
+        assert_equal(mock_user_info.call_count, 2)
+
+    @mock.patch('framework.auth.cas.CasClient.profile')
+    def test_cache_disabled(self, mock_user_info):
+        mock_user_info.return_value = cas.CasResponse(
+            authenticated=True, user=self.user._id,
+            attributes={'accessTokenScope': ['osf.full_read']}
+        )
+
+        with mock.patch('framework.auth.cas.settings.CAS_PROFILE_CACHE_TIMEOUT', 0):
+            for _ in range(2):
+                self.app.get(self.url, auth='some_valid_token', auth_type='jwt')
+        assert_equal(mock_user_info.call_count, 2)
+
+
 @pytest.mark.enable_quickfiles_creation
 class TestOAuthScopedAccess(ApiTestCase):
     """Verify that OAuth2 scopes restrict APIv2 access for a few sample views. These tests cover basic mechanics,
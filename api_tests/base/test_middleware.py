@@ -8,8 +8,12 @@ from rest_framework.test import APIRequestFactory
 from django.test.utils import override_settings
 
 from website.util import api_v2_url
+from api.base import instrumentation
 from api.base import settings
-from api.base.middleware import CorsMiddleware
+from api.base.middleware import CorsMiddleware, InstrumentationMiddleware
+from api.nodes.views import NodeDetail, NodeList
+from api.users.views import UserDetail
+from framework.auth import Auth
 from tests.base import ApiTestCase
 from osf_tests import factories
 
@@ -113,3 +117,132 @@ class TestCorsMiddleware(MiddlewareTestCase):
         self.middleware.process_request(request)
         self.middleware.process_response(request, response)
         assert_equal(response['Access-Control-Allow-Origin'], domain.geturl())
+
+
+class TestInstrumentationMiddleware(MiddlewareTestCase):
+    MIDDLEWARE = InstrumentationMiddleware
+
+    def process(self, view=NodeList, queries=0, method='get'):
+        request = getattr(self.request_factory, method)(api_v2_url('nodes/'))
+        response = HttpResponse()
+        self.middleware.process_request(request)
+        self.middleware.process_view(request, view.as_view(), (), {})
+        timings = instrumentation.current()
+        timings.add(instrumentation.DB, 0.002, count=queries)
+        with instrumentation.timed(instrumentation.SERIALIZER):
+            with instrumentation.timed(instrumentation.SERIALIZER):
+                pass
+        return timings, self.middleware.process_response(request, response)
+
+    def test_timings_are_recorded_per_view(self):
+        before = instrumentation.get_view_stats('nodes:node-list')['queries']['count']
+        timings, response = self.process(queries=3)
+        assert_equal(timings.view_fqn, 'nodes:node-list')
+        assert_equal(timings.counts[instrumentation.SERIALIZER], 1)
+        assert_is_none(instrumentation.current())
+        stats = instrumentation.get_view_stats('nodes:node-list')
+        assert_equal(stats['queries']['count'], before + 1)
+        assert_equal(stats['total_ms']['count'], before + 1)
+
+    @mock.patch('api.base.settings.SERVER_TIMING_HEADER', True)
+    def test_server_timing_header(self):
+        timings, response = self.process(queries=3)
+        header = response['Server-Timing']
+        assert_in('db;desc="3 queries";dur=2.0', header)
+        assert_in('serializer;dur=', header)
+        assert_in('total;dur=', header)
+
+    def test_no_server_timing_header_by_default(self):
+        timings, response = self.process()
+        assert_not_in('Server-Timing', response)
+
+    @mock.patch('api.base.settings.INSTRUMENT_REQUESTS', False)
+    def test_disabled(self):
+        request = self.request_factory.get(api_v2_url('nodes/'))
+        self.middleware.process_request(request)
+        assert_is_none(instrumentation.current())
+        response = self.middleware.process_response(request, HttpResponse())
+        assert_not_in('Server-Timing', response)
+
+    @mock.patch.object(NodeList, 'query_budget', 2)
+    @mock.patch('api.base.settings.QUERY_BUDGET_RAISE', True)
+    def test_query_budget_exceeded_raises(self):
+        with assert_raises(instrumentation.QueryBudgetExceeded):
+            self.process(queries=3)
+
+    @mock.patch.object(NodeList, 'query_budget', 2)
+    @mock.patch('api.base.settings.QUERY_BUDGET_RAISE', False)
+    def test_query_budget_exceeded_logs(self):
+        with mock.patch.object(instrumentation.logger, 'warning') as mock_warning:
+            self.process(queries=3)
+        assert_true(mock_warning.called)
+
+    @mock.patch.object(NodeList, 'query_budget', 2)
+    @mock.patch('api.base.settings.QUERY_BUDGET_RAISE', True)
+    def test_writes_are_not_budgeted(self):
+        timings, response = self.process(queries=3, method='post')
+        assert_equal(response.status_code, 200)
+
+    @mock.patch.object(NodeList, 'query_budget', 3)
+    def test_query_budget_met(self):
+        timings, response = self.process(queries=3)
+        assert_equal(response.status_code, 200)
+
+    def test_queries_are_counted(self):
+        node = factories.ProjectFactory(is_public=True)
+        with mock.patch('api.base.settings.SERVER_TIMING_HEADER', True):
+            res = self.app.get('/{}nodes/{}/'.format(settings.API_BASE, node._id))
+        db_timing = res.headers['Server-Timing'].split(', ')[0]
+        assert_true(db_timing.startswith('db;desc="'))
+        assert_not_equal(db_timing, 'db;desc="0 queries";dur=0.0')
+
+
+def get_query_count(res):
+    db_timing = res.headers['Server-Timing'].split(', ')[0]
+    return int(db_timing.split('"')[1].split(' ')[0])
+
+
+@mock.patch('api.base.settings.SERVER_TIMING_HEADER', True)
+@mock.patch('api.base.settings.QUERY_BUDGET_RAISE', True)
+class TestQueryBudgets(ApiTestCase):
+    """Requests to views with a query budget, which fail when they exceed it as QUERY_BUDGET_RAISE is set."""
+
+    def setUp(self):
+        super(TestQueryBudgets, self).setUp()
+        self.user = factories.AuthUserFactory()
+        self.project = factories.ProjectFactory(creator=self.user, is_public=True)
+        self.components = [self.create_component() for i in range(0, 10)]
+
+    def create_component(self):
+        component = factories.NodeFactory(parent=self.project, creator=self.user, is_public=True)
+        component.add_contributor(factories.UserFactory(), auth=Auth(self.user), save=True)
+        return component
+
+    def test_node_list(self):
+        res = self.app.get('/{}nodes/?embed=parent&embed=contributors'.format(settings.API_BASE), auth=self.user.auth)
+        assert_equal(len(res.json['data']), 10)
+        assert_less_equal(get_query_count(res), NodeList.query_budget)
+
+    def test_node_list_queries_dont_grow_per_node(self):
+        url = '/{}nodes/?embed=parent&embed=contributors&page[size]=5'.format(settings.API_BASE)
+        small_page = get_query_count(self.app.get(url, auth=self.user.auth))
+        url = '/{}nodes/?embed=parent&embed=contributors&page[size]=10'.format(settings.API_BASE)
+        res = self.app.get(url, auth=self.user.auth)
+        assert_equal(len(res.json['data']), 10)
+        # A query per node would add at least one for each of the five extra nodes
+        assert_less(get_query_count(res) - small_page, 5)
+
+    def test_node_detail(self):
+        url = '/{}nodes/{}/?embed=contributors&embed=children'.format(settings.API_BASE, self.project._id)
+        res = self.app.get(url, auth=self.user.auth)
+        assert_less_equal(get_query_count(res), NodeDetail.query_budget)
+
+        res = self.app.get('/{}nodes/{}/'.format(settings.API_BASE, self.project._id))
+        assert_less_equal(get_query_count(res), NodeDetail.query_budget)
+
+    def test_user_detail(self):
+        res = self.app.get('/{}users/{}/'.format(settings.API_BASE, self.user._id), auth=self.user.auth)
+        assert_less_equal(get_query_count(res), UserDetail.query_budget)
+
+        res = self.app.get('/{}users/me/'.format(settings.API_BASE), auth=self.user.auth)
+        assert_less_equal(get_query_count(res), UserDetail.query_budget)
@@ -1,11 +1,23 @@
 # -*- coding: utf-8 -*-
+import mock
+from django.core.cache import caches
 from nose.tools import *  # noqa:
 
+from framework.auth import Auth
+from osf.models import AbstractNode
 from osf_tests import factories
 from tests.base import ApiTestCase
 
 from api.base import settings
-from api.base.pagination import MaxSizePagination
+from api.nodes.views import NodeLogList
+from api.base.pagination import (
+    JSONAPIPagination,
+    MaxSizePagination,
+    decode_cursor,
+    encode_cursor,
+    get_keyset_filter,
+    get_keyset_ordering,
+)
 
 
 class TestMaxPagination(ApiTestCase):
@@ -54,3 +66,180 @@ class TestJSONAPIPagination(ApiTestCase):
         assert_not_in('meta', links)
         assert_in('total', meta)
         assert_in('per_page', meta)
+
+
+class TestCursorPagination(ApiTestCase):
+
+    def setUp(self):
+        super(TestCursorPagination, self).setUp()
+        caches[settings.LIST_COUNT_CACHE_NAME].clear()
+        self.user = factories.AuthUserFactory()
+        self.projects = [factories.ProjectFactory(creator=self.user) for i in range(0, 11)]
+        self.url = '/{}nodes/?version=2.1&page[size]=4&page[cursor]='.format(settings.API_BASE)
+        self.ordered_ids = [
+            node._id for node in
+            AbstractNode.objects.filter(id__in=[project.id for project in self.projects]).order_by('-modified', 'pk')
+        ]
+
+    def test_walk_list_by_cursor(self):
+        res = self.app.get(self.url, auth=self.user)
+        assert_equal(res.status_code, 200)
+        assert_is_none(res.json['links']['prev'])
+        assert_is_none(res.json['links']['first'])
+        assert_is_none(res.json['links']['last'])
+        assert_equal(res.json['meta']['per_page'], 4)
+        ids = [node['id'] for node in res.json['data']]
+        while res.json['links']['next']:
+            res = self.app.get(res.json['links']['next'], auth=self.user)
+            ids.extend(node['id'] for node in res.json['data'])
+        assert_equal(ids, self.ordered_ids)
+        assert_equal(len(res.json['data']), 3)
+
+        prev = self.app.get(res.json['links']['prev'], auth=self.user)
+        assert_equal([node['id'] for node in prev.json['data']], self.ordered_ids[4:8])
+        first = self.app.get(res.json['links']['first'], auth=self.user)
+        assert_equal([node['id'] for node in first.json['data']], self.ordered_ids[:4])
+
+    def test_cursor_respects_sort_and_filter(self):
+        self.projects[0].title = 'Filtered'
+        self.projects[0].save()
+        self.projects[1].title = 'Filtered too'
+        self.projects[1].save()
+        url = '/{}nodes/?version=2.1&page[size]=1&page[cursor]=&sort=title&filter[title]=Filtered'.format(settings.API_BASE)
+        res = self.app.get(url, auth=self.user)
+        assert_equal([node['id'] for node in res.json['data']], [self.projects[0]._id])
+        res = self.app.get(res.json['links']['next'], auth=self.user)
+        assert_equal([node['id'] for node in res.json['data']], [self.projects[1]._id])
+        assert_is_none(res.json['links']['next'])
+
+    def test_cached_total(self):
+        res = self.app.get(self.url, auth=self.user)
+        assert_equal(res.json['meta']['total'], 11)
+        assert_equal(res.json['meta']['total_type'], 'cached')
+        factories.ProjectFactory(creator=self.user)
+        res = self.app.get(self.url, auth=self.user)
+        assert_equal(res.json['meta']['total'], 11)
+        # A different filter is counted separately
+        res = self.app.get(self.url + '&filter[public]=false', auth=self.user)
+        assert_equal(res.json['meta']['total'], 12)
+
+    def test_no_total_without_count_cache(self):
+        node = self.projects[0]
+        url = '/{}nodes/{}/contributors/?version=2.1&page[cursor]='.format(settings.API_BASE, node._id)
+        res = self.app.get(url, auth=self.user)
+        assert_equal(res.status_code, 200)
+        assert_not_in('total', res.json['meta'])
+        assert_equal([contrib['id'] for contrib in res.json['data']], ['{}-{}'.format(node._id, self.user._id)])
+
+    def test_invalid_cursor(self):
+        res = self.app.get(self.url + 'garbage', auth=self.user, expect_errors=True)
+        assert_equal(res.status_code, 404)
+        res = self.app.get(self.url + encode_cursor([1]), auth=self.user, expect_errors=True)
+        assert_equal(res.status_code, 404)
+
+    def test_page_numbers_without_cursor(self):
+        res = self.app.get('/{}nodes/?version=2.1&page[size]=4'.format(settings.API_BASE), auth=self.user)
+        assert_equal(res.json['meta']['total'], 11)
+        assert_in('page=3', res.json['links']['last'])
+
+
+class TestCountStrategies(ApiTestCase):
+
+    def setUp(self):
+        super(TestCountStrategies, self).setUp()
+        caches[settings.LIST_COUNT_CACHE_NAME].clear()
+        self.user = factories.AuthUserFactory()
+        self.project = factories.ProjectFactory(creator=self.user)
+        for i in range(0, 3):
+            factories.ProjectFactory(creator=self.user)
+        self.nodes_url = '/{}nodes/?version=2.1'.format(settings.API_BASE)
+        self.logs_url = '/{}nodes/{}/logs/?version=2.1'.format(settings.API_BASE, self.project._id)
+
+    def test_exact_count_has_no_type(self):
+        url = '/{}nodes/{}/contributors/?version=2.1'.format(settings.API_BASE, self.project._id)
+        res = self.app.get(url, auth=self.user)
+        assert_equal(res.json['meta']['total'], 1)
+        assert_not_in('total_type', res.json['meta'])
+
+    def test_cached_count(self):
+        res = self.app.get(self.nodes_url, auth=self.user)
+        assert_equal(res.json['meta']['total'], 4)
+        assert_equal(res.json['meta']['total_type'], 'cached')
+
+        factories.ProjectFactory(creator=self.user)
+        res = self.app.get(self.nodes_url, auth=self.user)
+        assert_equal(res.json['meta']['total'], 4)
+        # Counts are cached per user
+        res = self.app.get(self.nodes_url, auth=factories.AuthUserFactory())
+        assert_equal(res.json['meta']['total'], 0)
+
+    def test_estimate_below_threshold_is_exact(self):
+        res = self.app.get(self.logs_url, auth=self.user)
+        assert_equal(res.json['meta']['total'], self.project.logs.count())
+        assert_equal(res.json['meta']['total_type'], 'exact')
+
+    @mock.patch.object(NodeLogList, 'count_estimate_threshold', 0)
+    @mock.patch('api.base.pagination.JSONAPIPagination.get_estimated_count', return_value=5000)
+    def test_estimate_above_threshold(self, mock_estimate):
+        res = self.app.get(self.logs_url, auth=self.user)
+        assert mock_estimate.called
+        assert_equal(res.json['meta']['total'], 5000)
+        assert_equal(res.json['meta']['total_type'], 'estimate')
+
+    @mock.patch('api.base.pagination.JSONAPIPagination.get_cached_count', return_value=1)
+    def test_pages_past_low_cached_count(self, mock_count):
+        res = self.app.get(self.nodes_url + '&page[size]=2', auth=self.user)
+        assert_equal(res.json['meta']['total'], 1)
+        assert_in('page=2', res.json['links']['next'])
+        assert_is_none(res.json['links']['last'])
+
+        res = self.app.get(res.json['links']['next'], auth=self.user)
+        assert_equal(len(res.json['data']), 2)
+        assert_is_none(res.json['links']['next'])
+        assert_in('page=1', res.json['links']['prev'])
+
+        res = self.app.get(self.nodes_url + '&page[size]=2&page=3', auth=self.user, expect_errors=True)
+        assert_equal(res.status_code, 404)
+
+    @mock.patch.object(NodeLogList, 'count_estimate_threshold', 0)
+    @mock.patch('api.base.pagination.JSONAPIPagination.get_estimated_count', return_value=1)
+    def test_pages_past_low_estimate(self, mock_estimate):
+        logs = self.project.logs.count()
+        for i in range(0, 3):
+            self.project.add_tag('tag{}'.format(i), auth=Auth(self.user))
+        res = self.app.get(self.logs_url + '&page[size]=1&page={}'.format(logs + 3), auth=self.user)
+        assert_equal(res.json['meta']['total'], 1)
+        assert_equal(len(res.json['data']), 1)
+        assert_is_none(res.json['links']['next'])
+
+
+class TestKeyset(ApiTestCase):
+
+    def test_cursor_round_trip(self):
+        assert_equal(decode_cursor(encode_cursor(['2020-01-01T00:00:00.123456+00:00', 5], True)), (['2020-01-01T00:00:00.123456+00:00', 5], True))
+        with assert_raises(ValueError):
+            decode_cursor('not a cursor')
+
+    def test_keyset_ordering_ends_in_pk(self):
+        assert_equal(get_keyset_ordering(AbstractNode.objects.order_by('-modified')), ['-modified', 'pk'])
+        assert_equal(get_keyset_ordering(AbstractNode.objects.order_by('-id', 'title')), ['-id'])
+        assert_is_none(get_keyset_ordering(AbstractNode.objects.order_by('?')))
+        assert_is_none(get_keyset_ordering([]))
+
+    def test_keyset_filter_handles_nulls(self):
+        described = factories.ProjectFactory(description='b')
+        undescribed = factories.ProjectFactory(description=None)
+        queryset = AbstractNode.objects.filter(id__in=[described.id, undescribed.id])
+        # NULLs come last ascending
+        after = queryset.filter(get_keyset_filter(['description', 'pk'], ['b', described.pk]))
+        assert_equal(list(after), [undescribed])
+        after = queryset.filter(get_keyset_filter(['description', 'pk'], [None, undescribed.pk], reverse=True))
+        assert_equal(list(after), [described])
+        # and first descending
+        after = queryset.filter(get_keyset_filter(['-description', 'pk'], [None, undescribed.pk]))
+        assert_equal(list(after), [described])
+
+    def test_planner_estimate(self):
+        estimate = JSONAPIPagination().get_estimated_count(AbstractNode.objects.filter(is_deleted=False))
+        assert isinstance(estimate, int)
+        assert estimate >= 0
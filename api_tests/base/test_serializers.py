@@ -1,7 +1,10 @@
 # -*- coding: utf-8 -*-
 from rest_framework import status as http_status
 import importlib
+import mock
+import os
 import pkgutil
+import time
 
 import pytest
 from pytz import utc
@@ -19,7 +22,7 @@ from osf.models import RegistrationSchema
 
 from api.base.settings.defaults import API_BASE
 from api.schemas.serializers import SchemaSerializer
-from api.base.serializers import JSONAPISerializer, BaseAPISerializer
+from api.base.serializers import FieldPlan, JSONAPISerializer, BaseAPISerializer
 from api.base import serializers as base_serializers
 from api.nodes.serializers import NodeSerializer, RelationshipField
 from api.waffle.serializers import WaffleSerializer, BaseWaffleSerializer
@@ -737,3 +740,77 @@ class VersionedDateTimeField(DbTestCase):
             datetime.strftime(self.old_date, self.new_format),
             data['attributes']['date_modified']
         )
+
+
+class TestFieldPlan(ApiTestCase):
+
+    def setUp(self):
+        super(TestFieldPlan, self).setUp()
+        self.nodes = [factories.NodeFactory(is_public=True) for i in range(0, 5)]
+
+    def serialize_list(self, version='2.0'):
+        req = make_drf_request_with_version(version=version)
+        serializer = NodeSerializer(self.nodes, many=True, context={'request': req})
+        return serializer, serializer.data
+
+    def serialize_list_without_plan(self):
+        """Serialize the list with the field plan recomputed for each object, as before plans were reused."""
+        get_field_plan = JSONAPISerializer.get_field_plan
+
+        def get_fresh_field_plan(serializer):
+            serializer.__dict__.pop('_field_plans', None)
+            return get_field_plan(serializer)
+
+        with mock.patch.object(JSONAPISerializer, 'get_field_plan', get_fresh_field_plan):
+            return self.serialize_list()
+
+    def test_plan_is_computed_once_per_list(self):
+        serializer, data = self.serialize_list()
+        assert_equal(len(data), len(self.nodes))
+        assert_equal(len(serializer.child._field_plans), 1)
+
+    def test_request_only_fields_are_dropped_from_plan(self):
+        serializer, data = self.serialize_list(version='2.1')
+        plan = serializer.child.get_field_plan()
+        assert_not_in('node_links', [planned.field.field_name for planned in plan.fields])
+        assert_not_in('node_links', data[0]['relationships'])
+
+        serializer, data = self.serialize_list(version='2.0')
+        plan = serializer.child.get_field_plan()
+        assert_in('node_links', [planned.field.field_name for planned in plan.fields])
+
+    def test_list_matches_items_serialized_alone(self):
+        serializer, data = self.serialize_list()
+        req = make_drf_request_with_version(version='2.0')
+        for node, item in zip(self.nodes, data):
+            assert_equal(item, NodeSerializer(node, context={'request': req}).data['data'])
+
+    def test_reused_plan_matches_plan_per_object(self):
+        def node_plans(mock_plan):
+            return [call for call in mock_plan.call_args_list if call[1]['type_'] == 'nodes']
+
+        with mock.patch('api.base.serializers.FieldPlan', side_effect=FieldPlan) as mock_plan:
+            planned = self.serialize_list()[1]
+            assert_equal(len(node_plans(mock_plan)), 1)
+
+            mock_plan.reset_mock()
+            unplanned = self.serialize_list_without_plan()[1]
+            assert_equal(len(node_plans(mock_plan)), len(self.nodes))
+
+        assert_equal(planned, unplanned)
+
+    @pytest.mark.skipif(not os.environ.get('OSF_BENCHMARKS'), reason='Benchmark, set OSF_BENCHMARKS and run with -s to see timings')
+    def test_benchmark_list_serialization(self):
+        """Compare serializing a 100 node list with the plan reused and with it recomputed for each node."""
+        self.nodes = [factories.NodeFactory(is_public=True) for i in range(0, 100)]
+
+        start = time.time()
+        planned = self.serialize_list()[1]
+        planned_time = time.time() - start
+
+        start = time.time()
+        unplanned = self.serialize_list_without_plan()[1]
+        unplanned_time = time.time() - start
+
+        assert_equal(planned, unplanned)
+        print('100 nodes: {:.3f}s with a reused field plan, {:.3f}s without'.format(planned_time, unplanned_time))
@@ -3,6 +3,7 @@ from nose.tools import *  # noqa:
 import mock  # noqa
 import unittest
 
+from django.urls import NoReverseMatch, resolve, reverse
 from rest_framework import fields
 from rest_framework.exceptions import ValidationError
 from api.base import utils as api_utils
@@ -115,3 +116,43 @@ class TestFlaskDjangoIntegration:
             assert_true(
                 False, 'Unexpected Exception from push_status_message when called '
                 'from the v2 API with type "error"')
+
+
+class TestLinkTemplates:
+
+    def test_matches_django_reverse(self):
+        for view_name, kwargs in [
+            ('nodes:node-detail', {'node_id': 'abc12', 'version': 'v2'}),
+            ('nodes:node-addon-detail', {'node_id': 'abc12', 'provider': 'github', 'version': 'v2'}),
+            ('users:user-detail', {'user_id': 'me', 'version': 'v2'}),
+            ('citations:citation-detail', {'citation_id': 'apa', 'version': 'v2'}),
+        ]:
+            assert_equal(api_utils.reverse_with_template(view_name, kwargs=kwargs), reverse(view_name, kwargs=kwargs))
+
+    def test_template_is_compiled_once(self):
+        kwargs = {'node_id': 'abc12', 'version': 'v2'}
+        with mock.patch.object(api_utils.LinkTemplate, 'compile', wraps=api_utils.LinkTemplate.compile) as mock_compile:
+            api_utils._link_templates.clear()
+            api_utils.reverse_with_template('nodes:node-children', kwargs=kwargs)
+            api_utils.reverse_with_template('nodes:node-children', kwargs=dict(kwargs, node_id='def34'))
+        assert_equal(mock_compile.call_count, 1)
+
+    def test_values_are_quoted(self):
+        template = api_utils.get_link_template('nodes:node-detail', ['node_id'], version='v2')
+        assert_equal(template.format({'node_id': 'a b'}), '/v2/nodes/a%20b/')
+
+    def test_unusual_patterns_fall_back_to_reverse(self):
+        assert_is_none(api_utils.get_link_template('nodes:node-files', ['node_id', 'provider', 'path'], version='v2'))
+        kwargs = {'node_id': 'abc12', 'provider': 'osfstorage', 'path': '/', 'version': 'v2'}
+        assert_equal(api_utils.reverse_with_template('nodes:node-files', kwargs=kwargs), reverse('nodes:node-files', kwargs=kwargs))
+        with assert_raises(NoReverseMatch):
+            api_utils.reverse_with_template('nodes:node-detail', kwargs={'node_id': 'abc12', 'version': 'v3'})
+
+    def test_resolve(self):
+        template = api_utils.get_link_template('nodes:node-detail', ['node_id'], version='v2')
+        match = template.resolve('/v2/nodes/abc12/')
+        expected = resolve('/v2/nodes/abc12/')
+        assert_equal(match.func.view_class, expected.func.view_class)
+        assert_equal(match.namespace, expected.namespace)
+        assert_equal(match.kwargs, expected.kwargs)
+        assert_is_none(template.resolve('/v2/users/abc12/'))
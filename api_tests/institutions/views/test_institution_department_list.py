@@ -178,3 +178,13 @@ class TestInstitutionDepartmentList:
         assert len(resp.json['data']) == 1
         assert resp.json['links']['meta']['per_page'] == 2
         assert resp.json['links']['meta']['total'] == 3
+
+    def test_sort(self, app, url, admin, institution, populate_counts):
+        resp = app.get(f'{url}?sort=name', auth=admin.auth)
+        assert [item['attributes']['name'] for item in resp.json['data']] == [
+            DEFAULT_ES_NULL_VALUE, 'New Department', 'Smaller Department'
+        ]
+
+        resp = app.get(f'{url}?sort=-number_of_users&page[size]=1&page=2', auth=admin.auth)
+        assert resp.json['links']['meta']['total'] == 3
+        assert resp.json['data'][0]['attributes']['number_of_users'] == 1
@@ -218,6 +218,19 @@ class TestInstitutionUserMetricList:
         resp = app.get(f'{url}?filter[department]=Psychology dept', auth=admin.auth)
         assert resp.json['data'][0]['attributes']['department'] == 'Psychology dept'
 
+    def test_sort_and_filter_in_search(self, app, url, user, user2, admin, populate_counts):
+        resp = app.get(f'{url}?sort=-public_projects', auth=admin.auth)
+        assert [item['id'] for item in resp.json['data']] == [user._id, user2._id]
+
+        resp = app.get(f'{url}?sort=public_projects&page[size]=1&page=2', auth=admin.auth)
+        assert resp.json['links']['meta']['total'] == 2
+        assert resp.json['data'][0]['id'] == user._id
+        assert resp.json['data'][0]['attributes']['user_name'] == user.fullname
+
+        resp = app.get(f'{url}?filter[public_projects][gte]=4', auth=admin.auth)
+        assert resp.json['links']['meta']['total'] == 1
+        assert resp.json['data'][0]['id'] == user._id
+
     @pytest.mark.skipif(settings.TRAVIS_ENV, reason='Non-deterministic fails on travis')
     def test_sort_and_pagination(self, app, url, user, user2, user3, admin, populate_counts, populate_more_counts, institution):
         resp = app.get(f'{url}?sort=user_name&page[size]=1&page=2', auth=admin.auth)
@@ -1,7 +1,9 @@
 import functools
+import mock
 import pytest
 
 from api.base.settings.defaults import API_BASE
+from api.nodes.views import NodeDetail
 from framework.auth.core import Auth
 from osf_tests.factories import (
     ProjectFactory,
@@ -156,3 +158,31 @@ class TestNodeEmbeds:
         res = app.get(url, auth=write_contrib_one.auth)
         assert res.status_code == 200
         assert res.json['data']['embeds']['contributors']['meta']['total_bibliographic'] == 3
+
+    def test_batched_embeds_on_list(
+            self, app, user, write_contrib_one,
+            subchild, root_node, child_one, child_two):
+        url = '/{}users/{}/nodes/?embed=parent'.format(API_BASE, write_contrib_one._id)
+
+        with mock.patch.object(NodeDetail, 'bulk_get_embedded_objects', wraps=NodeDetail.bulk_get_embedded_objects) as mock_bulk:
+            res = app.get(url, auth=write_contrib_one.auth)
+        assert res.status_code == 200
+        # The parents of the whole page are fetched together
+        assert mock_bulk.call_count == 1
+        assert set(mock_bulk.call_args[0][1]) == {root_node._id, child_two._id}
+
+        embeds = {node['id']: node.get('embeds', {}) for node in res.json['data']}
+        assert 'parent' not in embeds[root_node._id]
+        assert embeds[child_one._id]['parent']['data']['id'] == root_node._id
+        # Private parents the user can't see are still denied
+        assert embeds[subchild._id]['parent']['errors'][0]['detail'] == exceptions.PermissionDenied.default_detail
+
+    def test_batched_embeds_can_be_disabled(self, app, user, root_node, child_one):
+        url = '/{}users/{}/nodes/?embed=parent'.format(API_BASE, user._id)
+
+        with mock.patch('api.base.views.django_settings.BATCH_EMBEDS', False), \
+                mock.patch.object(NodeDetail, 'bulk_get_embedded_objects') as mock_bulk:
+            res = app.get(url, auth=user.auth)
+        assert not mock_bulk.called
+        embeds = {node['id']: node.get('embeds', {}) for node in res.json['data']}
+        assert embeds[child_one._id]['parent']['data']['id'] == root_node._id
@@ -363,7 +363,8 @@ class TestMove():
         res = app.post_json(move_url, signed_payload)
         assert res.status_code == 200
 
-        assert node.storage_usage is None
+        # Neither node had a running total yet, so both are recounted after the move
+        assert node.storage_usage == 0
         assert node_two.storage_usage == 1337
 
 
@@ -15,6 +15,13 @@ def increment_user_activity_counters(user_id, action, date_string):
     return UserActivityCounter.increment(user_id, action, date_string)
 
 
+@app.task(max_retries=5, default_retry_delay=60)
+def increment_user_activity_counters_batch(increments):
+    """Apply a list of `(user_id, action, date_string)` increments in a few set-based statements."""
+    from osf.models import UserActivityCounter
+    return UserActivityCounter.increment_many(increments)
+
+
 def get_total_activity_count(user_id):
     from osf.models import UserActivityCounter
     return UserActivityCounter.get_total_activity_count(user_id)
@@ -32,6 +39,13 @@ def update_counter(resource, file, version, action, node_info=None):
     return PageCounter.update_counter(resource, file, version=version, action=action, node_info=node_info)
 
 
+@app.task(max_retries=5, default_retry_delay=60)
+def flush_page_counter_events(batch_size=None):
+    """Fold buffered page hits into their PageCounters, see `PAGE_COUNTER_BUFFERED`."""
+    from osf.models import PageCounter
+    return PageCounter.flush_buffered_events(batch_size=batch_size)
+
+
 def get_basic_counters(resource, file, version, action):
     from osf.models import PageCounter
     return PageCounter.get_basic_counters(resource, file, version=version, action=action)
@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
 
 import furl
+import hashlib
+import logging
+from collections import Counter
 from rest_framework import status as http_status
 import json
 from future.moves.urllib.parse import quote
@@ -14,6 +17,14 @@ from framework.flask import redirect
 from framework.exceptions import HTTPError
 from website import settings
 
+logger = logging.getLogger(__name__)
+
+# Hit/miss counters for the access token profile cache, see `get_cached_profile`
+profile_cache_stats = Counter()
+
+PROFILE_CACHE_KEY = 'cas_profile:{generation}:{token_hash}'
+PROFILE_CACHE_GENERATION_KEY = 'cas_profile:generation'
+
 
 class CasError(HTTPError):
     """General CAS-related error."""
@@ -182,7 +193,14 @@ class CasClient(object):
         """Revoke a tokens based on payload"""
         url = self.get_auth_token_revocation_url()
 
-        resp = requests.post(url, data=payload)
+        try:
+            resp = requests.post(url, data=payload)
+        finally:
+            # Drop cached profiles even if CAS complains, the token is being deactivated regardless
+            if payload.get('token'):
+                invalidate_cached_profile(payload['token'])
+            else:
+                invalidate_all_cached_profiles()
         if resp.status_code == 204:
             return True
         else:
@@ -212,6 +230,94 @@ def get_client():
     return CasClient(settings.CAS_SERVER_URL)
 
 
+def _get_profile_cache():
+    from django.conf import settings as django_settings
+    from django.core.cache import caches
+    return caches[django_settings.CAS_PROFILE_CACHE_NAME]
+
+
+def _get_profile_cache_key(cache, access_token):
+    """
+    Build the cache key for an access token. Only a hash of the token is stored. The key embeds a
+    generation number so that revoking all tokens of an application can drop every cached profile
+    at once without having to know which tokens belonged to it.
+    """
+    generation = cache.get(PROFILE_CACHE_GENERATION_KEY, 0)
+    token_hash = hashlib.sha256(access_token.encode('utf-8')).hexdigest()
+    return PROFILE_CACHE_KEY.format(generation=generation, token_hash=token_hash)
+
+
+def get_cached_profile(access_token):
+    """
+    Return the `CasResponse` for an OAuth2 access token, asking CAS only if the profile is not
+    cached. Valid tokens are cached for `CAS_PROFILE_CACHE_TIMEOUT` seconds and tokens rejected by
+    CAS with a 4XX for `CAS_PROFILE_NEGATIVE_CACHE_TIMEOUT` seconds. Setting the former to 0
+    disables the cache.
+
+    :param str access_token: CAS access_token.
+    :rtype: CasResponse
+    :raises: CasHTTPError if CAS rejected the token, now or within the negative cache timeout.
+    """
+    if not settings.CAS_PROFILE_CACHE_TIMEOUT:
+        return get_client().profile(access_token)
+
+    cache = _get_profile_cache()
+    key = _get_profile_cache_key(cache, access_token)
+    cached = cache.get(key)
+    if cached is not None:
+        if cached['authenticated']:
+            profile_cache_stats['hits'] += 1
+            resp = CasResponse(authenticated=True, user=cached['user'], attributes=cached['attributes'])
+            resp.attributes['accessToken'] = access_token
+            resp.attributes['accessTokenScope'] = set(cached['scopes'])
+            return resp
+        profile_cache_stats['negative_hits'] += 1
+        raise CasHTTPError(
+            code=cached['code'],
+            message='Access token was rejected by the CAS server',
+            headers={},
+            content='',
+        )
+
+    profile_cache_stats['misses'] += 1
+    try:
+        resp = get_client().profile(access_token)
+    except CasHTTPError as e:
+        # Only remember definitive rejections, never outages or server errors
+        if 400 <= e.code < 500:
+            cache.set(key, {'authenticated': False, 'code': e.code}, settings.CAS_PROFILE_NEGATIVE_CACHE_TIMEOUT)
+        raise
+
+    if resp.authenticated:
+        attributes = {
+            name: value for name, value in resp.attributes.items()
+            if name not in ('accessToken', 'accessTokenScope')
+        }
+        cache.set(key, {
+            'authenticated': True,
+            'user': resp.user,
+            'scopes': list(resp.attributes.get('accessTokenScope', [])),
+            'attributes': attributes,
+        }, settings.CAS_PROFILE_CACHE_TIMEOUT)
+    return resp
+
+
+def invalidate_cached_profile(access_token):
+    """Remove a single access token from the profile cache."""
+    cache = _get_profile_cache()
+    cache.delete(_get_profile_cache_key(cache, access_token))
+    profile_cache_stats['invalidations'] += 1
+
+
+def invalidate_all_cached_profiles():
+    """Orphan every cached profile by bumping the cache generation; stale entries expire on their own."""
+    cache = _get_profile_cache()
+    generation = cache.get(PROFILE_CACHE_GENERATION_KEY, 0)
+    cache.set(PROFILE_CACHE_GENERATION_KEY, generation + 1, None)
+    profile_cache_stats['invalidations'] += 1
+    logger.info('CAS profile cache generation bumped to {}; stats: {}'.format(generation + 1, dict(profile_cache_stats)))
+
+
 def get_login_url(*args, **kwargs):
     """
     Convenience function for getting a login URL for a service.
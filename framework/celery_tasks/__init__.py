@@ -6,11 +6,16 @@ from celery.utils.log import get_task_logger
 from raven import Client
 from raven.contrib.celery import register_signal
 
+from website import settings
 from website.settings import SENTRY_DSN, VERSION, CeleryConfig
 
 app = Celery()
 app.config_from_object(CeleryConfig)
 
+for setting, schedule in getattr(CeleryConfig, 'buffer_flush_schedule', {}).items():
+    if getattr(settings, setting, False):
+        app.conf.beat_schedule.update(schedule)
+
 if SENTRY_DSN:
     client = Client(SENTRY_DSN, release=VERSION, tags={'App': 'celery'})
     register_signal(client)
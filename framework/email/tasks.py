@@ -1,9 +1,9 @@
-import smtplib
 import logging
 from email.mime.text import MIMEText
 
 from framework.celery_tasks import app
 from framework import sentry
+from framework.email import transport
 from website import settings
 import sendgrid
 
@@ -58,6 +58,21 @@ def send_email(from_addr, to_addr, subject, message, mimetype='html', ttls=True,
         )
 
 
+@app.task
+def send_emails(messages, workers=None):
+    """Send many emails at once, reusing connections to the mail server, e.g. for digests.
+
+    :param list messages: kwargs of `send_email` for each email
+    :param int workers: emails sent at once, MAIL_SEND_WORKERS by default
+    :return: dict of the number of emails sent and failed, and the time it took
+    """
+    if not settings.USE_EMAIL:
+        return
+    report = transport.send_batch(send_email, messages, workers=workers)
+    logger.info(report)
+    return report.as_dict()
+
+
 def _send_with_smtp(from_addr, to_addr, subject, message, mimetype='html', ttls=True, login=True, username=None, password=None):
     username = username or settings.MAIL_USERNAME
     password = password or settings.MAIL_PASSWORD
@@ -71,25 +86,22 @@ def _send_with_smtp(from_addr, to_addr, subject, message, mimetype='html', ttls=
     msg['From'] = from_addr
     msg['To'] = to_addr
 
-    s = smtplib.SMTP(settings.MAIL_SERVER)
-    s.ehlo()
-    if ttls:
-        s.starttls()
-        s.ehlo()
-    if login:
-        s.login(username, password)
-    s.sendmail(
+    transport.smtp_pool.sendmail(
         from_addr=from_addr,
         to_addrs=[to_addr],
-        msg=msg.as_string()
+        msg=msg.as_string(),
+        server=settings.MAIL_SERVER,
+        ttls=ttls,
+        login=login,
+        username=username,
+        password=password,
     )
-    s.quit()
     return True
 
 
 def _send_with_sendgrid(from_addr, to_addr, subject, message, mimetype='html', categories=None, attachment_name=None, attachment_content=None, client=None):
     if (settings.SENDGRID_WHITELIST_MODE and to_addr in settings.SENDGRID_EMAIL_WHITELIST) or settings.SENDGRID_WHITELIST_MODE is False:
-        client = client or sendgrid.SendGridClient(settings.SENDGRID_API_KEY)
+        client = client or transport.get_sendgrid_client()
         mail = sendgrid.Mail()
         mail.set_from(from_addr)
         mail.add_to(to_addr)
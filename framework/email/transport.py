@@ -0,0 +1,167 @@
+"""Connections to the mail server reused across emails, and sending many emails at once"""
+import contextlib
+import logging
+import smtplib
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import sendgrid
+
+from website import settings
+
+logger = logging.getLogger(__name__)
+
+_sendgrid_client = None
+_sendgrid_client_lock = threading.Lock()
+
+
+class SMTPConnectionPool(object):
+    """
+    Logged in SMTP connections kept open across emails, as connecting, STARTTLS and logging in take several
+    round trips each. Up to `MAIL_CONNECTION_POOL_SIZE` idle connections are kept per server and username,
+    and connections are closed once they are `MAIL_CONNECTION_MAX_AGE` seconds old, before servers drop them.
+    """
+
+    def __init__(self):
+        self._idle = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def _connect(self, server, ttls, login, username, password):
+        smtp = smtplib.SMTP(server)
+        smtp.ehlo()
+        if ttls:
+            smtp.starttls()
+            smtp.ehlo()
+        if login:
+            smtp.login(username, password)
+        return smtp
+
+    @contextlib.contextmanager
+    def connection(self, server, ttls=True, login=True, username=None, password=None, new=False):
+        """
+        A connection to `server`, returned to the pool when the block exits and closed if it raised. A new
+        connection is opened if `new`, rather than using an idle one.
+        """
+        key = (server, ttls, login, username)
+        expired = []
+        entry = None
+        with self._lock:
+            idle = self._idle[key]
+            while idle and entry is None and not new:
+                opened, smtp = idle.pop()
+                if time.time() - opened < settings.MAIL_CONNECTION_MAX_AGE:
+                    entry = (opened, smtp)
+                else:
+                    expired.append(smtp)
+        for smtp in expired:
+            _close(smtp)
+        if entry is None:
+            entry = (time.time(), self._connect(server, ttls, login, username, password))
+        try:
+            yield entry[1]
+        except Exception:
+            _close(entry[1])
+            raise
+        with self._lock:
+            if len(self._idle[key]) < settings.MAIL_CONNECTION_POOL_SIZE:
+                self._idle[key].append(entry)
+                return
+        _close(entry[1])
+
+    def sendmail(self, from_addr, to_addrs, msg, **connection_kwargs):
+        """Send an email through a pooled connection, connecting again once if the server closed it."""
+        for attempt in range(2):
+            try:
+                with self.connection(new=bool(attempt), **connection_kwargs) as smtp:
+                    return smtp.sendmail(from_addr=from_addr, to_addrs=to_addrs, msg=msg)
+            except smtplib.SMTPServerDisconnected:
+                if attempt:
+                    raise
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, defaultdict(list)
+        for entries in idle.values():
+            for _, smtp in entries:
+                _close(smtp)
+
+
+def _close(smtp):
+    try:
+        smtp.quit()
+    except smtplib.SMTPException:
+        smtp.close()
+    except OSError:
+        pass
+
+
+smtp_pool = SMTPConnectionPool()
+
+
+def get_sendgrid_client():
+    """Process wide Sendgrid client."""
+    global _sendgrid_client
+    with _sendgrid_client_lock:
+        if _sendgrid_client is None:
+            _sendgrid_client = sendgrid.SendGridClient(settings.SENDGRID_API_KEY)
+        return _sendgrid_client
+
+
+class SendReport(object):
+    """Throughput of sending a batch of emails."""
+
+    def __init__(self):
+        self.sent = 0
+        self.failed = 0
+        self.elapsed = 0
+
+    @property
+    def per_second(self):
+        return self.sent / self.elapsed if self.elapsed else 0
+
+    def add(self, report):
+        self.sent += report.sent
+        self.failed += report.failed
+        self.elapsed += report.elapsed
+
+    def as_dict(self):
+        return {
+            'sent': self.sent,
+            'failed': self.failed,
+            'elapsed': self.elapsed,
+            'per_second': self.per_second,
+        }
+
+    def __str__(self):
+        return 'Sent {} emails, {} failed, in {:.1f}s ({:.1f} emails/s)'.format(
+            self.sent, self.failed, self.elapsed, self.per_second,
+        )
+
+
+def send_batch(send, messages, workers=None):
+    """
+    Send emails with up to `workers` at once, reusing pooled connections. Emails that fail to send are
+    logged and counted rather than raised, so they don't stop the rest of the batch.
+
+    :param callable send: sends an email given one of `messages` as kwargs, returning whether it was sent
+    :param list messages: kwargs of `send`
+    :return: SendReport
+    """
+    report = SendReport()
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=workers or settings.MAIL_SEND_WORKERS) as executor:
+        futures = {executor.submit(send, **message): message for message in messages}
+        for future in as_completed(futures):
+            try:
+                sent = future.result()
+            except Exception:
+                logger.exception('Failed to send email to {}'.format(futures[future].get('to_addr')))
+                sent = False
+            if sent:
+                report.sent += 1
+            else:
+                report.failed += 1
+    report.elapsed = time.time() - start
+    return report
@@ -6,6 +6,7 @@ from rest_framework import status as http_status
 import json
 import logging
 import os
+import re
 
 from flask import request, make_response
 from mako.lookup import TemplateLookup
@@ -33,7 +34,8 @@ _TPL_LOOKUP = TemplateLookup(
         TEMPLATE_DIR,
         settings.ADDON_PATH,
     ],
-    module_directory='/tmp/mako_modules'
+    module_directory=os.path.join(settings.MAKO_MODULE_DIRECTORY, 'trusted'),
+    collection_size=settings.MAKO_TEMPLATE_CACHE_SIZE,
 )
 
 _TPL_LOOKUP_SAFE = TemplateLookup(
@@ -49,7 +51,8 @@ _TPL_LOOKUP_SAFE = TemplateLookup(
         TEMPLATE_DIR,
         settings.ADDON_PATH,
     ],
-    module_directory='/tmp/mako_modules',
+    module_directory=os.path.join(settings.MAKO_MODULE_DIRECTORY, 'safe'),
+    collection_size=settings.MAKO_TEMPLATE_CACHE_SIZE,
 )
 
 REDIRECT_CODES = [
@@ -207,7 +210,26 @@ def render_mustache_string(tpl_string, data):
 def render_jinja_string(tpl, data):
     pass
 
-mako_cache = {}
+@functools.lru_cache(maxsize=settings.MAKO_TEMPLATE_CACHE_SIZE)
+def _compile_mako_template(path, trust=True):
+    """Compile a template for `render_mako_string`, loading its module from MAKO_MODULE_DIRECTORY if it was
+    compiled before and the template hasn't changed since.
+    """
+    lookup_obj = _TPL_LOOKUP if trust else _TPL_LOOKUP_SAFE
+    return Template(
+        filename=path,
+        # A uri without directories, so that templates it includes or inherits from are looked up relative to
+        # the lookup's directories rather than to this one, and its module is at the top of the module directory
+        uri=re.sub(r'\W', '_', path),
+        format_exceptions=settings.DEBUG_MODE,  # thanks to abought
+        lookup=lookup_obj,
+        input_encoding='utf-8',
+        output_encoding='utf-8',
+        default_filters=lookup_obj.template_args['default_filters'],
+        imports=lookup_obj.template_args['imports'],  # FIXME: Temporary workaround for data stored in wrong format in DB. Unescape it before it gets re-escaped by Markupsafe. See [#OSF-4432]
+        module_directory=os.path.join(settings.MAKO_MODULE_DIRECTORY, 'pages' if trust else 'pages_safe'),
+    )
+
 def render_mako_string(tpldir, tplname, data, trust=True):
     """Render a mako template to a string.
 
@@ -216,31 +238,39 @@ def render_mako_string(tpldir, tplname, data, trust=True):
     :param data:
     :param trust: Optional. If ``False``, markup-save escaping will be enabled
     """
-
-    show_errors = settings.DEBUG_MODE  # thanks to abought
     # TODO: The "trust" flag is expected to be temporary, and should be removed
     #       once all templates manually set it to False.
-
-    lookup_obj = _TPL_LOOKUP_SAFE if trust is False else _TPL_LOOKUP
-
-    tpl = mako_cache.get(tplname)
-    if tpl is None:
-        with open(os.path.join(tpldir, tplname)) as f:
-            tpl_text = f.read()
-        tpl = Template(
-            tpl_text,
-            format_exceptions=show_errors,
-            lookup=lookup_obj,
-            input_encoding='utf-8',
-            output_encoding='utf-8',
-            default_filters=lookup_obj.template_args['default_filters'],
-            imports=lookup_obj.template_args['imports']  # FIXME: Temporary workaround for data stored in wrong format in DB. Unescape it before it gets re-escaped by Markupsafe. See [#OSF-4432]
-        )
+    path = os.path.abspath(os.path.join(tpldir, tplname))
     # Don't cache in debug mode
-    if not app.debug:
-        mako_cache[tplname] = tpl
+    compile_template = _compile_mako_template.__wrapped__ if app.debug else _compile_mako_template
+    tpl = compile_template(path, trust is not False)
     return tpl.render(**data)
 
+def _iter_mako_templates(directory):
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = [name for name in dirs if name != 'node_modules']
+        for name in sorted(files):
+            if name.endswith('.mako'):
+                yield os.path.join(root, name)
+
+def precompile_mako_templates():
+    """Compile every template of the web renderers and their lookups to MAKO_MODULE_DIRECTORY, and keep
+    them in their caches.
+
+    :return: (number of templates compiled, list of (path, error) for templates that failed to compile)
+    """
+    compiled, failed = 0, []
+    for lookup_obj in (_TPL_LOOKUP, _TPL_LOOKUP_SAFE):
+        for directory in lookup_obj.directories:
+            for path in _iter_mako_templates(directory):
+                try:
+                    lookup_obj.get_template(os.path.relpath(path, directory))
+                    _compile_mako_template(os.path.abspath(path), lookup_obj is _TPL_LOOKUP)
+                except Exception as e:
+                    failed.append((path, e))
+                else:
+                    compiled += 1
+    return compiled, failed
 
 renderer_extension_map = {
     '.stache': render_mustache_string,
@@ -159,7 +159,7 @@ def before_request():
     if cookie:
         try:
             session_id = itsdangerous.Signer(settings.SECRET_KEY).unsign(cookie)
-            user_session = Session.load(session_id) or Session(_id=session_id)
+            user_session = Session.load_cached(session_id) or Session(_id=session_id)
         except itsdangerous.BadData:
             return
         if not throttle_period_expired(user_session.created, settings.OSF_SESSION_TIMEOUT):
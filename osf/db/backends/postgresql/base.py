@@ -6,6 +6,9 @@ from django.conf import settings
 from django.db.backends.postgresql.base import \
     DatabaseWrapper as PostgresqlDatabaseWrapper
 from django.db.backends.postgresql.base import utc_tzinfo_factory
+from django.db.backends.utils import CursorDebugWrapper, CursorWrapper
+
+from api.base import instrumentation
 
 
 class server_side_cursors(object):
@@ -34,6 +37,28 @@ class server_side_cursors(object):
         self.connection.server_side_cursor_itersize = None
 
 
+class InstrumentedCursorMixin(object):
+    """
+    Records queries in the timings of instrumented requests, see `api.base.instrumentation`.
+    """
+
+    def execute(self, sql, params=None):
+        with instrumentation.timed(instrumentation.DB):
+            return super(InstrumentedCursorMixin, self).execute(sql, params)
+
+    def executemany(self, sql, param_list):
+        with instrumentation.timed(instrumentation.DB):
+            return super(InstrumentedCursorMixin, self).executemany(sql, param_list)
+
+
+class InstrumentedCursorWrapper(InstrumentedCursorMixin, CursorWrapper):
+    pass
+
+
+class InstrumentedCursorDebugWrapper(InstrumentedCursorMixin, CursorDebugWrapper):
+    pass
+
+
 # TODO: Server-side cursors are supported in Django 1.11. Remove our
 # implementation in favor of Django's
 class DatabaseWrapper(PostgresqlDatabaseWrapper):
@@ -66,3 +91,13 @@ class DatabaseWrapper(PostgresqlDatabaseWrapper):
         cursor.itersize = self.server_side_cursor_itersize
 
         return cursor
+
+    def make_cursor(self, cursor):
+        if instrumentation.current() is None:
+            return super(DatabaseWrapper, self).make_cursor(cursor)
+        return InstrumentedCursorWrapper(cursor, self)
+
+    def make_debug_cursor(self, cursor):
+        if instrumentation.current() is None:
+            return super(DatabaseWrapper, self).make_debug_cursor(cursor)
+        return InstrumentedCursorDebugWrapper(cursor, self)
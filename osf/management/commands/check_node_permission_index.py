@@ -0,0 +1,59 @@
+import logging
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from framework.celery_tasks import app as celery_app
+from osf.models import NodePermissionIndex
+from osf.management.commands.rebuild_node_permission_index import iter_node_id_batches
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(name='management.commands.check_node_permission_index')
+def check_node_permission_index(batch_size=1000, fix=False):
+    """
+    Compare the permission index of every node against guardian's tables, a batch of nodes at a time, and
+    rebuild the index of inconsistent nodes if `fix`.
+
+    :return: the number of inconsistent nodes
+    """
+    checked = inconsistent = 0
+    for node_ids in iter_node_id_batches(batch_size):
+        checked += len(node_ids)
+        missing, extra = NodePermissionIndex.find_inconsistencies(node_ids)
+        if not missing and not extra:
+            continue
+        for user_id, node_id, permission, source in missing:
+            logger.warning('Permission index of node {} is missing {} permission of user {} from {}'.format(node_id, permission, user_id, source))
+        for user_id, node_id, permission, source in extra:
+            logger.warning('Permission index of node {} has extra {} permission of user {} from {}'.format(node_id, permission, user_id, source))
+        inconsistent_node_ids = {node_id for _, node_id, _, _ in missing | extra}
+        inconsistent += len(inconsistent_node_ids)
+        if fix:
+            with transaction.atomic():
+                NodePermissionIndex.refresh(inconsistent_node_ids, descendants=False)
+    logger.info('Checked the permission index of {} nodes, {} inconsistent{}'.format(checked, inconsistent, ' and fixed' if fix else ''))
+    return inconsistent
+
+
+class Command(BaseCommand):
+    help = '''Checks the materialized permission index of nodes against guardian's tables, and optionally fixes
+    inconsistent nodes.'''
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch_size',
+            type=int,
+            default=1000,
+            help='How many nodes to check at a time',
+        )
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            dest='fix',
+            help='Rebuild the index of inconsistent nodes',
+        )
+
+    def handle(self, *args, **options):
+        check_node_permission_index(options['batch_size'], options['fix'])
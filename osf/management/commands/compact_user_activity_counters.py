@@ -0,0 +1,97 @@
+import datetime
+import logging
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from framework.celery_tasks import app as celery_app
+from osf.models import UserActivityCounter
+
+logger = logging.getLogger(__name__)
+
+
+def compact_dates(counts, cutoff, get_total, make_total):
+    """
+    Roll the per-day entries of `counts` older than `cutoff` into per-month entries. Day keys look like
+    'yyyy/mm/dd' and month keys like 'yyyy/mm'; as 'yyyy/mm' sorts before any day in that month, month
+    keys left by previous runs are folded in as well.
+
+    :return: the compacted dict, or None if there was nothing to compact
+    """
+    old_keys = [key for key in counts if key < cutoff]
+    if all(len(key) == 7 for key in old_keys):
+        return None
+    compacted = {key: value for key, value in counts.items() if key >= cutoff}
+    monthly_totals = {}
+    for key in old_keys:
+        monthly_totals[key[:7]] = monthly_totals.get(key[:7], 0) + get_total(counts[key])
+    compacted.update({month: make_total(total) for month, total in monthly_totals.items()})
+    return compacted
+
+
+def compact_counter(counter, cutoff):
+    """Compact both the `date` and the per-action `date` dicts of a UserActivityCounter in place."""
+    changed = False
+    date = compact_dates(counter.date, cutoff, lambda value: value['total'], lambda total: {'total': total})
+    if date is not None:
+        counter.date = date
+        changed = True
+    for action_counts in counter.action.values():
+        action_date = compact_dates(action_counts['date'], cutoff, lambda value: value, lambda total: total)
+        if action_date is not None:
+            action_counts['date'] = action_date
+            changed = True
+    return changed
+
+
+@celery_app.task(name='management.commands.compact_user_activity_counters')
+def compact_user_activity_counters(days=90, batch_size=1000, dry_run=False):
+    cutoff = (timezone.now() - datetime.timedelta(days=days)).strftime('%Y/%m/%d')
+    logger.info('Compacting user activity counts before {}'.format(cutoff))
+
+    last_id = 0
+    compacted = 0
+    while True:
+        with transaction.atomic():
+            counters = list(
+                UserActivityCounter.objects.select_for_update().filter(id__gt=last_id).order_by('id')[:batch_size]
+            )
+            if not counters:
+                break
+            last_id = counters[-1].id
+            for counter in counters:
+                if compact_counter(counter, cutoff):
+                    compacted += 1
+                    if not dry_run:
+                        counter.save(update_fields=['date', 'action', 'modified'])
+    logger.info('{}Compacted {} user activity counters'.format('[DRY RUN] ' if dry_run else '', compacted))
+    return compacted
+
+
+class Command(BaseCommand):
+    help = '''Rolls per-day user activity counts older than --days into per-month totals,
+    so that UserActivityCounter rows stop growing without bound.'''
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=90,
+            help='Keep per-day counts for this many days',
+        )
+        parser.add_argument(
+            '--batch_size',
+            type=int,
+            default=1000,
+            help='How many counters to lock and compact per transaction',
+        )
+        parser.add_argument(
+            '--dry_run',
+            action='store_true',
+            dest='dry_run',
+            help='Report how many counters would be compacted without saving them',
+        )
+
+    def handle(self, *args, **options):
+        compact_user_activity_counters(options['days'], options['batch_size'], options['dry_run'])
@@ -0,0 +1,35 @@
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from framework.routing import precompile_mako_templates
+from website.mails import precompile_templates as precompile_mail_templates
+
+logger = logging.getLogger(__name__)
+
+
+def precompile_templates():
+    """
+    Compile the Mako templates of the web renderers and of emails to MAKO_MODULE_DIRECTORY, so processes
+    load compiled modules rather than compiling each template on its first render.
+
+    :return: the number of templates that failed to compile
+    """
+    compiled, failed = 0, []
+    for precompile in (precompile_mako_templates, precompile_mail_templates):
+        precompiled, precompile_failed = precompile()
+        compiled += precompiled
+        failed.extend(precompile_failed)
+    for path, error in failed:
+        logger.error('Failed to compile {}: {}'.format(path, error))
+    logger.info('Compiled {} templates, {} failed'.format(compiled, len(failed)))
+    return len(failed)
+
+
+class Command(BaseCommand):
+    help = '''Compiles Mako templates to MAKO_MODULE_DIRECTORY, e.g. when building images.'''
+
+    def handle(self, *args, **options):
+        failed = precompile_templates()
+        if failed:
+            raise CommandError('{} templates failed to compile'.format(failed))
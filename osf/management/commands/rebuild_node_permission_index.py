@@ -0,0 +1,55 @@
+import logging
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from osf.models import AbstractNode, NodePermissionIndex
+
+logger = logging.getLogger(__name__)
+
+
+def iter_node_id_batches(batch_size, start_id=0):
+    last_id = start_id
+    while True:
+        node_ids = list(
+            AbstractNode.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not node_ids:
+            return
+        last_id = node_ids[-1]
+        yield node_ids
+
+
+def rebuild_node_permission_index(batch_size=1000, start_id=0):
+    """
+    Recompute the permission index of every node, a batch of nodes per transaction. Permissions changed
+    while it runs are kept current by the index's signal receivers.
+    """
+    rebuilt = 0
+    for node_ids in iter_node_id_batches(batch_size, start_id):
+        with transaction.atomic():
+            NodePermissionIndex.refresh(node_ids, descendants=False)
+        rebuilt += len(node_ids)
+        logger.info('Rebuilt the permission index of {} nodes, up to node {}'.format(rebuilt, node_ids[-1]))
+    return rebuilt
+
+
+class Command(BaseCommand):
+    help = '''Rebuilds the materialized permission index of nodes from guardian's tables.'''
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch_size',
+            type=int,
+            default=1000,
+            help='How many nodes to rebuild per transaction',
+        )
+        parser.add_argument(
+            '--start_id',
+            type=int,
+            default=0,
+            help='Only rebuild nodes with an id above this one, to resume an interrupted rebuild',
+        )
+
+    def handle(self, *args, **options):
+        rebuild_node_permission_index(options['batch_size'], options['start_id'])
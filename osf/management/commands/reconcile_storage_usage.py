@@ -0,0 +1,80 @@
+import logging
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from api.caching.tasks import update_storage_usage_cache
+from framework.celery_tasks import app as celery_app
+from osf.models import AbstractNode, NodeStorageUsage
+
+logger = logging.getLogger(__name__)
+
+BATCH_TOTALS_SQL = """
+    SELECT file.target_object_id, sum(version.size) FROM osf_basefileversionsthrough AS obfnv
+    LEFT JOIN osf_basefilenode file ON obfnv.basefilenode_id = file.id
+    LEFT JOIN osf_fileversion version ON obfnv.fileversion_id = version.id
+    LEFT JOIN django_content_type type on file.target_content_type_id = type.id
+    WHERE file.provider = 'osfstorage'
+    AND type.model = 'abstractnode'
+    AND file.deleted_on IS NULL
+    AND file.target_object_id = ANY(%s)
+    GROUP BY file.target_object_id
+"""
+
+
+@celery_app.task(name='management.commands.reconcile_storage_usage')
+def reconcile_storage_usage(batch_size=1000, dry_run=False):
+    """
+    Compare every node's running storage usage total against a recount, a batch of nodes per query,
+    and recount the drifted ones under lock.
+    """
+    last_id = 0
+    checked = drifted = 0
+    while True:
+        usages = list(
+            NodeStorageUsage.objects.filter(id__gt=last_id).order_by('id').values_list('id', 'node_id', 'total')[:batch_size]
+        )
+        if not usages:
+            break
+        last_id = usages[-1][0]
+        with connection.cursor() as cursor:
+            cursor.execute(BATCH_TOTALS_SQL, [[node_id for _, node_id, _ in usages]])
+            totals = {node_id: int(total or 0) for node_id, total in cursor.fetchall()}
+        checked += len(usages)
+        drifted_usages = [(node_id, total) for _, node_id, total in usages if totals.get(node_id, 0) != total]
+        if not drifted_usages:
+            continue
+        drifted += len(drifted_usages)
+        guids = dict(
+            AbstractNode.objects.filter(id__in=[node_id for node_id, _ in drifted_usages]).values_list('id', 'guids___id')
+        )
+        for node_id, total in drifted_usages:
+            logger.warning('Storage usage of node {} drifted: {} counted vs {} tracked'.format(
+                guids.get(node_id, node_id), totals.get(node_id, 0), total
+            ))
+            if not dry_run:
+                update_storage_usage_cache(node_id, guids.get(node_id, node_id))
+    logger.info('{}Checked storage usage of {} nodes, {} drifted'.format('[DRY RUN] ' if dry_run else '', checked, drifted))
+    return drifted
+
+
+class Command(BaseCommand):
+    help = '''Reconciles the running storage usage totals of nodes against a recount of their osfstorage
+    file versions, fixing any that drifted.'''
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch_size',
+            type=int,
+            default=1000,
+            help='How many nodes to recount per query',
+        )
+        parser.add_argument(
+            '--dry_run',
+            action='store_true',
+            dest='dry_run',
+            help='Only report drifted nodes',
+        )
+
+    def handle(self, *args, **options):
+        reconcile_storage_usage(options['batch_size'], options['dry_run'])
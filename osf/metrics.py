@@ -211,51 +211,21 @@ class UserInstitutionProjectCounts(MetricMixin, metrics.Metric):
         search = cls.filter_institution(institution).sort('-timestamp')
 
         # Rounding to the nearest minute
-        results = search.execute()
+        results = search[:1].execute()
         if results:
-            return search.execute()[0].timestamp.replace(microsecond=0, second=0)
+            return results[0].timestamp.replace(microsecond=0, second=0)
         # If there are no results, assume yesterday.
         return dt.datetime.now() - dt.timedelta(days=1)
 
     @classmethod
-    def get_department_counts(cls, institution) -> list:
+    def get_current_records(cls, institution):
         """
-        Gets the most recent document for every unique user.
+        Search for the records of an institution's users from the most recent report.
         :param institution: Institution
-        :return: list
+        :return: Search
         """
-        search = cls.filter_institution(institution).sort('timestamp')
         last_record_time = cls.get_recent_datetime(institution)
-
-        return search.update_from_dict({
-            'aggs': {
-                'date_range': {
-                    'filter': {
-                        'range': {
-                            'timestamp': {
-                                'gte': last_record_time,
-                            }
-                        }
-                    },
-                    'aggs': {
-                        'departments': {
-                            'terms': {
-                                'field': 'department',
-                                'missing': DEFAULT_ES_NULL_VALUE,
-                                'size': 250
-                            },
-                            'aggs': {
-                                'users': {
-                                    'terms': {
-                                        'field': 'user_id'
-                                    }
-                                }
-                            }
-                        }
-                    }
-                }
-            }
-        })
+        return cls.filter_institution(institution).filter('range', timestamp={'gte': last_record_time})
 
     @classmethod
     def record_user_institution_project_counts(cls, user, institution, public_project_count, private_project_count, **kwargs):
@@ -275,18 +245,7 @@ class UserInstitutionProjectCounts(MetricMixin, metrics.Metric):
         :param institution: Institution
         :return: list
         """
-        last_record_time = cls.get_recent_datetime(institution)
-
-        search = cls.filter_institution(
-            institution
-        ).filter(
-            'range',
-            timestamp={
-                'gte': last_record_time
-            }
-        ).sort(
-            'user_id'
-        )
+        search = cls.get_current_records(institution).sort('user_id')
         search.update_from_dict({
             'size': MAX_SIZE_OF_ES_QUERY
         })
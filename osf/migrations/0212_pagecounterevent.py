@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.28 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf', '0211_auto_20200709_1320'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PageCounterEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('page', models.CharField(max_length=300)),
+                ('action', models.CharField(max_length=128)),
+                ('version', models.IntegerField(blank=True, null=True)),
+                ('date', models.CharField(max_length=10)),
+                ('unique_today', models.BooleanField(default=False)),
+                ('counted', models.BooleanField(default=True)),
+                ('unique', models.BooleanField(default=False)),
+                ('file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='osf.BaseFileNode')),
+                ('resource', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='osf.Guid')),
+            ],
+        ),
+    ]
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.28 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf', '0213_nodestorageusage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingSearchUpdate',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('doc_type', models.CharField(max_length=16)),
+                ('object_id', models.CharField(max_length=255)),
+                ('index', models.CharField(blank=True, default='', max_length=255)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('modified', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='pendingsearchupdate',
+            unique_together=set([('doc_type', 'object_id', 'index')]),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.28 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf', '0214_pendingsearchupdate'),
+    ]
+
+    operations = [
+        migrations.RunSQL([
+            'CREATE INDEX IF NOT EXISTS osf_session_modified ON osf_session (modified);',
+        ], [
+            'DROP INDEX IF EXISTS osf_session_modified RESTRICT;',
+        ])
+    ]
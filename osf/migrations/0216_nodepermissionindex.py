@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.28 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Same as `rebuild_node_permission_index`, for all nodes at once
+POPULATE_SQL = """
+    INSERT INTO osf_nodepermissionindex (user_id, node_id, permission, source)
+    SELECT
+        UG.osfuser_id,
+        G.content_object_id,
+        (ARRAY['read', 'write', 'admin'])[MAX(CASE P.codename WHEN 'admin_node' THEN 3 WHEN 'write_node' THEN 2 ELSE 1 END)],
+        CASE WHEN AG.name LIKE 'osfgroup%' THEN 'osf_group' ELSE 'contributor' END
+    FROM osf_nodegroupobjectpermission AS G
+    JOIN auth_permission AS P ON P.id = G.permission_id AND P.codename IN ('read_node', 'write_node', 'admin_node')
+    JOIN osf_osfuser_groups AS UG ON UG.group_id = G.group_id
+    JOIN auth_group AS AG ON AG.id = G.group_id
+    GROUP BY 1, 2, 4;
+
+    INSERT INTO osf_nodepermissionindex (user_id, node_id, permission, source)
+    WITH RECURSIVE ancestors AS (
+        SELECT child_id AS node_id, parent_id AS ancestor_id
+        FROM osf_noderelation
+        WHERE is_node_link IS FALSE
+    UNION
+        SELECT A.node_id, R.parent_id
+        FROM ancestors AS A
+        JOIN osf_noderelation AS R ON R.child_id = A.ancestor_id
+        WHERE R.is_node_link IS FALSE
+    )
+    SELECT DISTINCT UG.osfuser_id, A.node_id, 'read', 'parent_admin'
+    FROM ancestors AS A
+    JOIN osf_abstractnode AS N ON N.id = A.ancestor_id AND N.type = 'osf.node'
+    JOIN osf_nodegroupobjectpermission AS G ON G.content_object_id = A.ancestor_id
+    JOIN auth_permission AS P ON P.id = G.permission_id AND P.codename = 'admin_node'
+    JOIN osf_osfuser_groups AS UG ON UG.group_id = G.group_id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf', '0215_session_modified_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NodePermissionIndex',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('permission', models.CharField(choices=[('read', 'read'), ('write', 'write'), ('admin', 'admin')], max_length=5)),
+                ('source', models.CharField(choices=[('contributor', 'Contributor'), ('osf_group', 'OSF group'), ('parent_admin', 'Admin of a parent project')], max_length=12)),
+                ('node', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='osf.AbstractNode')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='nodepermissionindex',
+            unique_together=set([('user', 'node', 'source')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='nodepermissionindex',
+            index_together=set([('node', 'user')]),
+        ),
+        migrations.RunSQL(POPULATE_SQL, migrations.RunSQL.noop),
+    ]
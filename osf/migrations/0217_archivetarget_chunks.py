@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.28 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations
+import osf.utils.datetime_aware_jsonfield
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf', '0216_nodepermissionindex'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivetarget',
+            name='chunks',
+            field=osf.utils.datetime_aware_jsonfield.DateTimeAwareJSONField(blank=True, default=list, encoder=osf.utils.datetime_aware_jsonfield.DateTimeAwareJSONEncoder),
+        ),
+    ]
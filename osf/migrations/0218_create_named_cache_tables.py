@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from django.db import migrations
+
+CREATE_CACHE_TABLE_SQL = """
+    CREATE TABLE "{0}" (
+        "cache_key" varchar(255) NOT NULL PRIMARY KEY,
+        "value" text NOT NULL,
+        "expires" timestamp with time zone NOT NULL
+    );
+    CREATE INDEX "{0}_expires" ON "{0}" ("expires");
+"""
+
+CACHE_TABLES = [
+    'osf_cas_profile_cache',
+    'osf_search_results_cache',
+    'osf_citation_cache',
+    'osf_list_count_cache',
+    'osf_archiver_stat_cache',
+]
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('osf', '0217_archivetarget_chunks'),
+    ]
+    operations = [
+        migrations.RunSQL(
+            [CREATE_CACHE_TABLE_SQL.format(table) for table in CACHE_TABLES],
+            ['DROP TABLE "{}";'.format(table) for table in CACHE_TABLES],
+        )
+    ]
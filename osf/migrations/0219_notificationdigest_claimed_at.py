@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.28 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations
+import osf.utils.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf', '0218_create_named_cache_tables'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationdigest',
+            name='claimed_at',
+            field=osf.utils.fields.NonNaiveDateTimeField(blank=True, null=True),
+        ),
+    ]
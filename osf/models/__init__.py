@@ -38,7 +38,8 @@ from osf.models.files import (  # noqa
 )  # noqa
 from osf.models.metadata import FileMetadataRecord  # noqa
 from osf.models.node_relation import NodeRelation  # noqa
-from osf.models.analytics import UserActivityCounter, PageCounter  # noqa
+from osf.models.node_permission_index import NodePermissionIndex  # noqa
+from osf.models.analytics import UserActivityCounter, PageCounter, PageCounterEvent  # noqa
 from osf.models.admin_profile import AdminProfile  # noqa
 from osf.models.admin_log_entry import AdminLogEntry  # noqa
 from osf.models.maintenance_state import MaintenanceState  # noqa
@@ -47,7 +48,8 @@ from osf.models.quickfiles import QuickFilesNode  # noqa
 from osf.models.dismissed_alerts import DismissedAlert  # noqa
 from osf.models.action import ReviewAction  # noqa
 from osf.models.action import NodeRequestAction, PreprintRequestAction, ReviewAction  # noqa
-from osf.models.storage import ProviderAssetFile  # noqa
+from osf.models.storage import ProviderAssetFile, NodeStorageUsage  # noqa
+from osf.models.search_update import PendingSearchUpdate  # noqa
 from osf.models.chronos import ChronosJournal, ChronosSubmission  # noqa
 from osf.models.blacklisted_email_domain import BlacklistedEmailDomain  # noqa
 from osf.models.brand import Brand  # noqa
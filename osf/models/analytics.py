@@ -1,7 +1,8 @@
+import json
 import logging
 
 from dateutil import parser
-from django.db import models, transaction
+from django.db import connection, models, transaction
 from django.db.models import Sum
 from django.db.models.expressions import RawSQL
 from django.utils import timezone
@@ -9,9 +10,46 @@ from django.utils import timezone
 from framework.sessions import session
 from osf.models.base import BaseModel, Guid
 from osf.utils.datetime_aware_jsonfield import DateTimeAwareJSONField
+from website import settings
 
 logger = logging.getLogger(__name__)
 
+INSERT_MISSING_ACTIVITY_COUNTERS_SQL = """
+    INSERT INTO osf_useractivitycounter (_id, action, date, total, created, modified)
+    SELECT user_id, '{}'::jsonb, '{}'::jsonb, 0, now(), now()
+    FROM unnest(%s::text[]) AS user_id
+    ON CONFLICT (_id) DO NOTHING;
+"""
+
+INCREMENT_ACTIVITY_COUNTERS_SQL = """
+    UPDATE osf_useractivitycounter UAC
+    SET
+        total = UAC.total + INC.total,
+        date = UAC.date || COALESCE((
+            SELECT jsonb_object_agg(D.key, jsonb_build_object(
+                'total', COALESCE((UAC.date->D.key->>'total')::int, 0) + (D.value->>'total')::int
+            ))
+            FROM jsonb_each(INC.counts->'date') D
+        ), '{}'::jsonb),
+        action = UAC.action || COALESCE((
+            SELECT jsonb_object_agg(A.key, jsonb_build_object(
+                'total', COALESCE((UAC.action->A.key->>'total')::int, 0) + (A.value->>'total')::int,
+                'date', COALESCE(UAC.action->A.key->'date', '{}'::jsonb) || COALESCE((
+                    SELECT jsonb_object_agg(AD.key, to_jsonb(
+                        COALESCE((UAC.action->A.key->'date'->>AD.key)::int, 0) + AD.value::int
+                    ))
+                    FROM jsonb_each_text(A.value->'date') AD
+                ), '{}'::jsonb)
+            ))
+            FROM jsonb_each(INC.counts->'action') A
+        ), '{}'::jsonb),
+        modified = now()
+    FROM (
+        SELECT unnest(%s::text[]) AS _id, unnest(%s::int[]) AS total, unnest(%s::jsonb[]) AS counts
+    ) INC
+    WHERE UAC._id = INC._id;
+"""
+
 
 class UserActivityCounter(BaseModel):
     primary_identifier_name = '_id'
@@ -54,6 +92,39 @@ class UserActivityCounter(BaseModel):
             uac.save()
         return True
 
+    @classmethod
+    def increment_many(cls, increments):
+        """
+        Apply many activity increments at once. The increments are aggregated per user in memory and
+        applied with one INSERT for users without a counter and one UPDATE that merges the aggregated
+        counts into the `action` and `date` JSON with jsonb operators.
+
+        :param increments: iterable of `(user_id, action, date_string)` tuples, as taken by `increment`
+        :return: the number of users whose counters were updated
+        """
+        counts = {}
+        for user_id, action, date_string in increments:
+            date = parser.parse(date_string).strftime('%Y/%m/%d')
+            user_counts = counts.setdefault(user_id, {'total': 0, 'action': {}, 'date': {}})
+            user_counts['total'] += 1
+            action_counts = user_counts['action'].setdefault(action, {'total': 0, 'date': {}})
+            action_counts['total'] += 1
+            action_counts['date'][date] = action_counts['date'].get(date, 0) + 1
+            user_counts['date'].setdefault(date, {'total': 0})['total'] += 1
+
+        if not counts:
+            return 0
+
+        user_ids = sorted(counts.keys())
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(INSERT_MISSING_ACTIVITY_COUNTERS_SQL, [user_ids])
+            cursor.execute(INCREMENT_ACTIVITY_COUNTERS_SQL, [
+                user_ids,
+                [counts[user_id]['total'] for user_id in user_ids],
+                [json.dumps(counts[user_id]) for user_id in user_ids],
+            ])
+        return len(user_ids)
+
 
 class PageCounter(BaseModel):
     primary_identifier_name = '_id'
@@ -96,17 +167,71 @@ class PageCounter(BaseModel):
             '$', '_'
         )
 
-    @classmethod
-    def update_counter(cls, resource, file, version, action, node_info):
+    @staticmethod
+    def get_page(resource, file, version, action):
         if version is not None:
-            page = '{0}:{1}:{2}:{3}'.format(action, resource._id, file._id, version)
-        else:
-            page = '{0}:{1}:{2}'.format(action, resource._id, file._id)
+            return '{0}:{1}:{2}:{3}'.format(action, resource._id, file._id, version)
+        return '{0}:{1}:{2}'.format(action, resource._id, file._id)
+
+    @classmethod
+    def record_visit(cls, page, date_string, node_info):
+        """
+        Record a hit on `page` in the visitor's session and work out which counts it contributes to.
 
+        :return: a tuple of booleans `(unique_today, counted, unique)`: whether the hit is the visitor's first
+            for the page today, whether it counts towards the page's total at all (contributors downloading
+            their own files don't) and whether it is the visitor's first ever hit on the page
+        """
         cleaned_page = cls.clean_page(page)
-        date = timezone.now()
-        date_string = date.strftime('%Y/%m/%d')
         visited_by_date = session.data.get('visited_by_date', {'date': date_string, 'pages': []})
+
+        # if they haven't visited something today, reset their visited by date
+        if date_string != visited_by_date['date']:
+            visited_by_date['date'] = date_string
+            visited_by_date['pages'] = []
+        unique_today = cleaned_page not in visited_by_date['pages']
+
+        # update their sessions
+        visited_by_date['pages'].append(cleaned_page)
+        session.data['visited_by_date'] = visited_by_date
+
+        # if a download counter is being updated, only perform the update
+        # if the user who is downloading isn't a contributor to the project
+        page_type = cleaned_page.split(':')[0]
+        if page_type in ('download', 'view') and node_info:
+            if node_info['contributors'].filter(guids___id__isnull=False, guids___id=session.data.get('auth_user_id')).exists():
+                return unique_today, False, False
+
+        visited = session.data.get('visited', [])
+        unique = page not in visited
+        if unique:
+            visited.append(page)
+            session.data['visited'] = visited
+
+        session.save()
+        return unique_today, True, unique
+
+    @classmethod
+    def update_counter(cls, resource, file, version, action, node_info):
+        page = cls.get_page(resource, file, version, action)
+        cleaned_page = cls.clean_page(page)
+        date_string = timezone.now().strftime('%Y/%m/%d')
+        unique_today, counted, unique = cls.record_visit(page, date_string, node_info)
+
+        if settings.PAGE_COUNTER_BUFFERED:
+            PageCounterEvent.objects.create(
+                page=cleaned_page,
+                resource=resource,
+                file=file,
+                action=action,
+                version=version,
+                date=date_string,
+                unique_today=unique_today,
+                counted=counted,
+                unique=unique,
+            )
+            return
+
         with transaction.atomic():
             # Temporary backwards compat - when creating new PageCounters, temporarily keep writing to _id field.
             # After we're sure this is stable, we can stop writing to the _id field, and query on
@@ -119,59 +244,79 @@ class PageCounter(BaseModel):
                 version=version
             )
 
-            # if they visited something today
-            if date_string == visited_by_date['date']:
-                # if they haven't visited this page today
-                if cleaned_page not in visited_by_date['pages']:
-                    # if the model_instance has today in it
-                    if date_string in model_instance.date.keys():
-                        # increment the number of unique visitors for today
-                        model_instance.date[date_string]['unique'] += 1
-                    else:
-                        # set the number of unique visitors for today to 1
-                        model_instance.date[date_string] = dict(unique=1)
-            # if they haven't visited something today
-            else:
-                # set their visited by date to blank
-                visited_by_date['date'] = date_string
-                visited_by_date['pages'] = []
-                # if the model_instance has today in it
-                if date_string in model_instance.date.keys():
-                    # increment the number of unique visitors for today
-                    model_instance.date[date_string]['unique'] += 1
-                else:
-                    # set the number of unique visitors to 1
-                    model_instance.date[date_string] = dict(unique=1)
+            counts_on_date = model_instance.date.setdefault(date_string, {})
+            if unique_today:
+                counts_on_date['unique'] = counts_on_date.get('unique', 0) + 1
+            counts_on_date['total'] = counts_on_date.get('total', 0) + 1
 
-            # update their sessions
-            visited_by_date['pages'].append(cleaned_page)
-            session.data['visited_by_date'] = visited_by_date
+            if counted:
+                model_instance.total += 1
+                if unique:
+                    model_instance.unique += 1
 
-            if date_string in model_instance.date.keys():
-                if 'total' not in model_instance.date[date_string].keys():
-                    model_instance.date[date_string].update(total=0)
-                model_instance.date[date_string]['total'] += 1
-            else:
-                model_instance.date[date_string] = dict(total=1)
+            model_instance.save()
 
-            # if a download counter is being updated, only perform the update
-            # if the user who is downloading isn't a contributor to the project
-            page_type = cleaned_page.split(':')[0]
-            if page_type in ('download', 'view') and node_info:
-                if node_info['contributors'].filter(guids___id__isnull=False, guids___id=session.data.get('auth_user_id')).exists():
-                    model_instance.save()
-                    return
+    @classmethod
+    def flush_buffered_events(cls, batch_size=None):
+        """
+        Fold buffered `PageCounterEvent`s into their PageCounters, one batch per transaction and a single
+        UPDATE per page in each batch. Events locked by a concurrent flush are skipped.
 
-            visited = session.data.get('visited', [])
-            if page not in visited:
-                model_instance.unique += 1
-                visited.append(page)
-                session.data['visited'] = visited
+        :return: the number of events flushed
+        """
+        batch_size = batch_size or settings.PAGE_COUNTER_FLUSH_BATCH_SIZE
+        flushed = 0
+        while True:
+            with transaction.atomic():
+                events = list(
+                    PageCounterEvent.objects.select_for_update(skip_locked=True).order_by('id')[:batch_size]
+                )
+                if not events:
+                    break
+                cls._apply_events(events)
+                PageCounterEvent.objects.filter(id__in=[event.id for event in events]).delete()
+            flushed += len(events)
+        if flushed:
+            logger.info('Flushed {} buffered page counter events'.format(flushed))
+        return flushed
 
-            session.save()
-            model_instance.total += 1
+    @classmethod
+    def _apply_events(cls, events):
+        pages = {}
+        for event in events:
+            page = pages.setdefault(event.page, {
+                'key': dict(resource_id=event.resource_id, file_id=event.file_id, action=event.action, version=event.version),
+                'dates': {},
+                'total': 0,
+                'unique': 0,
+            })
+            total_on_date, unique_on_date = page['dates'].get(event.date, (0, 0))
+            page['dates'][event.date] = (total_on_date + 1, unique_on_date + int(event.unique_today))
+            page['total'] += int(event.counted)
+            page['unique'] += int(event.counted and event.unique)
 
-            model_instance.save()
+        counter_ids = dict(cls.objects.filter(_id__in=list(pages.keys())).values_list('_id', 'id'))
+        for page_id, page in pages.items():
+            if page_id not in counter_ids:
+                counter_ids[page_id] = cls.objects.get_or_create(_id=page_id, **page['key'])[0].id
+
+        with connection.cursor() as cursor:
+            for page_id, page in pages.items():
+                date_sql = '"date"'
+                params = []
+                for date_string, (total_on_date, unique_on_date) in page['dates'].items():
+                    date_sql = (
+                        "{} || jsonb_build_object(%s, jsonb_build_object("
+                        "'total', COALESCE((\"date\"->%s->>'total')::int, 0) + %s, "
+                        "'unique', COALESCE((\"date\"->%s->>'unique')::int, 0) + %s))"
+                    ).format(date_sql)
+                    params.extend([date_string, date_string, total_on_date, date_string, unique_on_date])
+                cursor.execute(
+                    'UPDATE {} SET "date" = {}, "total" = "total" + %s, "unique" = "unique" + %s WHERE "id" = %s'.format(
+                        cls._meta.db_table, date_sql
+                    ),
+                    params + [page['total'], page['unique'], counter_ids[page_id]]
+                )
 
     @classmethod
     def get_basic_counters(cls, resource, file, version, action):
@@ -180,3 +325,20 @@ class PageCounter(BaseModel):
             return (counter.unique, counter.total)
         except cls.DoesNotExist:
             return (None, None)
+
+
+class PageCounterEvent(models.Model):
+    """
+    A single buffered hit on a PageCounter page, written instead of updating the PageCounter in place
+    when `PAGE_COUNTER_BUFFERED` is on. Events are append-only so concurrent downloads never contend on a
+    row lock; `PageCounter.flush_buffered_events` periodically folds them into their counters.
+    """
+    page = models.CharField(max_length=300)
+    action = models.CharField(max_length=128)
+    resource = models.ForeignKey(Guid, related_name='+', on_delete=models.CASCADE)
+    file = models.ForeignKey('osf.BaseFileNode', related_name='+', on_delete=models.CASCADE)
+    version = models.IntegerField(null=True, blank=True)
+    date = models.CharField(max_length=10)  # 'yyyy/mm/dd', same as the PageCounter.date keys
+    unique_today = models.BooleanField(default=False)
+    counted = models.BooleanField(default=True)
+    unique = models.BooleanField(default=False)
@@ -1,6 +1,6 @@
 from django.contrib.postgres.fields import ArrayField
 from django.utils import timezone
-from django.db import models
+from django.db import models, transaction
 
 from osf.utils.fields import NonNaiveDateTimeField
 from website import settings
@@ -10,6 +10,7 @@ from osf.utils.datetime_aware_jsonfield import DateTimeAwareJSONField
 from addons.base.models import BaseStorageAddon
 from website.archiver import (
     ARCHIVER_INITIATED,
+    ARCHIVER_PENDING,
     ARCHIVER_SUCCESS,
     ARCHIVER_FAILURE,
     ARCHIVER_FAILURE_STATUSES
@@ -33,6 +34,21 @@ class ArchiveTarget(ObjectIDMixin, BaseModel):
     # }
     stat_result = DateTimeAwareJSONField(default=dict, blank=True)
     errors = ArrayField(models.TextField(), default=list, blank=True)
+    # Groups of sibling subtrees copied separately when the addon is archived in chunks, see
+    # website.archiver.utils.plan_archive_chunks
+    # Format: [{
+    #     'path': <str>, source path of the chunk's first item, identifies the chunk
+    #     'items': <list>({'path': <str>, 'name': <str>}), subtrees each copied in their own WaterButler request
+    #     'done': <list>(<str>), source paths of the items copied so far
+    #     'folders': <list>(<str>), names of the folders between the archive folder and the chunk
+    #     'dst_path': <str>, path of the folder the chunk is copied into
+    #     'num_files': <int>,
+    #     'disk_usage': <float>,
+    #     'status': <str>,
+    #     'attempts': <int>,
+    #     'errors': <list>,
+    # }]
+    chunks = DateTimeAwareJSONField(default=list, blank=True)
 
     def __repr__(self):
         return '<{0}(_id={1}, name={2}, status={3})>'.format(
@@ -42,6 +58,31 @@ class ArchiveTarget(ObjectIDMixin, BaseModel):
             self.status
         )
 
+    def get_chunk(self, path):
+        """The chunk with an item at source `path`"""
+        path = path.strip('/')
+        for chunk in self.chunks:
+            if any(item['path'].strip('/') == path for item in chunk['items']):
+                return chunk
+        return None
+
+    def progress(self):
+        """Files and bytes copied so far out of the totals found when statting the addon"""
+        files_total = self.stat_result.get('num_files', 0)
+        bytes_total = self.stat_result.get('disk_usage', 0)
+        if self.status == ARCHIVER_SUCCESS:
+            files_done, bytes_done = files_total, bytes_total
+        else:
+            done = [chunk for chunk in self.chunks if chunk['status'] == ARCHIVER_SUCCESS]
+            files_done = sum(chunk['num_files'] for chunk in done)
+            bytes_done = sum(chunk['disk_usage'] for chunk in done)
+        return {
+            'files_done': files_done,
+            'files_total': files_total,
+            'bytes_done': bytes_done,
+            'bytes_total': bytes_total,
+        }
+
 
 class ArchiveJob(ObjectIDMixin, BaseModel):
 
@@ -96,11 +137,20 @@ class ArchiveJob(ObjectIDMixin, BaseModel):
                 'name': target.name,
                 'status': target.status,
                 'stat_result': target.stat_result,
-                'errors': target.errors
+                'errors': target.errors,
+                'progress': target.progress(),
             }
             for target in self.target_addons.all()
         ]
 
+    def progress(self):
+        """Files and bytes copied so far for all addons, out of the totals of their AggregateStatResult"""
+        progress = {'files_done': 0, 'files_total': 0, 'bytes_done': 0, 'bytes_total': 0}
+        for target in self.target_addons.all():
+            for key, value in target.progress().items():
+                progress[key] += value
+        return progress
+
     def archive_tree_finished(self):
         if self.pending:
             return False
@@ -163,12 +213,76 @@ class ArchiveJob(ObjectIDMixin, BaseModel):
         self.save()
 
     def update_target(self, addon_short_name, status, stat_result=None, errors=None):
-        stat_result = stat_result or {}
         errors = errors or []
 
         target = self.get_target(addon_short_name)
         target.status = status
         target.errors = errors
-        target.stat_result = stat_result
+        # Keep the totals recorded by archive_node for progress
+        if stat_result is not None:
+            target.stat_result = stat_result
         target.save()
         self._post_update_target()
+
+    def _lock_target(self, addon_short_name):
+        return self.target_addons.select_for_update().get(name=addon_short_name)
+
+    def start_chunks(self, addon_short_name):
+        """Mark the chunks of a target to copy next as pending, keeping at most ARCHIVER_CHUNK_CONCURRENCY
+        of them pending at once
+
+        :return: list of the chunks to copy
+        """
+        with transaction.atomic():
+            target = self._lock_target(addon_short_name)
+            if target.status != ARCHIVER_INITIATED:
+                return []
+            pending = len([chunk for chunk in target.chunks if chunk['status'] == ARCHIVER_PENDING])
+            started = []
+            for chunk in target.chunks:
+                if len(started) + pending >= settings.ARCHIVER_CHUNK_CONCURRENCY:
+                    break
+                if chunk['status'] == ARCHIVER_INITIATED:
+                    chunk['status'] = ARCHIVER_PENDING
+                    chunk['attempts'] += 1
+                    started.append(chunk)
+            if started:
+                target.save()
+        return started
+
+    def update_chunk(self, addon_short_name, path, status, errors=None):
+        """Record the outcome of copying an item of a chunk. A chunk succeeds once all its items were copied.
+        Failed chunks are queued to copy their remaining items again until they reach ARCHIVER_CHUNK_MAX_RETRIES,
+        then fail the target. The target succeeds once all its chunks did.
+
+        :param path: source path of the item
+        :return: True if the chunk will be copied again
+        """
+        errors = errors or []
+        retry = False
+        with transaction.atomic():
+            target = self._lock_target(addon_short_name)
+            chunk = target.get_chunk(path)
+            if chunk is None or chunk['status'] != ARCHIVER_PENDING:
+                return False
+            if status not in ARCHIVER_FAILURE_STATUSES:
+                path = path.strip('/')
+                if path not in chunk['done']:
+                    chunk['done'].append(path)
+                if len(chunk['done']) < len(chunk['items']):
+                    target.save()
+                    return False
+            chunk['errors'] = errors
+            if status in ARCHIVER_FAILURE_STATUSES and chunk['attempts'] <= settings.ARCHIVER_CHUNK_MAX_RETRIES:
+                chunk['status'] = ARCHIVER_INITIATED
+                retry = True
+            else:
+                chunk['status'] = status
+            if status in ARCHIVER_FAILURE_STATUSES and not retry:
+                target.status = ARCHIVER_FAILURE
+                target.errors = errors
+            elif all(each['status'] == ARCHIVER_SUCCESS for each in target.chunks):
+                target.status = ARCHIVER_SUCCESS
+            target.save()
+        self._post_update_target()
+        return retry
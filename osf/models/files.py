@@ -24,6 +24,7 @@ from osf.models.validators import validate_location
 from osf.utils.datetime_aware_jsonfield import DateTimeAwareJSONField
 from osf.utils.fields import NonNaiveDateTimeField
 from api.base.utils import waterbutler_api_url_for
+from api.caching.tasks import update_storage_usage_total
 from website.files import utils
 from website.files.exceptions import VersionNotFoundError
 from website.util import api_v2_url, web_url_for, api_url_for
@@ -245,6 +246,8 @@ class BaseFileNode(TypedModel, CommentableMixin, OptionalGuidMixin, Taggable, Ob
         """
         version_name = name or self.name
         BaseFileVersionsThrough.objects.create(fileversion=version, basefilenode=self, version_name=version_name)
+        if self.counts_towards_storage_usage:
+            update_storage_usage_total(self.target, version.size or 0)
         return version
 
     @classmethod
@@ -399,9 +402,21 @@ class BaseFileNode(TypedModel, CommentableMixin, OptionalGuidMixin, Taggable, Ob
     def _repoint_guids(self, updated):
         logger.warn('BaseFileNode._repoint_guids is deprecated.')
 
+    @property
+    def counts_towards_storage_usage(self):
+        return self.provider == 'osfstorage' and self.is_file and self.deleted_on is None
+
+    def get_versions_size(self):
+        return self.versions.aggregate(size=models.Sum('size'))['size'] or 0
+
     def _update_node(self, recursive=True, save=True):
         if self.parent is not None:
+            previous_target = self.target
             self.target = self.parent.target
+            if self.counts_towards_storage_usage and self.target != previous_target:
+                size = self.get_versions_size()
+                update_storage_usage_total(previous_target, -size)
+                update_storage_usage_total(self.target, size)
         if save:
             self.save()
         if recursive and not self.is_file:
@@ -420,6 +435,8 @@ class BaseFileNode(TypedModel, CommentableMixin, OptionalGuidMixin, Taggable, Ob
         :return:
         """
         deleted = deleted_on
+        if self.counts_towards_storage_usage:
+            update_storage_usage_total(self.target, -self.get_versions_size())
         if not self.is_root:
             self.deleted_by = user
             self.deleted = deleted_on or timezone.now()
@@ -660,6 +677,12 @@ class TrashedFileNode(BaseFileNode):
         type_cls = File if self.is_file else Folder
 
         self.recast(self._resolve_class(type_cls)._typedmodels_type)
+        # Restored files count towards storage usage again, both here and in recounts
+        self.deleted = None
+        self.deleted_on = None
+        self.deleted_by = None
+        if self.counts_towards_storage_usage:
+            update_storage_usage_total(self.target, self.get_versions_size())
 
         if save:
             self.save()
@@ -719,10 +742,11 @@ class TrashedFolder(TrashedFileNode):
         :param deleted_on:
         :return:
         """
+        # Children deleted along with the folder share its deleted_on, which restoring it clears
+        deleted_on = deleted_on or self.deleted_on
         tf = super(TrashedFolder, self).restore(recursive=True, parent=None, save=True, deleted_on=None)
 
         if not self.is_file and recursive:
-            deleted_on = deleted_on or self.deleted_on
             for child in TrashedFileNode.objects.filter(parent=self.id, deleted_on=deleted_on):
                 child.restore(recursive=True, save=save, deleted_on=deleted_on)
         return tf
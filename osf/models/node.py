@@ -79,8 +79,6 @@ from website.util.metrics import OsfSourceTags, CampaignSourceTags
 from website.util import api_url_for, api_v2_url, web_url_for
 from .base import BaseModel, GuidMixin, GuidMixinQuerySet
 from api.caching.tasks import update_storage_usage
-from api.caching import settings as cache_settings
-from api.caching.utils import storage_usage_cache
 
 
 logger = logging.getLogger(__name__)
@@ -153,6 +151,10 @@ class AbstractNodeQuerySet(GuidMixinQuerySet):
             return self.filter(private_links__is_deleted=False, private_links__key=private_link).filter(is_deleted=False)
 
         if user is not None and not isinstance(user, AnonymousUser):
+            if settings.NODE_PERMISSION_INDEX:
+                NodePermissionIndex = apps.get_model('osf', 'NodePermissionIndex')
+                qs |= self.filter(id__in=NodePermissionIndex.objects.for_user(user).values('node_id'))
+                return qs.filter(is_deleted=False)
             read_user_query = get_objects_for_user(user, READ_NODE, self, with_superuser=False)
             qs |= read_user_query
             qs |= self.extra(where=["""
@@ -215,6 +217,12 @@ class AbstractNodeManager(TypedModelManager, IncludeManager):
             raise ValueError('Permission must be one of {}, {}, or {}.'.format(PERMISSIONS[0], PERMISSIONS[1], PERMISSIONS[2]))
 
         nodes = base_queryset.filter(is_deleted=False)
+        if settings.NODE_PERMISSION_INDEX:
+            NodePermissionIndex = apps.get_model('osf', 'NodePermissionIndex')
+            query = Q(id__in=NodePermissionIndex.objects.for_user(user, permission, implicit=False).values('node_id'))
+            if include_public:
+                query |= Q(is_public=True)
+            return nodes.filter(query)
         permission_object_id = Permission.objects.get(codename=permission).id
         user_groups = OSFUserGroup.objects.filter(osfuser_id=user.id if user else None).values_list('group_id', flat=True)
         node_groups = NodeGroupObjectPermission.objects.filter(group_id__in=user_groups, permission_id=permission_object_id).values_list('content_object_id', flat=True)
@@ -2365,14 +2373,13 @@ class AbstractNode(DirtyFieldsMixin, TypedModel, AddonModelMixin, IdentifierMixi
 
     @property
     def storage_usage(self):
-        key = cache_settings.STORAGE_USAGE_KEY.format(target_id=self._id)
-
-        storage_usage_total = storage_usage_cache.get(key)
-        if storage_usage_total:
+        NodeStorageUsage = apps.get_model('osf.NodeStorageUsage')
+        storage_usage_total = NodeStorageUsage.objects.filter(node_id=self.id).values_list('total', flat=True).first()
+        if storage_usage_total is not None:
             return storage_usage_total
         else:
-            update_storage_usage(self)  # sets cache
-            return storage_usage_cache.get(key)
+            update_storage_usage(self)  # creates the running total
+            return NodeStorageUsage.objects.filter(node_id=self.id).values_list('total', flat=True).first()
 
     # Overrides ContributorMixin
     # TODO: Deprecate this when we emberize contributors management for nodes
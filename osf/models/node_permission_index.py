@@ -0,0 +1,203 @@
+from django.db import connection, models
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from osf.models.node import AbstractNode, NodeGroupObjectPermission
+from osf.models.node_relation import NodeRelation
+from osf.models.user import OSFUser
+from osf.utils.permissions import ADMIN, ADMIN_NODE, READ, READ_NODE, WRITE, WRITE_NODE
+
+# Short permissions that grant each node permission
+PERMISSION_LEVELS = {
+    READ_NODE: [READ, WRITE, ADMIN],
+    WRITE_NODE: [WRITE, ADMIN],
+    ADMIN_NODE: [ADMIN],
+}
+
+DESCENDANTS_SQL = """
+    WITH RECURSIVE descendants AS (
+        SELECT unnest(%s::integer[]) AS id
+    UNION
+        SELECT R.child_id
+        FROM descendants AS D
+        JOIN osf_noderelation AS R ON R.parent_id = D.id
+        WHERE R.is_node_link IS FALSE
+    ) SELECT id FROM descendants;
+"""
+
+# The highest permission users have through the django groups of the nodes they contribute to, and through the
+# groups of the OSF groups added to them
+EXPLICIT_PERMISSIONS_SQL = """
+    SELECT
+        UG.osfuser_id,
+        G.content_object_id,
+        (ARRAY['read', 'write', 'admin'])[MAX(CASE P.codename WHEN 'admin_node' THEN 3 WHEN 'write_node' THEN 2 ELSE 1 END)],
+        CASE WHEN AG.name LIKE 'osfgroup%%' THEN 'osf_group' ELSE 'contributor' END
+    FROM osf_nodegroupobjectpermission AS G
+    JOIN auth_permission AS P ON P.id = G.permission_id AND P.codename IN ('read_node', 'write_node', 'admin_node')
+    JOIN osf_osfuser_groups AS UG ON UG.group_id = G.group_id
+    JOIN auth_group AS AG ON AG.id = G.group_id
+    WHERE G.content_object_id = ANY(%(node_ids)s::integer[]) AND (%(user_ids)s::integer[] IS NULL OR UG.osfuser_id = ANY(%(user_ids)s::integer[]))
+    GROUP BY 1, 2, 4
+"""
+
+# Read permission implied by being an admin of a project above the node, see `AbstractNodeQuerySet.can_view`
+IMPLICIT_PERMISSIONS_SQL = """
+    WITH RECURSIVE ancestors AS (
+        SELECT child_id AS node_id, parent_id AS ancestor_id
+        FROM osf_noderelation
+        WHERE is_node_link IS FALSE AND child_id = ANY(%(node_ids)s::integer[])
+    UNION
+        SELECT A.node_id, R.parent_id
+        FROM ancestors AS A
+        JOIN osf_noderelation AS R ON R.child_id = A.ancestor_id
+        WHERE R.is_node_link IS FALSE
+    )
+    SELECT DISTINCT UG.osfuser_id, A.node_id, 'read', 'parent_admin'
+    FROM ancestors AS A
+    JOIN osf_abstractnode AS N ON N.id = A.ancestor_id AND N.type = 'osf.node'
+    JOIN osf_nodegroupobjectpermission AS G ON G.content_object_id = A.ancestor_id
+    JOIN auth_permission AS P ON P.id = G.permission_id AND P.codename = 'admin_node'
+    JOIN osf_osfuser_groups AS UG ON UG.group_id = G.group_id
+    WHERE %(user_ids)s::integer[] IS NULL OR UG.osfuser_id = ANY(%(user_ids)s::integer[])
+"""
+
+DELETE_PERMISSIONS_SQL = """
+    DELETE FROM osf_nodepermissionindex
+    WHERE node_id = ANY(%(node_ids)s::integer[]) AND (%(user_ids)s::integer[] IS NULL OR user_id = ANY(%(user_ids)s::integer[]));
+"""
+
+INSERT_PERMISSIONS_SQL = """
+    INSERT INTO osf_nodepermissionindex (user_id, node_id, permission, source)
+    {}
+    ON CONFLICT (user_id, node_id, source) DO UPDATE SET permission = EXCLUDED.permission;
+"""
+
+INDEXED_PERMISSIONS_SQL = """
+    SELECT user_id, node_id, permission, source
+    FROM osf_nodepermissionindex
+    WHERE node_id = ANY(%(node_ids)s::integer[])
+"""
+
+
+class NodePermissionIndexQuerySet(models.QuerySet):
+
+    def for_user(self, user, permission=READ_NODE, implicit=True):
+        """
+        Rows granting `user` at least `permission`, including the read permission implied by being an admin
+        of a parent project if `implicit`.
+        """
+        qs = self.filter(user_id=user.id if user else None, permission__in=PERMISSION_LEVELS[permission])
+        if not implicit:
+            qs = qs.exclude(source=NodePermissionIndex.PARENT_ADMIN)
+        return qs
+
+
+class NodePermissionIndex(models.Model):
+    """
+    Materialized permissions of users on nodes, kept current by the signal receivers below whenever a node's
+    django group permissions, the members of those groups, or node relations change. There is a row per
+    user, node and source holding the highest permission the user has from that source, so visibility
+    queries are a single index lookup rather than guardian joins and a recursive query over node relations.
+
+    `rebuild_node_permission_index` rebuilds it from scratch and `check_node_permission_index` compares it
+    against guardian's tables.
+    """
+    CONTRIBUTOR = 'contributor'
+    OSF_GROUP = 'osf_group'
+    PARENT_ADMIN = 'parent_admin'
+    SOURCE_CHOICES = (
+        (CONTRIBUTOR, 'Contributor'),
+        (OSF_GROUP, 'OSF group'),
+        (PARENT_ADMIN, 'Admin of a parent project'),
+    )
+    PERMISSION_CHOICES = ((READ, READ), (WRITE, WRITE), (ADMIN, ADMIN))
+
+    user = models.ForeignKey(OSFUser, related_name='+', on_delete=models.CASCADE)
+    node = models.ForeignKey(AbstractNode, related_name='+', on_delete=models.CASCADE)
+    permission = models.CharField(max_length=5, choices=PERMISSION_CHOICES)
+    source = models.CharField(max_length=12, choices=SOURCE_CHOICES)
+
+    objects = NodePermissionIndexQuerySet.as_manager()
+
+    class Meta:
+        unique_together = ('user', 'node', 'source')
+        index_together = (
+            ('node', 'user'),
+        )
+
+    @classmethod
+    def refresh(cls, node_ids, user_ids=None, descendants=True):
+        """
+        Recompute the permissions on the given nodes, and on their components if `descendants`, as the read
+        permission implied by admins of a project extends to everything below it. Only the permissions of
+        `user_ids` are recomputed if given.
+        """
+        node_ids = list(node_ids)
+        if not node_ids or (user_ids is not None and not user_ids):
+            return
+        params = {'node_ids': node_ids, 'user_ids': list(user_ids) if user_ids is not None else None}
+        with connection.cursor() as cursor:
+            if descendants:
+                cursor.execute(DESCENDANTS_SQL, [node_ids])
+                params['node_ids'] = [node_id for node_id, in cursor.fetchall()]
+            cursor.execute(DELETE_PERMISSIONS_SQL, params)
+            cursor.execute(INSERT_PERMISSIONS_SQL.format(EXPLICIT_PERMISSIONS_SQL), params)
+            cursor.execute(INSERT_PERMISSIONS_SQL.format(IMPLICIT_PERMISSIONS_SQL), params)
+
+    @classmethod
+    def find_inconsistencies(cls, node_ids):
+        """
+        Compare the indexed permissions on the given nodes against guardian's tables.
+
+        :return: (missing, extra) sets of (user_id, node_id, permission, source) rows
+        """
+        params = {'node_ids': list(node_ids), 'user_ids': None}
+        with connection.cursor() as cursor:
+            cursor.execute(EXPLICIT_PERMISSIONS_SQL, params)
+            expected = set(cursor.fetchall())
+            cursor.execute(IMPLICIT_PERMISSIONS_SQL, params)
+            expected.update(cursor.fetchall())
+            cursor.execute(INDEXED_PERMISSIONS_SQL, params)
+            indexed = set(cursor.fetchall())
+        return expected - indexed, indexed - expected
+
+
+##### Signal listeners #####
+@receiver(post_save, sender=NodeGroupObjectPermission)
+def update_permission_index_for_group_permission(sender, instance, **kwargs):
+    # Only the group's members are affected, and new nodes' groups have none yet
+    user_ids = OSFUser.groups.through.objects.filter(group_id=instance.group_id).values_list('osfuser_id', flat=True)
+    NodePermissionIndex.refresh([instance.content_object_id], user_ids=list(user_ids))
+
+
+@receiver(post_delete, sender=NodeGroupObjectPermission)
+def update_permission_index_for_node(sender, instance, **kwargs):
+    # The group's members may already be gone when the group itself is being deleted
+    NodePermissionIndex.refresh([instance.content_object_id])
+
+
+@receiver(post_save, sender=NodeRelation)
+@receiver(post_delete, sender=NodeRelation)
+def update_permission_index_for_component(sender, instance, **kwargs):
+    if not instance.is_node_link:
+        NodePermissionIndex.refresh([instance.child_id])
+
+
+@receiver(m2m_changed, sender=OSFUser.groups.through)
+def update_permission_index_for_group_members(sender, instance, action, reverse, model, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if action == 'post_clear':
+        if reverse:
+            # All members were removed from a group
+            group_ids, user_ids = [instance.id], None
+            node_ids = NodeGroupObjectPermission.objects.filter(group_id__in=group_ids).values_list('content_object_id', flat=True)
+        else:
+            # A user was removed from all groups
+            user_ids = [instance.id]
+            node_ids = NodePermissionIndex.objects.filter(user_id=instance.id).values_list('node_id', flat=True)
+    else:
+        group_ids, user_ids = ([instance.id], pk_set) if reverse else (pk_set, [instance.id])
+        node_ids = NodeGroupObjectPermission.objects.filter(group_id__in=group_ids).values_list('content_object_id', flat=True)
+    NodePermissionIndex.refresh(set(node_ids), user_ids=user_ids)
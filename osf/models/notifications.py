@@ -100,3 +100,5 @@ class NotificationDigest(ObjectIDMixin, BaseModel):
     message = models.TextField()
     # TODO: Could this be a m2m with or without an order field?
     node_lineage = ArrayField(models.CharField(max_length=5))
+    # When a run of send_users_email took this notification to send, it is deleted once sent
+    claimed_at = NonNaiveDateTimeField(null=True, blank=True)
@@ -0,0 +1,88 @@
+import logging
+from datetime import timedelta
+
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+from website import settings
+
+logger = logging.getLogger(__name__)
+
+ENQUEUE_SEARCH_UPDATE_SQL = """
+    INSERT INTO osf_pendingsearchupdate (doc_type, object_id, index, created, modified)
+    VALUES (%s, %s, %s, now(), now())
+    ON CONFLICT (doc_type, object_id, index) DO UPDATE SET modified = now();
+"""
+
+CLAIM_SEARCH_UPDATES_SQL = """
+    DELETE FROM osf_pendingsearchupdate
+    WHERE id IN (
+        SELECT id FROM osf_pendingsearchupdate
+        WHERE modified <= %s OR created <= %s
+        ORDER BY id
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING doc_type, object_id, index, created;
+"""
+
+
+class PendingSearchUpdate(models.Model):
+    """
+    A search document waiting to be reindexed, written instead of queueing a celery task per save when
+    `SEARCH_UPDATES_BUFFERED` is on. There is at most one row per document and index, so repeated saves of
+    the same object coalesce into a single reindex; `flush_search_updates` periodically claims the rows
+    that have been quiet for `SEARCH_UPDATE_DEBOUNCE` seconds and reindexes them in bulk.
+    """
+    DOC_TYPES = ('node', 'preprint', 'user')
+
+    doc_type = models.CharField(max_length=16)
+    object_id = models.CharField(max_length=255)  # guid of the node, preprint or user
+    index = models.CharField(max_length=255, blank=True, default='')  # '' for the default index
+    created = models.DateTimeField(default=timezone.now)  # first requested
+    modified = models.DateTimeField(default=timezone.now)  # last requested
+
+    class Meta:
+        unique_together = ('doc_type', 'object_id', 'index')
+
+    @classmethod
+    def enqueue(cls, doc_type, object_id, index=None):
+        """
+        Request a reindex of a document once the current transaction commits. Requesting a document that is
+        already pending just pushes its update back; the row is locked until the transaction ends, so a
+        concurrent flush can't claim it before the change being indexed is visible.
+        """
+        assert doc_type in cls.DOC_TYPES, 'Unknown search doc type {}'.format(doc_type)
+        with connection.cursor() as cursor:
+            cursor.execute(ENQUEUE_SEARCH_UPDATE_SQL, [doc_type, object_id, index or ''])
+
+    @classmethod
+    def claim(cls, batch_size=None, debounce=None, max_lag=None):
+        """
+        Remove and return a batch of pending updates that are ready to be indexed: those not requested again
+        in the last `debounce` seconds, or first requested more than `max_lag` seconds ago. Rows locked by
+        another flush or by an uncommitted request are skipped.
+
+        :return: list of (doc_type, object_id, index, created) tuples
+        """
+        batch_size = batch_size or settings.SEARCH_UPDATE_FLUSH_BATCH_SIZE
+        debounce = settings.SEARCH_UPDATE_DEBOUNCE if debounce is None else debounce
+        max_lag = settings.SEARCH_UPDATE_MAX_LAG if max_lag is None else max_lag
+        now = timezone.now()
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(CLAIM_SEARCH_UPDATES_SQL, [
+                    now - timedelta(seconds=debounce),
+                    now - timedelta(seconds=max_lag),
+                    batch_size,
+                ])
+                return cursor.fetchall()
+
+    @classmethod
+    def get_stats(cls):
+        """Queue depth and the age in seconds of the oldest pending update, for monitoring indexing latency."""
+        stats = cls.objects.aggregate(depth=models.Count('id'), oldest=models.Min('created'))
+        return {
+            'depth': stats['depth'],
+            'lag': (timezone.now() - stats['oldest']).total_seconds() if stats['oldest'] else 0,
+        }
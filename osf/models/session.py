@@ -1,10 +1,88 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+
+from django.db import connection, transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
 from osf.models.base import BaseModel, ObjectIDMixin
 from osf.utils.datetime_aware_jsonfield import DateTimeAwareJSONField
+from website import settings
+
+DELETE_EXPIRED_SESSIONS_SQL = """
+    DELETE FROM osf_session
+    WHERE id IN (
+        SELECT id FROM osf_session
+        WHERE modified < %s
+        ORDER BY modified
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING _id;
+"""
+
+
+class LocalSessionCache(object):
+    """
+    Per process LRU of anonymous session rows. Entries are kept for at most `SESSION_LOCAL_CACHE_TIMEOUT` seconds,
+    which bounds how long a change made by another process can go unseen.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None
+            expires, row = entry
+            if expires < time.time():
+                del self._entries[session_id]
+                return None
+            self._entries.move_to_end(session_id)
+            return row
+
+    def set(self, session_id, row):
+        if not settings.SESSION_LOCAL_CACHE_TIMEOUT:
+            return
+        with self._lock:
+            self._entries[session_id] = (time.time() + settings.SESSION_LOCAL_CACHE_TIMEOUT, row)
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > settings.SESSION_LOCAL_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def delete(self, session_id):
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_session_cache = LocalSessionCache()
+
+
+def invalidate_session_cache(session_ids):
+    """Drop sessions from this process's cache, e.g. after they are changed or deleted."""
+    for session_id in session_ids:
+        if session_id:
+            local_session_cache.delete(session_id)
 
 
 class Session(ObjectIDMixin, BaseModel):
     data = DateTimeAwareJSONField(default=dict, blank=True)
 
+    def __init__(self, *args, **kwargs):
+        super(Session, self).__init__(*args, **kwargs)
+        # `data` is missing when it's deferred, and loading it here would cost a query
+        self._saved_data = copy.deepcopy(self.__dict__['data']) if 'data' in self.__dict__ else None
+
     @property
     def is_authenticated(self):
         return 'auth_user_id' in self.data
@@ -12,3 +90,65 @@ class Session(ObjectIDMixin, BaseModel):
     @property
     def is_external_first_login(self):
         return 'auth_user_external_first_login' in self.data
+
+    @property
+    def is_dirty(self):
+        """Whether the session is new or its data changed since it was loaded or saved."""
+        return self._state.adding or self._saved_data is None or self.data != self._saved_data
+
+    @classmethod
+    def load_cached(cls, session_id):
+        """
+        Load a session by its `_id` through the process local session cache, for the cookie lookup made on
+        every request. Returns a fresh instance each time, so changes to it don't leak into the cache before
+        it's saved. Saving or deleting a session invalidates it in this process, other processes see the change
+        once their entry expires.
+
+        Authenticated sessions are always loaded from the database, as there is no way to invalidate them in
+        other processes, which would keep accepting the cookie of a session logged out or deleted elsewhere.
+
+        :return: the `Session`, or None if there is none with that `_id`
+        """
+        if not settings.SESSION_LOCAL_CACHE_TIMEOUT:
+            return cls.load(session_id)
+
+        field_names = [field.attname for field in cls._meta.concrete_fields]
+        row = local_session_cache.get(session_id)
+        if row is None:
+            row = cls.objects.filter(_id=session_id).values_list(*field_names).first()
+            if row is None:
+                return None
+            if 'auth_user_id' not in (row[field_names.index('data')] or {}):
+                local_session_cache.set(session_id, row)
+        return cls.from_db(connection.alias, field_names, copy.deepcopy(row))
+
+    def save(self, *args, **kwargs):
+        # Sessions are saved from many request handlers whether or not they changed them
+        if not self.is_dirty and not kwargs.get('force_update'):
+            return
+        super(Session, self).save(*args, **kwargs)
+        self._saved_data = copy.deepcopy(self.data)
+        invalidate_session_cache([self._id])
+        # Again once committed, in case another request cached the old row in the meantime
+        transaction.on_commit(partial(invalidate_session_cache, [self._id]))
+
+    @classmethod
+    def delete_expired(cls, before, batch_size=None):
+        """
+        Delete one batch of the sessions last modified before `before`, oldest first, skipping sessions
+        locked by requests saving them.
+
+        :return: list of the deleted sessions' `_id`s
+        """
+        batch_size = batch_size or settings.SESSION_CLEANUP_BATCH_SIZE
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(DELETE_EXPIRED_SESSIONS_SQL, [before, batch_size])
+                session_ids = [session_id for session_id, in cursor.fetchall()]
+        invalidate_session_cache(session_ids)
+        return session_ids
+
+
+@receiver(post_delete, sender=Session)
+def invalidate_deleted_session(sender, instance, **kwargs):
+    invalidate_session_cache([instance._id])
@@ -1,5 +1,7 @@
 
 from django.db import models
+from django.db.models import F
+from django.utils import timezone
 
 from osf.models.base import BaseModel
 
@@ -24,3 +26,18 @@ class ProviderAssetFile(BaseModel):
     name = models.CharField(choices=PROVIDER_ASSET_NAME_CHOICES, max_length=63)
     file = models.FileField(upload_to='assets')
     providers = models.ManyToManyField('AbstractProvider', blank=True, related_name='asset_files')
+
+
+class NodeStorageUsage(BaseModel):
+    """
+    Running total of the bytes used by a node's osfstorage file versions, kept up to date as versions
+    are added and files are deleted or moved between nodes (see api.caching.tasks.update_storage_usage_total)
+    and periodically reconciled against a full recount.
+    """
+    node = models.OneToOneField('AbstractNode', related_name='+', on_delete=models.CASCADE)
+    total = models.BigIntegerField(default=0)
+
+    @classmethod
+    def add(cls, node_id, delta):
+        """Atomically add `delta` bytes to a node's total. Returns False if the node has no total yet."""
+        return bool(cls.objects.filter(node_id=node_id).update(total=F('total') + delta, modified=timezone.now()))
@@ -141,6 +141,15 @@ class OSFUser(DirtyFieldsMixin, GuidMixin, BaseModel, AbstractBaseUser, Permissi
         'social',
     }
 
+    # User fields that appear in citations of the nodes the user contributes to
+    CITATION_NAME_FIELDS = {
+        'fullname',
+        'given_name',
+        'middle_names',
+        'family_name',
+        'suffix',
+    }
+
     # Overrides DirtyFieldsMixin, Foreign Keys checked by '<attribute_name>_id' rather than typical name.
     FIELDS_TO_CHECK = SEARCH_UPDATE_FIELDS.copy()
     FIELDS_TO_CHECK.update({'password', 'last_login', 'merged_by_id'})
@@ -1039,6 +1048,9 @@ class OSFUser(DirtyFieldsMixin, GuidMixin, BaseModel, AbstractBaseUser, Permissi
         if self.SEARCH_UPDATE_FIELDS.intersection(dirty_fields) and self.is_confirmed:
             self.update_search()
             self.update_search_nodes_contributors()
+        if self.CITATION_NAME_FIELDS.intersection(dirty_fields) and website_settings.CITATION_CACHE_TIMEOUT:
+            from api.citations.utils import invalidate_all_cached_citations
+            invalidate_all_cached_citations()
         if 'fullname' in dirty_fields:
             from osf.models.quickfiles import get_quickfiles_project_title, QuickFilesNode
 
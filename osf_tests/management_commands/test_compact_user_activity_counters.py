@@ -0,0 +1,53 @@
+import pytest
+
+from osf.models import UserActivityCounter
+from osf.management.commands.compact_user_activity_counters import (
+    compact_dates,
+    compact_user_activity_counters,
+)
+
+
+class TestCompactDates:
+
+    def test_old_days_are_rolled_into_months(self):
+        counts = {'2020/01/02': 1, '2020/01/30': 2, '2020/02/01': 3, '2020/03/15': 4}
+        compacted = compact_dates(counts, '2020/03/01', lambda value: value, lambda total: total)
+        assert compacted == {'2020/01': 3, '2020/02': 3, '2020/03/15': 4}
+
+    def test_existing_months_are_folded_in(self):
+        counts = {'2020/01': {'total': 5}, '2020/01/30': {'total': 2}, '2020/03/15': {'total': 4}}
+        compacted = compact_dates(counts, '2020/03/01', lambda value: value['total'], lambda total: {'total': total})
+        assert compacted == {'2020/01': {'total': 7}, '2020/03/15': {'total': 4}}
+
+    def test_nothing_to_compact(self):
+        counts = {'2020/01': 5, '2020/03/15': 4}
+        assert compact_dates(counts, '2020/03/01', lambda value: value, lambda total: total) is None
+
+
+@pytest.mark.django_db
+class TestCompactUserActivityCounters:
+
+    @pytest.fixture()
+    def counter(self):
+        return UserActivityCounter.objects.create(
+            _id='abcde',
+            total=4,
+            action={'project_created': {'total': 4, 'date': {'2001/01/01': 1, '2001/01/02': 3}}},
+            date={'2001/01/01': {'total': 1}, '2001/01/02': {'total': 3}},
+        )
+
+    def test_compact(self, counter):
+        assert compact_user_activity_counters(days=90) == 1
+
+        counter.refresh_from_db()
+        assert counter.total == 4
+        assert counter.date == {'2001/01': {'total': 4}}
+        assert counter.action == {'project_created': {'total': 4, 'date': {'2001/01': 4}}}
+
+        assert compact_user_activity_counters(days=90) == 0
+
+    def test_dry_run(self, counter):
+        assert compact_user_activity_counters(days=90, dry_run=True) == 1
+
+        counter.refresh_from_db()
+        assert counter.date == {'2001/01/01': {'total': 1}, '2001/01/02': {'total': 3}}
@@ -0,0 +1,34 @@
+import pytest
+
+from osf.models import NodePermissionIndex
+from osf.management.commands.check_node_permission_index import check_node_permission_index
+from osf.management.commands.rebuild_node_permission_index import rebuild_node_permission_index
+from osf_tests.factories import NodeFactory, ProjectFactory
+
+
+@pytest.mark.django_db
+class TestNodePermissionIndexCommands:
+
+    @pytest.fixture()
+    def project(self):
+        return ProjectFactory()
+
+    @pytest.fixture()
+    def component(self, project):
+        return NodeFactory(parent=project)
+
+    def test_rebuild(self, project, component):
+        expected = set(NodePermissionIndex.objects.values_list('user_id', 'node_id', 'permission', 'source'))
+        NodePermissionIndex.objects.all().delete()
+        rebuild_node_permission_index(batch_size=1)
+        assert set(NodePermissionIndex.objects.values_list('user_id', 'node_id', 'permission', 'source')) == expected
+
+    def test_check(self, project, component):
+        assert check_node_permission_index() == 0
+
+        NodePermissionIndex.objects.filter(node=component).delete()
+        assert check_node_permission_index(batch_size=1) == 1
+        assert check_node_permission_index() == 1
+
+        assert check_node_permission_index(fix=True) == 1
+        assert check_node_permission_index() == 0
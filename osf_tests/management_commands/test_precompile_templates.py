@@ -0,0 +1,65 @@
+import os
+
+import mock
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from framework import routing
+from osf.management.commands.precompile_templates import precompile_templates
+from website import mails, settings
+
+
+@pytest.fixture(autouse=True)
+def module_directory(tmpdir):
+    with mock.patch.object(settings, 'MAKO_MODULE_DIRECTORY', str(tmpdir)):
+        routing._compile_mako_template.cache_clear()
+        yield str(tmpdir)
+    routing._compile_mako_template.cache_clear()
+
+
+class TestPrecompileTemplates:
+
+    def test_precompile_templates(self, module_directory):
+        assert precompile_templates() == 0
+
+        path = os.path.join(settings.TEMPLATES_PATH, 'public', 'pages', 'meeting_landing.mako')
+        tpl = routing._compile_mako_template(os.path.abspath(path), True)
+        assert routing._compile_mako_template.cache_info().hits == 1
+        assert tpl.module.__file__.startswith(os.path.join(module_directory, 'pages'))
+
+    @mock.patch('osf.management.commands.precompile_templates.precompile_mail_templates')
+    def test_precompile_templates_counts_failures(self, mock_precompile):
+        mock_precompile.return_value = (1, [('broken.html.mako', SyntaxError())])
+        assert precompile_templates() == 1
+
+    @mock.patch('osf.management.commands.precompile_templates.precompile_mail_templates')
+    def test_command_fails_if_templates_fail(self, mock_precompile):
+        mock_precompile.return_value = (1, [('broken.html.mako', SyntaxError())])
+        with pytest.raises(CommandError):
+            call_command('precompile_templates')
+
+
+class TestTemplateCaches:
+
+    @pytest.fixture()
+    def tpldir(self, tmpdir):
+        tpldir = tmpdir.mkdir('templates')
+        tpldir.join('page.mako').write('${value}')
+        return str(tpldir)
+
+    def test_render_mako_string_caches_by_path_and_trust(self, tpldir):
+        assert routing.render_mako_string(tpldir, 'page.mako', {'value': '<b>'}) == b'<b>'
+        assert routing.render_mako_string(tpldir, 'page.mako', {'value': '<b>'}, trust=False) == b'&lt;b&gt;'
+        assert routing._compile_mako_template.cache_info().currsize == 2
+
+        routing.render_mako_string(tpldir, 'page.mako', {'value': '<b>'})
+        assert routing._compile_mako_template.cache_info().hits == 1
+
+    def test_mail_subjects_are_compiled_once(self):
+        mails._compile_subject.cache_clear()
+        mail = mails.Mail('test', subject='Hello ${name}')
+        assert mail.subject(name='A') == 'Hello A'
+        assert mail.subject(name='B') == 'Hello B'
+        assert mails._compile_subject.cache_info().misses == 1
+        assert mails._compile_subject.cache_info().hits == 1
@@ -0,0 +1,105 @@
+import mock
+import pytest
+
+from osf.models import NodeStorageUsage
+from osf.management.commands.reconcile_storage_usage import reconcile_storage_usage
+from osf_tests.factories import ProjectFactory, FileVersionFactory
+
+
+def set_total(node, total):
+    NodeStorageUsage.objects.update_or_create(node=node, defaults={'total': total})
+
+
+@pytest.mark.django_db
+class TestNodeStorageUsage:
+
+    @pytest.fixture()
+    def node(self):
+        return ProjectFactory()
+
+    @pytest.fixture()
+    def file(self, node):
+        root = node.get_addon('osfstorage').get_root()
+        file = root.append_file('file')
+        file.add_version(FileVersionFactory(size=100))
+        file.save()
+        return file
+
+    def test_add(self, node):
+        assert NodeStorageUsage.add(node.id, 10) is False
+
+        set_total(node, 5)
+        assert NodeStorageUsage.add(node.id, 10) is True
+        assert NodeStorageUsage.objects.get(node=node).total == 15
+
+    def test_new_version_increments_total(self, node, file):
+        set_total(node, 100)
+        file.add_version(FileVersionFactory(size=50))
+        assert node.storage_usage == 150
+
+    def test_delete_decrements_total(self, node, file):
+        set_total(node, 100)
+        file.delete()
+        assert node.storage_usage == 0
+
+    def test_restore_increments_total(self, node, file):
+        set_total(node, 100)
+        trashed = file.delete()
+        assert node.storage_usage == 0
+
+        restored = trashed.restore()
+        assert restored.deleted_on is None
+        assert node.storage_usage == 100
+        assert reconcile_storage_usage() == 0
+
+    def test_restore_folder_increments_total(self, node, file):
+        folder = node.get_addon('osfstorage').get_root().append_folder('folder')
+        file.move_under(folder)
+        set_total(node, 100)
+        trashed = folder.delete()
+        assert node.storage_usage == 0
+
+        trashed.restore()
+        assert node.storage_usage == 100
+
+    def test_move_between_nodes_moves_total(self, node, file):
+        other = ProjectFactory()
+        set_total(node, 100)
+        set_total(other, 0)
+
+        file.move_under(other.get_addon('osfstorage').get_root())
+        assert node.storage_usage == 0
+        assert other.storage_usage == 100
+
+
+@pytest.mark.django_db
+class TestReconcileStorageUsage:
+
+    @pytest.fixture()
+    def node(self):
+        node = ProjectFactory()
+        root = node.get_addon('osfstorage').get_root()
+        file = root.append_file('file')
+        file.add_version(FileVersionFactory(size=100))
+        file.save()
+        return node
+
+    def test_drifted_total_is_recounted(self, node):
+        set_total(node, 5)
+        assert reconcile_storage_usage(batch_size=1) == 1
+        assert NodeStorageUsage.objects.get(node=node).total == 100
+
+    @mock.patch('osf.management.commands.reconcile_storage_usage.update_storage_usage_cache')
+    def test_drifted_total_is_recounted_by_guid(self, mock_update, node):
+        set_total(node, 5)
+        reconcile_storage_usage()
+        mock_update.assert_called_once_with(node.id, node._id)
+
+    def test_accurate_total_is_left_alone(self, node):
+        set_total(node, 100)
+        assert reconcile_storage_usage() == 0
+
+    def test_dry_run(self, node):
+        set_total(node, 5)
+        assert reconcile_storage_usage(dry_run=True) == 1
+        assert NodeStorageUsage.objects.get(node=node).total == 5
@@ -12,7 +12,7 @@ from datetime import datetime
 
 from addons.osfstorage.models import OsfStorageFile
 from framework import analytics
-from osf.models import PageCounter, OSFGroup
+from osf.models import PageCounter, PageCounterEvent, OSFGroup, UserActivityCounter
 
 from tests.base import OsfTestCase
 from osf_tests.factories import UserFactory, ProjectFactory
@@ -40,6 +40,33 @@ class TestAnalytics(OsfTestCase):
         analytics.increment_user_activity_counters(user._id, 'project_created', date.isoformat())
         assert_equal(user.get_activity_points(), 1)
 
+    def test_increment_many_matches_increment(self):
+        user, other_user = UserFactory(), UserFactory()
+        date = timezone.now()
+        increments = [
+            (user._id, 'project_created', date.isoformat()),
+            (user._id, 'project_created', date.isoformat()),
+            (user._id, 'wiki_updated', date.isoformat()),
+            (other_user._id, 'project_created', date.isoformat()),
+        ]
+        analytics.increment_user_activity_counters(user._id, 'project_created', date.isoformat())
+
+        assert_equal(UserActivityCounter.increment_many(increments), 2)
+
+        counter = UserActivityCounter.objects.get(_id=user._id)
+        date_string = date.strftime('%Y/%m/%d')
+        assert_equal(counter.total, 4)
+        assert_equal(counter.date, {date_string: {'total': 4}})
+        assert_equal(counter.action, {
+            'project_created': {'total': 3, 'date': {date_string: 3}},
+            'wiki_updated': {'total': 1, 'date': {date_string: 1}},
+        })
+        assert_equal(analytics.get_total_activity_count(other_user._id), 1)
+        assert_equal(user.get_activity_points(), 4)
+
+    def test_increment_many_empty(self):
+        assert_equal(UserActivityCounter.increment_many([]), 0)
+
 
 @pytest.fixture()
 def user():
@@ -144,6 +171,60 @@ class TestPageCounter:
         assert page_counter.total == 1
         assert page_counter.unique == 1
 
+    @mock.patch('osf.models.analytics.settings.PAGE_COUNTER_BUFFERED', True)
+    @mock.patch('osf.models.analytics.session')
+    def test_buffered_update_counter(self, mock_session, project, file_node):
+        mock_session.data = {}
+        resource = project.guids.first()
+        PageCounter.update_counter(resource, file_node, version=None, action='download', node_info={})
+        PageCounter.update_counter(resource, file_node, version=None, action='download', node_info={})
+
+        assert PageCounterEvent.objects.count() == 2
+        assert PageCounter.get_basic_counters(resource, file_node, version=None, action='download') == (None, None)
+
+        assert analytics.flush_page_counter_events() == 2
+
+        assert not PageCounterEvent.objects.exists()
+        assert PageCounter.get_basic_counters(resource, file_node, version=None, action='download') == (1, 2)
+        page_counter = PageCounter.objects.get(resource=resource, file=file_node, version=None, action='download')
+        date_string = timezone.now().strftime('%Y/%m/%d')
+        assert page_counter.date[date_string] == {'total': 2, 'unique': 1}
+
+        mock_session.data = {}
+        PageCounter.update_counter(resource, file_node, version=None, action='download', node_info={})
+        analytics.flush_page_counter_events()
+
+        page_counter.refresh_from_db()
+        assert page_counter.total == 3
+        assert page_counter.unique == 2
+        assert page_counter.date[date_string] == {'total': 3, 'unique': 2}
+
+    @mock.patch('osf.models.analytics.settings.PAGE_COUNTER_BUFFERED', True)
+    @mock.patch('osf.models.analytics.session')
+    def test_buffered_update_counter_contributor(self, mock_session, user, project, file_node):
+        mock_session.data = {'auth_user_id': user._id}
+        resource = project.guids.first()
+
+        PageCounter.update_counter(resource, file_node, version=None, action='download', node_info={'contributors': project.contributors})
+        analytics.flush_page_counter_events()
+
+        page_counter = PageCounter.objects.get(resource=resource, file=file_node, version=None, action='download')
+        assert page_counter.total == 0
+        assert page_counter.unique == 0
+
+    @mock.patch('osf.models.analytics.settings.PAGE_COUNTER_BUFFERED', True)
+    @mock.patch('osf.models.analytics.session')
+    def test_buffered_flush_in_batches(self, mock_session, project, file_node, file_node2):
+        resource = project.guids.first()
+        for node in (file_node, file_node2, file_node):
+            mock_session.data = {}
+            PageCounter.update_counter(resource, node, version=None, action='download', node_info={})
+
+        assert PageCounter.flush_buffered_events(batch_size=2) == 3
+
+        assert PageCounter.get_basic_counters(resource, file_node, version=None, action='download') == (2, 2)
+        assert PageCounter.get_basic_counters(resource, file_node2, version=None, action='download') == (1, 1)
+
     def test_get_all_downloads_on_date(self, page_counter, page_counter2):
         """
         This method tests that multiple pagecounter objects have their download totals summed properly.
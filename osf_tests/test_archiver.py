@@ -2,7 +2,10 @@
 import re
 import datetime
 import functools
+import json
 import random
+import threading
+import time
 from contextlib import ExitStack, contextmanager
 
 import responses
@@ -18,6 +21,7 @@ from framework.celery_tasks import handlers
 
 from website.archiver import (
     ARCHIVER_INITIATED,
+    ARCHIVER_PENDING,
 )
 from website.archiver import utils as archiver_utils
 from website.app import *  # noqa: F403
@@ -30,6 +34,7 @@ from website import mails
 from website import settings
 from osf.models import RegistrationSchema, Registration
 from osf.utils.sanitize import strip_html
+from addons.base import crawler
 from addons.base.models import BaseStorageAddon
 from api.base.utils import waterbutler_api_url_for
 
@@ -460,6 +465,132 @@ class TestStorageAddonBase(ArchiverTestCase):
         for addon in [a for a in settings.ADDONS_ARCHIVABLE if a not in ['wiki', 'forward']]:
             self._test_addon(addon)
 
+class FakeWaterButler(object):
+    """
+    Serves the folder listings of a generated tree with `fanout` files and folders per folder, `depth` folders
+    deep, and records how many listings it served at once.
+    """
+
+    def __init__(self, provider, depth, fanout, failing_paths=()):
+        self.provider = provider
+        self.depth = depth
+        self.fanout = fanout
+        self.failing_paths = set(failing_paths)
+        self.requested = []
+        self.active = self.max_active = 0
+        self.lock = threading.Lock()
+
+    def listing(self, path):
+        children = [
+            {'attributes': {'kind': 'file', 'path': '{}file{}'.format(path, i), 'name': 'file{}'.format(i), 'size': 1}}
+            for i in range(self.fanout)
+        ]
+        if path.count('/') - 1 < self.depth:
+            children += [
+                {'attributes': {'kind': 'folder', 'path': '{}folder{}/'.format(path, i), 'name': 'folder{}'.format(i)}}
+                for i in range(self.fanout)
+            ]
+        return children
+
+    def callback(self, request):
+        path = '/' + request.url.split('?')[0].split('/providers/{}/'.format(self.provider), 1)[1]
+        with self.lock:
+            self.requested.append(path)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(0.01)
+        with self.lock:
+            self.active -= 1
+            if path in self.failing_paths:
+                self.failing_paths.remove(path)
+                return (503, {}, json.dumps({'message': 'Service unavailable'}))
+        return (200, {}, json.dumps({'data': self.listing(path)}))
+
+    def register(self):
+        responses.add_callback(
+            responses.GET,
+            re.compile(r'.*/providers/{}/.*'.format(self.provider)),
+            callback=self.callback,
+            content_type='application/json',
+        )
+
+
+def count_files(file_tree):
+    if file_tree['kind'] == 'file':
+        return 1
+    return sum(count_files(child) for child in file_tree['children'])
+
+
+class TestFileTreeCrawler(ArchiverTestCase):
+
+    def setUp(self):
+        super(TestFileTreeCrawler, self).setUp()
+        crawler._rate_limiters.clear()
+        self.addon = self.src.get_or_add_addon('dropbox', auth=self.auth)
+        self.root = {'path': '/', 'name': '', 'kind': 'folder'}
+
+    def tearDown(self):
+        super(TestFileTreeCrawler, self).tearDown()
+        crawler._rate_limiters.clear()
+
+    @responses.activate
+    @mock.patch('website.settings.ADDON_CRAWL_RATE_LIMITS', {'default': None})
+    def test_crawls_concurrently(self):
+        server = FakeWaterButler('dropbox', depth=2, fanout=3)
+        server.register()
+        file_tree = self.addon._get_file_tree(self.root, self.user)
+        # 1 + 3 + 9 folders with 3 files each
+        assert_equal(count_files(file_tree), 39)
+        assert_equal(len(server.requested), 13)
+        assert_equal(len(set(server.requested)), 13)
+        assert_greater(server.max_active, 1)
+        assert_equal([child['name'] for child in file_tree['children']], ['file0', 'file1', 'file2', 'folder0', 'folder1', 'folder2'])
+
+    @responses.activate
+    @mock.patch('website.settings.ADDON_CRAWL_RATE_LIMITS', {'default': None})
+    def test_resumes_after_failure(self):
+        server = FakeWaterButler('dropbox', depth=2, fanout=3, failing_paths=['/folder1/'])
+        server.register()
+        listings = {}
+        with assert_raises(HTTPError):
+            self.addon._get_file_tree(self.root, self.user, listings=listings)
+        assert_in('/', listings)
+        assert_not_in('/folder1/', listings)
+
+        requested_before = len(server.requested)
+        file_tree = self.addon._get_file_tree(self.root, self.user, listings=listings)
+        assert_equal(count_files(file_tree), 39)
+        # Only the folders not listed by the first attempt are listed again
+        assert_equal(len(server.requested) - requested_before, 13 - (requested_before - 1))
+
+    @responses.activate
+    @mock.patch('website.settings.ADDON_CRAWL_RATE_LIMITS', {'default': None, 'dropbox': 1000})
+    def test_uses_provider_rate_limiter(self):
+        FakeWaterButler('dropbox', depth=1, fanout=2).register()
+        self.addon._get_file_tree(self.root, self.user)
+        assert_equal(crawler._rate_limiters['dropbox'].rate, 1000)
+
+    def test_token_bucket(self):
+        bucket = crawler.TokenBucket(rate=10, capacity=2)
+        with mock.patch('addons.base.crawler.time.sleep') as mock_sleep:
+            bucket.acquire()
+            bucket.acquire()
+            assert_false(mock_sleep.called)
+            bucket.tokens = 0.5
+            bucket.updated = time.time()
+            with mock.patch('addons.base.crawler.time.time', side_effect=[bucket.updated, bucket.updated + 0.05]):
+                bucket.acquire()
+        assert_equal(mock_sleep.call_count, 1)
+        assert_almost_equal(mock_sleep.call_args[0][0], 0.05, places=3)
+
+    def test_unlimited_token_bucket(self):
+        bucket = crawler.TokenBucket(rate=None)
+        with mock.patch('addons.base.crawler.time.sleep') as mock_sleep:
+            for _ in range(100):
+                bucket.acquire()
+        assert_false(mock_sleep.called)
+
+
 class TestArchiverTasks(ArchiverTestCase):
 
     @mock.patch('framework.celery_tasks.handlers.enqueue_task')
@@ -488,6 +619,26 @@ class TestArchiverTasks(ArchiverTestCase):
         assert_equal(res.target_name, 'osfstorage')
         assert_equal(res.disk_usage, 128 + 256)
 
+    def test_stat_addon_retry_resumes(self):
+        def get_file_tree(addon, user=None, version=None, listings=None):
+            if not listings:
+                listings['/'] = []
+                raise HTTPError(503, data={'error': 'Service unavailable'})
+            assert_equal(listings, {'/': []})
+            return FILE_TREE
+
+        with mock.patch.object(BaseStorageAddon, '_get_file_tree', autospec=True, side_effect=get_file_tree) as mock_file_tree:
+            res = stat_addon.apply(kwargs={'addon_short_name': 'osfstorage', 'job_pk': self.archive_job._id}).get()
+        assert_equal(mock_file_tree.call_count, 2)
+        assert_equal(res.disk_usage, 128 + 256)
+        assert_is_none(get_stat_cache().get('{}:osfstorage'.format(self.archive_job._id)))
+
+    def test_stat_addon_does_not_retry_client_errors(self):
+        with mock.patch.object(BaseStorageAddon, '_get_file_tree', side_effect=HTTPError(403, data={'error': 'Forbidden'})) as mock_file_tree:
+            with assert_raises(HTTPError):
+                stat_addon('osfstorage', self.archive_job._id)
+        assert_equal(mock_file_tree.call_count, 1)
+
     @mock.patch('website.archiver.tasks.archive_addon.delay')
     def test_archive_node_pass(self, mock_archive_addon):
         settings.MAX_ARCHIVE_SIZE = 1024 ** 3
@@ -814,6 +965,185 @@ class TestArchiverTasks(ArchiverTestCase):
                     assert_in(child_reg._id, question['extra'][0]['viewUrl'])
 
 
+CHUNKED_FILE_TREE = {
+    'path': '/',
+    'name': '',
+    'kind': 'folder',
+    'children': [
+        {'path': '/a.txt', 'name': 'a.txt', 'kind': 'file', 'size': 10},
+        {
+            'path': '/big/',
+            'name': 'big',
+            'kind': 'folder',
+            'children': [
+                {'path': '/big/b.bin', 'name': 'b.bin', 'kind': 'file', 'size': 60},
+                {'path': '/big/c.bin', 'name': 'c.bin', 'kind': 'file', 'size': 60},
+                {
+                    'path': '/big/small/',
+                    'name': 'small',
+                    'kind': 'folder',
+                    'children': [
+                        {'path': '/big/small/d.txt', 'name': 'd.txt', 'kind': 'file', 'size': 10},
+                    ],
+                },
+            ],
+        },
+    ],
+}
+
+
+@mock.patch.object(settings, 'ARCHIVER_CHUNKED', True)
+@mock.patch.object(settings, 'ARCHIVER_CHUNK_SIZE', 100)
+@mock.patch.object(settings, 'ARCHIVER_CHUNK_CONCURRENCY', 2)
+@mock.patch.object(settings, 'ARCHIVER_CHUNK_MAX_RETRIES', 1)
+class TestArchiverChunks(ArchiverTestCase):
+
+    def stat_results(self):
+        with mock.patch.object(BaseStorageAddon, '_get_file_tree', return_value=CHUNKED_FILE_TREE):
+            return [stat_addon('osfstorage', self.archive_job._id)]
+
+    def archive_in_chunks(self):
+        with mock.patch('website.archiver.tasks.archive_addon.delay'):
+            archive_node(self.stat_results(), self.archive_job._id)
+        with mock.patch('website.archiver.tasks.archive_chunks.delay'):
+            archive_addon('osfstorage', self.archive_job._id)
+        return self.archive_job.get_target('osfstorage')
+
+    def test_plan_archive_chunks(self):
+        result = archiver_utils.aggregate_file_tree_metadata('osfstorage', CHUNKED_FILE_TREE, self.user)
+        chunks = archiver_utils.plan_archive_chunks(result)
+        assert_equal(
+            [
+                (chunk['path'], [item['path'] for item in chunk['items']], chunk['folders'], chunk['num_files'], chunk['disk_usage'])
+                for chunk in chunks
+            ],
+            [
+                ('/a.txt', ['/a.txt'], [], 1, 10),
+                ('/big/b.bin', ['/big/b.bin'], ['big'], 1, 60),
+                ('/big/c.bin', ['/big/c.bin', '/big/small/'], ['big'], 2, 70),
+            ]
+        )
+
+    @mock.patch.object(settings, 'ARCHIVER_CHUNK_MAX_FILES', 3)
+    def test_plan_archive_chunks_groups_files(self):
+        file_tree = {
+            'path': '/',
+            'name': '',
+            'kind': 'folder',
+            'children': [
+                {'path': '/{}.txt'.format(i), 'name': '{}.txt'.format(i), 'kind': 'file', 'size': 1} for i in range(10)
+            ],
+        }
+        result = archiver_utils.aggregate_file_tree_metadata('osfstorage', file_tree, self.user)
+        chunks = archiver_utils.plan_archive_chunks(result)
+        assert_equal([len(chunk['items']) for chunk in chunks], [3, 3, 3, 1])
+        assert_equal(sum(chunk['num_files'] for chunk in chunks), 10)
+
+    @mock.patch('website.archiver.tasks.archive_addon.delay')
+    def test_archive_node_plans_chunks_of_large_targets(self, mock_archive_addon):
+        archive_node(self.stat_results(), self.archive_job._id)
+        target = self.archive_job.get_target('osfstorage')
+        assert_equal(len(target.chunks), 3)
+        assert_equal(target.stat_result['num_files'], 4)
+        assert_equal(target.stat_result['disk_usage'], 140)
+        assert_not_in('targets', target.stat_result)
+
+    @mock.patch('website.archiver.tasks.archive_addon.delay')
+    def test_archive_node_does_not_chunk_small_targets(self, mock_archive_addon):
+        with mock.patch.object(settings, 'ARCHIVER_CHUNK_SIZE', 1000):
+            archive_node(self.stat_results(), self.archive_job._id)
+        assert_equal(self.archive_job.get_target('osfstorage').chunks, [])
+
+    @mock.patch('website.archiver.tasks.make_copy_request.delay')
+    @mock.patch('website.archiver.tasks.archive_chunks.delay')
+    def test_archive_addon_creates_chunk_folders(self, mock_archive_chunks, mock_make_copy_request):
+        target = self.archive_in_chunks()
+        archive_folder = self.dst.get_addon('osfstorage').get_root().find_child_by_name('Archive of OSF Storage', kind=0)
+        big = archive_folder.find_child_by_name('big', kind=0)
+        assert_equal(
+            [chunk['dst_path'] for chunk in target.chunks],
+            [archive_folder.path, big.path, big.path]
+        )
+        assert_false(mock_make_copy_request.called)
+
+    @mock.patch('website.archiver.tasks.make_chunk_copy_request.delay')
+    def test_archive_chunks_limits_concurrency(self, mock_make_chunk_copy_request):
+        self.archive_in_chunks()
+        archive_chunks('osfstorage', self.archive_job._id)
+        archive_chunks('osfstorage', self.archive_job._id)
+        assert_equal(
+            [each[1]['path'] for each in mock_make_chunk_copy_request.call_args_list],
+            ['/a.txt', '/big/b.bin']
+        )
+        target = self.archive_job.get_target('osfstorage')
+        assert_equal([chunk['status'] for chunk in target.chunks], [ARCHIVER_PENDING, ARCHIVER_PENDING, ARCHIVER_INITIATED])
+
+    @mock.patch('website.project.signals.archive_callback.send')
+    @mock.patch('website.archiver.tasks.archive_chunks.delay')
+    @mock.patch('website.archiver.tasks.make_chunk_copy_request.delay')
+    def test_update_archive_chunk_progress(self, mock_make_chunk_copy_request, mock_archive_chunks, mock_send):
+        self.archive_in_chunks()
+        archive_chunks('osfstorage', self.archive_job._id)
+        update_archive_chunk(self.dst, 'osfstorage', '/big/b.bin', ARCHIVER_SUCCESS)
+        assert_equal(self.archive_job.progress(), {'files_done': 1, 'files_total': 4, 'bytes_done': 60, 'bytes_total': 140})
+        mock_archive_chunks.assert_called_with(addon_short_name='osfstorage', job_pk=self.archive_job._id)
+        assert_true(mock_send.called)
+
+        archive_chunks('osfstorage', self.archive_job._id)
+        archive_chunks('osfstorage', self.archive_job._id)
+        for path in ('/a.txt', '/big/c.bin'):
+            update_archive_chunk(self.dst, 'osfstorage', path, ARCHIVER_SUCCESS)
+            archive_chunks('osfstorage', self.archive_job._id)
+        # The last chunk is done once both its items are
+        assert_equal(self.archive_job.get_target('osfstorage').get_chunk('/big/c.bin')['status'], ARCHIVER_PENDING)
+        assert_equal(self.archive_job.progress()['files_done'], 2)
+
+        update_archive_chunk(self.dst, 'osfstorage', '/big/small/', ARCHIVER_SUCCESS)
+        self.archive_job.reload()
+        assert_equal(self.archive_job.get_target('osfstorage').status, ARCHIVER_SUCCESS)
+        assert_equal(self.archive_job.status, ARCHIVER_SUCCESS)
+        assert_equal(self.archive_job.progress(), {'files_done': 4, 'files_total': 4, 'bytes_done': 140, 'bytes_total': 140})
+
+    @mock.patch('website.project.signals.archive_callback.send')
+    @mock.patch('website.archiver.tasks.archive_chunks.apply_async')
+    @mock.patch('website.archiver.tasks.make_chunk_copy_request.delay')
+    def test_failed_chunks_retry_alone(self, mock_make_chunk_copy_request, mock_apply_async, mock_send):
+        self.archive_in_chunks()
+        archive_chunks('osfstorage', self.archive_job._id)
+        with mock.patch('website.archiver.tasks.requests.post', return_value=mock.Mock(status_code=503)):
+            make_chunk_copy_request('osfstorage', self.archive_job._id, '/a.txt')
+        assert_true(mock_apply_async.called)
+        target = self.archive_job.get_target('osfstorage')
+        chunk = target.get_chunk('/a.txt')
+        assert_equal(chunk['status'], ARCHIVER_INITIATED)
+        assert_equal(chunk['errors'], ['WaterButler responded with 503'])
+        assert_equal(target.get_chunk('/big/b.bin')['status'], ARCHIVER_PENDING)
+        assert_equal(target.status, ARCHIVER_INITIATED)
+
+        # Copied again, and failing again exceeds ARCHIVER_CHUNK_MAX_RETRIES
+        archive_chunks('osfstorage', self.archive_job._id)
+        assert_equal(self.archive_job.get_target('osfstorage').get_chunk('/a.txt')['attempts'], 2)
+        update_archive_chunk(self.dst, 'osfstorage', '/a.txt', ARCHIVER_FAILURE, errors=['Copy failed'])
+        target = self.archive_job.get_target('osfstorage')
+        assert_equal(target.status, ARCHIVER_FAILURE)
+        assert_equal(target.errors, ['Copy failed'])
+
+    @mock.patch('website.project.signals.archive_callback.send')
+    @mock.patch('website.archiver.tasks.archive_chunks.delay')
+    def test_chunk_copies_its_remaining_items(self, mock_archive_chunks, mock_send):
+        self.archive_in_chunks()
+        with mock.patch('website.archiver.tasks.make_chunk_copy_request.delay'):
+            archive_chunks('osfstorage', self.archive_job._id)
+            update_archive_chunk(self.dst, 'osfstorage', '/a.txt', ARCHIVER_SUCCESS)
+            archive_chunks('osfstorage', self.archive_job._id)
+        update_archive_chunk(self.dst, 'osfstorage', '/big/c.bin', ARCHIVER_SUCCESS)
+
+        with mock.patch('website.archiver.tasks.requests.post', return_value=mock.Mock(status_code=202)) as mock_post:
+            make_chunk_copy_request('osfstorage', self.archive_job._id, '/big/c.bin')
+        assert_equal(mock_post.call_count, 1)
+        assert_equal(json.loads(mock_post.call_args[1]['data'])['rename'], 'small')
+
+
 class TestArchiverUtils(ArchiverTestCase):
 
     @mock.patch('website.mails.send_mail')
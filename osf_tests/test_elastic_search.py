@@ -2,6 +2,7 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
 
 import mock
+import os
 import time
 import unittest
 import logging
@@ -16,8 +17,9 @@ from website import settings
 import website.search.search as search
 from website.search import elastic_search
 from website.search.util import build_query
-from website.search_migration.migrate import migrate
+from website.search_migration.migrate import migrate, set_up_index, MigrationCheckpoint
 from osf.models import (
+    PendingSearchUpdate,
     Retraction,
     NodeLicense,
     OSFGroup,
@@ -1296,6 +1298,143 @@ class TestSearchExceptions(OsfTestCase):
         self.project.save()
 
 
+@pytest.mark.enable_search
+@pytest.mark.enable_enqueue_task
+class TestSearchCache(OsfTestCase):
+
+    def setUp(self):
+        super(TestSearchCache, self).setUp()
+        search.delete_index(elastic_search.INDEX)
+        search.create_index(elastic_search.INDEX)
+        self.user = factories.UserFactory(fullname='Alice Coltrane')
+        self.project = factories.ProjectFactory(title='Journey in Satchidananda', creator=self.user, is_public=True)
+
+    def test_repeated_query_is_cached(self):
+        first = query('category:project AND "Satchidananda"')
+        hits = elastic_search.search_cache_stats['hits']
+        with mock.patch.object(elastic_search.client(), 'search') as mock_search:
+            second = query('category:project AND "Satchidananda"')
+        assert_false(mock_search.called)
+        assert_equal(first, second)
+        # Both the results and the facets
+        assert_equal(elastic_search.search_cache_stats['hits'], hits + 2)
+
+    def test_index_write_invalidates_cache(self):
+        assert_equal(len(query('category:project AND "Satchidananda"')['results']), 1)
+        factories.ProjectFactory(title='Satchidananda Revisited', creator=self.user, is_public=True)
+        assert_equal(len(query('category:project AND "Satchidananda"')['results']), 2)
+
+    def test_write_invalidates_its_doc_types(self):
+        query('category:project AND "Satchidananda"')
+        elastic_search.invalidate_search_cache(['user'])
+        hits = elastic_search.search_cache_stats['hits']
+        query('category:project AND "Satchidananda"')
+        # The results are still cached, only the facets spanning every doc type are searched again
+        assert_equal(elastic_search.search_cache_stats['hits'], hits + 1)
+
+        elastic_search.invalidate_search_cache(['project'])
+        query('category:project AND "Satchidananda"')
+        assert_equal(elastic_search.search_cache_stats['hits'], hits + 1)
+
+    def test_nested_writes_invalidate_once(self):
+        @elastic_search.invalidates_search_cache('institution')
+        def nested_write():
+            pass
+
+        @elastic_search.invalidates_search_cache('user')
+        def write():
+            elastic_search.search_cache_written('file')
+            nested_write()
+
+        with mock.patch.object(elastic_search, 'invalidate_search_cache') as mock_invalidate:
+            write()
+        mock_invalidate.assert_called_once_with(['file', 'institution', 'user'])
+
+    def test_pages_share_facets(self):
+        search.search(build_query('Satchidananda', start=0, size=1), index=elastic_search.INDEX)
+        hits = elastic_search.search_cache_stats['hits']
+        results = search.search(build_query('Satchidananda', start=1, size=1), index=elastic_search.INDEX)
+        # The page itself misses, but its counts, aggregations and tags come from the cache
+        assert_equal(elastic_search.search_cache_stats['hits'], hits + 1)
+        assert_equal(results['counts']['project'], 1)
+
+    @mock.patch.object(settings, 'SEARCH_RESULTS_CACHE_TIMEOUT', 0)
+    def test_cache_can_be_disabled(self):
+        hits = elastic_search.search_cache_stats['hits']
+        query('category:project AND "Satchidananda"')
+        query('category:project AND "Satchidananda"')
+        assert_equal(elastic_search.search_cache_stats['hits'], hits)
+
+    @mock.patch.object(settings, 'SEARCH_RESULTS_CACHE_TIMEOUT', 0)
+    def test_results_and_facets_come_from_one_request(self):
+        es = elastic_search.client()
+        with mock.patch.object(es, 'search', side_effect=es.search) as mock_search:
+            results = search.search(build_query('Satchidananda'), index=elastic_search.INDEX, doc_type='user')
+        assert_equal(mock_search.call_count, 1)
+        assert_equal(results['results'], [])
+        # Counts span every doc type, licenses only the doc types searched
+        assert_equal(results['counts']['project'], 1)
+        assert_equal(results['aggs']['total'], 0)
+
+        results = search.search(build_query('Satchidananda'), index=elastic_search.INDEX, doc_type='project')
+        assert_equal(len(results['results']), 1)
+        assert_equal(results['counts']['project'], 1)
+        assert_equal(results['aggs']['total'], 1)
+
+    @mock.patch.object(settings, 'SEARCH_RESULTS_CACHE_TIMEOUT', 0)
+    def test_counts_ignore_the_query_filter(self):
+        filtered = {
+            'query': {
+                'filtered': {
+                    'query': build_query('Satchidananda')['query'],
+                    'filter': {'term': {'category': 'component'}},
+                },
+            },
+        }
+        results = search.search(filtered, index=elastic_search.INDEX)
+        assert_equal(results['results'], [])
+        assert_equal(results['counts']['project'], 1)
+        assert_equal(results['tags'], [])
+
+
+@pytest.mark.enable_search
+@pytest.mark.enable_enqueue_task
+class TestBufferedSearchUpdates(OsfTestCase):
+
+    def setUp(self):
+        super(TestBufferedSearchUpdates, self).setUp()
+        search.delete_index(elastic_search.INDEX)
+        search.create_index(elastic_search.INDEX)
+        self.user = factories.UserFactory(fullname='Ornette Coleman')
+
+    @mock.patch.object(settings, 'SEARCH_UPDATE_DEBOUNCE', 0)
+    def test_updates_are_coalesced_and_flushed_in_bulk(self):
+        with mock.patch.object(settings, 'SEARCH_UPDATES_BUFFERED', True):
+            project = factories.ProjectFactory(title='Free Jazz', creator=self.user, is_public=True)
+            project.title = 'The Shape of Jazz to Come'
+            project.save()
+
+        assert_equal(PendingSearchUpdate.objects.filter(doc_type='node', object_id=project._id).count(), 1)
+        assert_equal(len(query('category:project AND "Jazz"')['results']), 0)
+
+        elastic_search.flush_search_updates()
+
+        assert_false(PendingSearchUpdate.objects.filter(doc_type='node').exists())
+        docs = query('category:project AND "Shape of Jazz"')['results']
+        assert_equal(len(docs), 1)
+
+    @mock.patch.object(settings, 'SEARCH_UPDATE_DEBOUNCE', 0)
+    def test_unindexable_documents_are_deleted(self):
+        project = factories.ProjectFactory(title='Lonely Woman', creator=self.user, is_public=True)
+        assert_equal(len(query('category:project AND "Lonely Woman"')['results']), 1)
+
+        with mock.patch.object(settings, 'SEARCH_UPDATES_BUFFERED', True):
+            project.set_privacy('private')
+        elastic_search.flush_search_updates()
+
+        assert_equal(len(query('category:project AND "Lonely Woman"')['results']), 0)
+
+
 @pytest.mark.enable_search
 @pytest.mark.enable_enqueue_task
 class TestSearchMigration(OsfTestCase):
@@ -1349,6 +1488,19 @@ class TestSearchMigration(OsfTestCase):
             assert_equal(list(var[settings.ELASTIC_INDEX + '_v{}'.format(n + 1)]['aliases'].keys())[0], settings.ELASTIC_INDEX)
             assert not var.get(settings.ELASTIC_INDEX + '_v{}'.format(n))
 
+    def test_resume_migration(self):
+        new_index = set_up_index(settings.ELASTIC_INDEX)
+        MigrationCheckpoint(
+            settings.ELASTIC_MIGRATION_CHECKPOINT_PATH, settings.ELASTIC_INDEX, new_index, steps=['nodes']
+        ).save()
+
+        migrate(delete=False, remove=False, index=settings.ELASTIC_INDEX, app=self.app.app, resume=True)
+        var = self.es.indices.get_aliases()
+        # The interrupted migration's index is reused rather than a new version being created
+        assert_equal(list(var[settings.ELASTIC_INDEX + '_v1']['aliases'].keys())[0], settings.ELASTIC_INDEX)
+        assert not var.get(settings.ELASTIC_INDEX + '_v2')
+        assert not os.path.exists(settings.ELASTIC_MIGRATION_CHECKPOINT_PATH)
+
     def test_migration_institutions(self):
         migrate(delete=True, index=settings.ELASTIC_INDEX, app=self.app.app)
         count_query = {}
@@ -1543,3 +1695,37 @@ class TestSearchFiles(OsfTestCase):
 
         find = query_file('GreenLight.mp3')['results']
         assert_equal(len(find), 0)
+
+
+class TestMigrationCheckpoint:
+
+    @pytest.fixture()
+    def path(self, tmpdir):
+        return str(tmpdir.join('checkpoint.json'))
+
+    def test_round_trip(self, path):
+        checkpoint = MigrationCheckpoint(path, 'website', 'website_v2')
+        checkpoint.mark_step_done('institutions')
+        checkpoint.mark_shard_done('nodes', 0)
+        checkpoint.mark_shard_done('nodes', 10000)
+
+        loaded = MigrationCheckpoint.load(path, 'website')
+        assert loaded.index == 'website_v2'
+        assert loaded.is_step_done('institutions')
+        assert not loaded.is_step_done('nodes')
+        assert loaded.is_shard_done('nodes', 10000)
+        assert not loaded.is_shard_done('nodes', 20000)
+        assert not loaded.is_shard_done('files', 0)
+
+    def test_load_other_alias(self, path):
+        MigrationCheckpoint(path, 'website', 'website_v2').save()
+        assert MigrationCheckpoint.load(path, 'other') is None
+
+    def test_load_missing(self, path):
+        assert MigrationCheckpoint.load(path, 'website') is None
+
+    def test_clear(self, path):
+        checkpoint = MigrationCheckpoint(path, 'website', 'website_v2')
+        checkpoint.save()
+        checkpoint.clear()
+        assert MigrationCheckpoint.load(path, 'website') is None
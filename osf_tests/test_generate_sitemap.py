@@ -1,3 +1,4 @@
+import json
 import os
 
 import pytest
@@ -32,6 +33,19 @@ def get_all_sitemap_urls():
     return urls
 
 
+def get_sharded_sitemap_urls(sitemap_dir, **kwargs):
+    generate_sitemap.main(**kwargs)
+
+    namespace = '{http://www.sitemaps.org/schemas/sitemap/0.9}'
+    index = xml.etree.ElementTree.parse(os.path.join(sitemap_dir, 'sitemap_index.xml'))
+    urls = []
+    for loc in index.iter(namespace + 'loc'):
+        file_name = loc.text.rsplit('/', 1)[-1]
+        tree = xml.etree.ElementTree.parse(os.path.join(sitemap_dir, file_name))
+        urls.extend(element.text for element in tree.iter(namespace + 'loc'))
+    return urls
+
+
 @pytest.mark.django_db
 class TestGenerateSitemap:
 
@@ -175,3 +189,46 @@ class TestGenerateSitemap:
             urls = get_all_sitemap_urls()
 
         assert urljoin(settings.DOMAIN, project_deleted.url) not in urls
+
+    def test_sharded_links_included(self, all_included_links, create_tmp_directory):
+        with mock.patch('website.settings.STATIC_FOLDER', create_tmp_directory):
+            urls = get_sharded_sitemap_urls(os.path.join(create_tmp_directory, 'sitemaps'), parallel=True)
+        shutil.rmtree(create_tmp_directory)
+
+        assert len(all_included_links) == len(urls)
+        assert set(all_included_links) == set(urls)
+
+    def test_incremental_only_regenerates_changed_types(self, all_included_links, create_tmp_directory, project_registration_public):
+        sitemap_dir = os.path.join(create_tmp_directory, 'sitemaps')
+        state_path = os.path.join(sitemap_dir, generate_sitemap.STATE_FILE_NAME)
+
+        with mock.patch('website.settings.STATIC_FOLDER', create_tmp_directory):
+            get_sharded_sitemap_urls(sitemap_dir, incremental=True)
+            with open(state_path) as f:
+                first = json.load(f)
+
+            urls = get_sharded_sitemap_urls(sitemap_dir, incremental=True)
+            with open(state_path) as f:
+                second = json.load(f)
+            assert second['user']['generated'] == first['user']['generated']
+            assert second['node']['generated'] == first['node']['generated']
+            assert set(urls) == set(all_included_links)
+
+            project_registration_public.title = 'Changed'
+            project_registration_public.save()
+            get_sharded_sitemap_urls(sitemap_dir, incremental=True)
+            with open(state_path) as f:
+                third = json.load(f)
+            assert third['user']['generated'] == first['user']['generated']
+            assert third['node']['generated'] != first['node']['generated']
+        shutil.rmtree(create_tmp_directory)
+
+    def test_urls_are_escaped(self, create_tmp_directory):
+        writer = generate_sitemap.SitemapWriter(create_tmp_directory)
+        writer.add_url({'loc': 'https://osf.io/?a=1&b=<2>'})
+        assert writer.close() == ['sitemap_0.xml']
+
+        tree = xml.etree.ElementTree.parse(os.path.join(create_tmp_directory, 'sitemap_0.xml'))
+        assert [element.text for element in tree.iter('{http://www.sitemaps.org/schemas/sitemap/0.9}loc')] == ['https://osf.io/?a=1&b=<2>']
+        assert os.path.exists(os.path.join(create_tmp_directory, 'sitemap_0.xml.gz'))
+        shutil.rmtree(create_tmp_directory)
@@ -0,0 +1,123 @@
+import mock
+import pytest
+
+from framework.auth import Auth
+from osf.models import AbstractNode, NodePermissionIndex
+from osf.utils.permissions import ADMIN, ADMIN_NODE, READ, WRITE, WRITE_NODE
+from osf_tests.factories import AuthUserFactory, NodeFactory, OSFGroupFactory, ProjectFactory
+
+
+def indexed(node, user):
+    return set(NodePermissionIndex.objects.filter(node=node, user=user).values_list('permission', 'source'))
+
+
+def assert_consistent(*nodes):
+    assert NodePermissionIndex.find_inconsistencies([node.id for node in nodes]) == (set(), set())
+
+
+@pytest.mark.django_db
+class TestNodePermissionIndex:
+
+    @pytest.fixture()
+    def user(self):
+        return AuthUserFactory()
+
+    @pytest.fixture()
+    def project(self):
+        return ProjectFactory(is_public=False)
+
+    @pytest.fixture()
+    def component(self, project):
+        return NodeFactory(parent=project, creator=project.creator, is_public=False)
+
+    def test_creator(self, project):
+        assert indexed(project, project.creator) == {(ADMIN, NodePermissionIndex.CONTRIBUTOR)}
+        assert_consistent(project)
+
+    def test_contributor_added_updated_and_removed(self, project, user):
+        auth = Auth(project.creator)
+        project.add_contributor(user, permissions=READ, auth=auth, save=True)
+        assert indexed(project, user) == {(READ, NodePermissionIndex.CONTRIBUTOR)}
+
+        project.update_contributor(user, WRITE, True, auth, save=True)
+        assert indexed(project, user) == {(WRITE, NodePermissionIndex.CONTRIBUTOR)}
+
+        project.remove_contributor(user, auth)
+        assert indexed(project, user) == set()
+        assert_consistent(project)
+
+    def test_osf_group(self, project, user):
+        group = OSFGroupFactory(creator=project.creator)
+        project.add_osf_group(group, WRITE, Auth(project.creator))
+        group.make_member(user)
+        assert indexed(project, user) == {(WRITE, NodePermissionIndex.OSF_GROUP)}
+
+        group.remove_member(user)
+        assert indexed(project, user) == set()
+        assert_consistent(project)
+
+    def test_parent_admin_can_read_components(self, project, component, user):
+        grandchild = NodeFactory(parent=component, creator=component.creator)
+        project.add_contributor(user, permissions=ADMIN, auth=Auth(project.creator), save=True)
+        assert indexed(component, user) == {(READ, NodePermissionIndex.PARENT_ADMIN)}
+        assert indexed(grandchild, user) == {(READ, NodePermissionIndex.PARENT_ADMIN)}
+
+        project.update_contributor(user, WRITE, True, Auth(project.creator), save=True)
+        assert indexed(component, user) == set()
+        assert_consistent(project, component, grandchild)
+
+    def test_new_component_of_admin_project(self, project, user):
+        project.add_contributor(user, permissions=ADMIN, auth=Auth(project.creator), save=True)
+        component = NodeFactory(parent=project, creator=project.creator)
+        assert indexed(component, user) == {(READ, NodePermissionIndex.PARENT_ADMIN)}
+
+    def test_find_inconsistencies(self, project):
+        NodePermissionIndex.objects.filter(node=project).update(permission=READ)
+        missing, extra = NodePermissionIndex.find_inconsistencies([project.id])
+        assert missing == {(project.creator.id, project.id, ADMIN, NodePermissionIndex.CONTRIBUTOR)}
+        assert extra == {(project.creator.id, project.id, READ, NodePermissionIndex.CONTRIBUTOR)}
+
+        NodePermissionIndex.refresh([project.id])
+        assert_consistent(project)
+
+
+@pytest.mark.django_db
+class TestNodePermissionIndexQueries:
+
+    @pytest.fixture()
+    def user(self):
+        return AuthUserFactory()
+
+    @pytest.fixture()
+    def nodes(self, user):
+        private = ProjectFactory(is_public=False)
+        contributed = ProjectFactory(is_public=False)
+        contributed.add_contributor(user, permissions=WRITE, auth=Auth(contributed.creator), save=True)
+        administered = ProjectFactory(is_public=False, creator=user)
+        component = NodeFactory(parent=administered, creator=AuthUserFactory(), is_public=False)
+        group = OSFGroupFactory(creator=user)
+        grouped = ProjectFactory(is_public=False)
+        grouped.add_osf_group(group, ADMIN, Auth(grouped.creator))
+        public = ProjectFactory(is_public=True)
+        deleted = ProjectFactory(is_public=False, creator=user, is_deleted=True)
+        return [private, contributed, administered, component, grouped, public, deleted]
+
+    @pytest.mark.parametrize('queryset', [
+        lambda user: AbstractNode.objects.can_view(user),
+        lambda user: AbstractNode.objects.get_nodes_for_user(user),
+        lambda user: AbstractNode.objects.get_nodes_for_user(user, WRITE_NODE),
+        lambda user: AbstractNode.objects.get_nodes_for_user(user, ADMIN_NODE, include_public=True),
+    ])
+    def test_matches_guardian(self, user, nodes, queryset):
+        ids = [node.id for node in nodes]
+        from_index = set(queryset(user).filter(id__in=ids).values_list('id', flat=True))
+        with mock.patch('website.settings.NODE_PERMISSION_INDEX', False):
+            from_guardian = set(queryset(user).filter(id__in=ids).values_list('id', flat=True))
+        assert from_index == from_guardian
+        assert from_index
+
+    def test_can_view(self, user, nodes):
+        private, contributed, administered, component, grouped, public, deleted = nodes
+        assert set(AbstractNode.objects.can_view(user).filter(id__in=[node.id for node in nodes])) == {
+            contributed, administered, component, grouped, public
+        }
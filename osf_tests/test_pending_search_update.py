@@ -0,0 +1,63 @@
+import mock
+import pytest
+
+from osf.models import PendingSearchUpdate
+from osf_tests.factories import ProjectFactory
+from website.search import elastic_search
+from website.search.exceptions import BulkUpdateError
+
+
+@pytest.mark.django_db
+class TestPendingSearchUpdate:
+
+    @pytest.fixture()
+    def project(self):
+        return ProjectFactory()
+
+    def test_repeated_updates_are_coalesced(self, project):
+        PendingSearchUpdate.enqueue('node', project._id)
+        PendingSearchUpdate.enqueue('node', project._id)
+        PendingSearchUpdate.enqueue('node', project._id, index='other')
+        PendingSearchUpdate.enqueue('user', project.creator._id)
+
+        assert PendingSearchUpdate.objects.filter(doc_type='node', object_id=project._id).count() == 2
+        assert PendingSearchUpdate.objects.count() == 3
+
+    def test_unknown_doc_type(self, project):
+        with pytest.raises(AssertionError):
+            PendingSearchUpdate.enqueue('file', project._id)
+
+    def test_claim_waits_for_updates_to_settle(self, project):
+        PendingSearchUpdate.enqueue('node', project._id)
+
+        assert PendingSearchUpdate.claim(debounce=60, max_lag=3600) == []
+        assert PendingSearchUpdate.objects.count() == 1
+
+        claimed = PendingSearchUpdate.claim(debounce=0)
+        assert [(doc_type, object_id, index) for doc_type, object_id, index, _ in claimed] == [('node', project._id, '')]
+        assert not PendingSearchUpdate.objects.exists()
+
+    def test_claim_caps_lag(self, project):
+        PendingSearchUpdate.enqueue('node', project._id)
+        assert len(PendingSearchUpdate.claim(debounce=60, max_lag=0)) == 1
+
+    def test_claim_batch_size(self, project):
+        PendingSearchUpdate.enqueue('node', project._id)
+        PendingSearchUpdate.enqueue('user', project.creator._id)
+        assert len(PendingSearchUpdate.claim(batch_size=1, debounce=0)) == 1
+        assert PendingSearchUpdate.objects.count() == 1
+
+    def test_stats(self, project):
+        assert PendingSearchUpdate.get_stats() == {'depth': 0, 'lag': 0}
+        PendingSearchUpdate.enqueue('node', project._id)
+        stats = PendingSearchUpdate.get_stats()
+        assert stats['depth'] == 1
+        assert stats['lag'] >= 0
+
+    @mock.patch('website.search.elastic_search.settings.SEARCH_UPDATE_DEBOUNCE', 0)
+    def test_failed_flush_requeues_batch(self, project):
+        PendingSearchUpdate.enqueue('node', project._id)
+        with mock.patch('website.search.elastic_search.bulk_update_search', side_effect=BulkUpdateError('nope')):
+            with pytest.raises(BulkUpdateError):
+                elastic_search.flush_search_updates()
+        assert PendingSearchUpdate.objects.filter(doc_type='node', object_id=project._id).exists()
@@ -1,9 +1,15 @@
+import datetime
+
+import mock
 import pytest
+from django.utils import timezone
 
 from framework.sessions import utils
 from tests.base import DbTestCase
 from osf_tests.factories import SessionFactory, UserFactory
 from osf.models import OSFUser, Session
+from osf.models.session import local_session_cache
+from scripts.clear_sessions import clear_sessions
 
 @pytest.mark.django_db
 class TestSession:
@@ -31,6 +37,144 @@ class TestSession:
         assert Session.objects.count() == 1
 
 
+@pytest.mark.django_db
+class TestSessionCache:
+
+    @pytest.fixture(autouse=True)
+    def clear_local_cache(self):
+        local_session_cache.clear()
+        yield
+        local_session_cache.clear()
+
+    @pytest.fixture()
+    def session(self):
+        session = Session(data={'service_url': 'abc12'})
+        session.save()
+        return session
+
+    def test_load_cached(self, session, django_assert_num_queries):
+        loaded = Session.load_cached(session._id)
+        assert loaded.data == session.data
+        assert loaded.pk == session.pk
+        assert not loaded._state.adding
+
+        with django_assert_num_queries(0):
+            assert Session.load_cached(session._id).data == session.data
+
+    def test_authenticated_sessions_are_not_cached(self, django_assert_num_queries):
+        session = Session(data={'auth_user_id': 'abc12'})
+        session.save()
+        assert Session.load_cached(session._id).is_authenticated
+        assert local_session_cache.get(session._id) is None
+
+        # e.g. logged out by another process
+        Session.objects.filter(_id=session._id).update(data={})
+        with django_assert_num_queries(1):
+            assert not Session.load_cached(session._id).is_authenticated
+
+    def test_load_cached_missing(self):
+        assert Session.load_cached('notasession') is None
+
+    def test_loaded_sessions_are_copies(self, session):
+        loaded = Session.load_cached(session._id)
+        loaded.data['service_url'] = 'changed'
+        assert Session.load_cached(session._id).data['service_url'] == 'abc12'
+
+    def test_save_invalidates(self, session):
+        loaded = Session.load_cached(session._id)
+        loaded.data['service_url'] = 'changed'
+        loaded.save()
+        assert Session.load_cached(session._id).data['service_url'] == 'changed'
+
+    def test_delete_invalidates(self, session):
+        Session.load_cached(session._id)
+        Session.objects.filter(_id=session._id).delete()
+        assert Session.load_cached(session._id) is None
+
+    @mock.patch('website.settings.SESSION_LOCAL_CACHE_TIMEOUT', 0)
+    def test_disabled(self, session):
+        Session.load_cached(session._id)
+        Session.objects.filter(_id=session._id).update(data={})
+        assert Session.load_cached(session._id).data == {}
+
+    @mock.patch('website.settings.SESSION_LOCAL_CACHE_SIZE', 1)
+    def test_local_cache_is_bounded(self, session):
+        other = Session()
+        other.save()
+        Session.load_cached(session._id)
+        Session.load_cached(other._id)
+        assert local_session_cache.get(session._id) is None
+        assert local_session_cache.get(other._id) is not None
+
+    def test_local_cache_expires(self, session):
+        Session.load_cached(session._id)
+        with mock.patch('osf.models.session.time.time', return_value=timezone.now().timestamp() + 3600):
+            assert local_session_cache.get(session._id) is None
+
+
+@pytest.mark.django_db
+class TestSessionDirtyTracking:
+
+    def test_unchanged_session_is_not_saved(self, django_assert_num_queries):
+        session = Session(data={'auth_user_id': 'abc12'})
+        assert session.is_dirty
+        session.save()
+        assert not session.is_dirty
+
+        loaded = Session.load(session._id)
+        assert not loaded.is_dirty
+        with django_assert_num_queries(0):
+            loaded.save()
+
+    def test_changed_session_is_saved(self):
+        session = Session(data={'auth_user_id': 'abc12'})
+        session.save()
+        session.data['auth_user_fullname'] = 'Freddie Mercury'
+        assert session.is_dirty
+        session.save()
+        assert not session.is_dirty
+        assert Session.load(session._id).data['auth_user_fullname'] == 'Freddie Mercury'
+
+    def test_nested_change_is_saved(self):
+        session = Session(data={'status': []})
+        session.save()
+        session.data['status'].append('message')
+        assert session.is_dirty
+
+
+@pytest.mark.django_db
+class TestClearSessions:
+
+    @pytest.fixture()
+    def old_sessions(self):
+        sessions = [Session() for _ in range(3)]
+        for session in sessions:
+            session.save()
+        Session.objects.filter(id__in=[session.id for session in sessions]).update(
+            modified=timezone.now() - datetime.timedelta(days=60)
+        )
+        return sessions
+
+    @pytest.fixture()
+    def new_session(self):
+        session = Session()
+        session.save()
+        return session
+
+    def test_delete_expired(self, old_sessions, new_session):
+        deleted = Session.delete_expired(timezone.now() - datetime.timedelta(days=30), batch_size=2)
+        assert len(deleted) == 2
+        assert Session.objects.count() == 2
+
+    def test_clear_sessions(self, old_sessions, new_session):
+        assert clear_sessions(timezone.now() - datetime.timedelta(days=30), dry_run=False, batch_size=2) == 3
+        assert list(Session.objects.all()) == [new_session]
+
+    def test_clear_sessions_dry_run(self, old_sessions, new_session):
+        assert clear_sessions(timezone.now() - datetime.timedelta(days=30), dry_run=True) == 3
+        assert Session.objects.count() == 4
+
+
 class SessionUtilsTestCase(DbTestCase):
     def setUp(self, *args, **kwargs):
         super(SessionUtilsTestCase, self).setUp(*args, **kwargs)
@@ -3,10 +3,11 @@ import time
 import logging
 import datetime
 
-from django.db import transaction
+from dateutil.relativedelta import relativedelta
 from django.utils import timezone
 
 from framework.celery_tasks import app as celery_app
+from website import settings
 from website.app import setup_django
 setup_django()
 from osf.models import Session
@@ -20,22 +21,37 @@ logging.basicConfig(level=logging.INFO)
 SESSION_AGE_THRESHOLD = 30
 
 
-def main(dry_run=True):
-    old_sessions = Session.objects.filter(modified__lt=timezone.now() - datetime.timedelta(days=SESSION_AGE_THRESHOLD))
+def clear_sessions(before, dry_run=True, batch_size=None):
+    """
+    Delete the sessions last modified before `before`, a batch per transaction so that the table is never
+    locked for long, until none are left.
 
+    :return: the number of sessions deleted, or that would be in a dry run
+    """
     if dry_run:
-        logger.warn('Dry run mode, will delete sessions and then abort the transaction')
-    logger.info('Preparing to delete Session objects older than {} days'.format(SESSION_AGE_THRESHOLD))
+        count = Session.objects.filter(modified__lt=before).count()
+        logger.warn('Dry run mode, {} Session objects would be deleted'.format(count))
+        return count
+
+    start = time.time()
+    batch_size = batch_size or settings.SESSION_CLEANUP_BATCH_SIZE
+    sessions_deleted = 0
+    while True:
+        deleted = len(Session.delete_expired(before, batch_size=batch_size))
+        sessions_deleted += deleted
+        if deleted < batch_size:
+            break
+    logger.info('Deleting {} Session objects took {} seconds'.format(sessions_deleted, time.time() - start))
+    return sessions_deleted
 
-    with transaction.atomic():
-        start = time.time()
-        sessions_deleted = old_sessions.delete()[1]['osf.Session']
-        end = time.time()
 
-        logger.info('Deleting {} Session objects took {} seconds'.format(sessions_deleted, end - start))
+def clear_sessions_relative(months=1, dry_run=False):
+    return clear_sessions(timezone.now() - relativedelta(months=months), dry_run=dry_run)
 
-        if dry_run:
-            raise Exception('Dry run, aborting the transaction!')
+
+def main(dry_run=True):
+    logger.info('Preparing to delete Session objects older than {} days'.format(SESSION_AGE_THRESHOLD))
+    clear_sessions(timezone.now() - datetime.timedelta(days=SESSION_AGE_THRESHOLD), dry_run=dry_run)
 
 
 @celery_app.task(name='scripts.clear_sessions')
@@ -4,10 +4,13 @@
 import boto3
 import datetime
 import gzip
+import json
 import os
 import shutil
-from future.moves.urllib.parse import urlparse, urljoin
-import xml
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from future.moves.urllib.parse import urljoin
+from xml.sax.saxutils import escape
 
 import django
 django.setup()
@@ -16,9 +19,9 @@ import tempfile
 
 from framework import sentry
 from framework.celery_tasks import app as celery_app
-from django.db.models import Q
-from osf.models import OSFUser, AbstractNode, Preprint, PreprintProvider
-from osf.utils.workflows import DefaultStates
+from django.db import connection
+from django.utils import timezone
+from osf.models import OSFUser, AbstractNode, Preprint
 from scripts import utils as script_utils
 from website import settings
 from website.app import init_app
@@ -26,12 +29,139 @@ from website.app import init_app
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
+SITEMAP_NAMESPACE = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+STATE_FILE_NAME = 'sitemap_state.json'
+
+
+class SitemapWriter(object):
+    """Streams urls into numbered sitemap files of at most `SITEMAP_URL_MAX` urls each, writing every
+    <url> element as it's added instead of building a DOM. Each finished file is gzipped next to itself.
+    """
+
+    def __init__(self, sitemap_dir, prefix='sitemap', on_file_written=None):
+        self.sitemap_dir = sitemap_dir
+        self.prefix = prefix
+        self.on_file_written = on_file_written
+        self.file_names = []
+        self.file = None
+        self.url_count = 0
+        self.total_url_count = 0
+
+    def add_url(self, config):
+        """Adds a url to the current sitemap file, starting a new file when it is full"""
+        if self.file is None or self.url_count >= settings.SITEMAP_URL_MAX:
+            self.close_file()
+            self.open_file()
+        self.file.write('  <url>\n')
+        for name, text in config.items():
+            self.file.write('    <{0}>{1}</{0}>\n'.format(name, escape(text)))
+        self.file.write('  </url>\n')
+        self.url_count += 1
+        self.total_url_count += 1
+
+    def open_file(self):
+        self.file_name = '{}_{}.xml'.format(self.prefix, len(self.file_names))
+        self.file = open(os.path.join(self.sitemap_dir, self.file_name), 'w', encoding='utf-8')
+        self.file.write('<?xml version="1.0" encoding="utf-8"?>\n')
+        self.file.write('<urlset xmlns="{}">\n'.format(SITEMAP_NAMESPACE))
+        self.url_count = 0
+
+    def close_file(self):
+        """Finishes and gzips the current sitemap file"""
+        if self.file is None:
+            return
+        self.file.write('</urlset>\n')
+        self.file.close()
+        self.file = None
+
+        file_path = os.path.join(self.sitemap_dir, self.file_name)
+        print('Wrote and gzipping `{}`: url_count = {}'.format(file_path, str(self.url_count)))
+        with open(file_path, 'rb') as f_in, gzip.open(file_path + '.gz', 'wb') as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        self.file_names.append(self.file_name)
+        if self.on_file_written:
+            self.on_file_written(self.file_name, file_path)
+            self.on_file_written(self.file_name + '.gz', file_path + '.gz')
+
+    def close(self, always_write=False):
+        """Finishes the last sitemap file. With `always_write`, writes an empty sitemap if no urls were added."""
+        if self.file is None and always_write and not self.file_names:
+            self.open_file()
+        self.close_file()
+        return self.file_names
+
+
+def url_config(template, **values):
+    config = OrderedDict(template)
+    config.update(values)
+    return config
+
+
+def static_urls():
+    for config in settings.SITEMAP_STATIC_URLS:
+        yield url_config(config, loc=urljoin(settings.DOMAIN, config['loc']))
+
+
+def user_urls():
+    objs = (OSFUser.objects
+        .filter(is_active=True)
+        .exclude(date_confirmed__isnull=True)
+        .values_list('guids___id', flat=True))
+    for guid in objs.iterator():
+        yield url_config(settings.SITEMAP_USER_CONFIG, loc=urljoin(settings.DOMAIN, '/{}/'.format(guid)))
+
+
+def node_urls():
+    """AbstractNode urls (Nodes and Registrations, no Collections)"""
+    objs = (AbstractNode.objects
+        .filter(is_public=True, is_deleted=False, retraction_id__isnull=True)
+        .exclude(type__in=['osf.collection', 'osf.quickfilesnode'])
+        .values_list('guids___id', 'modified'))
+    for guid, modified in objs.iterator():
+        yield url_config(
+            settings.SITEMAP_NODE_CONFIG,
+            loc=urljoin(settings.DOMAIN, '/{}/'.format(guid)),
+            lastmod=modified.strftime('%Y-%m-%d'),
+        )
+
+
+def preprint_urls():
+    """Preprint urls and the urls of their files, built from the preprint's guid and provider without loading either"""
+    objs = (Preprint.objects.can_view()
+        .values_list('guids___id', 'modified', 'provider___id', 'provider__domain', 'provider__domain_redirect_enabled'))
+    for guid, modified, provider_id, provider_domain, domain_redirect_enabled in objs.iterator():
+        preprint_date = modified.strftime('%Y-%m-%d')
+        if provider_id == 'osf':
+            preprint_url = '/preprints/{}/'.format(guid)
+        elif domain_redirect_enabled and provider_domain:
+            preprint_url = '/{}/'.format(guid)
+        else:
+            preprint_url = '/preprints/{}/{}/'.format(provider_id, guid)
+        domain = provider_domain if (domain_redirect_enabled and provider_domain) else settings.DOMAIN
+        yield url_config(settings.SITEMAP_PREPRINT_CONFIG, loc=urljoin(domain, preprint_url), lastmod=preprint_date)
+
+        # Preprint file urls
+        yield url_config(
+            settings.SITEMAP_PREPRINT_FILE_CONFIG,
+            loc=urljoin(provider_domain or settings.DOMAIN, os.path.join(guid, 'download', '?format=pdf')),
+            lastmod=preprint_date,
+        )
+
+
+# Object types in the sitemap, with the url source for each and the model whose changes invalidate its shards
+URL_SOURCES = OrderedDict([
+    ('static', (static_urls, None)),
+    ('user', (user_urls, OSFUser)),
+    ('node', (node_urls, AbstractNode)),
+    ('preprint', (preprint_urls, Preprint)),
+])
+
 
 class Sitemap(object):
     def __init__(self):
-        self.sitemap_count = 0
         self.errors = 0
-        self.new_doc()
+        self.file_names = []
+        self.url_count = 0
         if not settings.SITEMAP_TO_S3:
             self.sitemap_dir = os.path.join(settings.STATIC_FOLDER, 'sitemaps')
             if not os.path.exists(self.sitemap_dir):
@@ -49,56 +179,17 @@ class Sitemap(object):
                 region_name='us-east-1'
             )
 
+    @property
+    def sitemap_count(self):
+        return len(self.file_names)
+
     def cleanup(self):
         if settings.SITEMAP_TO_S3:
             shutil.rmtree(self.sitemap_dir)
 
-    def new_doc(self):
-        """Creates new sitemap document and resets the url_count."""
-        self.doc = xml.dom.minidom.Document()
-        self.urlset = self.doc.createElement('urlset')
-        self.urlset.setAttribute('xmlns', 'http://www.sitemaps.org/schemas/sitemap/0.9')
-        self.doc.appendChild(self.urlset)
-        self.url_count = 0
-
-    def add_tag(self, name, text):
-        """Adds a tag to the current url"""
-        tag = self.doc.createElement(name)
-        self.url.appendChild(tag)
-        tag_text = self.doc.createTextNode(text)
-        tag.appendChild(tag_text)
-
-    def add_url(self, config):
-        """Adds a url to the current urlset"""
-        if self.url_count >= settings.SITEMAP_URL_MAX:
-            self.write_doc()
-            self.new_doc()
-        self.url = self.doc.createElement('url')
-        self.urlset.appendChild(self.url)
-
-        for k, v in config.items():
-            self.add_tag(k, v)
-        self.url_count += 1
-
-    def write_doc(self):
-        """Writes and gzips each sitemap xml file"""
-        file_name = 'sitemap_{}.xml'.format(str(self.sitemap_count))
-        file_path = os.path.join(self.sitemap_dir, file_name)
-        zip_file_name = file_name + '.gz'
-        zip_file_path = file_path + '.gz'
-        print('Writing and gzipping `{}`: url_count = {}'.format(file_path, str(self.url_count)))
-
-        xml_str = self.doc.toprettyxml(indent='  ', encoding='utf-8')
-        with open(file_path, 'wb') as f:
-            f.write(xml_str)
-
-        # Write zipped file
-        with open(file_path, 'rb') as f_in, gzip.open(zip_file_path, 'wb') as f_out:
-            shutil.copyfileobj(f_in, f_out)
+    def ship_file(self, name, path):
         if settings.SITEMAP_TO_S3:
-            self.ship_to_s3(file_name, file_path)
-            self.ship_to_s3(zip_file_name, zip_file_path)
-        self.sitemap_count += 1
+            self.ship_to_s3(name, path)
 
     def ship_to_s3(self, name, path):
         data = open(path, 'rb')
@@ -110,35 +201,24 @@ class Sitemap(object):
             sentry.log_message('ERROR: Sitemaps could not be uploaded to s3, see `generate_sitemap` logs')
         data.close()
 
-    def write_sitemap_index(self):
-        """Writes the index file for all of the sitemap files"""
-        doc = xml.dom.minidom.Document()
-        sitemap_index = self.doc.createElement('sitemapindex')
-        sitemap_index.setAttribute('xmlns', 'http://www.sitemaps.org/schemas/sitemap/0.9')
-        doc.appendChild(sitemap_index)
-
-        for f in range(self.sitemap_count):
-            sitemap = doc.createElement('sitemap')
-            sitemap_index.appendChild(sitemap)
-
-            loc = doc.createElement('loc')
-            sitemap.appendChild(loc)
-            loc_text = self.doc.createTextNode(urljoin(settings.DOMAIN, 'sitemaps/sitemap_{}.xml'.format(str(f))))
-            loc.appendChild(loc_text)
-
-            datemod = doc.createElement('lastmod')
-            sitemap.appendChild(datemod)
-            datemod_text = self.doc.createTextNode(datetime.datetime.now().strftime('%Y-%m-%d'))
-            datemod.appendChild(datemod_text)
+    def write_sitemap_index(self, files):
+        """Writes the index file for all of the sitemap files
 
+        :param list files: (file name, lastmod date) tuples
+        """
         print('Writing `sitemap_index.xml`')
         file_name = 'sitemap_index.xml'
         file_path = os.path.join(self.sitemap_dir, file_name)
-        xml_str = doc.toprettyxml(indent='  ', encoding='utf-8')
-        with open(file_path, 'wb') as f:
-            f.write(xml_str)
-        if settings.SITEMAP_TO_S3:
-            self.ship_to_s3(file_name, file_path)
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write('<?xml version="1.0" encoding="utf-8"?>\n')
+            f.write('<sitemapindex xmlns="{}">\n'.format(SITEMAP_NAMESPACE))
+            for name, lastmod in files:
+                f.write('  <sitemap>\n')
+                f.write('    <loc>{}</loc>\n'.format(escape(urljoin(settings.DOMAIN, 'sitemaps/{}'.format(name)))))
+                f.write('    <lastmod>{}</lastmod>\n'.format(lastmod))
+                f.write('  </sitemap>\n')
+            f.write('</sitemapindex>\n')
+        self.ship_file(file_name, file_path)
 
     def log_errors(self, obj, obj_id, error):
         if not self.errors:
@@ -154,100 +234,127 @@ class Sitemap(object):
             sentry.log_message('ERROR: generate_sitemap stopped execution after reaching 1000 errors. See logs for details.')
             raise Exception('Too many errors generating sitemap.')
 
-    def generate(self):
-        print('Generating Sitemap')
-
-        # Progress bar
-        progress = script_utils.Progress(precision=0)
-
-        # Static urls
-        progress.start(len(settings.SITEMAP_STATIC_URLS), 'STAT: ')
-        for config in settings.SITEMAP_STATIC_URLS:
-            config['loc'] = urljoin(settings.DOMAIN, config['loc'])
-            self.add_url(config)
-            progress.increment()
-        progress.stop()
-
-        # User urls
-        objs = OSFUser.objects.filter(is_active=True).exclude(date_confirmed__isnull=True).values_list('guids___id', flat=True)
-        progress.start(objs.count(), 'USER: ')
-        for obj in objs:
+    def write_urls(self, writer, object_type):
+        """Streams every url of `object_type` into `writer`"""
+        source, _ = URL_SOURCES[object_type]
+        urls = source()
+        while True:
             try:
-                config = settings.SITEMAP_USER_CONFIG
-                config['loc'] = urljoin(settings.DOMAIN, '/{}/'.format(obj))
-                self.add_url(config)
+                config = next(urls)
+            except StopIteration:
+                break
             except Exception as e:
-                self.log_errors('USER', obj, e)
-            progress.increment()
-        progress.stop()
-
-        # AbstractNode urls (Nodes and Registrations, no Collections)
-        objs = (AbstractNode.objects
-            .filter(is_public=True, is_deleted=False, retraction_id__isnull=True)
-            .exclude(type__in=['osf.collection', 'osf.quickfilesnode'])
-            .values('guids___id', 'modified'))
-        progress.start(objs.count(), 'NODE: ')
-        for obj in objs:
+                # The source can't continue past an error, but the other object types still get written
+                self.log_errors(object_type.upper(), None, e)
+                break
             try:
-                config = settings.SITEMAP_NODE_CONFIG
-                config['loc'] = urljoin(settings.DOMAIN, '/{}/'.format(obj['guids___id']))
-                config['lastmod'] = obj['modified'].strftime('%Y-%m-%d')
-                self.add_url(config)
+                writer.add_url(config)
             except Exception as e:
-                self.log_errors('NODE', obj['guids___id'], e)
-            progress.increment()
-        progress.stop()
+                self.log_errors(object_type.upper(), config.get('loc'), e)
 
-        # Preprint urls
+    def write_shard(self, object_type):
+        """Writes the `sitemap_<type>_<n>.xml` files of one object type"""
+        writer = SitemapWriter(self.sitemap_dir, prefix='sitemap_{}'.format(object_type), on_file_written=self.ship_file)
+        self.write_urls(writer, object_type)
+        file_names = writer.close()
+        print('Wrote {} {} urls to {} files'.format(writer.total_url_count, object_type, len(file_names)))
+        return file_names, writer.total_url_count
 
-        objs = (Preprint.objects.can_view()
-                    .select_related('node', 'provider', 'primary_file'))
-        progress.start(objs.count() * 2, 'PREP: ')
-        osf = PreprintProvider.objects.get(_id='osf')
-        for obj in objs:
-            try:
-                preprint_date = obj.modified.strftime('%Y-%m-%d')
-                config = settings.SITEMAP_PREPRINT_CONFIG
-                preprint_url = obj.url
-                provider = obj.provider
-                domain = provider.domain if (provider.domain_redirect_enabled and provider.domain) else settings.DOMAIN
-                if provider == osf:
-                    preprint_url = '/preprints/{}/'.format(obj._id)
-                config['loc'] = urljoin(domain, preprint_url)
-                config['lastmod'] = preprint_date
-                self.add_url(config)
-
-                # Preprint file urls
-                try:
-                    file_config = settings.SITEMAP_PREPRINT_FILE_CONFIG
-                    file_config['loc'] = urljoin(
-                        obj.provider.domain or settings.DOMAIN,
-                        os.path.join(
-                            obj._id,
-                            'download',
-                            '?format=pdf'
-                        )
-                    )
-                    file_config['lastmod'] = preprint_date
-                    self.add_url(file_config)
-                except Exception as e:
-                    self.log_errors(obj.primary_file, obj.primary_file._id, e)
-            except Exception as e:
-                self.log_errors(obj, obj._id, e)
-            progress.increment(2)
-        progress.stop()
+    def _write_shard_in_thread(self, object_type):
+        try:
+            return self.write_shard(object_type)
+        finally:
+            # Each worker thread opens its own database connection
+            connection.close()
 
-        # Final write
-        self.write_doc()
-        # Create index file
-        self.write_sitemap_index()
+    def load_state(self):
+        """Returns the sharded sitemap files written by the last run, and when, by object type"""
+        if settings.SITEMAP_TO_S3:
+            try:
+                self.s3.Bucket(settings.SITEMAP_AWS_BUCKET).download_file(
+                    'sitemaps/{}'.format(STATE_FILE_NAME), os.path.join(self.sitemap_dir, STATE_FILE_NAME)
+                )
+            except Exception:
+                return {}
+        try:
+            with open(os.path.join(self.sitemap_dir, STATE_FILE_NAME)) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def save_state(self, state):
+        file_path = os.path.join(self.sitemap_dir, STATE_FILE_NAME)
+        with open(file_path, 'w') as f:
+            json.dump(state, f)
+        self.ship_file(STATE_FILE_NAME, file_path)
+
+    def has_changed(self, object_type, since):
+        _, model = URL_SOURCES[object_type]
+        if model is None or since is None:
+            return True
+        return model.objects.filter(modified__gt=since).exists()
+
+    def generate(self, parallel=False, incremental=False):
+        """Generate the sitemap.
+
+        By default every url is streamed into one sequence of `sitemap_<n>.xml` files. With `parallel` or
+        `incremental`, each object type gets its own `sitemap_<type>_<n>.xml` shards instead, generated
+        concurrently with `parallel`. With `incremental`, the shards of object types that haven't changed
+        since the last sharded run are kept as they are.
+        """
+        print('Generating Sitemap')
+        today = datetime.datetime.now().strftime('%Y-%m-%d')
+
+        if not (parallel or incremental):
+            writer = SitemapWriter(self.sitemap_dir, on_file_written=self.ship_file)
+            for object_type in URL_SOURCES:
+                self.write_urls(writer, object_type)
+            # Final write
+            self.file_names = writer.close(always_write=True)
+            self.url_count = writer.total_url_count
+            self.write_sitemap_index([(name, today) for name in self.file_names])
+        else:
+            started = timezone.now()
+            state = self.load_state() if incremental else {}
+            stale = [
+                object_type for object_type in URL_SOURCES
+                if object_type not in state or self.has_changed(object_type, state[object_type]['generated'])
+            ]
+            for object_type in URL_SOURCES:
+                if object_type not in stale:
+                    print('Keeping {} sitemaps, unchanged since {}'.format(object_type, state[object_type]['generated']))
+
+            if parallel and connection.in_atomic_block:
+                # Worker threads use their own connections and can't see this transaction's writes
+                parallel = False
+            if parallel:
+                with ThreadPoolExecutor(max_workers=len(stale) or 1) as executor:
+                    shards = dict(zip(stale, executor.map(self._write_shard_in_thread, stale)))
+            else:
+                shards = {object_type: self.write_shard(object_type) for object_type in stale}
+
+            for object_type, (file_names, url_count) in shards.items():
+                state[object_type] = {
+                    'generated': started.isoformat(),
+                    'lastmod': today,
+                    'files': file_names,
+                    'url_count': url_count,
+                }
+            files = [
+                (name, state[object_type]['lastmod'])
+                for object_type in URL_SOURCES
+                for name in state[object_type]['files']
+            ]
+            self.file_names = [name for name, _ in files]
+            self.url_count = sum(state[object_type]['url_count'] for object_type in URL_SOURCES)
+            self.write_sitemap_index(files)
+            self.save_state(state)
 
         # TODO: once the sitemap is validated add a ping to google with sitemap index file location
-        # TODO: server side cursor query wrapper might be useful as the index gets larger.
         # Sitemap indexable limit check
         if self.sitemap_count > settings.SITEMAP_INDEX_MAX * .90:  # 10% of urls remaining
             sentry.log_message('WARNING: Max sitemaps nearly reached.')
-        print('Total url_count = {}'.format((self.sitemap_count - 1) * settings.SITEMAP_URL_MAX + self.url_count))
+        print('Total url_count = {}'.format(self.url_count))
         print('Total sitemap_count = {}'.format(str(self.sitemap_count)))
         if self.errors:
             sentry.log_message('WARNING: Generate sitemap encountered errors. See logs for details.')
@@ -256,12 +363,17 @@ class Sitemap(object):
             print('No errors')
 
 @celery_app.task(name='scripts.generate_sitemap')
-def main():
+def main(parallel=False, incremental=False):
     init_app(routes=False)  # Sets the storage backends on all models
     sitemap = Sitemap()
-    sitemap.generate()
+    sitemap.generate(parallel=parallel, incremental=incremental)
     sitemap.cleanup()
 
 if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Generate a sitemap for osf.io')
+    parser.add_argument('--parallel', action='store_true', help='Generate the sitemaps of each object type concurrently')
+    parser.add_argument('--incremental', action='store_true', help='Only regenerate the sitemaps of object types that changed')
+    args = parser.parse_args()
     init_app(set_backends=True, routes=False)
-    main()
+    main(parallel=args.parallel, incremental=args.incremental)
@@ -183,8 +183,8 @@ def celery_beat(ctx, level='debug', schedule=None):
     ctx.run(bin_prefix(cmd), pty=True)
 
 @task
-def migrate_search(ctx, delete=True, remove=False, index=settings.ELASTIC_INDEX):
-    """Migrate the search-enabled models."""
+def migrate_search(ctx, delete=True, remove=False, index=settings.ELASTIC_INDEX, workers=None, resume=False):
+    """Migrate the search-enabled models. Pass --resume to continue an interrupted migration."""
     from website.app import init_app
     init_app(routes=False, set_backends=False)
     from website.search_migration.migrate import migrate
@@ -195,7 +195,7 @@ def migrate_search(ctx, delete=True, remove=False, index=settings.ELASTIC_INDEX)
     for logger in SILENT_LOGGERS:
         logging.getLogger(logger).setLevel(logging.ERROR)
 
-    migrate(delete, remove=remove, index=index)
+    migrate(delete, remove=remove, index=index, workers=int(workers) if workers else None, resume=resume)
 
 @task
 def rebuild_search(ctx):
@@ -6,9 +6,11 @@ import mock
 from nose.tools import *  # noqa: F403
 import sendgrid
 
-from framework.email.tasks import send_email, _send_with_sendgrid
+from framework.email import transport
+from framework.email.tasks import send_email, send_emails, _send_with_sendgrid
 from website import settings
 from tests.base import fake
+from tests.utils import SMTPSink
 from osf_tests.factories import fake_email
 
 # Check if local mail server is running
@@ -77,5 +79,77 @@ class TestEmail(unittest.TestCase):
         assert_false(ret)
 
 
+class TestSMTPTransport(unittest.TestCase):
+
+    def setUp(self):
+        self.sink = SMTPSink().__enter__()
+        patches = [
+            mock.patch.object(settings, 'MAIL_SERVER', self.sink.address),
+            mock.patch.object(settings, 'USE_EMAIL', True),
+            mock.patch.object(settings, 'SENDGRID_API_KEY', None),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        transport.smtp_pool.close()
+        self.sink.__exit__(None, None, None)
+
+    def message(self, **kwargs):
+        message = dict(
+            from_addr=fake_email(),
+            to_addr=fake_email(),
+            subject=fake.bs(),
+            message='<h1>Greetings!</h1>',
+            ttls=False,
+            login=False,
+        )
+        message.update(kwargs)
+        return message
+
+    def test_send_email_reuses_connection(self):
+        messages = [self.message() for _ in range(3)]
+        for message in messages:
+            assert_true(send_email(**message))
+        assert_equal(self.sink.connections, 1)
+        assert_equal([each['To'] for each in self.sink.messages], [message['to_addr'] for message in messages])
+        assert_equal(self.sink.messages[0]['Subject'], messages[0]['subject'])
+
+    def test_send_email_reconnects_after_disconnect(self):
+        assert_true(send_email(**self.message()))
+        for entries in transport.smtp_pool._idle.values():
+            for _, smtp in entries:
+                smtp.close()
+        assert_true(send_email(**self.message()))
+        assert_equal(self.sink.connections, 2)
+        assert_equal(len(self.sink.messages), 2)
+
+    @mock.patch.object(settings, 'MAIL_CONNECTION_MAX_AGE', 0)
+    def test_send_email_does_not_reuse_old_connections(self):
+        assert_true(send_email(**self.message()))
+        assert_true(send_email(**self.message()))
+        assert_equal(self.sink.connections, 2)
+
+    def test_send_emails(self):
+        messages = [self.message() for _ in range(10)]
+        report = send_emails(messages, workers=2)
+        assert_equal(report['sent'], 10)
+        assert_equal(report['failed'], 0)
+        assert_less_equal(self.sink.connections, 2)
+        assert_equal(
+            sorted(each['To'] for each in self.sink.messages),
+            sorted(message['to_addr'] for message in messages)
+        )
+
+    def test_send_emails_counts_failures(self):
+        messages = [self.message(), self.message(login=True, username=None, password=None)]
+        with mock.patch.object(settings, 'MAIL_USERNAME', None):
+            report = send_emails(messages)
+        assert_equal(report['sent'], 1)
+        assert_equal(report['failed'], 1)
+        assert_equal(len(self.sink.messages), 1)
+
+
 if __name__ == '__main__':
     unittest.main()
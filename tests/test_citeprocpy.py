@@ -2,11 +2,14 @@
 import os
 import json
 
+import mock
+
 from django.utils import timezone
 from nose.tools import *  # noqa: F403
 
-from api.citations.utils import render_citation
-from osf_tests.factories import UserFactory, PreprintFactory
+from api.citations import utils as citation_utils
+from api.citations.utils import render_citation, get_cached_citation, get_style
+from osf_tests.factories import UserFactory, PreprintFactory, ProjectFactory
 from tests.base import OsfTestCase
 from osf.models import OSFUser
 
@@ -170,3 +173,53 @@ class TestCiteprocpyMLA(OsfTestCase):
                 self.preprint.provider.name,
                 self.formated_date)
         )
+
+
+class TestCitationCaches(OsfTestCase):
+
+    def setUp(self):
+        super(TestCitationCaches, self).setUp()
+        self.user = UserFactory(fullname='John Tordoff')
+        self.node = ProjectFactory(creator=self.user, title='My Project')
+        citation_utils.citation_cache_stats.clear()
+
+    def test_parsed_style_is_reused(self):
+        assert_is(get_style('apa'), get_style('apa'))
+
+    def test_parsed_style_is_reloaded_when_file_changes(self):
+        style = get_style('apa')
+        with mock.patch('api.citations.utils._get_style_mtime', return_value=0):
+            assert_is_not(get_style('apa'), style)
+
+    def test_cached_citation(self):
+        citation = get_cached_citation(self.node, 'apa')
+        assert_equal(citation, render_citation(self.node, 'apa'))
+        assert_equal(get_cached_citation(self.node, 'apa'), citation)
+        assert_equal(citation_utils.citation_cache_stats['misses'], 1)
+        assert_equal(citation_utils.citation_cache_stats['hits'], 1)
+
+    def test_cached_citation_invalidated_on_title_change(self):
+        get_cached_citation(self.node, 'apa')
+        self.node.title = 'A New Title'
+        self.node.save()
+        assert_in('A New Title', get_cached_citation(self.node, 'apa'))
+
+    def test_cached_citation_invalidated_on_contributor_change(self):
+        citation = get_cached_citation(self.node, 'apa')
+        self.node.add_contributor(UserFactory(fullname='Carson Wentz'), save=False)
+        new_citation = get_cached_citation(self.node, 'apa')
+        assert_not_equal(new_citation, citation)
+        assert_in('Wentz', new_citation)
+
+    def test_cached_citation_invalidated_on_name_change(self):
+        get_cached_citation(self.node, 'apa')
+        self.user.family_name = 'Foles'
+        self.user.given_name = 'Nick'
+        self.user.save()
+        assert_in('Foles', get_cached_citation(self.node, 'apa'))
+
+    @mock.patch('api.citations.utils.website_settings.CITATION_CACHE_TIMEOUT', 0)
+    def test_cache_disabled(self):
+        get_cached_citation(self.node, 'apa')
+        get_cached_citation(self.node, 'apa')
+        assert_equal(citation_utils.citation_cache_stats['hits'], 0)
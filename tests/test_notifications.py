@@ -1,4 +1,5 @@
 import collections
+from datetime import timedelta
 import mock
 from babel import dates, Locale
 from schema import Schema, And, Use, Or
@@ -7,9 +8,10 @@ from django.utils import timezone
 from nose.tools import *  # noqa PEP8 asserts
 
 from framework.auth import Auth
+from framework.email.transport import SendReport
 from osf.models import Comment, NotificationDigest, NotificationSubscription, Guid, OSFUser
 
-from website.notifications.tasks import get_users_emails, send_users_email, group_by_node, remove_notifications
+from website.notifications.tasks import send_users_email, group_by_node, remove_notifications, claim_users_emails
 from website.notifications.exceptions import InvalidSubscriptionError
 from website.notifications import constants
 from website.notifications import emails
@@ -1740,24 +1742,18 @@ class TestSendDigest(OsfTestCase):
             node_lineage=[self.project._id]
         )
         d3.save()
-        user_groups = list(get_users_emails(send_type))
+        user_groups = claim_users_emails(send_type, [self.user_1.id, self.user_2.id])
         expected = [
-            {
-                u'user_id': self.user_1._id,
-                u'info': [{
-                    u'message': u'Hello',
-                    u'node_lineage': [str(self.project._id)],
-                    u'_id': d._id
-                }]
-            },
-            {
-                u'user_id': self.user_2._id,
-                u'info': [{
-                    u'message': u'Hello',
-                    u'node_lineage': [str(self.project._id)],
-                    u'_id': d2._id
-                }]
-            }
+            (self.user_1.id, [{
+                'message': 'Hello',
+                'node_lineage': [self.project._id],
+                '_id': d._id
+            }]),
+            (self.user_2.id, [{
+                'message': 'Hello',
+                'node_lineage': [self.project._id],
+                '_id': d2._id
+            }]),
         ]
 
         assert_equal(len(user_groups), 2)
@@ -1792,24 +1788,18 @@ class TestSendDigest(OsfTestCase):
             node_lineage=[self.project._id]
         )
         d3.save()
-        user_groups = list(get_users_emails(send_type))
+        user_groups = claim_users_emails(send_type, [self.user_1.id, self.user_2.id])
         expected = [
-            {
-                u'user_id': str(self.user_1._id),
-                u'info': [{
-                    u'message': u'Hello',
-                    u'node_lineage': [str(self.project._id)],
-                    u'_id': str(d._id)
-                }]
-            },
-            {
-                u'user_id': str(self.user_2._id),
-                u'info': [{
-                    u'message': u'Hello',
-                    u'node_lineage': [str(self.project._id)],
-                    u'_id': str(d2._id)
-                }]
-            }
+            (self.user_1.id, [{
+                'message': 'Hello',
+                'node_lineage': [self.project._id],
+                '_id': d._id
+            }]),
+            (self.user_2.id, [{
+                'message': 'Hello',
+                'node_lineage': [self.project._id],
+                '_id': d2._id
+            }]),
         ]
 
         assert_equal(len(user_groups), 2)
@@ -1828,13 +1818,10 @@ class TestSendDigest(OsfTestCase):
             node_lineage=[factories.ProjectFactory()._id]
         )
         d.save()
-        user_groups = list(get_users_emails(send_type))
+        user = d.user
         send_users_email(send_type)
         assert_true(mock_send_mail.called)
-        assert_equals(mock_send_mail.call_count, len(user_groups))
-
-        last_user_index = len(user_groups) - 1
-        user = OSFUser.load(user_groups[last_user_index]['user_id'])
+        assert_equals(mock_send_mail.call_count, 1)
 
         args, kwargs = mock_send_mail.call_args
 
@@ -1843,7 +1830,7 @@ class TestSendDigest(OsfTestCase):
         assert_equal(kwargs['mail'], mails.DIGEST)
         assert_equal(kwargs['name'], user.fullname)
         assert_equal(kwargs['can_change_node_preferences'], True)
-        message = group_by_node(user_groups[last_user_index]['info'])
+        message = group_by_node([{'message': d.message, 'node_lineage': d.node_lineage, '_id': d._id}])
         assert_equal(kwargs['message'], message)
 
     @mock.patch('website.mails.send_mail')
@@ -1858,16 +1845,162 @@ class TestSendDigest(OsfTestCase):
         )
         d.save()
 
-        user_groups = list(get_users_emails(send_type))
-        last_user_index = len(user_groups) - 1
-
-        user = OSFUser.load(user_groups[last_user_index]['user_id'])
+        user = d.user
         user.is_disabled = True
         user.save()
 
         send_users_email(send_type)
         assert_false(mock_send_mail.called)
 
+    @mock.patch.object(settings, 'USE_EMAIL', True)
+    @mock.patch.object(settings, 'DIGEST_BATCH_SIZE', 2)
+    @mock.patch('website.notifications.tasks.transport.send_batch')
+    def test_send_users_email_sends_digests_in_batches(self, mock_send_batch):
+        send_type = 'email_transactional'
+        project = factories.ProjectFactory(title='Batched project')
+        users = [factories.UserFactory() for _ in range(3)]
+        for user in users:
+            factories.NotificationDigestFactory(
+                user=user,
+                send_type=send_type,
+                event='comment_replies',
+                timestamp=timezone.now(),
+                message='Hello',
+                node_lineage=[project._id]
+            )
+        mock_send_batch.return_value = SendReport()
+        send_users_email(send_type)
+
+        assert_equal(mock_send_batch.call_count, 2)
+        messages = [message for call in mock_send_batch.call_args_list for message in call[0][1]]
+        assert_equal(sorted(message['to_addr'] for message in messages), sorted(user.username for user in users))
+        assert_in('Batched project', messages[0]['message'])
+        assert_false(NotificationDigest.objects.filter(send_type=send_type).exists())
+
+    @mock.patch.object(settings, 'USE_EMAIL', True)
+    @mock.patch('website.notifications.tasks.log_exception')
+    @mock.patch('website.notifications.tasks.transport.send_batch')
+    @mock.patch('website.mails.send_mail')
+    def test_send_users_email_skips_digests_that_fail_to_render(self, mock_send_mail, mock_send_batch, mock_log_exception):
+        send_type = 'email_transactional'
+        project = factories.ProjectFactory()
+        bad_user, user = factories.UserFactory(), factories.UserFactory()
+        for each in (bad_user, user):
+            factories.NotificationDigestFactory(
+                user=each,
+                send_type=send_type,
+                event='comment_replies',
+                timestamp=timezone.now(),
+                message='Hello',
+                node_lineage=[project._id]
+            )
+
+        def send_mail(to_addr, mailer, **kwargs):
+            if to_addr == bad_user.username:
+                raise ValueError('Could not render')
+            mailer(to_addr=to_addr)
+
+        mock_send_mail.side_effect = send_mail
+        mock_send_batch.return_value = SendReport()
+        send_users_email(send_type)
+
+        assert_equal(mock_log_exception.call_count, 1)
+        assert_equal([message['to_addr'] for message in mock_send_batch.call_args[0][1]], [user.username])
+        unsent = NotificationDigest.objects.get(send_type=send_type)
+        assert_equal(unsent.user, bad_user)
+        assert_is_none(unsent.claimed_at)
+
+        mock_send_mail.side_effect = lambda to_addr, mailer, **kwargs: mailer(to_addr=to_addr)
+        send_users_email(send_type)
+        assert_equal([message['to_addr'] for message in mock_send_batch.call_args[0][1]], [bad_user.username])
+        assert_false(NotificationDigest.objects.filter(send_type=send_type).exists())
+
+    @mock.patch.object(settings, 'USE_EMAIL', True)
+    @mock.patch('website.notifications.tasks.send_email')
+    @mock.patch('website.mails.send_mail')
+    def test_send_users_email_keeps_digests_that_fail_to_send(self, mock_send_mail, mock_send_email):
+        send_type = 'email_transactional'
+        project = factories.ProjectFactory()
+        bad_user, user = factories.UserFactory(), factories.UserFactory()
+        for each in (bad_user, user):
+            factories.NotificationDigestFactory(
+                user=each,
+                send_type=send_type,
+                event='comment_replies',
+                timestamp=timezone.now(),
+                message='Hello',
+                node_lineage=[project._id]
+            )
+        mock_send_mail.side_effect = lambda to_addr, mailer, **kwargs: mailer(to_addr=to_addr)
+        mock_send_email.side_effect = lambda to_addr, **kwargs: to_addr != bad_user.username
+        send_users_email(send_type)
+
+        assert_equal(mock_send_email.call_count, 2)
+        unsent = NotificationDigest.objects.get(send_type=send_type)
+        assert_equal(unsent.user, bad_user)
+        assert_is_none(unsent.claimed_at)
+
+    def test_claim_users_emails(self):
+        send_type = 'email_digest'
+        project = factories.ProjectFactory()
+        user, other_user = factories.UserFactory(), factories.UserFactory()
+        digests = [
+            factories.NotificationDigestFactory(
+                user=each,
+                send_type=send_type,
+                event='comment_replies',
+                timestamp=timezone.now(),
+                message='Hello',
+                node_lineage=[project._id]
+            )
+            for each in (user, user, other_user)
+        ]
+
+        groups = claim_users_emails(send_type, [user.id])
+        assert_equal(groups, [(user.id, [
+            {'message': 'Hello', 'node_lineage': [project._id], '_id': digest._id}
+            for digest in digests[:2]
+        ])])
+        claimed = NotificationDigest.objects.filter(claimed_at__isnull=False)
+        assert_equal(set(claimed.values_list('_id', flat=True)), {digest._id for digest in digests[:2]})
+        assert_equal(claim_users_emails(send_type, [user.id]), [])
+
+        # Claims of a run that never finished are taken over once they time out
+        claimed.update(claimed_at=timezone.now() - timedelta(seconds=settings.DIGEST_CLAIM_TIMEOUT + 60))
+        assert_equal(len(claim_users_emails(send_type, [user.id])[0][1]), 2)
+
+    @mock.patch.object(settings, 'USE_EMAIL', True)
+    @mock.patch.object(settings, 'DIGEST_BATCH_SIZE', 1)
+    @mock.patch('website.notifications.tasks.transport.send_batch')
+    def test_send_users_email_resends_after_crash(self, mock_send_batch):
+        send_type = 'email_digest'
+        project = factories.ProjectFactory()
+        users = [factories.UserFactory() for _ in range(2)]
+        for user in users:
+            factories.NotificationDigestFactory(
+                user=user,
+                send_type=send_type,
+                event='comment_replies',
+                timestamp=timezone.now(),
+                message='Hello',
+                node_lineage=[project._id]
+            )
+        mock_send_batch.side_effect = [RuntimeError('Crashed sending'), SendReport(), SendReport()]
+        with assert_raises(RuntimeError):
+            send_users_email(send_type)
+        # The crashed run's notifications are still claimed, another run leaves them to it
+        send_users_email(send_type)
+        assert_equal(mock_send_batch.call_count, 2)
+        assert_equal([message['to_addr'] for message in mock_send_batch.call_args[0][1]], [users[1].username])
+
+        NotificationDigest.objects.filter(send_type=send_type).update(
+            claimed_at=timezone.now() - timedelta(seconds=settings.DIGEST_CLAIM_TIMEOUT + 60)
+        )
+        send_users_email(send_type)
+        assert_equal(mock_send_batch.call_count, 3)
+        assert_equal([message['to_addr'] for message in mock_send_batch.call_args[0][1]], [users[0].username])
+        assert_false(NotificationDigest.objects.filter(send_type=send_type).exists())
+
     def test_remove_sent_digest_notifications(self):
         d = factories.NotificationDigestFactory(
             event='comment_replies',
@@ -1,7 +1,10 @@
 import contextlib
 import datetime
+import email
 import functools
 import mock
+import socketserver
+import threading
 
 from django.http import HttpRequest
 from django.utils import timezone
@@ -261,3 +264,62 @@ def unique(factory):
 def run_celery_tasks():
     yield
     celery_teardown_request()
+
+
+class SMTPSink(object):
+    """Local SMTP server keeping the emails it receives, for testing sending email without a mail server.
+    Supports neither STARTTLS nor logging in, so send with `ttls=False, login=False`.
+
+    Example usage:
+    with SMTPSink() as sink, mock.patch.object(settings, 'MAIL_SERVER', sink.address):
+        send_email(...)
+    assert_equal(sink.messages[0]['To'], to_addr)
+    """
+
+    def __init__(self, host='localhost', port=0):
+        self.messages = []
+        self.connections = 0
+        sink = self
+
+        class Handler(socketserver.StreamRequestHandler):
+
+            def reply(self, line):
+                self.wfile.write((line + '\r\n').encode())
+
+            def handle(self):
+                sink.connections += 1
+                self.reply('220 localhost SMTP sink')
+                for line in self.rfile:
+                    command = line.decode().strip().upper()
+                    if command.startswith(('HELO', 'EHLO')):
+                        self.reply('250 localhost')
+                    elif command.startswith('DATA'):
+                        self.reply('354 End data with <CR><LF>.<CR><LF>')
+                        data = []
+                        for data_line in self.rfile:
+                            if data_line == b'.\r\n':
+                                break
+                            data.append(data_line[1:] if data_line.startswith(b'.') else data_line)
+                        sink.messages.append(email.message_from_bytes(b''.join(data)))
+                        self.reply('250 OK')
+                    elif command.startswith('QUIT'):
+                        self.reply('221 Bye')
+                        return
+                    elif command.startswith(('MAIL', 'RCPT', 'RSET', 'NOOP')):
+                        self.reply('250 OK')
+                    else:
+                        self.reply('502 Command not implemented')
+
+        self.server = socketserver.ThreadingTCPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.address = '{}:{}'.format(*self.server.server_address)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
@@ -10,6 +10,7 @@ from collections import OrderedDict
 
 import django
 from api.caching import listeners  # noqa
+from api.citations import listeners  # noqa
 from django.apps import apps
 from framework.addons.utils import render_addon_capabilities
 from framework.celery_tasks import handlers as celery_task_handlers
@@ -128,6 +129,11 @@ def init_app(settings_module='website.settings', set_backends=True, routes=True,
 
     apply_middlewares(app, settings)
 
+    if settings.MAKO_WARM_CACHES:
+        # Before servers fork workers, so they share the compiled templates
+        from osf.management.commands.precompile_templates import precompile_templates
+        precompile_templates()
+
     app.config['IS_INITIALIZED'] = True
     return app
 
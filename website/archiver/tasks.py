@@ -106,10 +106,23 @@ class ArchiverTask(celery.Task):
         archiver_signals.archive_fail.send(dst, errors=errors)
 
 
-@celery_app.task(base=ArchiverTask, ignore_result=False)
+def get_stat_cache():
+    from django.conf import settings as django_settings
+    from django.core.cache import caches
+    return caches[django_settings.ARCHIVER_STAT_CACHE_NAME]
+
+
+def is_retryable(error):
+    if isinstance(error, HTTPError):
+        return error.code == http_status.HTTP_429_TOO_MANY_REQUESTS or error.code >= 500
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+
+@celery_app.task(base=ArchiverTask, bind=True, ignore_result=False, max_retries=settings.ARCHIVER_STAT_MAX_RETRIES)
 @logged('stat_addon')
-def stat_addon(addon_short_name, job_pk):
-    """Collect metadata about the file tree of a given addon
+def stat_addon(self, addon_short_name, job_pk):
+    """Collect metadata about the file tree of a given addon. Network errors are retried, resuming
+    from the folders listed before the error.
 
     :param addon_short_name: AddonConfig.short_name of the addon to be examined
     :param job_pk: primary key of archive_job
@@ -129,15 +142,25 @@ def stat_addon(addon_short_name, job_pk):
     if hasattr(src_addon, 'configured') and not src_addon.configured:
         # Addon enabled but not configured - no file trees, nothing to archive.
         return AggregateStatResult(src_addon._id, addon_short_name)
+    cache = get_stat_cache()
+    cache_key = '{}:{}'.format(job_pk, addon_short_name)
+    listings = cache.get(cache_key) or {}
     try:
-        file_tree = src_addon._get_file_tree(user=user, version=version)
-    except HTTPError as e:
-        dst.archive_job.update_target(
-            addon_short_name,
-            ARCHIVER_NETWORK_ERROR,
-            errors=[e.data['error']],
-        )
+        file_tree = src_addon._get_file_tree(user=user, version=version, listings=listings)
+    except Exception as e:
+        if is_retryable(e) and self.request.retries < self.max_retries:
+            cache.set(cache_key, listings, settings.ARCHIVE_TIMEOUT_TIMEDELTA.total_seconds())
+            logger.warning('Retrying stat of {} on node {} with {} folders listed'.format(addon_short_name, src._id, len(listings)))
+            raise self.retry(exc=e, countdown=settings.ARCHIVER_STAT_RETRY_DELAY)
+        cache.delete(cache_key)
+        if isinstance(e, HTTPError):
+            dst.archive_job.update_target(
+                addon_short_name,
+                ARCHIVER_NETWORK_ERROR,
+                errors=[e.data['error']],
+            )
         raise
+    cache.delete(cache_key)
     result = AggregateStatResult(
         src_addon._id,
         addon_short_name,
@@ -165,10 +188,90 @@ def make_copy_request(job_pk, url, data):
     if res.status_code not in (http_status.HTTP_200_OK, http_status.HTTP_201_CREATED, http_status.HTTP_202_ACCEPTED):
         raise HTTPError(res.status_code)
 
-def make_waterbutler_payload(dst_id, rename):
+
+@celery_app.task(base=ArchiverTask, ignore_result=False)
+@logged('make_chunk_copy_request')
+def make_chunk_copy_request(addon_short_name, job_pk, path):
+    """Make the copy requests for the items of a chunk of an addon not copied yet to the WaterButler
+    API. Failures are recorded on the chunk, to copy it again, rather than failing the registration.
+
+    :param addon_short_name: AddonConfig.short_name of the addon being archived
+    :param job_pk: primary key of ArchiveJob
+    :param path: source path of the chunk
+    :return: None
+    """
+    create_app_context()
+    job = ArchiveJob.load(job_pk)
+    src, dst, user = job.info()
+    chunk = job.get_target(addon_short_name).get_chunk(path)
+    logger.info('Sending copy requests for {0} of addon: {1} on node: {2}'.format(path, addon_short_name, dst._id))
+    cookie = user.get_or_create_cookie().decode()
+    for item in chunk['items']:
+        if item['path'].strip('/') in chunk['done']:
+            continue
+        url = waterbutler_api_url_for(src._id, addon_short_name, path=item['path'], _internal=True, base_url=src.osfstorage_region.waterbutler_url, cookie=cookie)
+        data = make_waterbutler_payload(dst._id, item['name'], path=chunk['dst_path'])
+        # A chunk copied again may have been partly copied before
+        data['conflict'] = 'replace'
+        try:
+            res = requests.post(url, data=json.dumps(data))
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = str(e)
+        else:
+            if res.status_code in (http_status.HTTP_200_OK, http_status.HTTP_201_CREATED, http_status.HTTP_202_ACCEPTED):
+                continue
+            error = 'WaterButler responded with {}'.format(res.status_code)
+        update_archive_chunk(dst, addon_short_name, item['path'], ARCHIVER_NETWORK_ERROR, errors=[error])
+        return
+
+
+@celery_app.task(base=ArchiverTask, ignore_result=False)
+@logged('archive_chunks')
+def archive_chunks(addon_short_name, job_pk):
+    """Start copying the next chunks of an addon archived in chunks, up to
+    ARCHIVER_CHUNK_CONCURRENCY at once
+
+    :param addon_short_name: AddonConfig.short_name of the addon being archived
+    :param job_pk: primary key of ArchiveJob
+    :return: None
+    """
+    create_app_context()
+    job = ArchiveJob.load(job_pk)
+    for chunk in job.start_chunks(addon_short_name):
+        make_chunk_copy_request.delay(addon_short_name=addon_short_name, job_pk=job_pk, path=chunk['path'])
+
+
+def update_archive_chunk(dst, addon_short_name, path, status, errors=None):
+    """Record that copying an item of a chunk succeeded or failed, then continue with the next chunks, or
+    the same chunk again after ARCHIVER_CHUNK_RETRY_DELAY if it failed
+
+    :param dst: registration Node
+    :param addon_short_name: AddonConfig.short_name of the addon being archived
+    :param path: source path of the item
+    :param status: archiver status of the chunk
+    :param errors: errors copying the chunk
+    :return: None
+    """
+    job = dst.archive_job
+    retry = job.update_chunk(addon_short_name, path, status, errors=errors)
+    progress = job.progress()
+    logger.info('Archived {0}/{1} files ({2:.0f}/{3:.0f} bytes) of node: {4}'.format(
+        progress['files_done'], progress['files_total'], progress['bytes_done'], progress['bytes_total'], dst._id,
+    ))
+    if retry:
+        logger.warning('Retrying copy of {0} of addon: {1} on node: {2}'.format(path, addon_short_name, dst._id))
+        archive_chunks.apply_async(
+            kwargs={'addon_short_name': addon_short_name, 'job_pk': job._id},
+            countdown=settings.ARCHIVER_CHUNK_RETRY_DELAY,
+        )
+    else:
+        archive_chunks.delay(addon_short_name=addon_short_name, job_pk=job._id)
+    project_signals.archive_callback.send(dst)
+
+def make_waterbutler_payload(dst_id, rename, path='/'):
     return {
         'action': 'copy',
-        'path': '/',
+        'path': path,
         'rename': rename.replace('/', '-'),
         'resource': dst_id,
         'provider': settings.ARCHIVE_PROVIDER,
@@ -187,6 +290,7 @@ def archive_addon(addon_short_name, job_pk):
     create_app_context()
     job = ArchiveJob.load(job_pk)
     src, dst, user = job.info()
+    target = job.get_target(addon_short_name)
     logger.info('Archiving addon: {0} on node: {1}'.format(addon_short_name, src._id))
 
     cookie = user.get_or_create_cookie().decode()
@@ -205,6 +309,17 @@ def archive_addon(addon_short_name, job_pk):
     src_provider = src.get_addon(addon_short_name)
     folder_name = src_provider.archive_folder_name
     rename = '{}{}'.format(folder_name, rename_suffix)
+    if target.chunks:
+        # Create the folders the chunks are copied into, as WaterButler copies them separately
+        folders = {}
+        for chunk in target.chunks:
+            names = (rename.replace('/', '-'), ) + tuple(chunk['folders'])
+            if names not in folders:
+                folders[names] = utils.get_or_create_archive_folder(dst, names)
+            chunk['dst_path'] = folders[names].path
+        target.save()
+        archive_chunks.delay(addon_short_name=addon_short_name, job_pk=job_pk)
+        return
     url = waterbutler_api_url_for(src._id, addon_short_name, _internal=True, base_url=src.osfstorage_region.waterbutler_url, **params)
     data = make_waterbutler_payload(dst._id, rename)
     make_copy_request.delay(job_pk=job_pk, url=url, data=data)
@@ -239,6 +354,14 @@ def archive_node(stat_results, job_pk):
             job.status = ARCHIVER_SUCCESS
             job.save()
         for result in stat_result.targets:
+            target = job.get_target(result['target_name'])
+            if target:
+                # The totals, without the file tree, for the job's progress
+                target.stat_result = {key: value for key, value in result.items() if key != 'targets'}
+                # Dataverse targets aren't split, they're told apart by the name of the folder they're copied into
+                if settings.ARCHIVER_CHUNKED and 'dataverse' not in target.name and utils.is_archive_chunk_too_large(result):
+                    target.chunks = utils.plan_archive_chunks(result['targets'][0])
+                target.save()
             if not result['num_files']:
                 job.update_target(result['target_name'], ARCHIVER_SUCCESS)
             else:
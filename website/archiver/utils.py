@@ -1,9 +1,12 @@
 import functools
 
+from django.core.exceptions import ObjectDoesNotExist
+
 from framework.auth import Auth
 
 from website.archiver import (
     StatResult, AggregateStatResult,
+    ARCHIVER_INITIATED,
     ARCHIVER_NETWORK_ERROR,
     ARCHIVER_SIZE_EXCEEDED,
     ARCHIVER_FILE_NOT_FOUND,
@@ -170,6 +173,62 @@ def aggregate_file_tree_metadata(addon_short_name, fileobj_metadata, user):
             targets=[aggregate_file_tree_metadata(addon_short_name, child, user) for child in fileobj_metadata.get('children', [])],
         )
 
+def is_archive_chunk_too_large(stat_result):
+    return stat_result['disk_usage'] > settings.ARCHIVER_CHUNK_SIZE or stat_result['num_files'] > settings.ARCHIVER_CHUNK_MAX_FILES
+
+def plan_archive_chunks(file_tree_result):
+    """Split an addon's file tree into the chunks to copy separately. Folders within ARCHIVER_CHUNK_SIZE
+    and ARCHIVER_CHUNK_MAX_FILES are copied whole and larger folders are split into their children.
+    Siblings are grouped into chunks up to the same limits, so a folder of many small files makes a few
+    chunks rather than one per file, and a file over the size limit is copied on its own.
+
+    :param file_tree_result: AggregateStatResult of the addon's root folder
+    :return: list of chunks, in the format of ArchiveTarget.chunks
+    """
+    chunks = []
+
+    def split(folder, folders):
+        chunk = None
+        for child in folder['targets']:
+            if 'targets' in child and is_archive_chunk_too_large(child):
+                split(child, folders + [child['target_name']])
+                continue
+            if chunk is None or is_archive_chunk_too_large({
+                'num_files': chunk['num_files'] + child['num_files'],
+                'disk_usage': chunk['disk_usage'] + child['disk_usage'],
+            }):
+                chunk = {
+                    'path': '/' + child['target_id'],
+                    'items': [],
+                    'done': [],
+                    'folders': folders,
+                    'dst_path': None,
+                    'num_files': 0,
+                    'disk_usage': 0,
+                    'status': ARCHIVER_INITIATED,
+                    'attempts': 0,
+                    'errors': [],
+                }
+                chunks.append(chunk)
+            chunk['items'].append({'path': '/' + child['target_id'], 'name': child['target_name']})
+            chunk['num_files'] += child['num_files']
+            chunk['disk_usage'] += child['disk_usage']
+
+    split(file_tree_result, [])
+    return chunks
+
+def get_or_create_archive_folder(node, names):
+    """Get the folder of `node`'s archive provider at the path of folder `names`, creating
+    the folders that don't exist yet
+    """
+    folder = node.get_addon(settings.ARCHIVE_PROVIDER).get_root()
+    for name in names:
+        try:
+            folder = folder.find_child_by_name(name, kind=0)
+        except ObjectDoesNotExist:
+            folder = folder.append_folder(name)
+    return folder
+
 def before_archive(node, user):
     from osf.models import ArchiveJob
     link_archive_provider(node, user)
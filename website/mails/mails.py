@@ -19,6 +19,7 @@ Usage: ::
 
 """
 import os
+import functools
 import logging
 import waffle
 
@@ -34,6 +35,8 @@ EMAIL_TEMPLATES_DIR = os.path.join(settings.TEMPLATES_PATH, 'emails')
 
 _tpl_lookup = TemplateLookup(
     directories=[EMAIL_TEMPLATES_DIR],
+    module_directory=os.path.join(settings.MAKO_MODULE_DIRECTORY, 'emails'),
+    collection_size=settings.MAKO_TEMPLATE_CACHE_SIZE,
 )
 
 HTML_EXT = '.html.mako'
@@ -67,7 +70,12 @@ class Mail(object):
         return render_message(tpl_name, **context)
 
     def subject(self, **context):
-        return Template(self._subject).render(**context)
+        return _compile_subject(self._subject).render(**context)
+
+
+@functools.lru_cache(maxsize=settings.MAIL_SUBJECT_CACHE_SIZE)
+def _compile_subject(subject):
+    return Template(subject)
 
 
 def render_message(tpl_name, **context):
@@ -76,6 +84,34 @@ def render_message(tpl_name, **context):
     return tpl.render(**context)
 
 
+def precompile_templates():
+    """Compile every email template to MAKO_MODULE_DIRECTORY and the subjects of the emails defined here,
+    and keep them in their caches.
+
+    :return: (number of templates compiled, list of (path, error) for templates that failed to compile)
+    """
+    compiled, failed = 0, []
+    for root, dirs, files in os.walk(EMAIL_TEMPLATES_DIR):
+        for name in sorted(files):
+            if not name.endswith('.mako'):
+                continue
+            path = os.path.join(root, name)
+            try:
+                _tpl_lookup.get_template(os.path.relpath(path, EMAIL_TEMPLATES_DIR))
+            except Exception as e:
+                failed.append((path, e))
+            else:
+                compiled += 1
+    for mail in [value for value in globals().values() if isinstance(value, Mail)]:
+        try:
+            _compile_subject(mail._subject)
+        except Exception as e:
+            failed.append((mail.tpl_prefix, e))
+        else:
+            compiled += 1
+    return compiled, failed
+
+
 def send_mail(
         to_addr, mail, mimetype='html', from_addr=None, mailer=None, celery=True,
         username=None, password=None, callback=None, attachment_name=None,
@@ -1,18 +1,37 @@
 """
 Tasks for making even transactional emails consolidated.
 """
+import collections
+import functools
 import itertools
+import logging
+from concurrent.futures import ThreadPoolExecutor
 
-from django.db import connection
+from django.db import connection, transaction
 
 from framework.celery_tasks import app as celery_app
+from framework.email import transport
+from framework.email.tasks import send_email
 from framework.sentry import log_exception
-from osf.models import OSFUser, AbstractNode, AbstractProvider
+from osf.models import OSFUser, AbstractNode, AbstractProvider, Guid
 from osf.models import NotificationDigest
 from osf.utils.permissions import ADMIN
 from website import mails, settings
 from website.notifications.utils import NotificationsDict
 
+logger = logging.getLogger(__name__)
+
+CLAIM_USERS_EMAILS_SQL = """
+    UPDATE osf_notificationdigest SET claimed_at = now()
+    WHERE id IN (
+        SELECT id FROM osf_notificationdigest
+        WHERE send_type = %s AND event != 'new_pending_submissions' AND user_id = ANY(%s)
+        AND (claimed_at IS NULL OR claimed_at < now() - %s * interval '1 second')
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING user_id, _id, message, node_lineage, timestamp, id;
+"""
+
 
 @celery_app.task(name='website.notifications.tasks.send_users_email', max_retries=0)
 def send_users_email(send_type):
@@ -27,33 +46,144 @@ def send_users_email(send_type):
 
 def _send_global_and_node_emails(send_type):
     """
-    Called by `send_users_email`. Send all global and node-related notification emails.
+    Called by `send_users_email`. Send all global and node-related notification emails, streaming the users
+    with pending notifications from a server-side cursor and claiming, rendering and sending the digests of
+    DIGEST_BATCH_SIZE users at a time.
     """
-    grouped_emails = get_users_emails(send_type)
-    for group in grouped_emails:
-        user = OSFUser.load(group['user_id'])
+    user_ids = NotificationDigest.objects.filter(
+        send_type=send_type,
+        user__isnull=False,
+    ).exclude(
+        event='new_pending_submissions',
+    ).order_by('user_id').values_list('user_id', flat=True).distinct().iterator()
+    report = transport.SendReport()
+    while True:
+        chunk = list(itertools.islice(user_ids, settings.DIGEST_BATCH_SIZE))
+        if not chunk:
+            break
+        groups = claim_users_emails(send_type, chunk)
+        if groups:
+            batch_report = _send_digest_batch(groups)
+            if batch_report:
+                report.add(batch_report)
+    logger.info('Digests ({}): {}'.format(send_type, report))
+
+
+def claim_users_emails(send_type, user_ids):
+    """Mark the pending notifications of `user_ids` as claimed in a transaction, and return them to be sent.
+    Notifications claimed by another run are left to it, unless it claimed them more than DIGEST_CLAIM_TIMEOUT
+    seconds ago and never finished, and are deleted once their email is sent (see `_send_digest_batch`).
+    NOTE: These do not include reviews triggered emails for moderators.
+
+    :param send_type: from NOTIFICATION_TYPES
+    :param user_ids: primary keys of the users
+    :return: list of (user primary key, info) pairs, with info in the format of `get_users_emails`
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(CLAIM_USERS_EMAILS_SQL, [send_type, list(user_ids), settings.DIGEST_CLAIM_TIMEOUT])
+            rows = cursor.fetchall()
+    groups = collections.OrderedDict((user_id, []) for user_id in user_ids)
+    for user_id, _id, message, node_lineage, timestamp, pk in sorted(rows, key=lambda row: (row[4], row[5])):
+        groups[user_id].append({
+            'message': message,
+            'node_lineage': node_lineage,
+            '_id': _id,
+        })
+    return [(user_id, info) for user_id, info in groups.items() if info]
+
+
+def _send_digest_batch(groups):
+    """Send the digests of a batch of users, rendered by DIGEST_RENDER_WORKERS threads and sent through
+    the mail transport's connection pool. Notifications are deleted once their digest is sent, or if there
+    is nothing to send, and released for the next run if their digest failed to render or send.
+
+    :param groups: items of `claim_users_emails`
+    :return: SendReport, None if there was nothing to send
+    """
+    users = OSFUser.objects.in_bulk([user_id for user_id, info in groups])
+    digests = []
+    notification_ids = []
+    for user_id, info in groups:
+        notification_ids.extend(message['_id'] for message in info)
+        user = users.get(user_id)
         if not user:
             log_exception()
             continue
-        info = group['info']
-        notification_ids = [message['_id'] for message in info]
         sorted_messages = group_by_node(info)
-        if sorted_messages:
-            if not user.is_disabled:
-                # If there's only one node in digest we can show it's preferences link in the template.
-                notification_nodes = list(sorted_messages['children'].keys())
-                node = AbstractNode.load(notification_nodes[0]) if len(
-                    notification_nodes) == 1 else None
-                mails.send_mail(
-                    to_addr=user.username,
-                    mimetype='html',
-                    can_change_node_preferences=bool(node),
-                    node=node,
-                    mail=mails.DIGEST,
-                    name=user.fullname,
-                    message=sorted_messages,
-                )
-            remove_notifications(email_notification_ids=notification_ids)
+        if sorted_messages and not user.is_disabled:
+            digests.append((user, info, sorted_messages))
+
+    # Nodes to link to the preferences of, for digests about a single node, and the titles of every node
+    # mentioned, so rendering doesn't query them one at a time
+    node_ids = set()
+    lineage_ids = set()
+    for user, info, sorted_messages in digests:
+        if len(sorted_messages['children']) == 1:
+            node_ids.update(sorted_messages['children'].keys())
+        for message in info:
+            lineage_ids.update(message['node_lineage'])
+    nodes = {
+        node._id: node
+        for node in AbstractNode.objects.filter(guids___id__in=node_ids).prefetch_related('guids')
+    }
+    node_titles = {
+        guid._id: guid.referent.title
+        for guid in Guid.objects.filter(_id__in=lineage_ids).prefetch_related('referent')
+        if guid.referent is not None
+    }
+
+    messages = []
+    unsent_ids = []
+
+    def collect(digest_notification_ids, **kwargs):
+        messages.append(dict(kwargs, notification_ids=digest_notification_ids))
+
+    def render(digest):
+        user, info, sorted_messages = digest
+        digest_notification_ids = [message['_id'] for message in info]
+        # If there's only one node in digest we can show it's preferences link in the template.
+        notification_nodes = list(sorted_messages['children'].keys())
+        node = nodes.get(notification_nodes[0]) if len(notification_nodes) == 1 else None
+        try:
+            mails.send_mail(
+                to_addr=user.username,
+                mimetype='html',
+                can_change_node_preferences=bool(node),
+                node=node,
+                mail=mails.DIGEST,
+                name=user.fullname,
+                message=sorted_messages,
+                node_titles=node_titles,
+                mailer=functools.partial(collect, digest_notification_ids),
+                celery=False,
+            )
+        except Exception:
+            # Don't lose the rest of the batch's digests over one, this one is sent again by the next run
+            logger.exception('Could not render the digest of user {}'.format(user.id))
+            log_exception()
+            unsent_ids.extend(digest_notification_ids)
+        finally:
+            # In case rendering queried the database from this thread
+            connection.close()
+
+    def send(notification_ids, **kwargs):
+        sent = False
+        try:
+            sent = send_email(**kwargs)
+        finally:
+            if not sent:
+                unsent_ids.extend(notification_ids)
+        return sent
+
+    with ThreadPoolExecutor(max_workers=settings.DIGEST_RENDER_WORKERS) as executor:
+        list(executor.map(render, digests))
+    report = transport.send_batch(send, messages) if messages else None
+
+    unsent_ids = set(unsent_ids)
+    release_notifications(list(unsent_ids))
+    remove_notifications(email_notification_ids=[_id for _id in notification_ids if _id not in unsent_ids])
+    return report
 
 
 def _send_reviews_moderator_emails(send_type):
@@ -121,53 +251,6 @@ def get_moderators_emails(send_type):
         return itertools.chain.from_iterable(cursor.fetchall())
 
 
-def get_users_emails(send_type):
-    """Get all emails that need to be sent.
-    NOTE: These do not include reviews triggered emails for moderators.
-
-    :param send_type: from NOTIFICATION_TYPES
-    :return: Iterable of dicts of the form:
-        {
-            'user_id': 'se8ea',
-            'info': [{
-                'message': {
-                    'message': 'Freddie commented on your project Open Science',
-                    'timestamp': datetime object
-                },
-                'node_lineage': ['parent._id', 'node._id'],
-                '_id': NotificationDigest._id
-            }, ...
-            }]
-            {
-            'user_id': ...
-            }
-        }
-    """
-
-    sql = """
-    SELECT json_build_object(
-            'user_id', osf_guid._id,
-            'info', json_agg(
-                json_build_object(
-                    'message', nd.message,
-                    'node_lineage', nd.node_lineage,
-                    '_id', nd._id
-                )
-            )
-        )
-    FROM osf_notificationdigest AS nd
-      LEFT JOIN osf_guid ON nd.user_id = osf_guid.object_id
-    WHERE send_type = %s AND event != 'new_pending_submissions'
-    AND osf_guid.content_type_id = (SELECT id FROM django_content_type WHERE model = 'osfuser')
-    GROUP BY osf_guid.id
-    ORDER BY osf_guid.id ASC
-    """
-
-    with connection.cursor() as cursor:
-        cursor.execute(sql, [send_type, ])
-        return itertools.chain.from_iterable(cursor.fetchall())
-
-
 def group_by_node(notifications, limit=15):
     """Take list of notifications and group by node.
 
@@ -188,3 +271,13 @@ def remove_notifications(email_notification_ids=None):
     """
     if email_notification_ids:
         NotificationDigest.objects.filter(_id__in=email_notification_ids).delete()
+
+
+def release_notifications(email_notification_ids):
+    """Release claimed notifications that failed to send, for the next run to send.
+
+    :param email_notification_ids:
+    :return:
+    """
+    if email_notification_ids:
+        NotificationDigest.objects.filter(_id__in=email_notification_ids).update(claimed_at=None)
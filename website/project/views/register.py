@@ -243,6 +243,18 @@ def registration_callbacks(node, payload, *args, **kwargs):
         return {'status': 'success'}
     errors = payload.get('errors')
     src_provider = payload['source']['provider']
+    target = node.archive_job.get_target(src_provider)
+    if target and target.chunks:
+        # Prevent circular import with app.py
+        from website.archiver.tasks import update_archive_chunk
+        update_archive_chunk(
+            node,
+            src_provider,
+            payload['source']['path'],
+            ARCHIVER_FAILURE if errors else ARCHIVER_SUCCESS,
+            errors=errors,
+        )
+        return
     if errors:
         node.archive_job.update_target(
             src_provider,
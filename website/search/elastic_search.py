@@ -5,10 +5,15 @@ from __future__ import division
 
 import copy
 import functools
+import hashlib
+import json
 import logging
 import math
 import re
+import threading
+import time
 import unicodedata
+from collections import Counter
 from framework import sentry
 
 import six
@@ -17,8 +22,10 @@ from django.apps import apps
 from django.core.paginator import Paginator
 from django.contrib.contenttypes.models import ContentType
 from django.db.models import Q
+from django.utils import timezone
 from elasticsearch2 import (ConnectionError, Elasticsearch, NotFoundError,
-                           RequestError, TransportError, helpers)
+                           RequestError, TransportError, Urllib3HttpConnection, helpers)
+from api.base.instrumentation import instrument_es_connection
 from framework.celery_tasks import app as celery_app
 from framework.database import paginated
 from osf.models import AbstractNode
@@ -77,16 +84,24 @@ INDEX = settings.ELASTIC_INDEX
 
 CLIENT = None
 
+SEARCH_CACHE_KEY = 'search:{query_hash}'
+SEARCH_CACHE_GENERATION_KEY = 'search:generation:{doc_type}'
+SEARCH_DOC_TYPES = sorted(DOC_TYPE_TO_MODEL)
+SEARCH_CACHE_STATS_LOG_INTERVAL = 1000
+search_cache_stats = Counter()
+_local = threading.local()
+
 
 def client():
     global CLIENT
     if CLIENT is None:
         try:
+            kwargs = dict({'connection_class': instrument_es_connection(Urllib3HttpConnection)}, **settings.ELASTIC_KWARGS)
             CLIENT = Elasticsearch(
                 settings.ELASTIC_URI,
                 request_timeout=settings.ELASTIC_TIMEOUT,
                 retry_on_timeout=True,
-                **settings.ELASTIC_KWARGS
+                **kwargs
             )
             logging.getLogger('elasticsearch').setLevel(logging.WARN)
             logging.getLogger('elasticsearch.trace').setLevel(logging.WARN)
@@ -142,57 +157,151 @@ def requires_search(func):
     return wrapped
 
 
-@requires_search
-def get_aggregations(query, doc_type):
-    query['aggregations'] = {
-        'licenses': {
-            'terms': {
-                'field': 'license.id'
-            }
-        }
-    }
+def _get_search_cache():
+    from django.conf import settings as django_settings
+    from django.core.cache import caches
+    return caches[django_settings.SEARCH_RESULTS_CACHE_NAME]
 
-    res = client().search(index=INDEX, doc_type=doc_type, search_type='count', body=query)
-    ret = {
-        doc_type: {
-            item['key']: item['doc_count']
-            for item in agg['buckets']
-        }
-        for doc_type, agg in res['aggregations'].items()
-    }
-    ret['total'] = res['hits']['total']
-    return ret
 
+def get_search_doc_types(doc_type):
+    """The doc types a search of `doc_type`, e.g. 'project,component' or '_all', reads from."""
+    doc_types = [type_ for type_ in (doc_type or '').split(',') if type_]
+    if not doc_types or '_all' in doc_types:
+        return SEARCH_DOC_TYPES
+    return sorted(set(doc_types))
 
-@requires_search
-def get_counts(count_query, clean=True):
-    count_query['aggregations'] = {
-        'counts': {
-            'terms': {
-                'field': '_type',
-            }
-        }
-    }
 
-    res = client().search(index=INDEX, doc_type=None, search_type='count', body=count_query)
-    counts = {x['key']: x['doc_count'] for x in res['aggregations']['counts']['buckets'] if x['key'] in ALIASES.keys()}
+def get_search_cache_key(cache, doc_types, *args):
+    """
+    Build the cache key for a search reading from `doc_types`. Queries are normalized by serializing them
+    with sorted keys, so equivalent queries share an entry. The key embeds the cache generations of
+    `doc_types`, which writes to documents of those types bump.
+    """
+    generation_keys = [SEARCH_CACHE_GENERATION_KEY.format(doc_type=doc_type) for doc_type in doc_types]
+    generations = cache.get_many(generation_keys)
+    normalized = json.dumps(
+        [[generations.get(key, 0) for key in generation_keys], args],
+        sort_keys=True, separators=(',', ':'), default=str,
+    )
+    query_hash = hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+    return SEARCH_CACHE_KEY.format(query_hash=query_hash)
 
-    counts['total'] = sum([val for val in counts.values()])
-    return counts
 
+def _record_search_cache_lookup(hit):
+    search_cache_stats['hits' if hit else 'misses'] += 1
+    lookups = search_cache_stats['hits'] + search_cache_stats['misses']
+    if not lookups % SEARCH_CACHE_STATS_LOG_INTERVAL:
+        logger.info('Search cache hit rate {:.1%} over {} lookups; stats: {}'.format(
+            search_cache_stats['hits'] / lookups, lookups, dict(search_cache_stats)))
 
-@requires_search
-def get_tags(query, index):
-    query['aggregations'] = {
-        'tag_cloud': {
-            'terms': {'field': 'tags'}
+
+def invalidate_search_cache(doc_types=None):
+    """
+    Orphan the cached searches reading from `doc_types`, or from any doc type if None, by bumping their cache
+    generations; stale entries expire on their own.
+    """
+    if not settings.SEARCH_RESULTS_CACHE_TIMEOUT:
+        return
+    generation = time.time()
+    _get_search_cache().set_many({
+        SEARCH_CACHE_GENERATION_KEY.format(doc_type=doc_type): generation
+        for doc_type in (SEARCH_DOC_TYPES if doc_types is None else doc_types)
+    }, None)
+    search_cache_stats['invalidations'] += 1
+
+
+def search_cache_written(*doc_types):
+    """
+    Record a write to documents of `doc_types`, for writes whose doc types are only known once they run. Inside
+    a write decorated with `invalidates_search_cache` they are invalidated along with it, otherwise right away.
+    """
+    written = getattr(_local, 'written_doc_types', None)
+    if written is None:
+        invalidate_search_cache(doc_types)
+    else:
+        written.update(doc_types)
+
+
+def invalidates_search_cache(*doc_types):
+    """
+    Invalidate the cached searches reading from `doc_types` after the decorated index write, along with the
+    doc types it records with `search_cache_written`. Nested writes invalidate all the doc types they wrote
+    together, once.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapped(*args, **kwargs):
+            written = getattr(_local, 'written_doc_types', None)
+            outermost = written is None
+            if outermost:
+                written = _local.written_doc_types = set()
+            written.update(doc_types)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                if outermost:
+                    _local.written_doc_types = None
+                    if written:
+                        invalidate_search_cache(sorted(written))
+        return wrapped
+    return decorator
+
+
+def build_search_body(query, doc_type, results=True, facets=True):
+    """
+    Build a single search request for the page of results of `query` and, if `facets`, the counts, license
+    aggregations and tags shown beside them. The doc types searched and the query's filter only restrict the
+    results, through a post filter, so the aggregations span every doc type: the counts and licenses ignore the
+    filter, the tags keep it and the licenses are scoped to `doc_type` by a filter aggregation.
+
+    :param bool results: whether to return the page of results, else only the aggregations are computed
+    """
+    body = copy.deepcopy(query)
+    query_filter = None
+    try:
+        query_filter = body['query']['filtered'].pop('filter')
+    except KeyError:
+        pass
+    types = [type_ for type_ in (doc_type or '').split(',') if type_ and type_ != '_all']
+    type_filter = {'bool': {'should': [{'type': {'value': type_}} for type_ in types]}} if types else None
+
+    post_filters = [filter_ for filter_ in (query_filter, type_filter) if filter_]
+    if len(post_filters) == 1:
+        body['post_filter'] = post_filters[0]
+    elif post_filters:
+        body['post_filter'] = {'bool': {'must': post_filters}}
+    if not results:
+        body['size'] = 0
+    if facets:
+        body['aggregations'] = {
+            'counts': {
+                'terms': {'field': '_type'},
+            },
+            'doc_type': {
+                'filter': type_filter or {'match_all': {}},
+                'aggregations': {'licenses': {'terms': {'field': 'license.id'}}},
+            },
+            'tags': {
+                'filter': query_filter or {'match_all': {}},
+                'aggregations': {'tag_cloud': {'terms': {'field': 'tags'}}},
+            },
         }
-    }
+    return body
 
-    results = client().search(index=index, doc_type=None, body=query)
-    tags = results['aggregations']['tag_cloud']['buckets']
 
-    return tags
+def get_facets(res):
+    """The counts, license aggregations and tags of a search built by `build_search_body`."""
+    aggregations = res['aggregations']
+    counts = {x['key']: x['doc_count'] for x in aggregations['counts']['buckets'] if x['key'] in ALIASES.keys()}
+    counts['total'] = sum([val for val in counts.values()])
+    return {
+        'counts': counts,
+        'aggs': {
+            'licenses': {item['key']: item['doc_count'] for item in aggregations['doc_type']['licenses']['buckets']},
+            'total': aggregations['doc_type']['doc_count'],
+        },
+        'tags': aggregations['tags']['tag_cloud']['buckets'],
+    }
 
 
 @requires_search
@@ -210,39 +319,44 @@ def search(query, index=None, doc_type='_all', raw=False):
         typeAliases: the doc_types that exist in the search database
     """
     index = index or INDEX
-    tag_query = copy.deepcopy(query)
-    aggs_query = copy.deepcopy(query)
-    count_query = copy.deepcopy(query)
+    cache = _get_search_cache() if settings.SEARCH_RESULTS_CACHE_TIMEOUT else None
 
+    facets_query = copy.deepcopy(query)
     for key in ['from', 'size', 'sort']:
-        try:
-            del tag_query[key]
-            del aggs_query[key]
-            del count_query[key]
-        except KeyError:
-            pass
+        facets_query.pop(key, None)
+
+    # Facets don't depend on the page, so every page of a query shares them. Their counts and tags span every
+    # doc type, while the results only depend on the doc types searched, so they are cached separately.
+    facets = None
+    results = None
+    if cache:
+        facets_key = get_search_cache_key(cache, SEARCH_DOC_TYPES, 'facets', index, doc_type, facets_query)
+        facets = cache.get(facets_key)
+        _record_search_cache_lookup(facets is not None)
+        results_key = get_search_cache_key(cache, get_search_doc_types(doc_type), 'results', index, doc_type, raw, query)
+        results = cache.get(results_key)
+        _record_search_cache_lookup(results is not None)
+
+    if facets is None or results is None:
+        # Whatever isn't cached comes from a single request
+        body = build_search_body(query, doc_type, results=results is None, facets=facets is None)
+        res = client().search(index=index, doc_type=None, body=body)
+        if results is None:
+            results = res['hits']['hits'] if raw else format_results([hit['_source'] for hit in res['hits']['hits']])
+            if cache:
+                cache.set(results_key, results, settings.SEARCH_RESULTS_CACHE_TIMEOUT)
+        if facets is None:
+            facets = get_facets(res)
+            if cache:
+                cache.set(facets_key, facets, settings.SEARCH_RESULTS_CACHE_TIMEOUT)
 
-    tags = get_tags(tag_query, index)
-    try:
-        del aggs_query['query']['filtered']['filter']
-        del count_query['query']['filtered']['filter']
-    except KeyError:
-        pass
-    aggregations = get_aggregations(aggs_query, doc_type=doc_type)
-    counts = get_counts(count_query, index)
-
-    # Run the real query and get the results
-    raw_results = client().search(index=index, doc_type=doc_type, body=query)
-    results = [hit['_source'] for hit in raw_results['hits']['hits']]
-
-    return_value = {
-        'results': raw_results['hits']['hits'] if raw else format_results(results),
-        'counts': counts,
-        'aggs': aggregations,
-        'tags': tags,
+    return {
+        'results': results,
+        'counts': facets['counts'],
+        'aggs': facets['aggs'],
+        'tags': facets['tags'],
         'typeAliases': ALIASES
     }
-    return return_value
 
 def format_results(results):
     ret = []
@@ -420,7 +534,7 @@ def serialize_node(node, category):
         'normalized_title': normalized_title,
         'category': category,
         'public': node.is_public,
-        'tags': list(node.tags.filter(system=False).values_list('name', flat=True)),
+        'tags': [tag.name for tag in node.tags.all() if not tag.system],
         'description': node.description,
         'url': node.url,
         'is_registration': node.is_registration,
@@ -434,7 +548,7 @@ def serialize_node(node, category):
         'parent_id': parent_id,
         'date_created': node.created,
         'license': serialize_node_license_record(node.license),
-        'affiliated_institutions': list(node.affiliated_institutions.values_list('name', flat=True)),
+        'affiliated_institutions': [institution.name for institution in node.affiliated_institutions.all()],
         'boost': int(not node.is_registration) + 1,  # This is for making registered projects less relevant
         'extra_search_terms': clean_splitters(node.title),
     }
@@ -469,7 +583,7 @@ def serialize_preprint(preprint, category):
         'public': preprint.is_public,
         'published': preprint.verified_publishable,
         'is_retracted': preprint.is_retracted,
-        'tags': list(preprint.tags.filter(system=False).values_list('name', flat=True)),
+        'tags': [tag.name for tag in preprint.tags.all() if not tag.system],
         'description': preprint.description,
         'url': preprint.url,
         'date_created': preprint.created,
@@ -515,15 +629,27 @@ def serialize_group(group, category):
 
     return elastic_document
 
+def update_target_files(target, index=None):
+    from addons.osfstorage.models import OsfStorageFile
+    for file_ in paginated(OsfStorageFile, Q(target_content_type=ContentType.objects.get_for_model(type(target)), target_object_id=target.id)):
+        update_file(file_, index=index)
+
+def is_qa_target(target):
+    return bool(set(settings.DO_NOT_INDEX_LIST['tags']).intersection(tag.name for tag in target.tags.all())) or any(substring in target.title for substring in settings.DO_NOT_INDEX_LIST['titles'])
+
+def should_index_node(node):
+    return not (node.is_deleted or not node.is_public or node.archiving or node.is_spam or (node.spam_status == SpamStatus.FLAGGED and settings.SPAM_FLAGGED_REMOVE_FROM_SEARCH) or node.is_quickfiles or is_qa_target(node))
+
+def should_index_preprint(preprint):
+    return not (not preprint.verified_publishable or preprint.is_spam or (preprint.spam_status == SpamStatus.FLAGGED and settings.SPAM_FLAGGED_REMOVE_FROM_SEARCH) or is_qa_target(preprint))
+
 @requires_search
+@invalidates_search_cache('project', 'component', 'registration')
 def update_node(node, index=None, bulk=False, async_update=False):
-    from addons.osfstorage.models import OsfStorageFile
     index = index or INDEX
-    for file_ in paginated(OsfStorageFile, Q(target_content_type=ContentType.objects.get_for_model(type(node)), target_object_id=node.id)):
-        update_file(file_, index=index)
+    update_target_files(node, index=index)
 
-    is_qa_node = bool(set(settings.DO_NOT_INDEX_LIST['tags']).intersection(node.tags.all().values_list('name', flat=True))) or any(substring in node.title for substring in settings.DO_NOT_INDEX_LIST['titles'])
-    if node.is_deleted or not node.is_public or node.archiving or node.is_spam or (node.spam_status == SpamStatus.FLAGGED and settings.SPAM_FLAGGED_REMOVE_FROM_SEARCH) or node.is_quickfiles or is_qa_node:
+    if not should_index_node(node):
         delete_doc(node._id, node, index=index)
     else:
         category = get_doctype_from_node(node)
@@ -534,14 +660,12 @@ def update_node(node, index=None, bulk=False, async_update=False):
             client().index(index=index, doc_type=category, id=node._id, body=elastic_document, refresh=True)
 
 @requires_search
+@invalidates_search_cache('preprint')
 def update_preprint(preprint, index=None, bulk=False, async_update=False):
-    from addons.osfstorage.models import OsfStorageFile
     index = index or INDEX
-    for file_ in paginated(OsfStorageFile, Q(target_content_type=ContentType.objects.get_for_model(type(preprint)), target_object_id=preprint.id)):
-        update_file(file_, index=index)
+    update_target_files(preprint, index=index)
 
-    is_qa_preprint = bool(set(settings.DO_NOT_INDEX_LIST['tags']).intersection(preprint.tags.all().values_list('name', flat=True))) or any(substring in preprint.title for substring in settings.DO_NOT_INDEX_LIST['titles'])
-    if not preprint.verified_publishable or preprint.is_spam or (preprint.spam_status == SpamStatus.FLAGGED and settings.SPAM_FLAGGED_REMOVE_FROM_SEARCH) or is_qa_preprint:
+    if not should_index_preprint(preprint):
         delete_doc(preprint._id, preprint, category='preprint', index=index)
     else:
         category = 'preprint'
@@ -552,6 +676,7 @@ def update_preprint(preprint, index=None, bulk=False, async_update=False):
             client().index(index=index, doc_type=category, id=preprint._id, body=elastic_document, refresh=True)
 
 @requires_search
+@invalidates_search_cache('group')
 def update_group(group, index=None, bulk=False, async_update=False, deleted_id=None):
     index = index or INDEX
 
@@ -565,6 +690,7 @@ def update_group(group, index=None, bulk=False, async_update=False, deleted_id=N
         else:
             client().index(index=index, doc_type=category, id=group._id, body=elastic_document, refresh=True)
 
+@invalidates_search_cache()
 def bulk_update_nodes(serialize, nodes, index=None, category=None):
     """Updates the list of input projects
 
@@ -587,6 +713,7 @@ def bulk_update_nodes(serialize, nodes, index=None, category=None):
                 'doc_as_upsert': True,
             })
     if actions:
+        search_cache_written(*{action['_type'] for action in actions})
         return helpers.bulk(client(), actions)
 
 def serialize_cgm_contributor(contrib):
@@ -620,6 +747,7 @@ def serialize_cgm(cgm):
     }
 
 @requires_search
+@invalidates_search_cache('collectionSubmission')
 def bulk_update_cgm(cgms, actions=None, op='update', index=None):
     index = index or INDEX
     if not actions and cgms:
@@ -663,6 +791,7 @@ def update_contributors_async(self, user_id):
         bulk_update_contributors(p.page(page_num).object_list)
 
 @requires_search
+@invalidates_search_cache('user')
 def update_user(user, index=None):
 
     index = index or INDEX
@@ -684,6 +813,9 @@ def update_user(user, index=None):
             pass
         return
 
+    client().index(index=index, doc_type='user', body=serialize_user(user), id=user._id, refresh=True)
+
+def serialize_user(user):
     names = dict(
         fullname=user.fullname,
         given_name=user.given_name,
@@ -701,7 +833,7 @@ def update_user(user, index=None):
                 pass  # This is fine, will only happen in 2.x if val is already unicode
             normalized_names[key] = unicodedata.normalize('NFKD', val)
 
-    user_doc = {
+    return {
         'id': user._id,
         'user': user.fullname,
         'normalized_user': normalized_names['fullname'],
@@ -718,9 +850,102 @@ def update_user(user, index=None):
         'boost': 2,  # TODO(fabianvf): Probably should make this a constant or something
     }
 
-    client().index(index=index, doc_type='user', body=user_doc, id=user._id, refresh=True)
+def get_search_update_actions(doc_type, object_ids, index):
+    """Serialize a batch of pending search updates of one doc type into bulk index and delete actions.
+    Related objects the serializers need are prefetched for the whole batch.
+    """
+    actions = []
+    if doc_type == 'node':
+        nodes = (
+            AbstractNode.objects.filter(guids___id__in=object_ids)
+            .select_related('license__node_license')
+            .prefetch_related('guids', 'tags', 'affiliated_institutions')
+        )
+        for node in nodes:
+            update_target_files(node, index=index)
+            if should_index_node(node):
+                category = get_doctype_from_node(node)
+                actions.append(get_index_action(index, category, node._id, serialize_node(node, category)))
+            else:
+                actions.append(get_delete_action(index, get_delete_doctype(node), node._id))
+    elif doc_type == 'preprint':
+        preprints = (
+            Preprint.objects.filter(guids___id__in=object_ids)
+            .select_related('license__node_license', 'provider')
+            .prefetch_related('guids', 'tags')
+        )
+        for preprint in preprints:
+            update_target_files(preprint, index=index)
+            if should_index_preprint(preprint):
+                actions.append(get_index_action(index, 'preprint', preprint._id, serialize_preprint(preprint, 'preprint')))
+            else:
+                actions.append(get_delete_action(index, 'preprint', preprint._id))
+    elif doc_type == 'user':
+        for user in OSFUser.objects.filter(guids___id__in=object_ids).prefetch_related('guids'):
+            if user.is_active:
+                actions.append(get_index_action(index, 'user', user._id, serialize_user(user)))
+            else:
+                # Deactivated users may also need their quickfiles removed
+                update_user(user, index=index)
+    return actions
+
+def get_index_action(index, doc_type, doc_id, doc):
+    return {'_op_type': 'index', '_index': index, '_type': doc_type, '_id': doc_id, '_source': doc}
+
+def get_delete_action(index, doc_type, doc_id):
+    return {'_op_type': 'delete', '_index': index, '_type': doc_type, '_id': doc_id}
 
 @requires_search
+@invalidates_search_cache()
+def bulk_update_search(updates):
+    """Reindex a batch of (doc_type, object_id, index) updates with a single bulk request.
+
+    :return int: Number of documents indexed or deleted
+    """
+    batches = {}
+    for doc_type, object_id, index in updates:
+        batches.setdefault((doc_type, index or INDEX), set()).add(object_id)
+    actions = []
+    for (doc_type, index), object_ids in batches.items():
+        actions.extend(get_search_update_actions(doc_type, list(object_ids), index))
+    if not actions:
+        return 0
+    search_cache_written(*{action['_type'] for action in actions})
+    success, errors = helpers.bulk(client(), actions, refresh=True, raise_on_error=False)
+    # Deleting a document that was never indexed is fine
+    errors = [error for error in errors if error.get('delete', {}).get('status') != 404]
+    if errors:
+        raise exceptions.BulkUpdateError(errors)
+    return len(actions)
+
+@celery_app.task(ignore_results=True)
+def flush_search_updates(batch_size=None):
+    """Reindex the documents waiting in the search update queue, see `SEARCH_UPDATES_BUFFERED`."""
+    PendingSearchUpdate = apps.get_model('osf.PendingSearchUpdate')
+    flushed = 0
+    max_lag = 0
+    while True:
+        updates = PendingSearchUpdate.claim(batch_size=batch_size)
+        if not updates:
+            break
+        try:
+            bulk_update_search([(doc_type, object_id, index) for doc_type, object_id, index, _ in updates])
+        except Exception:
+            # Put the batch back so that the next flush retries it
+            for doc_type, object_id, index, _ in updates:
+                PendingSearchUpdate.enqueue(doc_type, object_id, index)
+            raise
+        now = timezone.now()
+        flushed += len(updates)
+        max_lag = max([max_lag] + [(now - created).total_seconds() for _, _, _, created in updates])
+    stats = PendingSearchUpdate.get_stats()
+    if flushed:
+        logger.info('Flushed {} search updates, max lag {:.1f}s; {} still queued, oldest {:.1f}s'.format(
+            flushed, max_lag, stats['depth'], stats['lag']))
+    return dict(stats, flushed=flushed, max_lag=max_lag)
+
+@requires_search
+@invalidates_search_cache('file')
 def update_file(file_, index=None, delete=False):
     index = index or INDEX
     target = file_.target
@@ -796,6 +1021,7 @@ def update_file(file_, index=None, delete=False):
     )
 
 @requires_search
+@invalidates_search_cache('institution')
 def update_institution(institution, index=None):
     index = index or INDEX
     id_ = institution._id
@@ -847,6 +1073,7 @@ def update_cgm_async(self, cgm_id, collection_id=None, op='update', index=None):
                 self.retry(exc=exc)
 
 @requires_search
+@invalidates_search_cache('collectionSubmission')
 def update_cgm(cgm, op='update', index=None):
     index = index or INDEX
     if op == 'delete':
@@ -856,16 +1083,19 @@ def update_cgm(cgm, op='update', index=None):
     client().index(index=index, doc_type='collectionSubmission', body=collection_submission_doc, id=cgm._id, refresh=True)
 
 @requires_search
+@invalidates_search_cache(*SEARCH_DOC_TYPES)
 def delete_all():
     delete_index(INDEX)
 
 
 @requires_search
+@invalidates_search_cache(*SEARCH_DOC_TYPES)
 def delete_index(index):
     client().indices.delete(index, ignore=[404])
 
 
 @requires_search
+@invalidates_search_cache(*SEARCH_DOC_TYPES)
 def create_index(index=None):
     """Creates index with some specified mappings to begin with,
     all of which are applied to all projects, components, preprints, and registrations.
@@ -934,18 +1164,22 @@ def create_index(index=None):
         client().indices.put_mapping(index=index, doc_type=type_, body=mapping, ignore=[400, 404])
 
 @requires_search
+@invalidates_search_cache()
 def delete_doc(elastic_document_id, node, index=None, category=None):
     index = index or INDEX
-    if not category:
-        if isinstance(node, Preprint):
-            category = 'preprint'
-        elif node.is_registration:
-            category = 'registration'
-        else:
-            category = node.project_or_component
+    category = category or get_delete_doctype(node)
+    search_cache_written(category)
     client().delete(index=index, doc_type=category, id=elastic_document_id, refresh=True, ignore=[404])
 
+def get_delete_doctype(node):
+    if isinstance(node, Preprint):
+        return 'preprint'
+    elif node.is_registration:
+        return 'registration'
+    return node.project_or_component
+
 @requires_search
+@invalidates_search_cache('group')
 def delete_group_doc(deleted_id, index=None):
     index = index or INDEX
     client().delete(index=index, doc_type='group', id=deleted_id, refresh=True, ignore=[404])
@@ -24,13 +24,20 @@ def search(query, index=None, doc_type=None, raw=None):
     index = index or settings.ELASTIC_INDEX
     return search_engine.search(query, index=index, doc_type=doc_type, raw=raw)
 
+def queue_search_update(doc_type, object_id, index=None):
+    """Add a document to the search update queue, where repeated updates are coalesced and flushed in bulk"""
+    from osf.models import PendingSearchUpdate
+    PendingSearchUpdate.enqueue(doc_type, object_id, index=index)
+
 @requires_search
 def update_node(node, index=None, bulk=False, async_update=True, saved_fields=None):
     kwargs = {
         'index': index,
         'bulk': bulk
     }
-    if async_update:
+    if async_update and settings.SEARCH_UPDATES_BUFFERED and not bulk:
+        queue_search_update('node', node._id, index=index)
+    elif async_update:
         node_id = node._id
         # We need the transaction to be committed before trying to run celery tasks.
         # For example, when updating a Node's privacy, is_public must be True in the
@@ -50,7 +57,9 @@ def update_preprint(preprint, index=None, bulk=False, async_update=True, saved_f
         'index': index,
         'bulk': bulk
     }
-    if async_update:
+    if async_update and settings.SEARCH_UPDATES_BUFFERED and not bulk:
+        queue_search_update('preprint', preprint._id, index=index)
+    elif async_update:
         preprint_id = preprint._id
         # We need the transaction to be committed before trying to run celery tasks.
         if settings.USE_CELERY:
@@ -101,6 +110,9 @@ def update_contributors_async(user_id):
 
 @requires_search
 def update_user(user, index=None, async_update=True):
+    if async_update and settings.SEARCH_UPDATES_BUFFERED:
+        queue_search_update('user', user._id, index=index)
+        return
     index = index or settings.ELASTIC_INDEX
     if async_update:
         user_id = user.id
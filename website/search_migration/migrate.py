@@ -2,9 +2,13 @@
 # -*- coding: utf-8 -*-
 """Migration script for Search-enabled Models."""
 from __future__ import absolute_import
-from math import ceil
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import functools
+import json
 import logging
+import os
+import threading
+import time
 
 from django.db import connection
 from django.core.paginator import Paginator
@@ -21,55 +25,168 @@ from osf.models import OSFUser, Institution, AbstractNode, BaseFileNode, Preprin
 from website import settings
 from website.app import init_app
 from website.search.elastic_search import client as es_client
-from website.search.elastic_search import bulk_update_cgm
+from website.search.elastic_search import bulk_update_cgm, invalidate_search_cache
 from website.search.search import update_institution, bulk_update_collected_metadata
 
 
 logger = logging.getLogger(__name__)
 
-def sql_migrate(index, sql, max_id, increment, es_args=None, **kwargs):
+class MigrationCheckpoint(object):
+    """Progress of a migration into a new index, saved to a JSON file as steps and id ranges complete
+    so that an interrupted migration can resume where it stopped.
+    """
+
+    def __init__(self, path, alias, index, steps=None, shards=None):
+        self.path = path
+        self.alias = alias
+        self.index = index
+        self.steps = set(steps or [])
+        self.shards = {label: set(page_starts) for label, page_starts in (shards or {}).items()}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path, alias):
+        """Return the saved checkpoint for migrating `alias`, or None if there isn't one."""
+        try:
+            with open(path) as fp:
+                data = json.load(fp)
+        except (IOError, ValueError):
+            return None
+        if data.get('alias') != alias:
+            return None
+        return cls(path, **data)
+
+    def save(self):
+        with self._lock:
+            data = {
+                'alias': self.alias,
+                'index': self.index,
+                'steps': sorted(self.steps),
+                'shards': {label: sorted(page_starts) for label, page_starts in self.shards.items()},
+            }
+            tmp_path = '{}.tmp'.format(self.path)
+            with open(tmp_path, 'w') as fp:
+                json.dump(data, fp)
+            os.replace(tmp_path, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def is_step_done(self, step):
+        return step in self.steps
+
+    def mark_step_done(self, step):
+        self.steps.add(step)
+        self.save()
+
+    def is_shard_done(self, label, page_start):
+        return page_start in self.shards.get(label, ())
+
+    def mark_shard_done(self, label, page_start):
+        with self._lock:
+            self.shards.setdefault(label, set()).add(page_start)
+        self.save()
+
+
+def migrate_shard(index, sql, page_start, page_end, es_args, **kwargs):
+    """Index the objects with ids in (`page_start`, `page_end`]. Returns the number of objects sent."""
+    with connection.cursor() as cursor:
+        cursor.execute(sql.format(
+            index=index,
+            page_start=page_start,
+            page_end=page_end,
+            **kwargs))
+        ser_objs = cursor.fetchone()[0]
+    if ser_objs:
+        helpers.bulk(client(), ser_objs, **es_args)
+    return len(ser_objs or [])
+
+def _threaded_migrate_shard(*args, **kwargs):
+    try:
+        return migrate_shard(*args, **kwargs)
+    finally:
+        # Each worker thread opens its own database connection
+        connection.close()
+
+def sql_migrate(index, sql, max_id, increment, es_args=None, workers=None, checkpoint=None, label='objects', **kwargs):
     """ Run provided SQL and send output to elastic.
 
+    The id space is split into shards of `increment` ids, which are queried and sent to elastic by a
+    pool of `workers` threads. Completed shards are recorded in `checkpoint`, if given, and skipped
+    when resuming.
+
     :param str index: Elastic index to update (formatted into `sql`)
     :param str sql: SQL to format and run. See __init__.py in this module
     :param int max_id: Last known object id. Indicates when to stop paging
     :param int increment: Page size
     :param  dict es_args:  Dict or None, to pass to `helpers.bulk`
+    :param int workers: Number of shards to migrate concurrently. Defaults to settings.ELASTIC_MIGRATION_WORKERS
+    :param MigrationCheckpoint checkpoint: Checkpoint to record completed shards in
+    :param str label: Name of the objects being migrated, for logging and checkpointing
     :kwargs: Additional format arguments for `sql` arg
 
     :return int: Number of migrated objects
     """
     if es_args is None:
         es_args = {}
-    total_pages = int(ceil(max_id / float(increment)))
+    workers = workers or settings.ELASTIC_MIGRATION_WORKERS
+    if workers > 1 and connection.in_atomic_block:
+        # Worker threads use their own connections and can't see this transaction's writes
+        logger.warning('Migrating {} serially because a transaction is open'.format(label))
+        workers = 1
+
+    # An extra page is included to cover the edge case where:
+    #       max_id == (total_pages * increment) - 1
+    # and two additional objects are created during runtime.
+    page_starts = range(0, max_id + increment + 1, increment)
+    pending = [
+        page_start for page_start in page_starts
+        if not (checkpoint and checkpoint.is_shard_done(label, page_start))
+    ]
+    if len(pending) < len(page_starts):
+        logger.info('Resuming {}: {} / {} pages already migrated'.format(label, len(page_starts) - len(pending), len(page_starts)))
+
     total_objs = 0
-    page_start = 0
-    page_end = 0
-    page = 0
-    while page_end <= (max_id + increment):
-        page += 1
-        page_end += increment
-        if page <= total_pages:
-            logger.info('Updating page {} / {}'.format(page_end / increment, total_pages))
-        else:
-            # An extra page is included to cover the edge case where:
-            #       max_id == (total_pages * increment) - 1
-            # and two additional objects are created during runtime.
-            logger.info('Cleaning up...')
-        with connection.cursor() as cursor:
-            cursor.execute(sql.format(
-                index=index,
-                page_start=page_start,
-                page_end=page_end,
-                **kwargs))
-            ser_objs = cursor.fetchone()[0]
-            if ser_objs:
-                total_objs += len(ser_objs)
-                helpers.bulk(client(), ser_objs, **es_args)
-        page_start = page_end
+    pages_done = 0
+    start = time.time()
+
+    def shard_done(page_start):
+        if checkpoint:
+            checkpoint.mark_shard_done(label, page_start)
+        elapsed = time.time() - start
+        logger.info('Updated {} page {} / {} ({:.0f} docs/sec)'.format(
+            label, pages_done, len(pending), total_objs / elapsed if elapsed else 0))
+
+    if workers == 1:
+        for page_start in pending:
+            total_objs += migrate_shard(index, sql, page_start, page_start + increment, es_args, **kwargs)
+            pages_done += 1
+            shard_done(page_start)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(_threaded_migrate_shard, index, sql, page_start, page_start + increment, es_args, **kwargs): page_start
+                for page_start in pending
+            }
+            try:
+                for future in as_completed(futures):
+                    total_objs += future.result()
+                    pages_done += 1
+                    shard_done(futures[future])
+            except Exception:
+                for future in futures:
+                    future.cancel()
+                raise
+
+    elapsed = time.time() - start
+    logger.info('Migrated {} {} in {:.1f}s ({:.0f} docs/sec)'.format(
+        total_objs, label, elapsed, total_objs / elapsed if elapsed else 0))
     return total_objs
 
-def migrate_nodes(index, delete, increment=10000):
+def migrate_nodes(index, delete, increment=10000, workers=None, checkpoint=None):
     logger.info('Migrating nodes to index: {}'.format(index))
     max_nid = AbstractNode.objects.last().id
     total_nodes = sql_migrate(
@@ -77,6 +194,9 @@ def migrate_nodes(index, delete, increment=10000):
         JSON_UPDATE_NODES_SQL,
         max_nid,
         increment,
+        workers=workers,
+        checkpoint=checkpoint,
+        label='nodes',
         spam_flagged_removed_from_search=settings.SPAM_FLAGGED_REMOVE_FROM_SEARCH)
     logger.info('{} nodes migrated'.format(total_nodes))
     if delete:
@@ -88,6 +208,9 @@ def migrate_nodes(index, delete, increment=10000):
             max_nid,
             increment,
             es_args={'raise_on_error': False},  # ignore 404s
+            workers=workers,
+            checkpoint=checkpoint,
+            label='deleted nodes',
             spam_flagged_removed_from_search=settings.SPAM_FLAGGED_REMOVE_FROM_SEARCH)
         logger.info('{} nodes marked deleted'.format(total_nodes))
 
@@ -119,7 +242,7 @@ def migrate_groups(index, delete):
         logger.info('Updating page {} / {}'.format(page_number, paginator.num_pages))
         OSFGroup.bulk_update_search(paginator.page(page_number).object_list, index=index)
 
-def migrate_files(index, delete, increment=10000):
+def migrate_files(index, delete, increment=10000, workers=None, checkpoint=None):
     logger.info('Migrating files to index: {}'.format(index))
     max_fid = BaseFileNode.objects.last().id
     total_files = sql_migrate(
@@ -127,6 +250,9 @@ def migrate_files(index, delete, increment=10000):
         JSON_UPDATE_FILES_SQL,
         max_fid,
         increment,
+        workers=workers,
+        checkpoint=checkpoint,
+        label='files',
         spam_flagged_removed_from_search=settings.SPAM_FLAGGED_REMOVE_FROM_SEARCH)
     logger.info('{} files migrated'.format(total_files))
     if delete:
@@ -138,17 +264,23 @@ def migrate_files(index, delete, increment=10000):
             max_fid,
             increment,
             es_args={'raise_on_error': False},  # ignore 404s
+            workers=workers,
+            checkpoint=checkpoint,
+            label='deleted files',
             spam_flagged_removed_from_search=settings.SPAM_FLAGGED_REMOVE_FROM_SEARCH)
         logger.info('{} files marked deleted'.format(total_files))
 
-def migrate_users(index, delete, increment=10000):
+def migrate_users(index, delete, increment=10000, workers=None, checkpoint=None):
     logger.info('Migrating users to index: {}'.format(index))
     max_uid = OSFUser.objects.last().id
     total_users = sql_migrate(
         index,
         JSON_UPDATE_USERS_SQL,
         max_uid,
-        increment)
+        increment,
+        workers=workers,
+        checkpoint=checkpoint,
+        label='users')
     logger.info('{} users migrated'.format(total_users))
     if delete:
         logger.info('Preparing to delete old user documents')
@@ -158,7 +290,10 @@ def migrate_users(index, delete, increment=10000):
             JSON_DELETE_USERS_SQL,
             max_uid,
             increment,
-            es_args={'raise_on_error': False})  # ignore 404s
+            es_args={'raise_on_error': False},  # ignore 404s
+            workers=workers,
+            checkpoint=checkpoint,
+            label='deleted users')
         logger.info('{} users marked deleted'.format(total_users))
 
 def migrate_collected_metadata(index, delete):
@@ -190,13 +325,15 @@ def migrate_institutions(index):
     for inst in Institution.objects.filter(is_deleted=False):
         update_institution(inst, index)
 
-def migrate(delete, remove=False, index=None, app=None):
+def migrate(delete, remove=False, index=None, app=None, workers=None, resume=False):
     """Reindexes relevant documents in ES
 
     :param bool delete: Delete documents that should not be indexed
     :param bool remove: Removes old index after migrating
     :param str index: index alias to version and migrate
     :param App app: Flask app for context
+    :param int workers: Number of id ranges to migrate concurrently. Defaults to settings.ELASTIC_MIGRATION_WORKERS
+    :param bool resume: Resume an interrupted migration into its new index, skipping completed work
     """
     index = index or settings.ELASTIC_INDEX
     app = app or init_app('website.settings', set_backends=True, routes=True)
@@ -208,19 +345,43 @@ def migrate(delete, remove=False, index=None, app=None):
     ctx = app.test_request_context()
     ctx.push()
 
-    new_index = set_up_index(index)
-
+    checkpoint = None
+    if resume:
+        checkpoint = MigrationCheckpoint.load(settings.ELASTIC_MIGRATION_CHECKPOINT_PATH, index)
+        if checkpoint and not es_client().indices.exists(index=checkpoint.index):
+            logger.info('Index {} from the checkpoint no longer exists, starting over'.format(checkpoint.index))
+            checkpoint = None
+    if checkpoint:
+        new_index = checkpoint.index
+        logger.info('Resuming migration of {0} to {1}'.format(index, new_index))
+    else:
+        new_index = set_up_index(index)
+        checkpoint = MigrationCheckpoint(settings.ELASTIC_MIGRATION_CHECKPOINT_PATH, index, new_index)
+        checkpoint.save()
+
+    steps = [
+        ('nodes', functools.partial(migrate_nodes, new_index, delete=delete, workers=workers, checkpoint=checkpoint)),
+        ('files', functools.partial(migrate_files, new_index, delete=delete, workers=workers, checkpoint=checkpoint)),
+        ('users', functools.partial(migrate_users, new_index, delete=delete, workers=workers, checkpoint=checkpoint)),
+        ('preprints', functools.partial(migrate_preprints, new_index, delete=delete)),
+        ('preprint files', functools.partial(migrate_preprint_files, new_index, delete=delete)),
+        ('collected metadata', functools.partial(migrate_collected_metadata, new_index, delete=delete)),
+        ('groups', functools.partial(migrate_groups, new_index, delete=delete)),
+    ]
     if settings.ENABLE_INSTITUTIONS:
-        migrate_institutions(new_index)
-    migrate_nodes(new_index, delete=delete)
-    migrate_files(new_index, delete=delete)
-    migrate_users(new_index, delete=delete)
-    migrate_preprints(new_index, delete=delete)
-    migrate_preprint_files(new_index, delete=delete)
-    migrate_collected_metadata(new_index, delete=delete)
-    migrate_groups(new_index, delete=delete)
+        steps.insert(0, ('institutions', functools.partial(migrate_institutions, new_index)))
+
+    for step, migrate_step in steps:
+        if checkpoint.is_step_done(step):
+            logger.info('Skipping {}, already migrated'.format(step))
+            continue
+        start = time.time()
+        migrate_step()
+        logger.info('Migrated {} in {:.1f}s'.format(step, time.time() - start))
+        checkpoint.mark_step_done(step)
 
     set_up_alias(index, new_index)
+    checkpoint.clear()
 
     if remove:
         remove_old_index(new_index)
@@ -250,12 +411,18 @@ def set_up_index(idx):
 
 
 def set_up_alias(old_index, index):
+    """Point the `old_index` alias at `index`, removing it from any other indices in the same atomic update."""
     alias = es_client().indices.get_aliases(index=old_index)
+    actions = []
     if alias:
         logger.info('Removing old aliases to {}'.format(old_index))
-        es_client().indices.delete_alias(index=old_index, name='_all', ignore=404)
+        for aliased_index, aliases in alias.items():
+            for name in aliases.get('aliases', {}):
+                actions.append({'remove': {'index': aliased_index, 'alias': name}})
     logger.info('Creating new alias from {0} to {1}'.format(old_index, index))
-    es_client().indices.put_alias(index=index, name=old_index)
+    actions.append({'add': {'index': index, 'alias': old_index}})
+    es_client().indices.update_aliases(body={'actions': actions})
+    invalidate_search_cache()
 
 
 def remove_old_index(index):
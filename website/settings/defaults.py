@@ -97,6 +97,13 @@ EXTERNAL_EMBER_APPS = {}
 
 LOG_PATH = os.path.join(APP_PATH, 'logs')
 TEMPLATES_PATH = os.path.join(BASE_PATH, 'templates')
+# Mako templates are compiled to modules here, see the precompile_templates management command
+MAKO_MODULE_DIRECTORY = '/tmp/mako_modules'
+# Compiled templates and email subjects each process keeps
+MAKO_TEMPLATE_CACHE_SIZE = 500
+MAIL_SUBJECT_CACHE_SIZE = 500
+# Compile every template when the app is initialized, so workers forked afterwards share them
+MAKO_WARM_CACHES = False
 
 # User management & registration
 CONFIRM_REGISTRATIONS_BY_EMAIL = True
@@ -106,6 +113,13 @@ SEARCH_ENGINE = 'elastic'  # Can be 'elastic', or None
 ELASTIC_URI = '127.0.0.1:9200'
 ELASTIC_TIMEOUT = 10
 ELASTIC_INDEX = 'website'
+# Seconds to cache search results and their facet counts, 0 disables the cache. Any write to the index
+# invalidates the whole cache.
+SEARCH_RESULTS_CACHE_TIMEOUT = 30
+# Number of id ranges `invoke migrate_search` queries and sends to elastic concurrently
+ELASTIC_MIGRATION_WORKERS = 4
+# Progress of the current search migration, used to resume it if it's interrupted
+ELASTIC_MIGRATION_CHECKPOINT_PATH = os.path.join(LOG_PATH, 'search_migration_checkpoint.json')
 ELASTIC_KWARGS = {
     # 'use_ssl': False,
     # 'verify_certs': True,
@@ -120,6 +134,12 @@ COOKIE_NAME = 'osf'
 OSF_COOKIE_DOMAIN = None
 # server-side verification timeout
 OSF_SESSION_TIMEOUT = 30 * 24 * 60 * 60  # 30 days in seconds
+# Anonymous sessions looked up by cookie kept in each process's cache, and the seconds they are kept, 0 disables
+# the cache. The timeout bounds how long a session changed by another process, e.g. logged in, can be served stale.
+SESSION_LOCAL_CACHE_SIZE = 1000
+SESSION_LOCAL_CACHE_TIMEOUT = 5
+# Sessions deleted per transaction by `scripts/clear_sessions.py`
+SESSION_CLEANUP_BATCH_SIZE = 10000
 # TODO: Override SECRET_KEY in local.py in production
 SECRET_KEY = 'CHANGEME'
 SESSION_COOKIE_SECURE = SECURE_MODE
@@ -160,6 +180,18 @@ SENDGRID_API_KEY = None
 SENDGRID_WHITELIST_MODE = False
 SENDGRID_EMAIL_WHITELIST = []
 
+# Idle SMTP connections each process keeps open to reuse across emails, and seconds before they're closed
+MAIL_CONNECTION_POOL_SIZE = 4
+MAIL_CONNECTION_MAX_AGE = 60
+# Emails sent at once when sending a batch, e.g. digests
+MAIL_SEND_WORKERS = 4
+
+# Users whose digests are loaded, rendered and sent together, and threads rendering them
+DIGEST_BATCH_SIZE = 100
+DIGEST_RENDER_WORKERS = 4
+# Seconds after which notifications claimed by a run that never finished sending them are claimed again
+DIGEST_CLAIM_TIMEOUT = 60 * 60
+
 # Mailchimp
 MAILCHIMP_API_KEY = None
 MAILCHIMP_WEBHOOK_SECRET_KEY = 'CHANGEME'  # OSF secret key to ensure webhook is secure
@@ -353,6 +385,10 @@ SHARE_URL = None
 SHARE_API_TOKEN = None  # Required to send project updates to SHARE
 
 CAS_SERVER_URL = 'http://localhost:8080'
+# Seconds to cache the CAS profile of a valid OAuth2 access token, 0 disables the cache
+CAS_PROFILE_CACHE_TIMEOUT = 60
+# Seconds to remember that CAS rejected an OAuth2 access token
+CAS_PROFILE_NEGATIVE_CACHE_TIMEOUT = 10
 MFR_SERVER_URL = 'http://localhost:7778'
 
 ###### ARCHIVER ###########
@@ -364,6 +400,28 @@ ARCHIVE_TIMEOUT_TIMEDELTA = timedelta(1)  # 24 hours
 
 ENABLE_ARCHIVER = True
 
+# Folders of an addon's file tree listed at once when statting it for archiving
+ADDON_CRAWL_WORKERS = 8
+# Folder listings per second each process sends to WaterButler for each addon, 'default' for addons not listed
+ADDON_CRAWL_RATE_LIMITS = {
+    'default': 5,
+}
+# Seconds to wait for WaterButler to list a folder
+ADDON_CRAWL_TIMEOUT = 60
+# Retries of statting an addon after WaterButler errors, resuming from the folders already listed
+ARCHIVER_STAT_MAX_RETRIES = 3
+ARCHIVER_STAT_RETRY_DELAY = 60
+
+# Copy addons larger than a chunk as several subtrees, each in its own WaterButler request, rather than at once
+ARCHIVER_CHUNKED = False
+ARCHIVER_CHUNK_SIZE = 1024 ** 3  # 1 GB
+ARCHIVER_CHUNK_MAX_FILES = 1000
+# Chunks of an addon being copied at once
+ARCHIVER_CHUNK_CONCURRENCY = 4
+# Retries of a chunk whose copy failed, before failing the addon
+ARCHIVER_CHUNK_MAX_RETRIES = 3
+ARCHIVER_CHUNK_RETRY_DELAY = 60
+
 JWT_SECRET = 'changeme'
 JWT_ALGORITHM = 'HS256'
 
@@ -410,7 +468,10 @@ class CeleryConfig:
         'osf.management.commands.migrate_deleted_date',
         'osf.management.commands.addon_deleted_date',
         'osf.management.commands.migrate_registration_responses',
-        'osf.management.commands.update_institution_project_counts'
+        'osf.management.commands.update_institution_project_counts',
+        'osf.management.commands.compact_user_activity_counters',
+        'osf.management.commands.reconcile_storage_usage',
+        'osf.management.commands.check_node_permission_index',
     }
 
     med_pri_modules = {
@@ -496,6 +557,10 @@ class CeleryConfig:
         'osf.management.commands.deactivate_requested_accounts',
         'osf.management.commands.check_crossref_dois',
         'osf.management.commands.update_institution_project_counts',
+        'framework.analytics',
+        'osf.management.commands.compact_user_activity_counters',
+        'osf.management.commands.reconcile_storage_usage',
+        'osf.management.commands.check_node_permission_index',
     )
 
     # Modules that need metrics and release requirements
@@ -607,6 +672,11 @@ class CeleryConfig:
             #   'task': 'management.commands.data_storage_usage',
             #   'schedule': crontab(day_of_month=1, minute=30, hour=4),  # Last of the month at 11:30 p.m.
             # },
+            # 'compact_user_activity_counters': {
+            #   'task': 'management.commands.compact_user_activity_counters',
+            #   'schedule': crontab(minute=0, hour=7, day_of_month=1),  # Monthly 2:00 a.m.
+            #   'kwargs': {'days': 90},
+            # },
             # 'migrate_pagecounter_data': {
             #   'task': 'management.commands.migrate_pagecounter_data',
             #   'schedule': crontab(minute=0, hour=7),  # Daily 2:00 a.m.
@@ -637,6 +707,32 @@ class CeleryConfig:
                 'task': 'management.commands.update_institution_project_counts',
                 'schedule': crontab(minute=0, hour=9), # Daily 05:00 a.m. EDT
             },
+            'reconcile_storage_usage': {
+                'task': 'management.commands.reconcile_storage_usage',
+                'schedule': crontab(minute=0, hour=8),  # Daily 3:00 a.m.
+            },
+            'check_node_permission_index': {
+                'task': 'management.commands.check_node_permission_index',
+                'schedule': crontab(minute=0, hour=9, day_of_week=0),  # Sunday 4:00 a.m.
+                'kwargs': {'fix': True},
+            },
+        }
+
+        # Tasks flushing a buffer, keyed by the setting that enables the buffer. They are only scheduled when
+        # it is on, see framework.celery_tasks, as local.py is loaded after this class is defined.
+        buffer_flush_schedule = {
+            'PAGE_COUNTER_BUFFERED': {
+                'flush_page_counter_events': {
+                    'task': 'framework.analytics.flush_page_counter_events',
+                    'schedule': crontab(minute='*'),  # Every minute
+                },
+            },
+            'SEARCH_UPDATES_BUFFERED': {
+                'flush_search_updates': {
+                    'task': 'website.search.elastic_search.flush_search_updates',
+                    'schedule': timedelta(seconds=10),  # Every 10 seconds
+                },
+            },
         }
 
         # Tasks that need metrics and release requirements
@@ -672,9 +768,32 @@ ENABLE_INSTITUTIONS = True
 
 ENABLE_STORAGE_USAGE_CACHE = True
 
+# Append file view/download hits to a buffer that a periodic task folds into PageCounters,
+# instead of locking and rewriting the PageCounter row on every hit
+PAGE_COUNTER_BUFFERED = False
+PAGE_COUNTER_FLUSH_BATCH_SIZE = 5000
+
+# Queue node, preprint and user search updates in a table that coalesces repeated updates to the same document
+# and is flushed in bulk, instead of running a celery task with a single-document index call per save
+SEARCH_UPDATES_BUFFERED = False
+SEARCH_UPDATE_FLUSH_BATCH_SIZE = 500
+# A queued document is flushed once it hasn't been updated for SEARCH_UPDATE_DEBOUNCE seconds,
+# or at the latest SEARCH_UPDATE_MAX_LAG seconds after it was first queued
+SEARCH_UPDATE_DEBOUNCE = 5
+SEARCH_UPDATE_MAX_LAG = 60
+
+# Answer node visibility and permission queries from the materialized NodePermissionIndex rather than guardian's
+# tables. The index is maintained either way; turn this off to fall back while it's rebuilt or checked.
+NODE_PERMISSION_INDEX = True
+
 ENABLE_VARNISH = False
 ENABLE_ESI = False
 VARNISH_SERVERS = []  # This should be set in local.py or cache invalidation won't work
+# Ban the API urls of models registered in api.caching.rules whenever they are saved or deleted
+VARNISH_BAN_ON_MODEL_CHANGES = False
+# Send each flush's paths as anchored regexes in the X-Ban-Url header of one BAN per server, rather than a BAN
+# per path to the path's url. Requires the VCL in api/caching/regex_bans.vcl to be deployed first.
+VARNISH_REGEX_BANS = False
 ESI_MEDIA_TYPES = {'application/vnd.api+json', 'application/json'}
 
 # Used for gathering meta information about the current build
@@ -1918,6 +2037,11 @@ CUSTOM_CITATIONS = {
     'bluebook2': 'bluebook',
     'bluebook-inline': 'bluebook'
 }
+# Parsed citation styles kept per process, keyed by style id and file modification time
+CITATION_STYLE_CACHE_SIZE = 64
+# Seconds to cache a rendered citation, 0 disables the cache. Entries are keyed by the node's modified
+# timestamp and dropped when its contributors or their names change.
+CITATION_CACHE_TIMEOUT = 60 * 60 * 24
 
 #Email templates logo
 OSF_LOGO = 'osf_logo'
@@ -1,6 +1,15 @@
 <%inherit file="notify_base.mako" />
 
 <% from website import util %>
+<%def name="node_title(guid)">
+<% node_titles = context.get('node_titles') or {} %>
+%if guid in node_titles:
+${node_titles[guid]}
+%else:
+<% from osf.models import Guid %>
+${Guid.objects.get(_id=guid).referent.title}
+%endif
+</%def>
 <%def name="build_message(d, parent=None)">
 %for key in d['children']:
     %if d['children'][key]['messages']:
@@ -8,10 +17,9 @@
             <thead class="block-head">
             <th colspan="2" style="padding: 0px 15px 0px 15px;">
                 <h3 style="padding: 0 15px 5px 15px; margin: 30px 0 0 0;border: none;list-style: none;font-weight: 300; border-bottom: 1px solid #eee; text-align: left;">
-                  <% from osf.models import Guid %>
-                ${Guid.objects.get(_id=key).referent.title}
+                ${node_title(key)}
                 %if parent :
-                  <small style="font-size: 14px;color: #999;"> in ${Guid.objects.get(_id=parent).referent.title}</small>
+                  <small style="font-size: 14px;color: #999;"> in ${node_title(parent)}</small>
                 %endif
                 </h3>
             </th>